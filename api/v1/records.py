@@ -8,16 +8,20 @@ import os
 import sys
 import json
 import logging
-from flask import Blueprint, request, jsonify, current_app
+from urllib.parse import urlencode
+from flask import Blueprint, Response, request, jsonify, current_app, stream_with_context
 from datetime import datetime
 
 # Add parent directory to path
 sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
 
-from database.models import Session, MedicalRecord, User
-from utils.database import create_medical_record, get_medical_records_for_patient, log_record_access
-from utils.helpers import load_encryption_key, generate_unique_id
-from config.config import BLOCKCHAIN_KEY_FILE
+from database.models import Session, MedicalRecord, User, close_session, init_app
+from utils.database import create_medical_record, get_record_page_for_patient, log_record_access, log_records_access
+from utils.helpers import parse_datetime
+from utils.keyring import get_keyring
+from utils.anchoring import get_batch_anchorer
+from utils.record_export import export_patient_records
+from config.config import BLOCKCHAIN_KEY_FILE, RECORDS_PAGE_SIZE, RECORDS_MAX_PAGE_SIZE
 
 # Import authentication decorator from users module
 from .users import auth_required
@@ -28,6 +32,9 @@ logger = logging.getLogger(__name__)
 # Initialize blueprint
 records_blueprint = Blueprint('records', __name__, url_prefix='/api/v1/records')
 
+# Share one database session per request in the app this blueprint is registered on
+records_blueprint.record_once(lambda state: init_app(state.app))
+
 # Helper function to check record access permission
 def check_record_access_permission(user_id, user_role, record):
     """
@@ -67,76 +74,141 @@ def check_record_access_permission(user_id, user_role, record):
     
     return False
 
+def get_requested_patient_id():
+    """
+    Get the patient whose records the request is for
+    
+    Returns:
+        tuple: (patient ID, None), or (None, error response) if the ID is
+            missing or the user may not read that patient's records
+    """
+    patient_id = request.args.get('patient_id')
+    if patient_id:
+        patient_id = int(patient_id)
+        
+        # If requesting records for a specific patient, check permissions
+        if request.user_role != 'admin' and request.user_role != 'doctor' and request.user_id != patient_id:
+            return None, (jsonify({'error': 'Not authorized to access these records'}), 403)
+        return patient_id, None
+    
+    # If no patient ID specified, use the logged-in user's ID (if patient)
+    if request.user_role == 'patient':
+        return request.user_id, None
+    
+    # For admin, doctor, or insurance, we need a patient ID
+    return None, (jsonify({'error': 'Patient ID required'}), 400)
+
 # Define API endpoints
 @records_blueprint.route('/', methods=['GET'])
 @auth_required
 def get_records():
-    """Get medical records"""
+    """
+    Get a page of medical records, newest first
+    
+    Query parameters: patient_id, limit, cursor (from the X-Next-Cursor
+    header of the previous page), fields (comma-separated), record_type,
+    from and to (recorded_at bounds, YYYY-MM-DD or YYYY-MM-DD HH:MM:SS).
+    """
     try:
         # Check if a specific patient ID is provided
-        patient_id = request.args.get('patient_id')
-        if patient_id:
-            patient_id = int(patient_id)
-            
-            # If requesting records for a specific patient, check permissions
-            if request.user_role != 'admin' and request.user_role != 'doctor' and request.user_id != patient_id:
-                return jsonify({'error': 'Not authorized to access these records'}), 403
-        else:
-            # If no patient ID specified, use the logged-in user's ID (if patient)
-            if request.user_role == 'patient':
-                patient_id = request.user_id
-            else:
-                # For admin, doctor, or insurance, we need a patient ID
-                return jsonify({'error': 'Patient ID required'}), 400
+        patient_id, error = get_requested_patient_id()
+        if error:
+            return error
         
-        # Get records
-        records = get_medical_records_for_patient(patient_id)
+        # Parse paging, projection and filters
+        try:
+            limit = min(int(request.args.get('limit', RECORDS_PAGE_SIZE)), RECORDS_MAX_PAGE_SIZE)
+            if limit < 1:
+                raise ValueError("limit must be positive")
+        except ValueError:
+            return jsonify({'error': 'Invalid limit'}), 400
         
-        # Format records
-        record_list = []
-        session = Session()
+        fields = [field.strip() for field in request.args.get('fields', '').split(',') if field.strip()]
+        
+        filters = {'record_type': request.args.get('record_type')}
+        for param, name in (('from', 'recorded_from'), ('to', 'recorded_to')):
+            if request.args.get(param):
+                filters[name] = parse_datetime(request.args[param])
+                if filters[name] is None:
+                    return jsonify({'error': f'Invalid {param} date'}), 400
+        
+        # Get one page of records, filtered and projected in SQL
         try:
-            for record in records:
-                # Get provider name
-                provider = session.query(User).filter(User.id == record.provider_id).first()
-                provider_name = provider.full_name if provider else "Unknown"
-                
-                # Format record data
-                record_data = {
-                    'id': record.id,
-                    'record_id': record.record_id,
-                    'patient_id': record.patient_id,
-                    'provider_id': record.provider_id,
-                    'provider_name': provider_name,
-                    'record_type': record.record_type,
-                    'created_at': record.created_at.isoformat() if record.created_at else None,
-                    'recorded_at': record.recorded_at.isoformat() if record.recorded_at else None,
-                    'institution': record.institution,
-                    'department': record.department,
-                    'location': record.location,
-                    'transaction_id': record.transaction_id,
-                    'block_number': record.block_number
-                }
-                
-                record_list.append(record_data)
-                
-                # Log this access
-                log_record_access(
-                    record_id=record.id,
-                    user_id=request.user_id,
-                    action='view',
-                    ip_address=request.remote_addr,
-                    user_agent=request.user_agent.string
-                )
-                
-            return jsonify(record_list)
-        finally:
-            session.close()
+            record_list, record_ids, next_cursor = get_record_page_for_patient(
+                patient_id, limit, fields=fields, cursor=request.args.get('cursor'), **filters
+            )
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        for record_data in record_list:
+            for field in ('created_at', 'recorded_at'):
+                if record_data.get(field):
+                    record_data[field] = record_data[field].isoformat()
+        
+        # Log this access
+        log_records_access(
+            record_ids=record_ids,
+            user_id=request.user_id,
+            action='view',
+            ip_address=request.remote_addr,
+            user_agent=request.user_agent.string
+        )
+        
+        response = jsonify(record_list)
+        if next_cursor:
+            response.headers['X-Next-Cursor'] = next_cursor
+            args = request.args.to_dict()
+            args['cursor'] = next_cursor
+            response.headers['Link'] = f'<{request.base_url}?{urlencode(args)}>; rel="next"'
+        return response
             
     except Exception as e:
         logger.error(f"Error getting records: {str(e)}")
         return jsonify({'error': str(e)}), 500
 
+@records_blueprint.route('/export', methods=['GET'])
+@auth_required
+def export_records():
+    """
+    Stream a patient's full record history with decrypted data
+    
+    Query parameters: patient_id, format (ndjson or gzip). Records are
+    written oldest first as they are decrypted, one JSON object per line.
+    """
+    try:
+        patient_id, error = get_requested_patient_id()
+        if error:
+            return error
+        
+        export_format = request.args.get('format', 'ndjson')
+        if export_format not in ('ndjson', 'gzip'):
+            return jsonify({'error': 'Invalid format'}), 400
+        
+        keys = get_keyring(BLOCKCHAIN_KEY_FILE).keys
+        if not keys:
+            return jsonify({'error': 'Encryption key not found'}), 500
+        
+        # Log each batch as it is sent
+        user_id = request.user_id
+        ip_address = request.remote_addr
+        user_agent = request.user_agent.string
+        def log_batch(record_ids):
+            log_records_access(record_ids=record_ids, user_id=user_id, action='view',
+                               ip_address=ip_address, user_agent=user_agent)
+        
+        chunks = export_patient_records(patient_id, keys, compress=export_format == 'gzip', on_batch=log_batch)
+        filename = f"records-{patient_id}.ndjson" + ('.gz' if export_format == 'gzip' else '')
+        response = Response(
+            stream_with_context(chunks),
+            mimetype='application/gzip' if export_format == 'gzip' else 'application/x-ndjson'
+        )
+        response.headers['Content-Disposition'] = f'attachment; filename="{filename}"'
+        response.headers['Cache-Control'] = 'no-store'
+        return response
+            
+    except Exception as e:
+        logger.error(f"Error exporting records: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
 @records_blueprint.route('/<int:record_id>', methods=['GET'])
 @auth_required
 def get_record(record_id):
@@ -168,10 +240,10 @@ def get_record(record_id):
             decrypted_data = None
             
             if encrypted_data:
-                # Load encryption key
-                key = load_encryption_key(BLOCKCHAIN_KEY_FILE)
-                if key:
-                    decrypted_data = record.decrypt_data(key)
+                # Older keys still decrypt records not yet rotated
+                keys = get_keyring(BLOCKCHAIN_KEY_FILE).keys
+                if keys:
+                    decrypted_data = record.decrypt_data(keys)
             
             # Format record data
             record_data = {
@@ -190,6 +262,7 @@ def get_record(record_id):
                 'location': record.location,
                 'transaction_id': record.transaction_id,
                 'block_number': record.block_number,
+                'confirmation_status': record.confirmation_status,
                 'data': decrypted_data
             }
             
@@ -204,7 +277,7 @@ def get_record(record_id):
             
             return jsonify(record_data)
         finally:
-            session.close()
+            close_session(session)
             
     except Exception as e:
         logger.error(f"Error getting record: {str(e)}")
@@ -244,13 +317,8 @@ def create_record():
             if field in data:
                 record_data[field] = data[field]
         
-        # Load encryption key
-        key = load_encryption_key(BLOCKCHAIN_KEY_FILE)
-        if not key:
-            # Generate a new key if none exists
-            from utils.helpers import generate_encryption_key, save_encryption_key
-            key = generate_encryption_key()
-            save_encryption_key(key, BLOCKCHAIN_KEY_FILE)
+        # Get the encryption keys, generating a key if none exists
+        key = get_keyring(BLOCKCHAIN_KEY_FILE).ensure_key()
         
         # Create record
         record = create_medical_record(
@@ -267,23 +335,14 @@ def create_record():
             user_agent=request.user_agent.string
         )
         
-        # TODO: Submit to blockchain
-        # In a real implementation, we would submit the record to the blockchain here
-        # For now, we'll just simulate by setting a transaction ID
-        
-        session = Session()
-        try:
-            record = session.query(MedicalRecord).filter(MedicalRecord.id == record.id).first()
-            record.transaction_id = f"tx_{generate_unique_id()}"
-            record.block_number = 12345  # Simulated block number
-            session.commit()
-        finally:
-            session.close()
+        # Queue the record hash for the next anchored Merkle batch
+        get_batch_anchorer().add(record.id, record.data_hash)
         
         return jsonify({
             'message': 'Record created successfully',
             'record_id': record.id,
-            'blockchain_tx': record.transaction_id
+            'blockchain_tx': None,
+            'confirmation_status': 'pending'
         }), 201
         
     except Exception as e:
@@ -311,7 +370,8 @@ def update_record(record_id):
             
             # Fields that cannot be updated
             restricted_fields = ['id', 'record_id', 'patient_id', 'provider_id', 'created_at', 
-                                 'data_hash', 'transaction_id', 'block_number']
+                                 'data_hash', 'transaction_id', 'block_number', 'confirmation_status',
+                                 'encrypted_data', 'wrapped_data_key', 'key_version']
             
             # Update metadata fields
             updated_fields = []
@@ -322,8 +382,7 @@ def update_record(record_id):
             
             # Update record data if provided
             if 'data' in data:
-                # Load encryption key
-                key = load_encryption_key(BLOCKCHAIN_KEY_FILE)
+                key = get_keyring(BLOCKCHAIN_KEY_FILE).keys
                 if not key:
                     return jsonify({'error': 'Encryption key not found'}), 500
                 
@@ -334,14 +393,17 @@ def update_record(record_id):
                 
                 updated_fields.append('data')
                 
-                # TODO: Update on blockchain
-                # In a real implementation, we would update the record on the blockchain here
-                # For now, we'll just simulate by updating the transaction ID
-                record.transaction_id = f"tx_update_{generate_unique_id()}"
+                # The new data hash is anchored with the next batch
+                record.transaction_id = None
+                record.block_number = None
+                record.confirmation_status = 'pending'
             
             # Save changes
             session.commit()
             
+            if 'data' in data:
+                get_batch_anchorer().add(record.id, record.data_hash)
+            
             # Log update
             log_record_access(
                 record_id=record.id,
@@ -357,7 +419,7 @@ def update_record(record_id):
             })
             
         finally:
-            session.close()
+            close_session(session)
             
     except Exception as e:
         logger.error(f"Error updating record: {str(e)}")
@@ -403,7 +465,7 @@ def delete_record(record_id):
             })
             
         finally:
-            session.close()
+            close_session(session)
             
     except Exception as e:
         logger.error(f"Error deleting record: {str(e)}")
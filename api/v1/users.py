@@ -15,7 +15,7 @@ import jwt
 # Add parent directory to path
 sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
 
-from database.models import Session
+from database.models import Session, close_session, init_app, replica_reads, set_session_user
 from utils.database import create_user, get_user_by_id, get_user_by_username
 from utils.helpers import hash_password, verify_password, is_valid_email, is_valid_password
 from config.config import JWT_SECRET_KEY, JWT_ACCESS_TOKEN_EXPIRES
@@ -26,6 +26,9 @@ logger = logging.getLogger(__name__)
 # Initialize blueprint
 users_blueprint = Blueprint('users', __name__, url_prefix='/api/v1/users')
 
+# Share one database session per request in the app this blueprint is registered on
+users_blueprint.record_once(lambda state: init_app(state.app))
+
 # Helper function to generate JWT token
 def generate_token(user_id, user_role):
     """Generate a JWT token for a user"""
@@ -55,6 +58,7 @@ def auth_required(f):
             # Add user_id to request
             request.user_id = payload['user_id']
             request.user_role = payload['role']
+            set_session_user(request.user_id)
             
             return f(*args, **kwargs)
         except jwt.ExpiredSignatureError:
@@ -103,7 +107,7 @@ def register():
                     return jsonify({'error': 'Email already registered'}), 400
                     
         finally:
-            session.close()
+            close_session(session)
         
         # Hash password
         password_hash = hash_password(data['password'])
@@ -170,7 +174,7 @@ def login():
             user.last_login = datetime.utcnow()
             session.commit()
         finally:
-            session.close()
+            close_session(session)
         
         # Generate token
         token = generate_token(user.id, user.role)
@@ -280,7 +284,7 @@ def update_profile():
             })
             
         finally:
-            session.close()
+            close_session(session)
             
     except Exception as e:
         logger.error(f"Error updating profile: {str(e)}")
@@ -298,7 +302,8 @@ def get_all_users():
         # Get all users
         session = Session()
         try:
-            users = session.query(User).all()
+            with replica_reads(session):
+                users = session.query(User).all()
             
             # Format user data
             user_list = [{
@@ -315,7 +320,7 @@ def get_all_users():
             return jsonify(user_list)
             
         finally:
-            session.close()
+            close_session(session)
             
     except Exception as e:
         logger.error(f"Error getting all users: {str(e)}")
@@ -48,9 +48,38 @@ MODELS_DIR = os.getenv("MODELS_DIR", os.path.join(os.path.dirname(os.path.dirnam
 os.makedirs(MODELS_DIR, exist_ok=True)
 
 # Blockchain Configuration
-BLOCKCHAIN_PROVIDER = os.getenv("BLOCKCHAIN_PROVIDER", "http://localhost:8545")
+BLOCKCHAIN_PROVIDER = os.getenv("BLOCKCHAIN_PROVIDER", "http://localhost:8545")  # Comma-separated for failover
 BLOCKCHAIN_CONTRACT_ADDRESS = os.getenv("BLOCKCHAIN_CONTRACT_ADDRESS", None)
 BLOCKCHAIN_KEY_FILE = os.getenv("BLOCKCHAIN_KEY_FILE", "encryption_key.key")
+KEYRING_CHECK_INTERVAL = float(os.getenv("KEYRING_CHECK_INTERVAL", "5"))  # seconds between key file stats
+BLOCKCHAIN_ACCOUNT_ADDRESS = os.getenv("BLOCKCHAIN_ACCOUNT_ADDRESS", None)
+BLOCKCHAIN_PRIVATE_KEY = os.getenv("BLOCKCHAIN_PRIVATE_KEY", None)
+
+# Merkle batch anchoring (a root is anchored when a batch fills up or the interval elapses)
+ANCHOR_BATCH_SIZE = int(os.getenv("ANCHOR_BATCH_SIZE", "256"))
+ANCHOR_BATCH_INTERVAL = float(os.getenv("ANCHOR_BATCH_INTERVAL", "30"))  # seconds
+
+# Record listing pages
+RECORDS_PAGE_SIZE = int(os.getenv("RECORDS_PAGE_SIZE", "20"))
+RECORDS_MAX_PAGE_SIZE = int(os.getenv("RECORDS_MAX_PAGE_SIZE", "200"))
+
+# Record history export (batches are decrypted by a bounded thread pool)
+RECORDS_EXPORT_BATCH_SIZE = int(os.getenv("RECORDS_EXPORT_BATCH_SIZE", "500"))
+RECORDS_EXPORT_WORKERS = int(os.getenv("RECORDS_EXPORT_WORKERS", "4"))
+
+# Access log writer (entries are journaled, then inserted in batches)
+AUDIT_BATCH_SIZE = int(os.getenv("AUDIT_BATCH_SIZE", "500"))
+AUDIT_FLUSH_INTERVAL = float(os.getenv("AUDIT_FLUSH_INTERVAL", "1"))  # seconds
+AUDIT_SPILL_DIR = os.getenv("AUDIT_SPILL_DIR", os.path.join(os.path.dirname(os.path.dirname(__file__)), "audit_journal"))
+
+# Access log partitions (older months are archived to segment files)
+ACCESS_LOG_RETAIN_MONTHS = int(os.getenv("ACCESS_LOG_RETAIN_MONTHS", "3"))  # whole months kept in the database
+ACCESS_LOG_ARCHIVE_DIR = os.getenv("ACCESS_LOG_ARCHIVE_DIR", os.path.join(os.path.dirname(os.path.dirname(__file__)), "access_log_archive"))
+
+# Contract event indexer
+INDEXER_REORG_DEPTH = int(os.getenv("INDEXER_REORG_DEPTH", "12"))  # blocks
+INDEXER_CHUNK_SIZE = int(os.getenv("INDEXER_CHUNK_SIZE", "2000"))  # blocks per eth_getLogs call
+INDEXER_START_BLOCK = int(os.getenv("INDEXER_START_BLOCK", "0"))
 
 # Security Configuration
 SECRET_KEY = os.getenv("SECRET_KEY", "dev-key-change-in-production")
@@ -65,8 +94,22 @@ DB_NAME = os.getenv("DB_NAME", "medblock")
 DB_USER = os.getenv("DB_USER", "medblock")
 DB_PASSWORD = os.getenv("DB_PASSWORD", "password")
 
+# Connection pool (not used for in-memory SQLite)
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "10"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "20"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))  # seconds to wait for a connection
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))  # seconds before a connection is replaced
+DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "true").lower() == "true"
+
 # SQLite specific configuration
 SQLITE_DB_PATH = os.getenv("SQLITE_DB_PATH", os.path.join(os.path.dirname(os.path.dirname(__file__)), "medblock.db"))
+SQLITE_MMAP_SIZE = int(os.getenv("SQLITE_MMAP_SIZE", str(256 * 1024 * 1024)))  # bytes of the file mapped into memory
+SQLITE_BUSY_TIMEOUT = int(os.getenv("SQLITE_BUSY_TIMEOUT", "5000"))  # ms to wait for the write lock
+
+# Read replicas; reads fall back to the primary when none is within the allowed lag
+DATABASE_REPLICA_URLS = [url.strip() for url in os.getenv("DATABASE_REPLICA_URLS", "").split(",") if url.strip()]
+REPLICA_MAX_LAG = float(os.getenv("REPLICA_MAX_LAG", "5"))  # seconds
+REPLICA_CHECK_INTERVAL = float(os.getenv("REPLICA_CHECK_INTERVAL", "1"))  # seconds between lag checks
 
 # Get database URL based on configuration
 if DB_TYPE == "sqlite":
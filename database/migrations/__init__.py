@@ -0,0 +1,100 @@
+"""
+Database Migrations for MedBlock
+
+This package brings existing databases up to the current models. Each
+migration is a module with an upgrade(connection) function, applied once
+in the order of MIGRATIONS and recorded in the schema_migrations table.
+Upgrades check what already exists, so a database created by init_db is
+only stamped. A module setting TRANSACTIONAL = False runs outside a
+transaction, which PostgreSQL needs for CREATE INDEX CONCURRENTLY.
+
+Run with:
+
+    python -m database.migrations
+"""
+
+import datetime
+import importlib
+import logging
+
+from sqlalchemy import MetaData, Table, Column, String, DateTime, select
+
+# Set up logger
+logger = logging.getLogger(__name__)
+
+# Applied in list order
+MIGRATIONS = [
+    'v001_envelope_key_columns',
+    'v002_record_confirmation_status',
+    'v003_hot_path_indexes',
+    'v004_partition_access_logs',
+    'v005_anchor_chain_replication_tables'
+]
+
+_metadata = MetaData()
+schema_migrations = Table(
+    'schema_migrations', _metadata,
+    Column('version', String(64), primary_key=True),
+    Column('applied_at', DateTime, nullable=False)
+)
+
+
+def applied_migrations(engine):
+    """
+    Get the migrations already applied to a database
+
+    Args:
+        engine (Engine): Database engine
+
+    Returns:
+        set: Applied migration names
+    """
+    _metadata.create_all(engine)
+    with engine.connect() as connection:
+        return set(connection.execute(select(schema_migrations.c.version)).scalars())
+
+
+def migrate(engine=None):
+    """
+    Apply pending migrations
+
+    Args:
+        engine (Engine, optional): Database engine, defaults to the application engine
+
+    Returns:
+        list: Names of the migrations applied
+    """
+    if engine is None:
+        from database.models import engine
+
+    applied = applied_migrations(engine)
+    newly_applied = []
+    for name in MIGRATIONS:
+        if name in applied:
+            continue
+        module = importlib.import_module(f"{__name__}.{name}")
+        logger.info(f"Applying migration {name}")
+
+        if getattr(module, 'TRANSACTIONAL', True):
+            with engine.begin() as connection:
+                module.upgrade(connection)
+                connection.execute(schema_migrations.insert().values(
+                    version=name, applied_at=datetime.datetime.utcnow()
+                ))
+        else:
+            with engine.connect().execution_options(isolation_level='AUTOCOMMIT') as connection:
+                module.upgrade(connection)
+                connection.execute(schema_migrations.insert().values(
+                    version=name, applied_at=datetime.datetime.utcnow()
+                ))
+        newly_applied.append(name)
+
+    return newly_applied
+
+
+def main():
+    """Command line entry point"""
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    applied = migrate()
+    logger.info(f"Applied {len(applied)} migrations" if applied else "Database is up to date")
+    return 0
@@ -0,0 +1,13 @@
+"""
+Apply pending MedBlock database migrations
+"""
+
+import os
+import sys
+
+# Add parent directory to path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from database.migrations import main
+
+sys.exit(main())
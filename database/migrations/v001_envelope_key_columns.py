@@ -0,0 +1,19 @@
+"""
+Add the envelope encryption columns to medical_records
+
+Records written before envelope encryption keep NULL in both columns and
+are still decrypted with the master key directly.
+"""
+
+from sqlalchemy import inspect, text
+
+from database.models import MedicalRecord
+
+
+def upgrade(connection):
+    """Add wrapped_data_key and key_version where missing"""
+    existing = {column['name'] for column in inspect(connection).get_columns('medical_records')}
+    for column in (MedicalRecord.__table__.c.wrapped_data_key, MedicalRecord.__table__.c.key_version):
+        if column.name not in existing:
+            column_type = column.type.compile(dialect=connection.dialect)
+            connection.execute(text(f"ALTER TABLE medical_records ADD COLUMN {column.name} {column_type}"))
@@ -0,0 +1,27 @@
+"""
+Add the confirmation_status column to medical_records
+
+Records from before batch anchoring get 'confirmed' when their
+transaction already has a block number and 'pending' otherwise.
+"""
+
+from sqlalchemy import inspect, text
+
+from database.models import MedicalRecord
+
+
+def upgrade(connection):
+    """Add and backfill confirmation_status where missing"""
+    existing = {column['name'] for column in inspect(connection).get_columns('medical_records')}
+    if 'confirmation_status' in existing:
+        return
+
+    column = MedicalRecord.__table__.c.confirmation_status
+    # Creates the enum type on PostgreSQL; nothing to do elsewhere
+    column.type.create(connection, checkfirst=True)
+    column_type = column.type.compile(dialect=connection.dialect)
+    connection.execute(text(f"ALTER TABLE medical_records ADD COLUMN confirmation_status {column_type}"))
+    connection.execute(text(
+        "UPDATE medical_records SET confirmation_status = "
+        "CASE WHEN block_number IS NOT NULL THEN 'confirmed' ELSE 'pending' END"
+    ))
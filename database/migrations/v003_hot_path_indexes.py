@@ -0,0 +1,32 @@
+"""
+Index the record listing and access log queries
+
+Adds the indexes declared on MedicalRecord and AccessLog: the patient
+listing order, access_time, anomalous entries by time and a record's
+access history. On PostgreSQL they are built CONCURRENTLY so writes to
+access_logs are not blocked while a large table is indexed.
+"""
+
+from sqlalchemy import inspect, text
+
+from database.models import MedicalRecord, AccessLog
+
+# CREATE INDEX CONCURRENTLY cannot run inside a transaction
+TRANSACTIONAL = False
+
+
+def upgrade(connection):
+    """Create the indexes that do not exist yet"""
+    inspector = inspect(connection)
+    for table in (MedicalRecord.__table__, AccessLog.__table__):
+        existing = {index['name'] for index in inspector.get_indexes(table.name)}
+        for index in sorted(table.indexes, key=lambda index: index.name):
+            if index.name in existing:
+                continue
+            if connection.dialect.name == 'postgresql':
+                columns = ', '.join(column.name for column in index.columns)
+                connection.execute(text(
+                    f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {index.name} ON {table.name} ({columns})"
+                ))
+            else:
+                index.create(connection)
@@ -0,0 +1,72 @@
+"""
+Partition access_logs by month on PostgreSQL
+
+The table is recreated as a parent partitioned by range of access_time
+and the existing rows are copied into it. Monthly partitions are created
+for the months holding rows and for the current and next month, and a
+default partition takes rows outside them; the rollover job in
+utils.access_log_archive creates the later months. The primary key
+becomes (id, access_time) because it has to include the partition key.
+
+SQLite keeps a single table, which rollover splits into monthly shards.
+"""
+
+import datetime
+
+from sqlalchemy import text
+
+from database.models import AccessLog
+
+
+def _is_partitioned(connection):
+    """Return True if access_logs is already a partitioned table"""
+    return connection.execute(text(
+        "SELECT 1 FROM pg_partitioned_table "
+        "JOIN pg_class ON pg_class.oid = pg_partitioned_table.partrelid "
+        "WHERE pg_class.relname = 'access_logs'"
+    )).first() is not None
+
+
+def upgrade(connection):
+    """Replace access_logs with a partitioned table"""
+    if connection.dialect.name != 'postgresql' or _is_partitioned(connection):
+        return
+
+    from utils.access_log_archive import COLUMNS, month_start, add_months, create_month_partition
+
+    table = AccessLog.__table__
+    connection.execute(text("ALTER TABLE access_logs RENAME TO access_logs_unpartitioned"))
+    connection.execute(text(
+        "ALTER TABLE access_logs_unpartitioned RENAME CONSTRAINT access_logs_pkey TO access_logs_unpartitioned_pkey"
+    ))
+    for index in table.indexes:
+        connection.execute(text(f"ALTER INDEX IF EXISTS {index.name} RENAME TO {index.name}_unpartitioned"))
+
+    connection.execute(text(
+        "CREATE TABLE access_logs (LIKE access_logs_unpartitioned INCLUDING DEFAULTS) "
+        "PARTITION BY RANGE (access_time)"
+    ))
+    connection.execute(text("ALTER TABLE access_logs ADD PRIMARY KEY (id, access_time)"))
+    connection.execute(text("ALTER TABLE access_logs ADD FOREIGN KEY (record_id) REFERENCES medical_records (id)"))
+    connection.execute(text("ALTER TABLE access_logs ADD FOREIGN KEY (user_id) REFERENCES users (id)"))
+    for index in table.indexes:
+        columns = ', '.join(column.name for column in index.columns)
+        connection.execute(text(f"CREATE INDEX {index.name} ON access_logs ({columns})"))
+    # The ID sequence would otherwise be dropped with the old table
+    connection.execute(text("ALTER SEQUENCE access_logs_id_seq OWNED BY access_logs.id"))
+
+    oldest = connection.execute(text("SELECT min(access_time) FROM access_logs_unpartitioned")).scalar()
+    current = month_start(datetime.datetime.utcnow())
+    month = month_start(oldest) if oldest and oldest < current else current
+    while month <= add_months(current, 1):
+        create_month_partition(connection, month)
+        month = add_months(month, 1)
+    connection.execute(text("CREATE TABLE access_logs_default PARTITION OF access_logs DEFAULT"))
+
+    columns = ', '.join(COLUMNS)
+    selected = ', '.join(
+        "COALESCE(access_time, now() AT TIME ZONE 'utc')" if column == 'access_time' else column
+        for column in COLUMNS
+    )
+    connection.execute(text(f"INSERT INTO access_logs ({columns}) SELECT {selected} FROM access_logs_unpartitioned"))
+    connection.execute(text("DROP TABLE access_logs_unpartitioned"))
@@ -0,0 +1,29 @@
+"""
+Create the anchoring, chain index and replication tables
+
+Databases created before batch anchoring, the chain event indexer and
+read replicas only have users, medical_records and access_logs. Tables
+that already exist are left as they are.
+"""
+
+from database.models import (
+    Base, AnchorBatch, RecordProof, ChainEvent, ChainPatient, ChainRecord, ChainAccessGrant,
+    ChainBlock, IndexerCheckpoint, ReplicationHeartbeat
+)
+
+TABLES = [
+    AnchorBatch.__table__,
+    RecordProof.__table__,
+    ChainEvent.__table__,
+    ChainPatient.__table__,
+    ChainRecord.__table__,
+    ChainAccessGrant.__table__,
+    ChainBlock.__table__,
+    IndexerCheckpoint.__table__,
+    ReplicationHeartbeat.__table__
+]
+
+
+def upgrade(connection):
+    """Create the tables that do not exist yet"""
+    Base.metadata.create_all(connection, tables=TABLES, checkfirst=True)
@@ -4,30 +4,80 @@ Database Models for MedBlock
 This module initializes all models for the MedBlock database.
 """
 
-from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker, scoped_session
-from sqlalchemy.ext.declarative import declarative_base
 
-from .user import User, Base as UserBase
-from .record import MedicalRecord, AccessLog, Base as RecordBase
+from .base import Base
+from .user import User
+from .record import MedicalRecord, AccessLog
+from .anchor import AnchorBatch, RecordProof
+from .chain import ChainEvent, ChainPatient, ChainRecord, ChainAccessGrant, ChainBlock, IndexerCheckpoint
+from .replication import ReplicationHeartbeat
+from .connection import create_db_engine, begin_request_scope, end_request_scope, close_session
+from .routing import ReplicaSet, RoutingSession, replica_reads, load_last_write, save_last_write
 
 # Import config
 import sys
 import os
 sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
-from config.config import DATABASE_URL
+from config.config import DATABASE_REPLICA_URLS
 
-# Create engine and session
-engine = create_engine(DATABASE_URL)
-session_factory = sessionmaker(bind=engine)
+# Create engine and session; objects stay readable after the commit that saved them
+engine = create_db_engine()
+replicas = ReplicaSet(engine, DATABASE_REPLICA_URLS)
+session_factory = sessionmaker(bind=engine, class_=RoutingSession, replicas=replicas, expire_on_commit=False)
 Session = scoped_session(session_factory)
 
+def remove_request_session(exception=None):
+    """Remove the request's session at application context teardown"""
+    end_request_scope()
+    Session.remove()
+
+def load_request_last_write():
+    """Keep the request's replica reads on the primary if its client wrote recently"""
+    from flask import request
+    load_last_write(Session(), request.cookies)
+
+def save_request_last_write(response):
+    """Tell the client when its request wrote"""
+    return save_last_write(Session(), response)
+
+def set_session_user(user_id):
+    """
+    Tie the current session to the user it serves
+    
+    Reads for a user who wrote within the allowed replica lag stay on the primary.
+    
+    Args:
+        user_id (int): ID of the authenticated user
+    """
+    Session().info['user_id'] = user_id
+
+def init_app(app):
+    """
+    Scope sessions to the requests of a Flask app
+    
+    Args:
+        app (Flask): Application to register the request hooks on
+    """
+    if app.extensions.get('medblock_db'):
+        return
+    app.extensions['medblock_db'] = True
+    app.before_request(begin_request_scope)
+    app.before_request(load_request_last_write)
+    app.after_request(save_request_last_write)
+    app.teardown_appcontext(remove_request_session)
+
 # Create all tables
 def init_db():
     """Initialize the database by creating all tables"""
-    UserBase.metadata.create_all(engine)
-    RecordBase.metadata.create_all(engine)
+    Base.metadata.create_all(engine)
+    # New tables already match the models, so this only records the migrations
+    from database.migrations import migrate
+    migrate(engine)
     print("Database tables created")
 
 # Export models
-__all__ = ['User', 'MedicalRecord', 'AccessLog', 'Session', 'init_db'] 
\ No newline at end of file
+__all__ = ['Base', 'User', 'MedicalRecord', 'AccessLog', 'AnchorBatch', 'RecordProof',
+           'ChainEvent', 'ChainPatient', 'ChainRecord', 'ChainAccessGrant', 'ChainBlock',
+           'IndexerCheckpoint', 'ReplicationHeartbeat', 'Session', 'init_db', 'init_app', 'close_session',
+           'create_db_engine', 'replicas', 'replica_reads', 'set_session_user'] 
\ No newline at end of file
@@ -0,0 +1,66 @@
+"""
+Anchoring Models for MedBlock
+
+This module defines the models that record Merkle batches of medical record
+hashes anchored on the blockchain, and the inclusion proof of each record.
+"""
+
+import datetime
+import json
+from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Enum, Text
+from sqlalchemy.orm import relationship
+
+from .base import Base
+
+
+class AnchorBatch(Base):
+    """A Merkle root anchored on the blockchain for a batch of records"""
+
+    __tablename__ = 'anchor_batches'
+
+    id = Column(Integer, primary_key=True)
+    merkle_root = Column(String(64), unique=True, nullable=False)
+    leaf_count = Column(Integer, nullable=False)
+
+    # Blockchain transaction carrying the root
+    transaction_id = Column(String(128), nullable=True, index=True)
+    block_number = Column(Integer, nullable=True)
+    status = Column(Enum('pending', 'confirmed', 'failed', 'simulated', name='anchor_statuses'),
+                    nullable=False, default='pending')
+
+    # Timestamps
+    created_at = Column(DateTime, default=datetime.datetime.utcnow)
+    anchored_at = Column(DateTime, nullable=True)
+
+    proofs = relationship('RecordProof', back_populates='batch')
+
+    def __repr__(self):
+        """Return string representation of the batch"""
+        return f"<AnchorBatch(id={self.id}, root='{self.merkle_root}', leaves={self.leaf_count})>"
+
+
+class RecordProof(Base):
+    """Merkle inclusion proof linking a medical record to an anchored batch"""
+
+    __tablename__ = 'record_proofs'
+
+    id = Column(Integer, primary_key=True)
+
+    # One current proof per record
+    record_id = Column(Integer, ForeignKey('medical_records.id'), unique=True, nullable=False)
+    batch_id = Column(Integer, ForeignKey('anchor_batches.id'), nullable=False, index=True)
+    batch = relationship('AnchorBatch', back_populates='proofs')
+
+    # Leaf data and its path to the root
+    data_hash = Column(String(128), nullable=False, index=True)
+    leaf_index = Column(Integer, nullable=False)
+    proof = Column(Text, nullable=False)  # JSON list of [sibling_hash, side] pairs
+
+    def __repr__(self):
+        """Return string representation of the proof"""
+        return f"<RecordProof(record_id={self.record_id}, batch_id={self.batch_id}, leaf_index={self.leaf_index})>"
+
+    @property
+    def proof_path(self):
+        """Return the proof as a list of (sibling_hash, side) pairs"""
+        return [tuple(step) for step in json.loads(self.proof)]
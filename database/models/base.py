@@ -0,0 +1,10 @@
+"""
+Declarative Base for MedBlock
+
+This module defines the declarative base shared by all MedBlock models, so
+relationships and foreign keys can refer to tables defined in other modules.
+"""
+
+from sqlalchemy.ext.declarative import declarative_base
+
+Base = declarative_base()
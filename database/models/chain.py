@@ -0,0 +1,108 @@
+"""
+Chain Index Models for MedBlock
+
+This module defines the tables that mirror the MedicalRecords contract state.
+They are filled by the chain indexer from contract events, so reads and
+access checks can be served from the database instead of the blockchain.
+"""
+
+import datetime
+from sqlalchemy import Column, Integer, BigInteger, String, DateTime, Text, Index, UniqueConstraint
+
+from .base import Base
+
+
+class ChainEvent(Base):
+    """A contract event as it was indexed, kept for reorg rollback and replay"""
+
+    __tablename__ = 'chain_events'
+
+    id = Column(Integer, primary_key=True)
+    block_number = Column(Integer, nullable=False, index=True)
+    block_hash = Column(String(66), nullable=False)
+    transaction_hash = Column(String(66), nullable=False)
+    log_index = Column(Integer, nullable=False)
+
+    event_name = Column(String(32), nullable=False)
+    patient_id = Column(String(64), nullable=False, index=True)
+    provider_address = Column(String(42), nullable=True)
+    args = Column(Text, nullable=False)  # JSON encoded event arguments
+
+    def __repr__(self):
+        """Return string representation of the event"""
+        return f"<ChainEvent(block={self.block_number}, log_index={self.log_index}, event='{self.event_name}')>"
+
+
+class ChainPatient(Base):
+    """Patient registered on the contract"""
+
+    __tablename__ = 'chain_patients'
+
+    id = Column(Integer, primary_key=True)
+    patient_id = Column(String(64), unique=True, nullable=False)
+    patient_address = Column(String(42), nullable=False, index=True)
+    block_number = Column(Integer, nullable=False)
+
+    def __repr__(self):
+        """Return string representation of the patient"""
+        return f"<ChainPatient(patient_id='{self.patient_id}', address='{self.patient_address}')>"
+
+
+class ChainRecord(Base):
+    """Medical record stored on the contract"""
+
+    __tablename__ = 'chain_records'
+    __table_args__ = (
+        UniqueConstraint('patient_id', 'record_id', name='uq_chain_records_patient_record'),
+    )
+
+    id = Column(Integer, primary_key=True)
+    patient_id = Column(String(64), nullable=False)
+    record_id = Column(String(64), nullable=False)
+    record_type = Column(String(64), nullable=False)
+    block_number = Column(Integer, nullable=False)
+    transaction_hash = Column(String(66), nullable=False)
+
+    def __repr__(self):
+        """Return string representation of the record"""
+        return f"<ChainRecord(patient_id='{self.patient_id}', record_id='{self.record_id}')>"
+
+
+class ChainAccessGrant(Base):
+    """Current access grant of a provider to a patient's records"""
+
+    __tablename__ = 'chain_access_grants'
+    __table_args__ = (
+        UniqueConstraint('provider_address', 'patient_id', name='uq_chain_access_provider_patient'),
+        Index('ix_chain_access_patient', 'patient_id'),
+    )
+
+    id = Column(Integer, primary_key=True)
+    provider_address = Column(String(42), nullable=False)  # Lowercase
+    patient_id = Column(String(64), nullable=False)
+    access_level = Column(Integer, nullable=False)
+    expiry = Column(BigInteger, nullable=False)
+    block_number = Column(Integer, nullable=False)
+
+    def __repr__(self):
+        """Return string representation of the grant"""
+        return f"<ChainAccessGrant(provider='{self.provider_address}', patient_id='{self.patient_id}', level={self.access_level})>"
+
+
+class ChainBlock(Base):
+    """Hash of an indexed block, kept within the reorg depth to detect forks"""
+
+    __tablename__ = 'chain_blocks'
+
+    block_number = Column(Integer, primary_key=True, autoincrement=False)
+    block_hash = Column(String(66), nullable=False)
+
+
+class IndexerCheckpoint(Base):
+    """Last block processed by an indexer"""
+
+    __tablename__ = 'indexer_checkpoints'
+
+    name = Column(String(64), primary_key=True)
+    last_block = Column(Integer, nullable=False)
+    updated_at = Column(DateTime, default=datetime.datetime.utcnow, onupdate=datetime.datetime.utcnow)
@@ -0,0 +1,103 @@
+"""
+Database Connection Setup for MedBlock
+
+This module builds the SQLAlchemy engine with the configured connection
+pool and, for SQLite, the pragmas that let readers and a writer work
+concurrently. It also ties the thread-local session to the Flask request:
+helpers share one session during a request, and it is removed when the
+application context is torn down.
+"""
+
+import threading
+
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import make_url
+from sqlalchemy.pool import QueuePool
+
+# Import config
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+from config.config import (
+    DATABASE_URL, DB_POOL_SIZE, DB_MAX_OVERFLOW, DB_POOL_TIMEOUT, DB_POOL_RECYCLE, DB_POOL_PRE_PING,
+    SQLITE_MMAP_SIZE, SQLITE_BUSY_TIMEOUT
+)
+
+_request_scope = threading.local()
+
+
+def _set_sqlite_pragmas(dbapi_connection, connection_record):
+    """Configure every new SQLite connection"""
+    cursor = dbapi_connection.cursor()
+    # WAL lets readers run while a write is in progress; NORMAL only syncs at checkpoints
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute("PRAGMA synchronous=NORMAL")
+    cursor.execute(f"PRAGMA mmap_size={SQLITE_MMAP_SIZE}")
+    cursor.execute(f"PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT}")
+    cursor.close()
+
+
+def create_db_engine(url=DATABASE_URL, **kwargs):
+    """
+    Create a database engine with the configured pool settings
+
+    Args:
+        url (str): Database URL
+        **kwargs: Overrides for create_engine arguments
+
+    Returns:
+        Engine: Configured engine
+    """
+    database_url = make_url(url)
+    options = {'pool_pre_ping': DB_POOL_PRE_PING}
+
+    if database_url.get_backend_name() == 'sqlite':
+        in_memory = database_url.database in (None, '', ':memory:')
+        options['connect_args'] = {'check_same_thread': False}
+        if not in_memory:
+            # SQLAlchemy 1.4 defaults file databases to NullPool, which takes no pool arguments
+            options.update(poolclass=QueuePool, pool_size=DB_POOL_SIZE, max_overflow=DB_MAX_OVERFLOW,
+                           pool_timeout=DB_POOL_TIMEOUT)
+    else:
+        options.update(
+            pool_size=DB_POOL_SIZE,
+            max_overflow=DB_MAX_OVERFLOW,
+            pool_timeout=DB_POOL_TIMEOUT,
+            pool_recycle=DB_POOL_RECYCLE
+        )
+    options.update(kwargs)
+
+    engine = create_engine(url, **options)
+    if database_url.get_backend_name() == 'sqlite' and not in_memory:
+        event.listen(engine, 'connect', _set_sqlite_pragmas)
+    return engine
+
+
+def begin_request_scope():
+    """Mark the current thread as serving a request"""
+    _request_scope.active = True
+
+
+def end_request_scope():
+    """Mark the current thread as no longer serving a request"""
+    _request_scope.active = False
+
+
+def in_request_scope():
+    """Return True if the current thread is serving a request"""
+    return getattr(_request_scope, 'active', False)
+
+
+def close_session(session):
+    """
+    Close a session unless it belongs to the current request
+
+    A request's session stays open for the rest of the request and is
+    removed at teardown, so the helpers it calls share one session and
+    one pooled connection.
+
+    Args:
+        session (Session): Session from the scoped Session registry
+    """
+    if not in_request_scope():
+        session.close()
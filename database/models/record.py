@@ -6,17 +6,20 @@ This module defines the MedicalRecord model for the MedBlock system.
 
 import datetime
 import json
-from sqlalchemy import Column, Integer, String, Float, DateTime, ForeignKey, Enum, Text, Boolean
+from sqlalchemy import Column, Integer, String, Float, DateTime, ForeignKey, Enum, Text, Boolean, Index
 from sqlalchemy.orm import relationship
-from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.ext.hybrid import hybrid_property
 
-Base = declarative_base()
+from .base import Base
 
 class MedicalRecord(Base):
     """Medical record model for storing patient health records"""
     
     __tablename__ = 'medical_records'
+    __table_args__ = (
+        # Patient record listings, newest first with id as the keyset tie-breaker
+        Index('ix_medical_records_patient_listing', 'patient_id', 'is_active', 'recorded_at', 'id'),
+    )
     
     id = Column(Integer, primary_key=True)
     record_id = Column(String(64), unique=True, nullable=False)  # Blockchain identifier
@@ -51,6 +54,8 @@ class MedicalRecord(Base):
     # Record data - encrypted on blockchain, this is a reference
     data_hash = Column(String(128), nullable=False)  # Hash of the data on the blockchain
     encrypted_data = Column(Text, nullable=True)  # Encrypted data if stored in DB
+    wrapped_data_key = Column(Text, nullable=True)  # Per-record data key wrapped by the master key
+    key_version = Column(String(32), nullable=True)  # Fingerprint of the wrapping master key
     
     # Status
     is_active = Column(Boolean, default=True)
@@ -59,6 +64,8 @@ class MedicalRecord(Base):
     # Blockchain transaction ID
     transaction_id = Column(String(128), nullable=True)
     block_number = Column(Integer, nullable=True)
+    confirmation_status = Column(Enum('pending', 'confirmed', 'failed', 'simulated', name='confirmation_statuses'),
+                                 default='pending')
     
     # Additional metadata
     institution = Column(String(100), nullable=True)
@@ -79,31 +86,25 @@ class MedicalRecord(Base):
         return None
     
     def decrypt_data(self, decryption_key):
-        """Decrypt the medical record data using the provided key"""
+        """Decrypt the medical record data using the provided master key"""
         if not self.encrypted_data:
             return None
         
         try:
-            # In a real implementation, this would use a proper encryption library
-            # This is just a placeholder
-            import base64
-            from cryptography.fernet import Fernet
+            from utils.envelope import decrypt_envelope
             
-            cipher = Fernet(decryption_key)
-            decrypted_data = cipher.decrypt(self.encrypted_data.encode())
+            # Records without a wrapped data key predate envelope encryption
+            decrypted_data = decrypt_envelope(self.encrypted_data, self.wrapped_data_key, decryption_key)
             return json.loads(decrypted_data.decode())
         except Exception as e:
             print(f"Error decrypting data: {str(e)}")
             return None
     
     def encrypt_data(self, data, encryption_key):
-        """Encrypt the medical record data using the provided key"""
+        """Encrypt the medical record data under a new data key wrapped by the master key"""
         try:
-            # In a real implementation, this would use a proper encryption library
-            # This is just a placeholder
-            import base64
             import hashlib
-            from cryptography.fernet import Fernet
+            from utils.envelope import encrypt_envelope
             
             # Convert data to JSON string
             data_str = json.dumps(data)
@@ -113,19 +114,42 @@ class MedicalRecord(Base):
             self.data_hash = hash_obj.hexdigest()
             
             # Encrypt data
-            cipher = Fernet(encryption_key)
-            self.encrypted_data = cipher.encrypt(data_str.encode()).decode()
+            self.encrypted_data, self.wrapped_data_key, self.key_version = encrypt_envelope(
+                data_str.encode(), encryption_key
+            )
             
             return True
         except Exception as e:
             print(f"Error encrypting data: {str(e)}")
             return False
+    
+    def rewrap_key(self, old_key, new_key):
+        """
+        Rewrap the record's data key under a new master key
+        
+        The encrypted payload is left untouched. Records from before envelope
+        encryption have no data key and must be re-encrypted instead.
+        
+        Returns:
+            bool: True if the data key was rewrapped
+        """
+        if not self.wrapped_data_key:
+            return False
+        
+        from utils.envelope import rewrap_data_key
+        self.wrapped_data_key, self.key_version = rewrap_data_key(self.wrapped_data_key, old_key, new_key)
+        return True
 
 
 class AccessLog(Base):
     """Log of access to medical records"""
     
     __tablename__ = 'access_logs'
+    __table_args__ = (
+        Index('ix_access_logs_access_time', 'access_time'),
+        Index('ix_access_logs_anomalous_time', 'is_anomalous', 'access_time'),
+        Index('ix_access_logs_record_time', 'record_id', 'access_time'),
+    )
     
     id = Column(Integer, primary_key=True)
     
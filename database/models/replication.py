@@ -0,0 +1,24 @@
+"""
+Replication Models for MedBlock
+
+This module defines the heartbeat row the primary updates so that the
+lag of each read replica can be measured from the replica itself.
+"""
+
+import datetime
+from sqlalchemy import Column, Integer, DateTime
+
+from .base import Base
+
+
+class ReplicationHeartbeat(Base):
+    """Time of the primary's latest heartbeat, as replicated"""
+
+    __tablename__ = 'replication_heartbeat'
+
+    id = Column(Integer, primary_key=True)
+    beat_at = Column(DateTime, nullable=False, default=datetime.datetime.utcnow)
+
+    def __repr__(self):
+        """Return string representation of the heartbeat"""
+        return f"<ReplicationHeartbeat(beat_at='{self.beat_at}')>"
@@ -0,0 +1,341 @@
+"""
+Read Replica Routing for MedBlock
+
+This module sends read-only queries to a set of read replicas. Sessions
+route a SELECT to a replica only inside a replica_reads() block and only
+until the session has flushed a write, so writes and reads of the
+session's own writes stay on the primary.
+
+A write committed in one request may not have reached a replica by the
+next one. The last write time of each user is kept per process, and sent
+to the client in a cookie so other processes see it too; that user's
+reads stay on the primary until the allowed lag has passed.
+
+Replica lag is measured with a heartbeat: the primary's heartbeat row is
+updated on every check, and a replica whose copy of the row is older than
+the allowed lag is skipped until it catches up. With no healthy replica,
+reads fall back to the primary.
+"""
+
+import datetime
+import itertools
+import logging
+import math
+import threading
+import time
+from contextlib import contextmanager
+
+from sqlalchemy import event, select
+from sqlalchemy.exc import IntegrityError, SQLAlchemyError
+from sqlalchemy.orm import Session as OrmSession
+
+from .replication import ReplicationHeartbeat
+from .connection import create_db_engine
+
+# Import config
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+from config.config import REPLICA_MAX_LAG, REPLICA_CHECK_INTERVAL
+
+logger = logging.getLogger(__name__)
+
+HEARTBEAT_ID = 1
+LAST_WRITE_COOKIE = 'medblock_last_write'
+
+
+class ReplicaSet:
+    """Read replicas of a primary database and their measured lag"""
+
+    def __init__(self, primary, replicas, max_lag=REPLICA_MAX_LAG, check_interval=REPLICA_CHECK_INTERVAL):
+        """
+        Initialize the replica set
+
+        Args:
+            primary (Engine): Engine of the primary database
+            replicas (list): Replica database URLs or engines
+            max_lag (float): Seconds a replica may be behind and still serve reads
+            check_interval (float): Seconds between lag checks
+        """
+        self.primary = primary
+        self.engines = [create_db_engine(replica) if isinstance(replica, str) else replica
+                        for replica in replicas]
+        self.max_lag = max_lag
+        self.check_interval = check_interval
+        self.lags = {}
+
+        self._healthy = []
+        self._checked_at = None
+        self._last_beat = None
+        self._check_lock = threading.Lock()
+        self._counter = itertools.count()
+        self._last_writes = {}
+        self._writes_lock = threading.Lock()
+
+    def beat(self):
+        """
+        Update the heartbeat on the primary
+
+        Returns:
+            datetime: Time written
+        """
+        table = ReplicationHeartbeat.__table__
+        beat_at = datetime.datetime.utcnow()
+        with self.primary.begin() as connection:
+            updated = connection.execute(
+                table.update().where(table.c.id == HEARTBEAT_ID).values(beat_at=beat_at)
+            )
+            if updated.rowcount == 0:
+                try:
+                    with connection.begin_nested():
+                        connection.execute(table.insert().values(id=HEARTBEAT_ID, beat_at=beat_at))
+                except IntegrityError:
+                    # Another process created the row first
+                    pass
+        self._last_beat = beat_at
+        return beat_at
+
+    def lag(self, engine):
+        """
+        Measure how far a replica is behind the primary
+
+        A replica that has the last heartbeat written here is not behind.
+        Otherwise it is at least as far behind as its own heartbeat is old.
+
+        Args:
+            engine (Engine): Replica engine
+
+        Returns:
+            float: Lag in seconds, or None if the replica cannot be read
+        """
+        table = ReplicationHeartbeat.__table__
+        try:
+            with engine.connect() as connection:
+                beat_at = connection.execute(
+                    select(table.c.beat_at).where(table.c.id == HEARTBEAT_ID)
+                ).scalar()
+        except SQLAlchemyError as e:
+            logger.warning(f"Replica {engine.url!r} unavailable: {e}")
+            return None
+
+        if beat_at is None:
+            return None
+        if self._last_beat is not None and beat_at >= self._last_beat:
+            return 0.0
+        return (datetime.datetime.utcnow() - beat_at).total_seconds()
+
+    def check(self):
+        """
+        Measure the lag of every replica and write a new heartbeat
+
+        Returns:
+            list: Engines of the replicas within the allowed lag
+        """
+        lags = {engine: self.lag(engine) for engine in self.engines}
+        healthy = [engine for engine in self.engines
+                   if lags[engine] is not None and lags[engine] <= self.max_lag]
+        for engine in self.engines:
+            if engine not in healthy and engine in self._healthy:
+                logger.warning(f"Replica {engine.url!r} taken out of rotation, lag {lags[engine]}")
+
+        try:
+            self.beat()
+        except SQLAlchemyError as e:
+            logger.error(f"Error writing replication heartbeat: {e}")
+
+        self.lags = lags
+        self._healthy = healthy
+        self._checked_at = time.monotonic()
+        return healthy
+
+    def choose(self):
+        """
+        Pick a replica to read from, checking lag when a check is due
+
+        Returns:
+            Engine: Replica engine, or None to read from the primary
+        """
+        if not self.engines:
+            return None
+
+        if self._checked_at is None or time.monotonic() - self._checked_at >= self.check_interval:
+            # Only one thread checks; the others use the previous result
+            if self._check_lock.acquire(blocking=self._checked_at is None):
+                try:
+                    self.check()
+                finally:
+                    self._check_lock.release()
+
+        healthy = self._healthy
+        if not healthy:
+            return None
+        return healthy[next(self._counter) % len(healthy)]
+
+    def note_write(self, user_id, written_at=None):
+        """
+        Record that a user committed a write to the primary
+
+        Args:
+            user_id (int): ID of the user
+            written_at (float, optional): Unix time of the commit, defaults to now
+        """
+        written_at = written_at or time.time()
+        cutoff = written_at - self.max_lag
+        with self._writes_lock:
+            # Writes older than the allowed lag are on every healthy replica
+            for stale in [user for user, at in self._last_writes.items() if at < cutoff]:
+                del self._last_writes[stale]
+            self._last_writes[user_id] = max(written_at, self._last_writes.get(user_id, 0))
+
+    def reads_held(self, user_id=None, last_write=None):
+        """
+        Check whether a user wrote too recently for a replica to have the write
+
+        Args:
+            user_id (int, optional): ID of the user
+            last_write (float, optional): Unix time of the client's last write,
+                as sent back in its cookie
+
+        Returns:
+            bool: True if the user's reads must stay on the primary
+        """
+        latest = last_write or 0
+        if user_id is not None:
+            with self._writes_lock:
+                latest = max(latest, self._last_writes.get(user_id, 0))
+        return time.time() - latest < self.max_lag
+
+    def mark_down(self, engine):
+        """
+        Stop reading from a replica until the next check
+
+        Args:
+            engine (Engine): Replica that failed
+        """
+        self._healthy = [healthy for healthy in self._healthy if healthy is not engine]
+
+
+class RoutingSession(OrmSession):
+    """Session that sends reads inside replica_reads() to a replica"""
+
+    def __init__(self, replicas=None, **kwargs):
+        """
+        Initialize the session
+
+        Args:
+            replicas (ReplicaSet): Replicas to read from, None for primary only
+            **kwargs: Session arguments
+        """
+        super().__init__(**kwargs)
+        self.replicas = replicas
+
+    def get_bind(self, mapper=None, clause=None, **kwargs):
+        """Return the replica for a routed read, the primary otherwise"""
+        if self._reads_from_replica(clause):
+            # Reads in one replica_reads() block use the same replica
+            engine = self.info.get('replica') or self.replicas.choose()
+            if engine is not None:
+                self.info['replica'] = engine
+                return engine
+        return super().get_bind(mapper, clause=clause, **kwargs)
+
+    def _reads_from_replica(self, clause):
+        """Return True if a statement may be sent to a replica"""
+        return (
+            self.replicas is not None
+            and self.info.get('use_replica', False)
+            and not self.info.get('wrote', False)
+            and not self._flushing
+            and clause is not None
+            and getattr(clause, 'is_select', False)
+            and not self.replicas.reads_held(self.info.get('user_id'), self.info.get('last_write'))
+        )
+
+    def close(self):
+        """Close the session; its next reads may use replicas again"""
+        self.info.pop('wrote', None)
+        super().close()
+
+
+@event.listens_for(RoutingSession, 'after_flush')
+def _mark_written(session, flush_context):
+    """Keep the session's reads on the primary once it has written"""
+    session.info['wrote'] = True
+    session.info['uncommitted_write'] = True
+
+
+@event.listens_for(RoutingSession, 'after_commit')
+def _note_write(session):
+    """Hold the user's later reads on the primary until replicas have the write"""
+    if not session.info.pop('uncommitted_write', False) or session.replicas is None:
+        return
+    session.info['written_at'] = time.time()
+    if session.info.get('user_id') is not None:
+        session.replicas.note_write(session.info['user_id'], session.info['written_at'])
+
+
+@event.listens_for(RoutingSession, 'after_rollback')
+def _discard_write(session):
+    """A rolled back write never reaches the replicas"""
+    session.info.pop('uncommitted_write', None)
+
+
+def load_last_write(session, cookies):
+    """
+    Read a client's last write time from its cookie
+
+    Args:
+        session (Session): Session serving the client's request
+        cookies (dict): Request cookies
+    """
+    try:
+        last_write = float(cookies.get(LAST_WRITE_COOKIE, ''))
+    except ValueError:
+        return
+    if math.isfinite(last_write):
+        session.info['last_write'] = last_write
+
+
+def save_last_write(session, response):
+    """
+    Send the time of a request's write to the client
+
+    The cookie expires with the allowed lag, after which every replica in
+    rotation has the write.
+
+    Args:
+        session (Session): Session that served the request
+        response (Response): Response to the request
+
+    Returns:
+        Response: The same response
+    """
+    replicas = getattr(session, 'replicas', None)
+    written_at = session.info.get('written_at')
+    if replicas is not None and replicas.engines and written_at is not None:
+        response.set_cookie(LAST_WRITE_COOKIE, f"{written_at:.3f}", max_age=math.ceil(replicas.max_lag),
+                            httponly=True, samesite='Lax')
+    return response
+
+
+@contextmanager
+def replica_reads(session):
+    """
+    Route the session's reads to a replica inside the block
+
+    Args:
+        session (RoutingSession): Session to route
+
+    Yields:
+        RoutingSession: The same session
+    """
+    if session.info.get('use_replica'):
+        yield session
+        return
+
+    session.info['use_replica'] = True
+    try:
+        yield session
+    finally:
+        session.info.pop('use_replica', None)
+        session.info.pop('replica', None)
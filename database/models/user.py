@@ -6,9 +6,8 @@ This module defines the User model for the MedBlock system.
 
 import datetime
 from sqlalchemy import Column, Integer, String, Boolean, DateTime, Enum, Float
-from sqlalchemy.ext.declarative import declarative_base
 
-Base = declarative_base()
+from .base import Base
 
 class User(Base):
     """User model representing users in the MedBlock system."""
@@ -1,8 +1,9 @@
 import os
+import sys
 import json
 import logging
 import datetime
-from flask import Flask, request, jsonify, send_from_directory
+from flask import Flask, Request, Response, request, jsonify, send_file, send_from_directory, stream_with_context
 from flask_cors import CORS
 from werkzeug.utils import secure_filename
 
@@ -16,6 +17,28 @@ except ImportError:
     ML_IMPORTS_SUCCESS = False
     logging.warning("ML models could not be imported. Using mock implementations.")
 
+# Import the record verification layer from the main package
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+try:
+    from utils.verification import verify_records, patient_record_ids, verify_data_hash
+    from utils.keyring import get_keyring
+    from config.config import BLOCKCHAIN_KEY_FILE
+    VERIFICATION_AVAILABLE = True
+except ImportError:
+    VERIFICATION_AVAILABLE = False
+    logging.warning("Record verification could not be imported. Blockchain verification is disabled.")
+
+# Import streaming attachment encryption
+try:
+    from utils.stream_crypto import EncryptedFile, StreamDecryptionError, is_encrypted
+    from utils.blob_store import BlobStore, DIGEST_PATTERN
+    from utils.keyring import get_keyring
+    from config.config import BLOCKCHAIN_KEY_FILE
+    ATTACHMENT_ENCRYPTION_AVAILABLE = True
+except ImportError:
+    ATTACHMENT_ENCRYPTION_AVAILABLE = False
+    logging.warning("Attachment encryption could not be imported. Uploads are stored unencrypted.")
+
 # Configure logging
 logging.basicConfig(
     level=logging.INFO,
@@ -23,19 +46,33 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+class EncryptingRequest(Request):
+    """Request whose uploaded files are encrypted into the attachment store as they are parsed"""
+    
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        # The default factory spools large parts to a plaintext temporary file
+        if not attachment_store:
+            return super()._get_file_stream(total_content_length, content_type, filename, content_length)
+        return attachment_store.open_upload(get_keyring(BLOCKCHAIN_KEY_FILE).ensure_key())
+
 # Initialize Flask app
 app = Flask(__name__, static_folder='frontend', static_url_path='')
+app.request_class = EncryptingRequest
 CORS(app)  # Enable CORS for all routes
 
 # Configuration
 UPLOAD_FOLDER = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'uploads')
 ALLOWED_EXTENSIONS = {'pdf', 'jpg', 'jpeg', 'png', 'doc', 'docx'}
+MAX_VERIFY_RECORDS = 10000  # Records per verification request
 app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
-app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024  # 16MB max upload
+app.config['MAX_CONTENT_LENGTH'] = int(os.getenv('MAX_UPLOAD_SIZE', 1024 * 1024 * 1024))  # 1GB max upload, imaging studies are large
 
 # Create uploads folder if it doesn't exist
 os.makedirs(UPLOAD_FOLDER, exist_ok=True)
 
+# Attachments are stored once per content hash
+attachment_store = BlobStore(os.path.join(UPLOAD_FOLDER, 'store')) if ATTACHMENT_ENCRYPTION_AVAILABLE else None
+
 # Mock user database (would be replaced with a real database)
 USERS_DB_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'users.json')
 os.makedirs(os.path.dirname(USERS_DB_FILE), exist_ok=True)
@@ -151,6 +188,32 @@ def save_record(record):
         json.dump(records_data, f, indent=2)
     return record
 
+def add_record_attachment(record_id, attachment):
+    """Add an attachment to a record, returns False if the record does not exist"""
+    records_data = get_records()
+    for record in records_data["records"]:
+        if record["id"] == record_id:
+            if all(existing.get("sha256") != attachment["sha256"] for existing in record["attachments"]):
+                record["attachments"].append(attachment)
+                with open(RECORDS_DB_FILE, 'w') as f:
+                    json.dump(records_data, f, indent=2)
+            return True
+    return False
+
+def remove_record_attachment(record_id, sha256):
+    """Remove an attachment from a record, returns False if the record does not have it"""
+    records_data = get_records()
+    for record in records_data["records"]:
+        if record["id"] == record_id:
+            attachments = [a for a in record["attachments"] if a.get("sha256") != sha256]
+            if len(attachments) == len(record["attachments"]):
+                return False
+            record["attachments"] = attachments
+            with open(RECORDS_DB_FILE, 'w') as f:
+                json.dump(records_data, f, indent=2)
+            return True
+    return False
+
 def generate_blockchain_hash():
     """Mock function to generate a blockchain hash"""
     import random
@@ -264,21 +327,142 @@ def upload_file():
     
     if file and allowed_file(file.filename):
         filename = secure_filename(file.filename)
-        file_path = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-        file.save(file_path)
         
-        # In a real app, we would update the record with the file attachment
-        # and potentially store the file on a secure storage service
+        if not attachment_store:
+            file_path = os.path.join(app.config['UPLOAD_FOLDER'], filename)
+            file.save(file_path)
+            return jsonify({
+                "success": True,
+                "filename": filename,
+                "path": file_path,
+                "record_id": record_id,
+                "encrypted": False
+            })
+        
+        # The part was hashed and encrypted chunk by chunk while the form was
+        # parsed; a file that is already stored is kept once
+        result = attachment_store.commit_upload(file.stream)
+        
+        attachment = {
+            "filename": filename,
+            "sha256": result['sha256'],
+            "size": result['size'],
+            "content_type": file.mimetype
+        }
+        if record_id:
+            if not add_record_attachment(record_id, attachment):
+                return jsonify({"error": "Record not found"}), 404
+            attachment_store.add_ref(result['sha256'], record_id)
         
         return jsonify({
             "success": True,
             "filename": filename,
-            "path": file_path,
-            "record_id": record_id
+            "record_id": record_id,
+            "sha256": result['sha256'],
+            "size": result['size'],
+            "url": f"/api/files/{result['sha256']}",
+            "encrypted": result['encrypted'],
+            "deduplicated": result['deduplicated']
         })
     
     return jsonify({"error": "File type not allowed"}), 400
 
+@app.route('/api/records/<record_id>/attachments/<sha256>', methods=['DELETE'])
+def delete_attachment(record_id, sha256):
+    """Detach a file from a record; unreferenced files are removed by the store's gc"""
+    if not attachment_store or not DIGEST_PATTERN.match(sha256):
+        return jsonify({"error": "Attachment not found"}), 404
+    if not remove_record_attachment(record_id, sha256):
+        return jsonify({"error": "Attachment not found"}), 404
+    
+    references = attachment_store.remove_ref(sha256, record_id)
+    return jsonify({"success": True, "sha256": sha256, "references": references})
+
+def send_encrypted_file(file_path, etag, download_name):
+    """
+    Stream an encrypted attachment, decrypting only the chunks a Range request covers
+    
+    Args:
+        file_path (str): Path of the encrypted file
+        etag (str): Strong entity tag of the plaintext
+        download_name (str): File name offered to the client
+        
+    Returns:
+        Response: 200, 206, 304 or 416 response
+    """
+    if request.if_none_match.contains(etag):
+        response = Response(status=304)
+        response.set_etag(etag)
+        return response
+    
+    try:
+        encrypted = EncryptedFile(file_path, get_keyring(BLOCKCHAIN_KEY_FILE).keys)
+    except StreamDecryptionError as e:
+        logger.error(f"Error opening attachment {download_name}: {str(e)}")
+        return jsonify({"error": "Attachment could not be decrypted"}), 500
+    
+    start, stop, status = 0, encrypted.size, 200
+    byte_range = request.range
+    # A stale If-Range validator means the client gets the whole current file
+    if byte_range and (not request.headers.get('If-Range') or request.if_range.etag == etag):
+        bounds = byte_range.range_for_length(encrypted.size)
+        if bounds:
+            (start, stop), status = bounds, 206
+        elif len(byte_range.ranges) == 1:
+            encrypted.close()
+            response = Response(status=416)
+            response.headers['Content-Range'] = f"bytes */{encrypted.size}"
+            return response
+        # Multiple ranges are answered with the whole file
+    
+    response = Response(
+        stream_with_context(encrypted.iter_range(start, stop - 1)),
+        status=status,
+        mimetype='application/octet-stream',
+        direct_passthrough=True
+    )
+    response.call_on_close(encrypted.close)
+    response.headers['Content-Length'] = str(stop - start)
+    response.headers['Accept-Ranges'] = 'bytes'
+    response.headers['Content-Disposition'] = f'attachment; filename="{download_name}"'
+    if status == 206:
+        response.headers['Content-Range'] = f"bytes {start}-{stop - 1}/{encrypted.size}"
+    response.set_etag(etag)
+    response.cache_control.private = True
+    return response
+
+@app.route('/api/files/<filename>', methods=['GET'])
+def download_file(filename):
+    """Download a file attachment by content hash, or by name for older uploads"""
+    if attachment_store and DIGEST_PATTERN.match(filename) and attachment_store.exists(filename):
+        file_path = attachment_store.blob_path(filename)
+        # Blobs never change, so their content hash is a strong validator
+        etag = filename
+    else:
+        filename = secure_filename(filename)
+        file_path = os.path.join(app.config['UPLOAD_FOLDER'], filename)
+        etag = None
+    if not filename or not os.path.isfile(file_path):
+        return jsonify({"error": "File not found"}), 404
+    
+    if ATTACHMENT_ENCRYPTION_AVAILABLE and is_encrypted(file_path):
+        if etag is None:
+            stat = os.stat(file_path)
+            etag = f"{stat.st_mtime_ns:x}-{stat.st_size:x}"
+        return send_encrypted_file(file_path, etag, filename)
+    
+    # Plain files go out through the server's file wrapper (sendfile where available)
+    response = send_file(
+        file_path,
+        mimetype='application/octet-stream',
+        as_attachment=True,
+        download_name=filename,
+        etag=etag if etag else True,
+        conditional=True
+    )
+    response.cache_control.private = True
+    return response
+
 @app.route('/api/ml/fraud/detect', methods=['POST'])
 def detect_fraud():
     """Endpoint for fraud detection using ML model"""
@@ -380,20 +564,60 @@ def detect_anomaly():
 
 @app.route('/api/blockchain/verify', methods=['POST'])
 def verify_blockchain():
-    """Endpoint to verify a record's blockchain hash"""
+    """
+    Endpoint to verify records against their anchored Merkle roots
+    
+    Accepts a single data 'hash', a list of 'record_ids', or a 'patient_id'
+    to verify a patient's whole history in one request, up to
+    MAX_VERIFY_RECORDS records either way.
+    """
     data = request.json
-    if not data or 'hash' not in data:
+    if not data or not any(field in data for field in ('hash', 'record_ids', 'patient_id')):
         return jsonify({"error": "Invalid request"}), 400
     
-    # In a real app, we would verify the hash against the blockchain
-    # For demo, we'll always return success
+    if not VERIFICATION_AVAILABLE:
+        return jsonify({"error": "Record verification is not available"}), 503
     
-    return jsonify({
-        "success": True,
-        "verified": True,
-        "hash": data['hash'],
-        "timestamp": datetime.datetime.now().isoformat()
-    })
+    try:
+        # Verify a single anchored hash
+        if 'hash' in data:
+            result = verify_data_hash(data['hash'])
+            return jsonify({
+                "success": True,
+                "verified": result['verified'],
+                "hash": data['hash'],
+                "result": result,
+                "timestamp": datetime.datetime.now().isoformat()
+            })
+        
+        # Verifying record contents requires the decryption key
+        key = get_keyring(BLOCKCHAIN_KEY_FILE).keys
+        if not key:
+            return jsonify({"error": "Encryption key not found"}), 500
+        
+        if 'patient_id' in data:
+            # One past the cap is enough to tell the history is too long
+            record_ids = patient_record_ids(int(data['patient_id']), limit=MAX_VERIFY_RECORDS + 1)
+        else:
+            record_ids = [int(record_id) for record_id in data['record_ids']]
+        if len(record_ids) > MAX_VERIFY_RECORDS:
+            return jsonify({"error": f"At most {MAX_VERIFY_RECORDS} records can be verified per request"}), 400
+        results = verify_records(record_ids, key)
+        
+        verified_count = sum(1 for result in results if result['verified'])
+        return jsonify({
+            "success": True,
+            "verified": bool(results) and verified_count == len(results),
+            "total": len(results),
+            "verified_count": verified_count,
+            "results": results,
+            "timestamp": datetime.datetime.now().isoformat()
+        })
+    except (TypeError, ValueError):
+        return jsonify({"error": "Invalid request"}), 400
+    except Exception as e:
+        logger.error(f"Error verifying records: {str(e)}")
+        return jsonify({"error": "Error verifying records"}), 500
 
 @app.route('/api/blockchain/access-log', methods=['GET'])
 def get_access_log():
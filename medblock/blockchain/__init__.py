@@ -0,0 +1,27 @@
+"""
+MedBlock Blockchain Package
+
+This package contains the Ethereum integration used by the MedBlock application
+for storing medical records and managing access rights on chain.
+"""
+
+from .cache import TTLCache
+from .confirmations import ReceiptPoller
+from .providers import FailoverProvider, get_provider
+from .nonce_manager import NonceManager, TransactionPipeline, PendingTransaction
+from .smart_contracts import BlockchainIntegration
+from .local_chain import LocalChain, LocalChainProvider, local_blockchain
+
+__all__ = [
+    'BlockchainIntegration',
+    'FailoverProvider',
+    'get_provider',
+    'NonceManager',
+    'TransactionPipeline',
+    'PendingTransaction',
+    'ReceiptPoller',
+    'TTLCache',
+    'LocalChain',
+    'LocalChainProvider',
+    'local_blockchain'
+]
@@ -0,0 +1,118 @@
+"""
+Read-Through Caching for MedBlock
+
+This module provides a bounded, thread-safe LRU cache whose entries expire
+after a time-to-live or at an explicit timestamp, whichever comes first.
+"""
+
+import time
+import threading
+from collections import OrderedDict
+
+# Sentinel distinguishing a cache miss from a cached None
+MISSING = object()
+
+
+class TTLCache:
+    """
+    Bounded LRU cache with per-entry expiry
+
+    The least recently used entry is evicted once maxsize is reached.
+    Expiry times are Unix timestamps so they can be aligned with on-chain
+    expiry values.
+    """
+
+    def __init__(self, maxsize=10000, ttl=300):
+        """
+        Initialize the cache
+
+        Args:
+            maxsize (int): Maximum number of entries
+            ttl (float): Default lifetime of an entry in seconds
+        """
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries = OrderedDict()  # key -> (value, expires_at)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, default=MISSING):
+        """
+        Get a cached value
+
+        Args:
+            key: Cache key
+            default: Value returned on a miss
+
+        Returns:
+            Cached value, or default if missing or expired
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return default
+            value, expires_at = entry
+            if expires_at <= time.time():
+                del self._entries[key]
+                self.misses += 1
+                return default
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key, value, expires_at=None):
+        """
+        Store a value
+
+        Args:
+            key: Cache key
+            value: Value to cache
+            expires_at (float, optional): Unix timestamp after which the entry
+                is stale, capped at the default time-to-live
+        """
+        deadline = time.time() + self.ttl
+        if expires_at is not None:
+            deadline = min(deadline, expires_at)
+
+        with self._lock:
+            self._entries[key] = (value, deadline)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, key):
+        """Remove one entry"""
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def invalidate_where(self, predicate):
+        """
+        Remove every entry whose key matches a predicate
+
+        Args:
+            predicate (callable): Called with each key, True removes the entry
+
+        Returns:
+            int: Number of entries removed
+        """
+        with self._lock:
+            keys = [key for key in self._entries if predicate(key)]
+            for key in keys:
+                del self._entries[key]
+            return len(keys)
+
+    def clear(self):
+        """Remove all entries"""
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        with self._lock:
+            return len(self._entries)
+
+    def stats(self):
+        """Return hit and miss counters"""
+        with self._lock:
+            return {'size': len(self._entries), 'hits': self.hits, 'misses': self.misses}
@@ -0,0 +1,157 @@
+"""
+Transaction Confirmation Polling for MedBlock
+
+This module tracks sent transactions and collects their receipts from a
+single background thread. Every tick fetches the receipts of all pending
+transactions with one batched eth_getTransactionReceipt request.
+"""
+
+import time
+import logging
+import threading
+from concurrent.futures import Future
+
+from hexbytes import HexBytes
+from web3 import Web3
+from web3.exceptions import TimeExhausted
+
+from .rpc import batch_request
+
+logger = logging.getLogger(__name__)
+
+# Receipt fields that nodes return as hex quantities
+QUANTITY_FIELDS = ('blockNumber', 'status', 'gasUsed', 'cumulativeGasUsed', 'transactionIndex', 'effectiveGasPrice')
+
+
+def format_receipt(raw_receipt):
+    """
+    Convert a raw JSON-RPC receipt into the shape web3 returns
+
+    Args:
+        raw_receipt (dict): Receipt as returned by the node
+
+    Returns:
+        dict: Receipt with integer quantities and checksummed addresses
+    """
+    receipt = dict(raw_receipt)
+    for field in QUANTITY_FIELDS:
+        if isinstance(receipt.get(field), str):
+            receipt[field] = int(receipt[field], 16)
+    if receipt.get('contractAddress'):
+        receipt['contractAddress'] = Web3.to_checksum_address(receipt['contractAddress'])
+    if receipt.get('transactionHash'):
+        receipt['transactionHash'] = HexBytes(receipt['transactionHash'])
+    return receipt
+
+
+class ReceiptPoller:
+    """
+    Background receipt collector for sent transactions
+
+    Callers register a transaction hash with track() and get a Future that
+    resolves to the receipt. One thread polls all tracked hashes in a single
+    JSON-RPC batch per tick, so no thread is blocked per transaction.
+    """
+
+    def __init__(self, web3, interval=1.0, timeout=600, max_batch_size=500):
+        """
+        Initialize the poller
+
+        Args:
+            web3 (Web3): Connected Web3 instance
+            interval (float): Seconds between polling ticks
+            timeout (float): Seconds before a tracked transaction is given up on
+            max_batch_size (int): Maximum receipts requested per batch
+        """
+        self.web3 = web3
+        self.interval = interval
+        self.timeout = timeout
+        self.max_batch_size = max_batch_size
+
+        self._pending = {}  # tx hash hex -> (future, deadline)
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def track(self, tx_hash, timeout=None):
+        """
+        Start tracking a transaction
+
+        Args:
+            tx_hash (str or bytes): Hash of the sent transaction
+            timeout (float, optional): Seconds to wait instead of the poller default
+
+        Returns:
+            Future: Resolves to the transaction receipt
+        """
+        tx_hash = Web3.to_hex(HexBytes(tx_hash))
+        deadline = time.monotonic() + (timeout if timeout is not None else self.timeout)
+
+        with self._lock:
+            if tx_hash in self._pending:
+                return self._pending[tx_hash][0]
+            future = Future()
+            self._pending[tx_hash] = (future, deadline)
+            self._ensure_running()
+        return future
+
+    def pending_count(self):
+        """Return the number of transactions still waiting for a receipt"""
+        with self._lock:
+            return len(self._pending)
+
+    def _ensure_running(self):
+        """Start the polling thread if it is not running"""
+        if self._thread is None or not self._thread.is_alive():
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name='receipt-poller', daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        """Poll until stopped"""
+        while not self._stop.wait(self.interval):
+            try:
+                self.poll()
+            except Exception as e:
+                logger.error(f"Error polling transaction receipts: {str(e)}")
+
+    def poll(self):
+        """
+        Fetch receipts for tracked transactions once
+
+        Returns:
+            int: Number of transactions resolved in this tick
+        """
+        with self._lock:
+            tx_hashes = list(self._pending)[:self.max_batch_size]
+        if not tx_hashes:
+            return 0
+
+        replies = batch_request(self.web3, [('eth_getTransactionReceipt', [tx_hash]) for tx_hash in tx_hashes])
+
+        resolved = 0
+        now = time.monotonic()
+        for tx_hash, reply in zip(tx_hashes, replies):
+            raw_receipt = reply.get('result')
+            with self._lock:
+                future, deadline = self._pending[tx_hash]
+                if raw_receipt:
+                    del self._pending[tx_hash]
+                elif now >= deadline:
+                    del self._pending[tx_hash]
+                else:
+                    continue
+
+            if raw_receipt:
+                future.set_result(format_receipt(raw_receipt))
+                resolved += 1
+            else:
+                future.set_exception(TimeExhausted(f"Transaction {tx_hash} is not in the chain after the receipt timeout"))
+        return resolved
+
+    def stop(self):
+        """Stop the polling thread"""
+        self._stop.set()
+        if self._thread:
+            self._thread.join()
+            self._thread = None
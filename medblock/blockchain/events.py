@@ -0,0 +1,66 @@
+"""
+Contract Event Decoding for MedBlock
+
+This module fetches the MedicalRecords contract logs for a block range with
+a single eth_getLogs call and decodes them into named events.
+"""
+
+import logging
+
+from eth_utils import event_abi_to_log_topic
+
+logger = logging.getLogger(__name__)
+
+# Events emitted by the MedicalRecords contract
+CONTRACT_EVENTS = ('PatientAdded', 'MedicalRecordAdded', 'AccessGranted', 'AccessRevoked')
+
+
+def event_decoders(contract):
+    """
+    Map each contract event topic to its decoder
+
+    Args:
+        contract (Contract): Loaded MedicalRecords contract
+
+    Returns:
+        dict: Event topic bytes -> ContractEvent instance
+    """
+    decoders = {}
+    for abi in contract.abi:
+        if abi.get('type') == 'event' and abi.get('name') in CONTRACT_EVENTS:
+            decoders[bytes(event_abi_to_log_topic(abi))] = getattr(contract.events, abi['name'])()
+    return decoders
+
+
+def fetch_events(web3, contract, from_block, to_block, decoders=None):
+    """
+    Fetch and decode contract events in a block range
+
+    Args:
+        web3 (Web3): Connected Web3 instance
+        contract (Contract): Loaded MedicalRecords contract
+        from_block (int): First block of the range
+        to_block (int): Last block of the range, inclusive
+        decoders (dict, optional): Result of event_decoders() to reuse
+
+    Returns:
+        list: Decoded events in log order, each with 'event', 'args',
+            'blockNumber', 'blockHash', 'transactionHash' and 'logIndex'
+    """
+    decoders = decoders or event_decoders(contract)
+    logs = web3.eth.get_logs({
+        'address': contract.address,
+        'fromBlock': from_block,
+        'toBlock': to_block
+    })
+
+    events = []
+    for log in logs:
+        if not log['topics']:
+            continue
+        decoder = decoders.get(bytes(log['topics'][0]))
+        if decoder is None:
+            logger.debug(f"Skipping unknown log in block {log['blockNumber']}")
+            continue
+        events.append(decoder.process_log(log))
+    return events
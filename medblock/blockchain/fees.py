@@ -0,0 +1,200 @@
+"""
+Fee and Gas Estimation for MedBlock
+
+This module prices transactions with EIP-1559 fee fields sampled from
+recent blocks, and sizes gas limits from cached estimate_gas results, so
+building a transaction does not need its own fee or gas RPC calls.
+"""
+
+import time
+import logging
+import threading
+from statistics import median
+
+from .cache import TTLCache, MISSING
+
+logger = logging.getLogger(__name__)
+
+# Reward percentiles sampled for each transaction speed
+SPEED_PERCENTILES = {
+    'slow': 10,
+    'standard': 50,
+    'fast': 90
+}
+
+
+class FeeOracle:
+    """
+    Caches base fee and priority fee percentiles from eth_feeHistory
+
+    One fee history call covers every transaction sent within the refresh
+    interval. Chains without a base fee fall back to a cached legacy gas
+    price.
+    """
+
+    def __init__(self, web3, refresh_interval=12, block_count=20, base_fee_multiplier=2,
+                 min_priority_fee=10 ** 9):
+        """
+        Initialize the fee oracle
+
+        Args:
+            web3 (Web3): Connected Web3 instance
+            refresh_interval (float): Seconds a fee sample stays valid
+            block_count (int): Number of recent blocks sampled
+            base_fee_multiplier (float): Headroom over the next base fee in maxFeePerGas,
+                so a transaction stays valid while the base fee rises
+            min_priority_fee (int): Lowest priority fee offered, in wei
+        """
+        self.web3 = web3
+        self.refresh_interval = refresh_interval
+        self.block_count = block_count
+        self.base_fee_multiplier = base_fee_multiplier
+        self.min_priority_fee = min_priority_fee
+
+        self._sample = None
+        self._sampled_at = 0.0
+        self._lock = threading.Lock()
+
+    def _fetch(self):
+        """
+        Sample fees from recent blocks
+
+        Returns:
+            dict: 'base_fee' and 'priority_fees' by speed, or 'gas_price' on
+                chains without a base fee
+        """
+        percentiles = sorted(SPEED_PERCENTILES.values())
+        try:
+            history = self.web3.eth.fee_history(self.block_count, 'latest', percentiles)
+        except Exception as e:
+            logger.warning(f"Fee history unavailable, using legacy gas price: {str(e)}")
+            return {'gas_price': self.web3.eth.gas_price}
+
+        base_fees = history.get('baseFeePerGas') or []
+        if not base_fees or not base_fees[-1]:
+            return {'gas_price': self.web3.eth.gas_price}
+
+        rewards = history.get('reward') or []
+        priority_fees = {}
+        for speed, percentile in SPEED_PERCENTILES.items():
+            column = percentiles.index(percentile)
+            samples = [block[column] for block in rewards if len(block) > column]
+            priority_fees[speed] = max(int(median(samples)) if samples else 0, self.min_priority_fee)
+
+        # The last entry is the base fee of the next block
+        return {'base_fee': base_fees[-1], 'priority_fees': priority_fees}
+
+    def sample(self):
+        """
+        Get the cached fee sample, refreshing it once it is stale
+
+        Returns:
+            dict: Latest fee sample
+        """
+        with self._lock:
+            if self._sample is None or time.monotonic() - self._sampled_at >= self.refresh_interval:
+                self._sample = self._fetch()
+                self._sampled_at = time.monotonic()
+            return self._sample
+
+    def fee_params(self, speed='standard'):
+        """
+        Get fee fields for a transaction
+
+        Args:
+            speed (str): 'slow', 'standard' or 'fast'
+
+        Returns:
+            dict: maxFeePerGas and maxPriorityFeePerGas, or gasPrice on
+                chains without a base fee
+        """
+        sample = self.sample()
+        if 'gas_price' in sample:
+            return {'gasPrice': sample['gas_price']}
+
+        priority_fee = sample['priority_fees'][speed]
+        return {
+            'maxFeePerGas': int(sample['base_fee'] * self.base_fee_multiplier) + priority_fee,
+            'maxPriorityFeePerGas': priority_fee
+        }
+
+
+def argument_words(args):
+    """
+    Get the size class of contract call arguments
+
+    Strings and bytes count one 32-byte word per started word plus their
+    length word, everything else one word. Calls in the same class write
+    the same number of storage slots.
+
+    Args:
+        args (tuple): Contract call arguments
+
+    Returns:
+        int: Number of ABI words
+    """
+    words = 0
+    for arg in args:
+        if isinstance(arg, str):
+            arg = arg.encode()
+        if isinstance(arg, (bytes, bytearray)):
+            words += 1 + (len(arg) + 31) // 32
+        elif isinstance(arg, (list, tuple)):
+            words += 1 + argument_words(arg)
+        else:
+            words += 1
+    return words
+
+
+class GasEstimator:
+    """
+    Caches estimate_gas results per contract function and argument size class
+
+    The highest estimate seen for a class is kept, since the same call can
+    cost more when it writes fresh storage than when it overwrites it, and
+    a safety margin is added on top.
+    """
+
+    def __init__(self, margin=1.2, ttl=3600, maxsize=1024):
+        """
+        Initialize the estimator
+
+        Args:
+            margin (float): Multiplier applied to cached estimates
+            ttl (float): Seconds an estimate stays cached
+            maxsize (int): Maximum number of cached estimates
+        """
+        self.margin = margin
+        self.cache = TTLCache(maxsize=maxsize, ttl=ttl)
+
+    def estimate(self, contract_call, account_address):
+        """
+        Get the gas limit for a contract call
+
+        Args:
+            contract_call (ContractFunction): Contract call to send
+            account_address (str): Address of the sending account
+
+        Returns:
+            int: Gas limit
+        """
+        key = (contract_call.address, contract_call.fn_name, argument_words(contract_call.args))
+        gas = self.cache.get(key)
+        if gas is MISSING:
+            gas = contract_call.estimate_gas({'from': account_address})
+            self.cache.set(key, gas)
+            logger.debug(f"Estimated {gas} gas for {contract_call.fn_name} ({key[2]} words)")
+        return int(gas * self.margin)
+
+    def observe(self, contract_call, gas_used):
+        """
+        Raise the cached estimate of a class to gas used by a mined transaction
+
+        Args:
+            contract_call (ContractFunction): Contract call that was sent
+            gas_used (int): gasUsed from the transaction receipt
+        """
+        key = (contract_call.address, contract_call.fn_name, argument_words(contract_call.args))
+        cached = self.cache.get(key)
+        if cached is MISSING or gas_used > cached:
+            self.cache.set(key, gas_used)
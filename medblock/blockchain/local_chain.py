@@ -0,0 +1,717 @@
+"""
+In-Process Chain Stand-In for MedBlock
+
+This module provides a Web3 provider backed by an in-memory chain that
+implements the MedicalRecords contract from CONTRACT_INTERFACE in Python.
+Signed transactions are decoded and checked for their nonce, the contract's
+onlyAdmin and onlyAuthorized rules are enforced, events are emitted as logs,
+and blocks are mined on every transaction or at a fixed block time. The
+whole BlockchainIntegration stack, including nonce pipelining, receipt
+polling, fee sampling, caching and event indexing, runs against it without
+an Ethereum node.
+
+Contract creation transactions deploy the Python contract instead of
+executing their bytecode, and gas is charged from a simple model of
+calldata, storage words and logs.
+"""
+
+import os
+import json
+import time
+import logging
+import threading
+from collections import defaultdict
+
+import rlp
+from eth_abi import decode, encode
+from eth_account import Account
+from eth_utils import (
+    keccak, to_checksum_address, function_abi_to_4byte_selector, event_abi_to_log_topic
+)
+from web3.providers.base import JSONBaseProvider
+
+from .fees import argument_words
+
+logger = logging.getLogger(__name__)
+
+ABI_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'abi', 'MedicalRecords.json')
+
+# Gas model
+TRANSACTION_GAS = 21000
+CREATE_GAS = 32000
+STORAGE_WORD_GAS = 22100
+LOG_GAS = 375
+LOG_TOPIC_GAS = 375
+LOG_DATA_GAS = 8
+BLOCK_GAS_LIMIT = 30000000
+
+# Error(string) selector used in revert data
+REVERT_SELECTOR = bytes.fromhex('08c379a0')
+
+
+class Revert(Exception):
+    """Raised when a contract call fails a require()"""
+
+
+class OutOfGas(Revert):
+    """Raised when a transaction needs more gas than its limit"""
+
+
+def _hex(value):
+    """Encode bytes or an integer as a 0x-prefixed hex string"""
+    if isinstance(value, int):
+        return hex(value)
+    return '0x' + bytes(value).hex()
+
+
+def _to_bytes(value):
+    """Decode a 0x-prefixed hex string into bytes"""
+    if isinstance(value, (bytes, bytearray)):
+        return bytes(value)
+    value = value[2:] if value.startswith('0x') else value
+    return bytes.fromhex(value)
+
+
+def _types(params):
+    """Return the ABI type strings of function or event parameters"""
+    return [param['type'] for param in params]
+
+
+def decode_raw_transaction(raw):
+    """
+    Decode a signed legacy, EIP-2930 or EIP-1559 transaction
+
+    Args:
+        raw (bytes): Serialized signed transaction
+
+    Returns:
+        dict: Transaction fields including the recovered sender
+    """
+    if raw[0] == 2:
+        fields = rlp.decode(raw[1:])
+        chain_id, nonce, priority_fee, max_fee, gas, to, value, data = fields[:8]
+        gas_price = None
+    elif raw[0] == 1:
+        fields = rlp.decode(raw[1:])
+        chain_id, nonce, gas_price, gas, to, value, data = fields[:7]
+        priority_fee = max_fee = None
+    else:
+        nonce, gas_price, gas, to, value, data = rlp.decode(raw)[:6]
+        chain_id = priority_fee = max_fee = None
+
+    as_int = lambda value: int.from_bytes(value, 'big') if value is not None else None
+    return {
+        'hash': keccak(raw),
+        'type': raw[0] if raw[0] < 0x7f else 0,
+        'from': Account.recover_transaction(raw),
+        'to': to_checksum_address(to) if to else None,
+        'nonce': as_int(nonce),
+        'gas': as_int(gas),
+        'gasPrice': as_int(gas_price),
+        'maxFeePerGas': as_int(max_fee),
+        'maxPriorityFeePerGas': as_int(priority_fee),
+        'value': as_int(value),
+        'data': data,
+        'chainId': as_int(chain_id)
+    }
+
+
+class MedicalRecordsContract:
+    """
+    Python implementation of the MedicalRecords contract
+
+    Each function validates its inputs first and returns a closure that
+    applies the state change, so a call can be estimated or simulated
+    without side effects.
+    """
+
+    def __init__(self, address, admin):
+        """
+        Initialize contract storage
+
+        Args:
+            address (str): Contract address
+            admin (str): Address of the deploying account
+        """
+        self.address = address
+        self.admin = admin.lower()
+        self.patients = {}     # patient ID -> patient
+        self.records = {}      # (patient ID, record ID) -> record
+        self.access = {}       # (provider, patient ID) -> (access level, expiry)
+
+    def _only_admin(self, sender):
+        if sender != self.admin:
+            raise Revert("Only admin can perform this action")
+
+    def _only_authorized(self, sender, patient_id, required_level, now):
+        if sender == self.admin:
+            return
+        patient = self.patients.get(patient_id)
+        if patient and patient['address'] == sender:
+            return
+        grant = self.access.get((sender, patient_id))
+        if grant and grant[0] >= required_level and grant[1] > now:
+            return
+        raise Revert("Not authorized")
+
+    def _require_patient(self, patient_id):
+        if patient_id not in self.patients:
+            raise Revert("Patient does not exist")
+
+    def execute(self, fn_name, args, sender, now):
+        """
+        Run a contract function
+
+        Args:
+            fn_name (str): Function name
+            args (tuple): Decoded arguments
+            sender (str): Lowercase address of msg.sender
+            now (int): block.timestamp
+
+        Returns:
+            tuple: (outputs, apply, events) where apply is None for views and
+                events are (name, values) pairs
+
+        Raises:
+            Revert: If a require() fails
+        """
+        handler = getattr(self, f"_fn_{fn_name}", None)
+        if handler is None:
+            raise Revert(f"Unknown function {fn_name}")
+        return handler(sender, now, *args)
+
+    def _fn_admin(self, sender, now):
+        return [to_checksum_address(self.admin)], None, []
+
+    def _fn_addPatient(self, sender, now, patient_id, patient_address, encrypted_name, encrypted_dob):
+        self._only_admin(sender)
+        if patient_id in self.patients:
+            raise Revert("Patient already exists")
+
+        def apply():
+            self.patients[patient_id] = {
+                'address': patient_address.lower(),
+                'name': encrypted_name,
+                'dob': encrypted_dob
+            }
+        return [], apply, [('PatientAdded', [patient_id, patient_address])]
+
+    def _fn_addMedicalRecord(self, sender, now, patient_id, record_id, record_type, encrypted_data, timestamp):
+        self._only_authorized(sender, patient_id, 2, now)
+        self._require_patient(patient_id)
+        if (patient_id, record_id) in self.records:
+            raise Revert("Record already exists")
+
+        def apply():
+            self.records[(patient_id, record_id)] = (record_type, encrypted_data, timestamp, sender)
+        return [], apply, [('MedicalRecordAdded', [patient_id, record_id, record_type])]
+
+    def _fn_getMedicalRecord(self, sender, now, patient_id, record_id):
+        self._only_authorized(sender, patient_id, 1, now)
+        self._require_patient(patient_id)
+        record = self.records.get((patient_id, record_id))
+        if record is None:
+            raise Revert("Record does not exist")
+        record_type, encrypted_data, timestamp, provider = record
+        return [record_type, encrypted_data, timestamp, to_checksum_address(provider)], None, []
+
+    def _fn_grantAccess(self, sender, now, patient_id, provider, access_level, expiry):
+        self._only_authorized(sender, patient_id, 3, now)
+        self._require_patient(patient_id)
+        if not 1 <= access_level <= 3:
+            raise Revert("Invalid access level")
+        if expiry <= now:
+            raise Revert("Expiry must be in the future")
+
+        def apply():
+            self.access[(provider.lower(), patient_id)] = (access_level, expiry)
+        return [], apply, [('AccessGranted', [patient_id, provider, access_level, expiry])]
+
+    def _fn_revokeAccess(self, sender, now, patient_id, provider):
+        self._only_authorized(sender, patient_id, 3, now)
+        self._require_patient(patient_id)
+        if (provider.lower(), patient_id) not in self.access:
+            raise Revert("No access rights to revoke")
+
+        def apply():
+            del self.access[(provider.lower(), patient_id)]
+        return [], apply, [('AccessRevoked', [patient_id, provider])]
+
+    def _fn_checkAccess(self, sender, now, provider, patient_id):
+        grant = self.access.get((provider.lower(), patient_id))
+        if grant is None:
+            return [False, 0, 0], None, []
+        access_level, expiry = grant
+        return [expiry > now, access_level, expiry], None, []
+
+
+class LocalChain:
+    """
+    In-memory chain hosting MedicalRecords contracts
+
+    With block_time 0 every transaction is mined into its own block as soon
+    as it is sent. Otherwise transactions wait in a pending pool that a
+    background miner seals every block_time seconds.
+    """
+
+    def __init__(self, block_time=0, chain_id=1337, base_fee=10 ** 9, priority_fee=10 ** 9):
+        """
+        Initialize the chain with a genesis block
+
+        Args:
+            block_time (float): Seconds between blocks, 0 mines on every transaction
+            chain_id (int): Chain ID reported to clients
+            base_fee (int): Base fee per gas of every block, in wei
+            priority_fee (int): Priority fee reported by the fee history, in wei
+        """
+        with open(ABI_PATH, 'r') as f:
+            self.abi = json.load(f)['abi']
+        self.functions = {
+            function_abi_to_4byte_selector(abi): abi
+            for abi in self.abi if abi.get('type') == 'function'
+        }
+        self.events = {abi['name']: abi for abi in self.abi if abi.get('type') == 'event'}
+
+        self.block_time = block_time
+        self.chain_id = chain_id
+        self.base_fee = base_fee
+        self.priority_fee = priority_fee
+        self.time_offset = 0
+
+        self.blocks = []
+        self.transactions = {}   # tx hash -> transaction
+        self.receipts = {}       # tx hash -> receipt
+        self.logs = []
+        self.contracts = {}      # lowercase address -> MedicalRecordsContract
+        self.nonces = defaultdict(int)          # mined nonces
+        self.pending_nonces = defaultdict(int)  # nonces including the pending pool
+        self.pending = []
+
+        self._lock = threading.RLock()
+        self._stop = threading.Event()
+        self._miner = None
+        self._seal_block([])
+
+        if block_time:
+            self._miner = threading.Thread(target=self._run_miner, name='local-chain-miner', daemon=True)
+            self._miner.start()
+
+    def now(self):
+        """Return the current chain timestamp"""
+        return int(time.time()) + self.time_offset
+
+    def advance_time(self, seconds):
+        """Move the chain clock forward, for example to expire access grants"""
+        with self._lock:
+            self.time_offset += seconds
+
+    @property
+    def block_number(self):
+        """Number of the latest block"""
+        return len(self.blocks) - 1
+
+    def _run_miner(self):
+        """Seal a block every block_time seconds"""
+        while not self._stop.wait(self.block_time):
+            self.mine()
+
+    def stop(self):
+        """Stop the background miner"""
+        self._stop.set()
+        if self._miner:
+            self._miner.join()
+            self._miner = None
+
+    def mine(self):
+        """
+        Seal the pending transactions into a new block
+
+        Returns:
+            int: Number of the new block
+        """
+        with self._lock:
+            pending, self.pending = self.pending, []
+            return self._seal_block(pending)
+
+    def _seal_block(self, pending):
+        """Execute transactions and append a block holding them"""
+        number = len(self.blocks)
+        timestamp = self.now()
+        parent_hash = self.blocks[-1]['hash'] if self.blocks else b'\x00' * 32
+        block_hash = keccak(parent_hash + number.to_bytes(32, 'big') + b''.join(tx['hash'] for tx in pending))
+
+        cumulative_gas = 0
+        for index, tx in enumerate(pending):
+            receipt = self._execute(tx, number, block_hash, index, timestamp)
+            cumulative_gas += receipt['gasUsed']
+            receipt['cumulativeGasUsed'] = cumulative_gas
+            self.nonces[tx['from'].lower()] = tx['nonce'] + 1
+            tx.update(blockNumber=number, blockHash=block_hash, transactionIndex=index)
+
+        self.blocks.append({
+            'number': number,
+            'hash': block_hash,
+            'parentHash': parent_hash,
+            'timestamp': timestamp,
+            'gasUsed': cumulative_gas,
+            'transactions': [tx['hash'] for tx in pending]
+        })
+        return number
+
+    def _calldata_gas(self, data):
+        return sum(16 if byte else 4 for byte in data)
+
+    def _run(self, tx, now, apply_changes, gas_limit=None):
+        """
+        Execute a transaction or call against contract state
+
+        State changes are only applied when apply_changes is set and the
+        gas used fits the gas limit.
+
+        Returns:
+            tuple: (outputs, events, gas used, created contract address)
+
+        Raises:
+            Revert: If the contract rejects the call
+        """
+        sender = tx['from'].lower()
+        data = tx.get('data') or b''
+        gas = TRANSACTION_GAS + self._calldata_gas(data)
+
+        if not tx.get('to'):
+            # Contract creation deploys the Python contract in place of the bytecode
+            nonce = tx.get('nonce', self.pending_nonces[sender])
+            address = to_checksum_address(keccak(rlp.encode([_to_bytes(sender), nonce]))[12:])
+            if gas_limit is not None and gas + CREATE_GAS > gas_limit:
+                raise OutOfGas("out of gas")
+            if apply_changes:
+                self.contracts[address.lower()] = MedicalRecordsContract(address, sender)
+            return [], [], gas + CREATE_GAS, address
+
+        contract = self.contracts.get(tx['to'].lower())
+        if contract is None:
+            # Plain transfer, data is only recorded
+            return [], [], gas, None
+
+        function_abi = self.functions.get(data[:4])
+        if function_abi is None:
+            raise Revert("Unknown function selector")
+        args = decode(_types(function_abi['inputs']), data[4:])
+        outputs, apply, events = contract.execute(function_abi['name'], args, sender, now)
+
+        if apply is not None:
+            gas += STORAGE_WORD_GAS * argument_words(args)
+            for name, values in events:
+                gas += LOG_GAS + LOG_TOPIC_GAS + LOG_DATA_GAS * len(encode(_types(self.events[name]['inputs']), values))
+            if gas_limit is not None and gas > gas_limit:
+                raise OutOfGas("out of gas")
+            if apply_changes:
+                apply()
+
+        output_types = _types(function_abi.get('outputs', []))
+        return encode(output_types, outputs) if output_types else b'', events, gas, None
+
+    def _execute(self, tx, number, block_hash, index, timestamp):
+        """Execute a mined transaction and store its receipt"""
+        logs = []
+        try:
+            _, events, gas_used, contract_address = self._run(tx, timestamp, apply_changes=True, gas_limit=tx['gas'])
+            status = 1
+        except Revert as e:
+            logger.debug(f"Transaction {_hex(tx['hash'])} reverted: {str(e)}")
+            events = []
+            contract_address = None
+            status = 0
+            # Running out of gas consumes the whole limit
+            gas_used = tx['gas'] if isinstance(e, OutOfGas) else min(
+                TRANSACTION_GAS + self._calldata_gas(tx['data']), tx['gas']
+            )
+
+        for name, values in events:
+            log = {
+                'address': tx['to'],
+                'topics': [event_abi_to_log_topic(self.events[name])],
+                'data': encode(_types(self.events[name]['inputs']), values),
+                'blockNumber': number,
+                'blockHash': block_hash,
+                'transactionHash': tx['hash'],
+                'transactionIndex': index,
+                'logIndex': len(self.logs)
+            }
+            self.logs.append(log)
+            logs.append(log)
+
+        effective_price = tx['gasPrice'] if tx['gasPrice'] is not None else min(
+            tx['maxFeePerGas'], self.base_fee + tx['maxPriorityFeePerGas']
+        )
+        receipt = {
+            'transactionHash': tx['hash'],
+            'transactionIndex': index,
+            'blockNumber': number,
+            'blockHash': block_hash,
+            'from': tx['from'],
+            'to': tx['to'],
+            'contractAddress': contract_address,
+            'gasUsed': gas_used,
+            'effectiveGasPrice': effective_price,
+            'status': status,
+            'type': tx['type'],
+            'logs': logs
+        }
+        self.receipts[tx['hash']] = receipt
+        return receipt
+
+    def send_raw_transaction(self, raw):
+        """
+        Accept a signed transaction
+
+        Args:
+            raw (bytes): Serialized signed transaction
+
+        Returns:
+            bytes: Transaction hash
+
+        Raises:
+            ValueError: If the nonce or chain ID is wrong
+        """
+        tx = decode_raw_transaction(raw)
+        sender = tx['from'].lower()
+        with self._lock:
+            if tx['chainId'] is not None and tx['chainId'] != self.chain_id:
+                raise ValueError(f"Invalid chain id {tx['chainId']}")
+            expected = self.pending_nonces[sender]
+            if tx['nonce'] < expected:
+                raise ValueError(f"nonce too low: next nonce {expected}, tx nonce {tx['nonce']}")
+            if tx['nonce'] > expected:
+                raise ValueError(f"nonce too high: next nonce {expected}, tx nonce {tx['nonce']}")
+
+            self.pending_nonces[sender] = expected + 1
+            self.transactions[tx['hash']] = tx
+            self.pending.append(tx)
+            if not self.block_time:
+                self.mine()
+        return tx['hash']
+
+    def call(self, tx):
+        """
+        Run a call without changing state
+
+        Args:
+            tx (dict): 'to', 'data' and optionally 'from'
+
+        Returns:
+            tuple: (output bytes, gas the call would use)
+        """
+        call = {
+            'from': tx.get('from') or '0x' + '00' * 20,
+            'to': tx.get('to'),
+            'data': _to_bytes(tx.get('data') or tx.get('input') or '0x')
+        }
+        with self._lock:
+            output, _, gas, _ = self._run(call, self.now(), apply_changes=False)
+        return output, gas
+
+    def block(self, identifier):
+        """Get a block by number or tag"""
+        with self._lock:
+            if identifier in ('latest', 'pending', 'safe', 'finalized'):
+                return self.blocks[-1]
+            if identifier == 'earliest':
+                return self.blocks[0]
+            number = int(identifier, 16) if isinstance(identifier, str) else identifier
+            return self.blocks[number] if 0 <= number < len(self.blocks) else None
+
+    def get_logs(self, log_filter):
+        """Get logs matching an eth_getLogs filter"""
+        from_block = self.block(log_filter.get('fromBlock', 'latest'))
+        to_block = self.block(log_filter.get('toBlock', 'latest'))
+        if from_block is None or to_block is None:
+            return []
+        addresses = log_filter.get('address')
+        if isinstance(addresses, str):
+            addresses = [addresses]
+        addresses = {address.lower() for address in addresses} if addresses else None
+
+        with self._lock:
+            return [
+                log for log in self.logs
+                if from_block['number'] <= log['blockNumber'] <= to_block['number']
+                and (addresses is None or log['address'].lower() in addresses)
+            ]
+
+
+def _format_log(log):
+    return {
+        'address': log['address'],
+        'topics': [_hex(topic) for topic in log['topics']],
+        'data': _hex(log['data']),
+        'blockNumber': _hex(log['blockNumber']),
+        'blockHash': _hex(log['blockHash']),
+        'transactionHash': _hex(log['transactionHash']),
+        'transactionIndex': _hex(log['transactionIndex']),
+        'logIndex': _hex(log['logIndex']),
+        'removed': False
+    }
+
+
+def _format_receipt(receipt):
+    formatted = dict(receipt)
+    for field in ('transactionIndex', 'blockNumber', 'gasUsed', 'cumulativeGasUsed',
+                  'effectiveGasPrice', 'status', 'type'):
+        formatted[field] = _hex(receipt[field])
+    formatted['transactionHash'] = _hex(receipt['transactionHash'])
+    formatted['blockHash'] = _hex(receipt['blockHash'])
+    formatted['logs'] = [_format_log(log) for log in receipt['logs']]
+    return formatted
+
+
+def _format_block(block, base_fee):
+    return {
+        'number': _hex(block['number']),
+        'hash': _hex(block['hash']),
+        'parentHash': _hex(block['parentHash']),
+        'timestamp': _hex(block['timestamp']),
+        'gasUsed': _hex(block['gasUsed']),
+        'gasLimit': _hex(BLOCK_GAS_LIMIT),
+        'baseFeePerGas': _hex(base_fee),
+        'miner': '0x' + '00' * 20,
+        'difficulty': '0x0',
+        'extraData': '0x',
+        'transactions': [_hex(tx_hash) for tx_hash in block['transactions']]
+    }
+
+
+class LocalChainProvider(JSONBaseProvider):
+    """Web3 provider answering JSON-RPC requests from a LocalChain"""
+
+    def __init__(self, chain=None, **kwargs):
+        """
+        Initialize the provider
+
+        Args:
+            chain (LocalChain, optional): Chain to serve, created from kwargs if omitted
+            **kwargs: LocalChain options
+        """
+        super().__init__()
+        self.chain = chain or LocalChain(**kwargs)
+
+    def __str__(self):
+        return f"LocalChainProvider(chain_id={self.chain.chain_id})"
+
+    def _rpc_eth_sendRawTransaction(self, raw):
+        return _hex(self.chain.send_raw_transaction(_to_bytes(raw)))
+
+    def _rpc_eth_call(self, tx, block_identifier='latest'):
+        return _hex(self.chain.call(tx)[0])
+
+    def _rpc_eth_estimateGas(self, tx, block_identifier='latest'):
+        return _hex(self.chain.call(tx)[1])
+
+    def _rpc_eth_getTransactionCount(self, address, block_identifier='latest'):
+        nonces = self.chain.pending_nonces if block_identifier == 'pending' else self.chain.nonces
+        return _hex(nonces[address.lower()])
+
+    def _rpc_eth_getTransactionReceipt(self, tx_hash):
+        receipt = self.chain.receipts.get(_to_bytes(tx_hash))
+        return _format_receipt(receipt) if receipt else None
+
+    def _rpc_eth_getBlockByNumber(self, identifier, full_transactions=False):
+        block = self.chain.block(identifier)
+        return _format_block(block, self.chain.base_fee) if block else None
+
+    def _rpc_eth_blockNumber(self):
+        return _hex(self.chain.block_number)
+
+    def _rpc_eth_getLogs(self, log_filter):
+        return [_format_log(log) for log in self.chain.get_logs(log_filter)]
+
+    def _rpc_eth_feeHistory(self, block_count, newest_block, reward_percentiles):
+        block_count = int(block_count, 16) if isinstance(block_count, str) else block_count
+        newest = self.chain.block(newest_block)['number']
+        count = min(block_count, newest + 1)
+        return {
+            'oldestBlock': _hex(newest - count + 1),
+            'baseFeePerGas': [_hex(self.chain.base_fee)] * (count + 1),
+            'gasUsedRatio': [0.5] * count,
+            'reward': [[_hex(self.chain.priority_fee)] * len(reward_percentiles)] * count
+        }
+
+    def _rpc_eth_gasPrice(self):
+        return _hex(self.chain.base_fee + self.chain.priority_fee)
+
+    def _rpc_eth_maxPriorityFeePerGas(self):
+        return _hex(self.chain.priority_fee)
+
+    def _rpc_eth_chainId(self):
+        return _hex(self.chain.chain_id)
+
+    def _rpc_net_version(self):
+        return str(self.chain.chain_id)
+
+    def _rpc_web3_clientVersion(self):
+        return 'MedBlock/LocalChain'
+
+    def _rpc_eth_getCode(self, address, block_identifier='latest'):
+        return '0x01' if address.lower() in self.chain.contracts else '0x'
+
+    def _rpc_eth_accounts(self):
+        return []
+
+    def handle(self, request):
+        """
+        Answer one JSON-RPC request
+
+        Args:
+            request (dict): Request with 'method', 'params' and 'id'
+
+        Returns:
+            dict: JSON-RPC response
+        """
+        response = {'jsonrpc': '2.0', 'id': request.get('id')}
+        handler = getattr(self, f"_rpc_{request['method']}", None)
+        if handler is None:
+            response['error'] = {'code': -32601, 'message': f"Method {request['method']} not supported"}
+            return response
+        try:
+            response['result'] = handler(*(request.get('params') or []))
+        except Revert as e:
+            response['error'] = {
+                'code': 3,
+                'message': f"execution reverted: {str(e)}",
+                'data': _hex(REVERT_SELECTOR + encode(['string'], [str(e)]))
+            }
+        except ValueError as e:
+            response['error'] = {'code': -32000, 'message': str(e)}
+        return response
+
+    def make_request(self, method, params):
+        """Send one JSON-RPC request"""
+        request_id = next(self.request_counter)
+        return self.handle({'jsonrpc': '2.0', 'id': request_id, 'method': method, 'params': params})
+
+    def make_batch(self, payload):
+        """Send a JSON-RPC batch"""
+        return [self.handle(request) for request in payload]
+
+
+def local_blockchain(block_time=0, **kwargs):
+    """
+    Create a BlockchainIntegration on a fresh local chain with the contract deployed
+
+    Args:
+        block_time (float): Seconds between blocks, 0 mines on every transaction
+        **kwargs: Further BlockchainIntegration options
+
+    Returns:
+        tuple: (BlockchainIntegration, admin address, admin private key)
+    """
+    from .smart_contracts import BlockchainIntegration
+
+    provider = LocalChainProvider(block_time=block_time)
+    blockchain = BlockchainIntegration(provider=provider, **kwargs)
+    # Receipts arrive within a block, so poll at block pace
+    blockchain.pipeline.poller.interval = min(blockchain.pipeline.poller.interval, block_time or 0.01)
+
+    admin = Account.create()
+    blockchain.deploy_contract(admin.address, admin.key)
+    return blockchain, admin.address, admin.key
@@ -0,0 +1,204 @@
+"""
+Nonce Management and Transaction Pipelining for MedBlock
+
+This module keeps a local nonce counter per sending account so that many
+transactions can be signed and sent back-to-back without waiting for each
+one to be mined. Receipts are collected asynchronously by a ReceiptPoller.
+"""
+
+import threading
+import logging
+from contextlib import contextmanager
+
+from .confirmations import ReceiptPoller
+
+logger = logging.getLogger(__name__)
+
+
+class NonceManager:
+    """
+    Local nonce allocator with one counter per sending account
+
+    The first allocation for an account reads the pending transaction count
+    from the node. Later allocations are served from memory, so one account
+    can have many transactions in flight at once.
+    """
+
+    def __init__(self, web3):
+        """
+        Initialize the nonce manager
+
+        Args:
+            web3 (Web3): Connected Web3 instance
+        """
+        self.web3 = web3
+        self._lock = threading.Lock()
+        self._account_locks = {}
+        self._next_nonce = {}
+
+    def _account_lock(self, account_address):
+        """Return the lock that serializes allocations for an account"""
+        with self._lock:
+            if account_address not in self._account_locks:
+                self._account_locks[account_address] = threading.Lock()
+            return self._account_locks[account_address]
+
+    @contextmanager
+    def reserve(self, account_address):
+        """
+        Reserve the next nonce for an account
+
+        The account stays locked until the block exits, so the transaction
+        using the nonce is sent before the next one is allocated. If the
+        block raises, the counter is resynchronized from the node.
+
+        Args:
+            account_address (str): Address of the sending account
+
+        Yields:
+            int: Nonce to use for the transaction
+        """
+        with self._account_lock(account_address):
+            nonce = self._next_nonce.get(account_address)
+            if nonce is None:
+                nonce = self.web3.eth.get_transaction_count(account_address, 'pending')
+            try:
+                yield nonce
+            except Exception:
+                self._next_nonce.pop(account_address, None)
+                raise
+            self._next_nonce[account_address] = nonce + 1
+
+    def allocate(self, account_address):
+        """
+        Allocate the next nonce for an account
+
+        Args:
+            account_address (str): Address of the sending account
+
+        Returns:
+            int: Allocated nonce
+        """
+        with self.reserve(account_address) as nonce:
+            return nonce
+
+    def reset(self, account_address=None):
+        """
+        Drop cached nonces so they are re-read from the node
+
+        Args:
+            account_address (str, optional): Account to reset, all accounts if None
+        """
+        with self._lock:
+            if account_address is None:
+                self._next_nonce.clear()
+            else:
+                self._next_nonce.pop(account_address, None)
+
+
+class PendingTransaction:
+    """A transaction that has been sent but may not be mined yet"""
+
+    def __init__(self, tx_hash, nonce, future):
+        self.tx_hash = tx_hash
+        self.nonce = nonce
+        self._future = future
+
+    @property
+    def receipt_future(self):
+        """Return the Future that resolves to the receipt"""
+        return self._future
+
+    def done(self):
+        """Return True once the receipt has been collected"""
+        return self._future.done()
+
+    def receipt(self, timeout=None):
+        """
+        Wait for the transaction receipt
+
+        Args:
+            timeout (float, optional): Seconds to wait before giving up
+
+        Returns:
+            dict: Transaction receipt
+        """
+        return self._future.result(timeout=timeout)
+
+    def add_done_callback(self, callback):
+        """Call callback(pending_tx) once the receipt has been collected"""
+        self._future.add_done_callback(lambda future: callback(self))
+
+    def __repr__(self):
+        return f"<PendingTransaction(tx_hash='{self.tx_hash.hex()}', nonce={self.nonce})>"
+
+
+class TransactionPipeline:
+    """
+    Pipeline that signs and sends transactions without blocking on receipts
+
+    Nonces come from a shared NonceManager. Receipts are collected by a
+    ReceiptPoller in batches, so the caller gets a PendingTransaction back as
+    soon as the node has accepted the raw transaction.
+    """
+
+    def __init__(self, web3, nonce_manager=None, poller=None, receipt_timeout=120, poll_latency=0.5):
+        """
+        Initialize the transaction pipeline
+
+        Args:
+            web3 (Web3): Connected Web3 instance
+            nonce_manager (NonceManager, optional): Shared nonce allocator
+            poller (ReceiptPoller, optional): Shared receipt poller
+            receipt_timeout (float): Seconds to wait for each receipt
+            poll_latency (float): Seconds between receipt polls
+        """
+        self.web3 = web3
+        self.nonce_manager = nonce_manager or NonceManager(web3)
+        self.poller = poller or ReceiptPoller(web3, interval=poll_latency, timeout=receipt_timeout)
+        self.receipt_timeout = receipt_timeout
+
+    def submit(self, account_address, private_key, tx_params, contract_call=None):
+        """
+        Sign and send a transaction, then return without waiting for it to be mined
+
+        Args:
+            account_address (str): Address of the sending account
+            private_key (str): Private key of the sending account
+            tx_params (dict): Transaction fields such as gas and gasPrice
+            contract_call (ContractFunction, optional): Contract call to build the transaction from
+
+        Returns:
+            PendingTransaction: Handle for the sent transaction
+        """
+        with self.nonce_manager.reserve(account_address) as nonce:
+            tx = dict(tx_params, **{'from': account_address, 'nonce': nonce})
+            if contract_call is not None:
+                tx = contract_call.build_transaction(tx)
+            signed_tx = self.web3.eth.account.sign_transaction(tx, private_key)
+            tx_hash = self.web3.eth.send_raw_transaction(signed_tx.rawTransaction)
+
+        future = self.poller.track(tx_hash, timeout=self.receipt_timeout)
+        logger.debug(f"Sent transaction {tx_hash.hex()} from {account_address} with nonce {nonce}")
+        return PendingTransaction(tx_hash, nonce, future)
+
+    def submit_many(self, account_address, private_key, calls):
+        """
+        Send several transactions from one account back-to-back
+
+        Args:
+            account_address (str): Address of the sending account
+            private_key (str): Private key of the sending account
+            calls (list): (contract_call, tx_params) pairs
+
+        Returns:
+            list: PendingTransaction objects in submission order
+        """
+        return [
+            self.submit(account_address, private_key, tx_params, contract_call=contract_call)
+            for contract_call, tx_params in calls
+        ]
+
+    def shutdown(self):
+        """Stop collecting receipts"""
+        self.poller.stop()
@@ -0,0 +1,314 @@
+"""
+Pooled Failover Provider for MedBlock
+
+This module provides a Web3 provider that spreads JSON-RPC requests over
+several Ethereum nodes. All providers share keep-alive HTTP connection
+pools, requests go to the healthy node with the lowest observed latency,
+and a failing node is skipped until a background health check sees it
+answer again.
+"""
+
+import json
+import time
+import logging
+import threading
+
+import requests
+from requests.adapters import HTTPAdapter
+from web3.providers.base import JSONBaseProvider
+
+logger = logging.getLogger(__name__)
+
+# Weight of the newest sample in the latency moving average
+LATENCY_SMOOTHING = 0.2
+
+_sessions = {}
+_providers = {}
+_registry_lock = threading.Lock()
+
+
+def shared_session(pool_size=20):
+    """
+    Get the process-wide HTTP session for a connection pool size
+
+    Args:
+        pool_size (int): Maximum kept-alive connections per node
+
+    Returns:
+        requests.Session: Shared session
+    """
+    with _registry_lock:
+        session = _sessions.get(pool_size)
+        if session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=8, pool_maxsize=pool_size)
+            session.mount('http://', adapter)
+            session.mount('https://', adapter)
+            _sessions[pool_size] = session
+        return session
+
+
+def parse_urls(provider_url):
+    """
+    Split a provider setting into node URLs
+
+    Args:
+        provider_url (str or list): One URL, comma-separated URLs or a list
+
+    Returns:
+        list: Node URLs
+    """
+    if isinstance(provider_url, str):
+        provider_url = provider_url.split(',')
+    return [url.strip() for url in provider_url if url and url.strip()]
+
+
+class NodeState:
+    """Health and latency bookkeeping for one node"""
+
+    def __init__(self, url):
+        self.url = url
+        self.healthy = True
+        self.latency = None  # Moving average in seconds
+        self.block_number = None
+        self.requests = 0
+        self.failures = 0
+        self.consecutive_failures = 0
+        self.last_error = None
+        self.last_checked = None
+
+    def record_success(self, elapsed):
+        """Record a successful request, only a health check brings the node back into rotation"""
+        self.requests += 1
+        self.consecutive_failures = 0
+        if self.latency is None:
+            self.latency = elapsed
+        else:
+            self.latency += LATENCY_SMOOTHING * (elapsed - self.latency)
+
+    def record_failure(self, error, max_failures):
+        """Record a failed request, marking the node unhealthy after max_failures in a row"""
+        self.requests += 1
+        self.failures += 1
+        self.consecutive_failures += 1
+        self.last_error = str(error)
+        if self.consecutive_failures >= max_failures:
+            self.healthy = False
+
+    def to_dict(self):
+        """Return the node metrics as a dictionary"""
+        return {
+            'url': self.url,
+            'healthy': self.healthy,
+            'latency_ms': round(self.latency * 1000, 1) if self.latency is not None else None,
+            'block_number': self.block_number,
+            'requests': self.requests,
+            'failures': self.failures,
+            'last_error': self.last_error,
+            'last_checked': self.last_checked
+        }
+
+
+class FailoverProvider(JSONBaseProvider):
+    """
+    JSON-RPC provider with latency-based node selection and failover
+
+    Nodes are tried in order of health and latency until one answers. A
+    node is marked unhealthy after max_failures consecutive errors, or when
+    a health check finds it down or more than max_block_lag blocks behind
+    the best node.
+    """
+
+    def __init__(self, urls, timeout=30, pool_size=20, max_concurrency=None, max_failures=3,
+                 health_check_interval=15, max_block_lag=5):
+        """
+        Initialize the provider
+
+        Args:
+            urls (list): Node URLs
+            timeout (float): HTTP timeout in seconds
+            pool_size (int): Kept-alive connections per node in the shared pool
+            max_concurrency (int, optional): Maximum requests in flight, defaults to pool_size
+            max_failures (int): Consecutive errors that mark a node unhealthy
+            health_check_interval (float): Seconds between health checks, 0 disables them
+            max_block_lag (int): Blocks a node may trail the best node and stay healthy
+        """
+        super().__init__()
+        if not urls:
+            raise ValueError("At least one node URL is required")
+
+        self.nodes = [NodeState(url) for url in urls]
+        self.timeout = timeout
+        self.max_failures = max_failures
+        self.max_block_lag = max_block_lag
+        self.session = shared_session(pool_size)
+        self._slots = threading.BoundedSemaphore(max_concurrency or pool_size)
+        self._lock = threading.Lock()
+
+        self.health_check_interval = health_check_interval
+        self._stop = threading.Event()
+        self._thread = None
+        if health_check_interval:
+            self._thread = threading.Thread(target=self._run_health_checks, name='provider-health', daemon=True)
+            self._thread.start()
+
+    @property
+    def endpoint_uri(self):
+        """URL of the node the next request goes to"""
+        return self._ordered_nodes()[0].url
+
+    def __str__(self):
+        return f"FailoverProvider({', '.join(node.url for node in self.nodes)})"
+
+    def _ordered_nodes(self):
+        """Return the nodes to try, healthy ones first and fastest first"""
+        with self._lock:
+            return sorted(self.nodes, key=lambda node: (
+                not node.healthy,
+                node.latency if node.latency is not None else 0.0
+            ))
+
+    def _post(self, payload):
+        """
+        Post a JSON-RPC payload, failing over between nodes
+
+        Args:
+            payload (bytes): Encoded request or batch
+
+        Returns:
+            bytes: Raw response body
+
+        Raises:
+            requests.RequestException: If every node failed
+        """
+        last_error = None
+        with self._slots:
+            for node in self._ordered_nodes():
+                started = time.monotonic()
+                try:
+                    response = self.session.post(
+                        node.url,
+                        data=payload,
+                        headers={'Content-Type': 'application/json'},
+                        timeout=self.timeout
+                    )
+                    response.raise_for_status()
+                except requests.RequestException as e:
+                    with self._lock:
+                        node.record_failure(e, self.max_failures)
+                    logger.warning(f"Request to {node.url} failed: {str(e)}")
+                    last_error = e
+                    continue
+
+                with self._lock:
+                    node.record_success(time.monotonic() - started)
+                return response.content
+        raise last_error
+
+    def make_request(self, method, params):
+        """Send one JSON-RPC request"""
+        return self.decode_rpc_response(self._post(self.encode_rpc_request(method, params)))
+
+    def make_batch(self, payload):
+        """
+        Send a JSON-RPC batch
+
+        Args:
+            payload (list): Request dictionaries
+
+        Returns:
+            list or dict: Decoded response
+        """
+        return self.decode_rpc_response(self._post(json.dumps(payload).encode()))
+
+    def check_health(self):
+        """
+        Probe every node with eth_blockNumber
+
+        Returns:
+            list: Node metrics after the check
+        """
+        reachable = []
+        for node in self.nodes:
+            started = time.monotonic()
+            try:
+                response = self.session.post(
+                    node.url,
+                    json={'jsonrpc': '2.0', 'id': 0, 'method': 'eth_blockNumber', 'params': []},
+                    timeout=self.timeout
+                )
+                response.raise_for_status()
+                block_number = int(response.json()['result'], 16)
+            except (requests.RequestException, ValueError, KeyError) as e:
+                with self._lock:
+                    node.healthy = False
+                    node.failures += 1
+                    node.last_error = str(e)
+                    node.last_checked = time.time()
+                continue
+
+            with self._lock:
+                node.record_success(time.monotonic() - started)
+                node.block_number = block_number
+                node.last_checked = time.time()
+            reachable.append(node)
+
+        # A reachable node is healthy unless it trails the best node
+        with self._lock:
+            if reachable:
+                best = max(node.block_number for node in reachable)
+                for node in reachable:
+                    node.healthy = best - node.block_number <= self.max_block_lag
+        return self.metrics()
+
+    def _run_health_checks(self):
+        """Run health checks until stopped"""
+        while not self._stop.wait(self.health_check_interval):
+            try:
+                self.check_health()
+            except Exception as e:
+                logger.error(f"Error checking node health: {str(e)}")
+
+    def metrics(self):
+        """
+        Get per-node health and latency metrics
+
+        Returns:
+            list: One dictionary per node
+        """
+        with self._lock:
+            return [node.to_dict() for node in self.nodes]
+
+    def close(self):
+        """Stop the background health checks"""
+        self._stop.set()
+        if self._thread:
+            self._thread.join()
+            self._thread = None
+
+
+def get_provider(provider_url, **kwargs):
+    """
+    Get the shared provider for a set of node URLs
+
+    Instances of BlockchainIntegration pointing at the same nodes share one
+    provider, so its connections, metrics and health checks are reused.
+
+    Args:
+        provider_url (str or list): One URL, comma-separated URLs or a list
+        **kwargs: FailoverProvider options used when the provider is created
+
+    Returns:
+        FailoverProvider: Shared provider
+    """
+    urls = tuple(parse_urls(provider_url))
+    with _registry_lock:
+        provider = _providers.get(urls)
+    if provider is None:
+        provider = FailoverProvider(list(urls), **kwargs)
+        with _registry_lock:
+            shared = _providers.setdefault(urls, provider)
+        if shared is not provider:
+            provider.close()
+        provider = shared
+    return provider
@@ -0,0 +1,69 @@
+"""
+JSON-RPC Batch Requests for MedBlock
+
+This module sends several JSON-RPC calls to an Ethereum node in a single
+HTTP request. Providers that cannot batch fall back to one call at a time.
+"""
+
+import logging
+import itertools
+import threading
+
+from .providers import shared_session
+
+logger = logging.getLogger(__name__)
+
+_request_ids = itertools.count()
+_id_lock = threading.Lock()
+
+
+def _next_id():
+    """Return a process-wide unique JSON-RPC request ID"""
+    with _id_lock:
+        return next(_request_ids)
+
+
+def batch_request(web3, calls, timeout=30):
+    """
+    Send JSON-RPC calls as one batch
+
+    Args:
+        web3 (Web3): Web3 instance whose provider receives the calls
+        calls (list): (method, params) pairs
+        timeout (float): HTTP timeout in seconds
+
+    Returns:
+        list: One JSON-RPC response per call, in call order. Each response is
+            a dict holding either 'result' or 'error'
+    """
+    if not calls:
+        return []
+
+    ids = [_next_id() for _ in calls]
+    endpoint = getattr(web3.provider, 'endpoint_uri', None)
+    payload = [
+        {'jsonrpc': '2.0', 'id': request_id, 'method': method, 'params': params}
+        for request_id, (method, params) in zip(ids, calls)
+    ]
+
+    if hasattr(web3.provider, 'make_batch') or (endpoint and str(endpoint).startswith(('http://', 'https://'))):
+        if hasattr(web3.provider, 'make_batch'):
+            # Pooled failover provider
+            replies = web3.provider.make_batch(payload)
+        else:
+            # Shared HTTP session so batches reuse keep-alive connections
+            response = shared_session().post(str(endpoint), json=payload, timeout=timeout)
+            response.raise_for_status()
+            replies = response.json()
+        if isinstance(replies, dict):
+            # Nodes answer a rejected batch with a single error object
+            return [replies] * len(calls)
+        by_id = {reply.get('id'): reply for reply in replies}
+    else:
+        by_id = {
+            request_id: web3.provider.make_request(method, params)
+            for request_id, (method, params) in zip(ids, calls)
+        }
+
+    missing = {'error': {'code': -32603, 'message': 'No response in batch'}}
+    return [by_id.get(request_id, missing) for request_id in ids]
@@ -1,10 +1,26 @@
 import json
 import os
+import sys
+import threading
 from web3 import Web3
+from hexbytes import HexBytes
 from cryptography.fernet import Fernet
 from datetime import datetime
 import logging
 
+# Add the repository root to path for the shared key handling
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from utils.keyring import get_keyring
+from utils.envelope import get_cipher
+
+from .nonce_manager import NonceManager, TransactionPipeline
+from .cache import TTLCache, MISSING
+from .events import fetch_events, event_decoders
+from .rpc import batch_request
+from .providers import get_provider
+from .fees import FeeOracle, GasEstimator
+
 # Configure logging
 logging.basicConfig(
     level=logging.INFO,
@@ -22,20 +38,27 @@ class BlockchainIntegration:
     with role-based access control
     """
     
-    def __init__(self, provider_url=None, contract_address=None, keyfile=None):
+    def __init__(self, provider_url=None, contract_address=None, keyfile=None, cache_size=10000, cache_ttl=300,
+                 provider=None):
         """
         Initialize blockchain connection
         
         Args:
-            provider_url (str): URL of the blockchain provider
+            provider_url (str or list): URL of the blockchain provider, or several
+                node URLs (a list or comma-separated) to fail over between
             contract_address (str): Address of the deployed smart contract
             keyfile (str): Path to the encryption key file
+            cache_size (int): Maximum entries in each read cache
+            cache_ttl (float): Seconds a cached contract read stays valid
+            provider (BaseProvider, optional): Web3 provider to use instead of
+                connecting to provider_url, such as a LocalChainProvider
         """
         # Default to local development chain if no provider URL is provided
         self.provider_url = provider_url or "http://localhost:8545"
         
         try:
-            self.web3 = Web3(Web3.HTTPProvider(self.provider_url))
+            # Instances pointing at the same nodes share one pooled provider
+            self.web3 = Web3(provider or get_provider(self.provider_url))
             if self.web3.is_connected():
                 logger.info(f"Connected to Ethereum node at {self.provider_url}")
             else:
@@ -44,6 +67,22 @@ class BlockchainIntegration:
             logger.error(f"Error connecting to blockchain: {str(e)}")
             self.web3 = None
         
+        # Local nonce allocation lets one account keep many transactions in flight
+        self.nonce_manager = NonceManager(self.web3) if self.web3 else None
+        self.pipeline = TransactionPipeline(self.web3, self.nonce_manager) if self.web3 else None
+        
+        # Fees are sampled once per interval and gas limits come from cached estimates
+        self.fee_oracle = FeeOracle(self.web3) if self.web3 else None
+        self.gas_estimator = GasEstimator()
+        
+        # Read-through caches for contract calls, invalidated by contract events
+        self.record_cache = TTLCache(maxsize=cache_size, ttl=cache_ttl)
+        self.access_cache = TTLCache(maxsize=cache_size, ttl=cache_ttl)
+        self._event_decoders = None
+        self._last_event_block = None
+        self._event_thread = None
+        self._stop_events = threading.Event()
+        
         self.contract_address = contract_address
         self.contract = None
         
@@ -51,19 +90,21 @@ class BlockchainIntegration:
         if contract_address and self.web3 and self.web3.is_connected():
             self._load_contract()
         
-        # Initialize encryption key
-        self.key = None
-        if keyfile and os.path.exists(keyfile):
-            with open(keyfile, 'rb') as f:
-                self.key = f.read()
+        # Key files hold one key per line once rotated, the primary first;
+        # a key is generated if the file has none
+        self.keyring = get_keyring(keyfile) if keyfile else None
+        if self.keyring:
+            self.keyring.ensure_key()
+            self._key = None
         else:
-            # Generate a new key if none is provided
-            self.key = Fernet.generate_key()
-            if keyfile:
-                with open(keyfile, 'wb') as f:
-                    f.write(self.key)
-        
-        self.cipher = Fernet(self.key)
+            self._key = Fernet.generate_key()
+    
+    @property
+    def cipher(self):
+        """MultiFernet over the key file's keys, so data under older keys still decrypts"""
+        if self.keyring:
+            return get_cipher(self.keyring.keys)
+        return get_cipher(self._key)
     
     def _load_contract(self):
         """Load the smart contract from its ABI"""
@@ -76,7 +117,7 @@ class BlockchainIntegration:
             # Initialize contract
             self.contract = self.web3.eth.contract(
                 address=self.contract_address,
-                abi=contract_abi
+                abi=contract_abi['abi']
             )
             logger.info(f"Contract loaded at address {self.contract_address}")
         except Exception as e:
@@ -109,21 +150,14 @@ class BlockchainIntegration:
                 bytecode=contract_data['bytecode']
             )
             
-            # Build transaction
-            nonce = self.web3.eth.get_transaction_count(account_address)
-            transaction = MedicalRecords.constructor().build_transaction({
-                'from': account_address,
-                'nonce': nonce,
-                'gas': 2000000,
-                'gasPrice': self.web3.to_wei('50', 'gwei')
-            })
-            
-            # Sign and send transaction
-            signed_tx = self.web3.eth.account.sign_transaction(transaction, private_key)
-            tx_hash = self.web3.eth.send_raw_transaction(signed_tx.rawTransaction)
-            
-            # Wait for transaction receipt
-            tx_receipt = self.web3.eth.wait_for_transaction_receipt(tx_hash)
+            # Sign and send transaction, then wait for the receipt
+            pending = self.pipeline.submit(
+                account_address,
+                private_key,
+                dict(self.fee_oracle.fee_params(), gas=2000000),
+                contract_call=MedicalRecords.constructor()
+            )
+            tx_receipt = pending.receipt()
             contract_address = tx_receipt['contractAddress']
             
             # Update contract address and load the contract
@@ -136,7 +170,62 @@ class BlockchainIntegration:
             logger.error(f"Error deploying contract: {str(e)}")
             raise
     
-    def add_patient(self, account_address, private_key, patient_id, patient_address, name, dob):
+    def _send_transaction(self, account_address, private_key, contract_call, gas=None, speed='standard'):
+        """
+        Sign and send a contract transaction through the pipeline
+        
+        Args:
+            account_address (str): Address of the sending account
+            private_key (str): Private key of the sending account
+            contract_call (ContractFunction): Contract call to send
+            gas (int, optional): Gas limit, estimated from cached results if omitted
+            speed (str): Fee level, 'slow', 'standard' or 'fast'
+            
+        Returns:
+            PendingTransaction: Handle for the sent transaction
+        """
+        tx_params = self.fee_oracle.fee_params(speed)
+        tx_params['gas'] = gas or self.gas_estimator.estimate(contract_call, account_address)
+        pending = self.pipeline.submit(account_address, private_key, tx_params, contract_call=contract_call)
+        
+        def observe(pending_tx):
+            # Keep the cached estimate at or above what the call really used
+            try:
+                self.gas_estimator.observe(contract_call, pending_tx.receipt(timeout=0)['gasUsed'])
+            except Exception:
+                # Timed out or dropped, there is no gas usage to learn from
+                pass
+        
+        pending.add_done_callback(observe)
+        return pending
+    
+    def _transaction_result(self, pending, wait=True):
+        """
+        Format a sent transaction as a result dictionary
+        
+        Args:
+            pending (PendingTransaction): Handle for the sent transaction
+            wait (bool): Wait for the receipt before formatting the result
+            
+        Returns:
+            dict: Transaction details
+        """
+        if not wait and not pending.done():
+            return {
+                'transaction_hash': pending.tx_hash.hex(),
+                'nonce': pending.nonce,
+                'status': 'pending',
+                'pending': pending
+            }
+        
+        tx_receipt = pending.receipt()
+        return {
+            'transaction_hash': pending.tx_hash.hex(),
+            'block_number': tx_receipt['blockNumber'],
+            'status': 'success' if tx_receipt['status'] == 1 else 'failed'
+        }
+    
+    def add_patient(self, account_address, private_key, patient_id, patient_address, name, dob, wait=True):
         """
         Add a new patient to the system
         
@@ -147,6 +236,7 @@ class BlockchainIntegration:
             patient_address (str): Ethereum address of the patient
             name (str): Patient's name (will be encrypted)
             dob (str): Patient's date of birth (will be encrypted)
+            wait (bool): Wait for the receipt instead of returning a pending result
             
         Returns:
             dict: Transaction details
@@ -159,38 +249,24 @@ class BlockchainIntegration:
             encrypted_name = self.encrypt(name)
             encrypted_dob = self.encrypt(dob)
             
-            # Build transaction
-            nonce = self.web3.eth.get_transaction_count(account_address)
-            transaction = self.contract.functions.addPatient(
+            # Build the contract call
+            contract_call = self.contract.functions.addPatient(
                 patient_id,
                 patient_address,
                 encrypted_name,
                 encrypted_dob
-            ).build_transaction({
-                'from': account_address,
-                'nonce': nonce,
-                'gas': 500000,
-                'gasPrice': self.web3.to_wei('50', 'gwei')
-            })
+            )
             
             # Sign and send transaction
-            signed_tx = self.web3.eth.account.sign_transaction(transaction, private_key)
-            tx_hash = self.web3.eth.send_raw_transaction(signed_tx.rawTransaction)
-            
-            # Wait for transaction receipt
-            tx_receipt = self.web3.eth.wait_for_transaction_receipt(tx_hash)
+            pending = self._send_transaction(account_address, private_key, contract_call)
             
             logger.info(f"Patient {patient_id} added successfully")
-            return {
-                'transaction_hash': tx_hash.hex(),
-                'block_number': tx_receipt['blockNumber'],
-                'status': 'success' if tx_receipt['status'] == 1 else 'failed'
-            }
+            return self._transaction_result(pending, wait)
         except Exception as e:
             logger.error(f"Error adding patient: {str(e)}")
             raise
     
-    def add_medical_record(self, account_address, private_key, patient_id, record_id, record_type, data, timestamp=None):
+    def add_medical_record(self, account_address, private_key, patient_id, record_id, record_type, data, timestamp=None, wait=True):
         """
         Add a medical record for a patient
         
@@ -202,6 +278,7 @@ class BlockchainIntegration:
             record_type (str): Type of medical record
             data (dict): Medical record data (will be encrypted)
             timestamp (str, optional): Timestamp of the record
+            wait (bool): Wait for the receipt instead of returning a pending result
             
         Returns:
             dict: Transaction details
@@ -218,34 +295,22 @@ class BlockchainIntegration:
             if not timestamp:
                 timestamp = datetime.now().isoformat()
             
-            # Build transaction
-            nonce = self.web3.eth.get_transaction_count(account_address)
-            transaction = self.contract.functions.addMedicalRecord(
+            # Build the contract call
+            contract_call = self.contract.functions.addMedicalRecord(
                 patient_id,
                 record_id,
                 record_type,
                 encrypted_data,
                 timestamp
-            ).build_transaction({
-                'from': account_address,
-                'nonce': nonce,
-                'gas': 1000000,
-                'gasPrice': self.web3.to_wei('50', 'gwei')
-            })
+            )
             
             # Sign and send transaction
-            signed_tx = self.web3.eth.account.sign_transaction(transaction, private_key)
-            tx_hash = self.web3.eth.send_raw_transaction(signed_tx.rawTransaction)
+            pending = self._send_transaction(account_address, private_key, contract_call)
             
-            # Wait for transaction receipt
-            tx_receipt = self.web3.eth.wait_for_transaction_receipt(tx_hash)
+            self.apply_event({'event': 'MedicalRecordAdded', 'args': {'patientId': patient_id, 'recordId': record_id}})
             
             logger.info(f"Medical record {record_id} added for patient {patient_id}")
-            return {
-                'transaction_hash': tx_hash.hex(),
-                'block_number': tx_receipt['blockNumber'],
-                'status': 'success' if tx_receipt['status'] == 1 else 'failed'
-            }
+            return self._transaction_result(pending, wait)
         except Exception as e:
             logger.error(f"Error adding medical record: {str(e)}")
             raise
@@ -264,6 +329,12 @@ class BlockchainIntegration:
         if not self.web3 or not self.contract:
             raise ConnectionError("Blockchain or contract not initialized")
         
+        # Serve repeated reads from the cache
+        cache_key = (patient_id, record_id)
+        cached = self.record_cache.get(cache_key)
+        if cached is not MISSING:
+            return dict(cached)
+        
         try:
             # Call the contract to get the record
             record = self.contract.functions.getMedicalRecord(patient_id, record_id).call()
@@ -275,7 +346,7 @@ class BlockchainIntegration:
             json_data = self.decrypt(encrypted_data)
             data = json.loads(json_data)
             
-            return {
+            result = {
                 'patient_id': patient_id,
                 'record_id': record_id,
                 'record_type': record_type,
@@ -283,11 +354,13 @@ class BlockchainIntegration:
                 'timestamp': timestamp,
                 'provider': provider
             }
+            self.record_cache.set(cache_key, result)
+            return dict(result)
         except Exception as e:
             logger.error(f"Error retrieving medical record: {str(e)}")
             raise
     
-    def grant_access(self, account_address, private_key, patient_id, provider_address, access_level, expiry=None):
+    def grant_access(self, account_address, private_key, patient_id, provider_address, access_level, expiry=None, wait=True):
         """
         Grant access to a provider for a patient's records
         
@@ -298,6 +371,7 @@ class BlockchainIntegration:
             provider_address (str): Address of the healthcare provider
             access_level (int): Level of access (1: Read, 2: Write, 3: Admin)
             expiry (int, optional): Unix timestamp for access expiry
+            wait (bool): Wait for the receipt instead of returning a pending result
             
         Returns:
             dict: Transaction details
@@ -310,38 +384,26 @@ class BlockchainIntegration:
             if not expiry:
                 expiry = int((datetime.now().timestamp() + 2592000))  # 30 days in seconds
             
-            # Build transaction
-            nonce = self.web3.eth.get_transaction_count(account_address)
-            transaction = self.contract.functions.grantAccess(
+            # Build the contract call
+            contract_call = self.contract.functions.grantAccess(
                 patient_id,
                 provider_address,
                 access_level,
                 expiry
-            ).build_transaction({
-                'from': account_address,
-                'nonce': nonce,
-                'gas': 500000,
-                'gasPrice': self.web3.to_wei('50', 'gwei')
-            })
+            )
             
             # Sign and send transaction
-            signed_tx = self.web3.eth.account.sign_transaction(transaction, private_key)
-            tx_hash = self.web3.eth.send_raw_transaction(signed_tx.rawTransaction)
+            pending = self._send_transaction(account_address, private_key, contract_call)
             
-            # Wait for transaction receipt
-            tx_receipt = self.web3.eth.wait_for_transaction_receipt(tx_hash)
+            self.apply_event({'event': 'AccessGranted', 'args': {'patientId': patient_id, 'provider': provider_address}})
             
             logger.info(f"Access granted to provider {provider_address} for patient {patient_id}")
-            return {
-                'transaction_hash': tx_hash.hex(),
-                'block_number': tx_receipt['blockNumber'],
-                'status': 'success' if tx_receipt['status'] == 1 else 'failed'
-            }
+            return self._transaction_result(pending, wait)
         except Exception as e:
             logger.error(f"Error granting access: {str(e)}")
             raise
     
-    def revoke_access(self, account_address, private_key, patient_id, provider_address):
+    def revoke_access(self, account_address, private_key, patient_id, provider_address, wait=True):
         """
         Revoke a provider's access to a patient's records
         
@@ -350,6 +412,7 @@ class BlockchainIntegration:
             private_key (str): Private key of the patient or admin
             patient_id (str): ID of the patient
             provider_address (str): Address of the healthcare provider
+            wait (bool): Wait for the receipt instead of returning a pending result
             
         Returns:
             dict: Transaction details
@@ -358,35 +421,59 @@ class BlockchainIntegration:
             raise ConnectionError("Blockchain or contract not initialized")
         
         try:
-            # Build transaction
-            nonce = self.web3.eth.get_transaction_count(account_address)
-            transaction = self.contract.functions.revokeAccess(
+            # Build the contract call
+            contract_call = self.contract.functions.revokeAccess(
                 patient_id,
                 provider_address
-            ).build_transaction({
-                'from': account_address,
-                'nonce': nonce,
-                'gas': 500000,
-                'gasPrice': self.web3.to_wei('50', 'gwei')
-            })
+            )
             
             # Sign and send transaction
-            signed_tx = self.web3.eth.account.sign_transaction(transaction, private_key)
-            tx_hash = self.web3.eth.send_raw_transaction(signed_tx.rawTransaction)
+            pending = self._send_transaction(account_address, private_key, contract_call)
             
-            # Wait for transaction receipt
-            tx_receipt = self.web3.eth.wait_for_transaction_receipt(tx_hash)
+            self.apply_event({'event': 'AccessRevoked', 'args': {'patientId': patient_id, 'provider': provider_address}})
             
             logger.info(f"Access revoked for provider {provider_address} to patient {patient_id}")
-            return {
-                'transaction_hash': tx_hash.hex(),
-                'block_number': tx_receipt['blockNumber'],
-                'status': 'success' if tx_receipt['status'] == 1 else 'failed'
-            }
+            return self._transaction_result(pending, wait)
         except Exception as e:
             logger.error(f"Error revoking access: {str(e)}")
             raise
     
+    def anchor_root(self, account_address, private_key, merkle_root, wait=True):
+        """
+        Anchor a Merkle root of record hashes on the blockchain
+        
+        The root is written into the data field of a zero-value transaction
+        sent to the anchoring account itself, so one transaction covers a
+        whole batch of records without any contract storage.
+        
+        Args:
+            account_address (str): Address of the anchoring account
+            private_key (str): Private key of the anchoring account
+            merkle_root (str): Hex-encoded 32-byte Merkle root
+            wait (bool): Wait for the receipt instead of returning a pending result
+            
+        Returns:
+            dict: Transaction details
+        """
+        if not self.web3:
+            raise ConnectionError("Not connected to blockchain")
+        
+        try:
+            # Sign and send transaction
+            pending = self.pipeline.submit(account_address, private_key, dict(
+                self.fee_oracle.fee_params(),
+                to=Web3.to_checksum_address(account_address),
+                value=0,
+                data='0x' + merkle_root,
+                gas=30000
+            ))
+            
+            logger.info(f"Merkle root {merkle_root} anchored by {account_address}")
+            return self._transaction_result(pending, wait)
+        except Exception as e:
+            logger.error(f"Error anchoring Merkle root: {str(e)}")
+            raise
+    
     def check_access(self, provider_address, patient_id):
         """
         Check if a provider has access to a patient's records
@@ -402,19 +489,186 @@ class BlockchainIntegration:
             raise ConnectionError("Blockchain or contract not initialized")
         
         try:
-            # Call the contract to check access
-            has_access, access_level, expiry = self.contract.functions.checkAccess(provider_address, patient_id).call()
-            
-            return {
-                'has_access': has_access,
-                'access_level': access_level,
-                'expiry': expiry,
-                'expired': expiry < datetime.now().timestamp() if expiry > 0 else False
-            }
+            # Serve repeated checks from the cache
+            cache_key = (provider_address.lower(), patient_id)
+            cached = self.access_cache.get(cache_key)
+            if cached is MISSING:
+                # Call the contract to check access
+                cached = tuple(self.contract.functions.checkAccess(provider_address, patient_id).call())
+                self._cache_access(cache_key, cached)
+            
+            return self._access_result(*cached)
         except Exception as e:
             logger.error(f"Error checking access: {str(e)}")
             raise
     
+    def check_access_many(self, provider_address, patient_ids, use_cache=True, batch_size=500):
+        """
+        Check a provider's access to many patients' records at once
+        
+        Cached results are used where available and the remaining checkAccess
+        calls are sent as eth_call requests in JSON-RPC batches.
+        
+        Args:
+            provider_address (str): Address of the healthcare provider
+            patient_ids (list): IDs of the patients
+            use_cache (bool): Serve and fill the access cache
+            batch_size (int): Maximum calls per JSON-RPC batch
+        
+        Returns:
+            dict: Patient ID -> access details
+        """
+        if not self.web3 or not self.contract:
+            raise ConnectionError("Blockchain or contract not initialized")
+        
+        provider = provider_address.lower()
+        results = {}
+        missing = []
+        for patient_id in dict.fromkeys(patient_ids):
+            cached = self.access_cache.get((provider, patient_id)) if use_cache else MISSING
+            if cached is MISSING:
+                missing.append(patient_id)
+            else:
+                results[patient_id] = self._access_result(*cached)
+        
+        try:
+            provider_address = Web3.to_checksum_address(provider_address)
+            output_types = ['bool', 'uint8', 'uint256']
+            for start in range(0, len(missing), batch_size):
+                chunk = missing[start:start + batch_size]
+                calls = [
+                    ('eth_call', [{
+                        'to': self.contract.address,
+                        'data': self.contract.encode_abi('checkAccess', args=[provider_address, patient_id])
+                    }, 'latest'])
+                    for patient_id in chunk
+                ]
+                for patient_id, reply in zip(chunk, batch_request(self.web3, calls)):
+                    if 'error' in reply:
+                        raise ValueError(f"checkAccess failed for patient {patient_id}: {reply['error'].get('message')}")
+                    access = tuple(self.web3.codec.decode(output_types, HexBytes(reply['result'])))
+                    if use_cache:
+                        self._cache_access((provider, patient_id), access)
+                    results[patient_id] = self._access_result(*access)
+            
+            logger.info(f"Checked access for {len(results)} patients with {len(missing)} contract calls")
+            return results
+        except Exception as e:
+            logger.error(f"Error checking access: {str(e)}")
+            raise
+
+    def _cache_access(self, cache_key, access):
+        """
+        Cache a checkAccess result
+        
+        A granted entry expires at the grant's expiry, when the contract
+        would start reporting it as expired.
+        
+        Args:
+            cache_key (tuple): (provider address, patient ID)
+            access (tuple): (has_access, access_level, expiry) from the contract
+        """
+        has_access, access_level, expiry = access
+        self.access_cache.set(cache_key, access, expires_at=expiry if has_access and expiry > 0 else None)
+    
+    def _access_result(self, has_access, access_level, expiry):
+        """Format a checkAccess result as a dictionary"""
+        return {
+            'has_access': has_access,
+            'access_level': access_level,
+            'expiry': expiry,
+            'expired': expiry < datetime.now().timestamp() if expiry > 0 else False
+        }
+    
+    def apply_event(self, event):
+        """
+        Invalidate cached reads affected by a contract event
+        
+        Args:
+            event (dict): Decoded contract event with 'event' and 'args'
+        """
+        args = event['args']
+        if event['event'] == 'MedicalRecordAdded':
+            self.record_cache.invalidate((args['patientId'], args['recordId']))
+        elif event['event'] in ('AccessGranted', 'AccessRevoked'):
+            self.access_cache.invalidate((args['provider'].lower(), args['patientId']))
+            if event['event'] == 'AccessRevoked':
+                # Record reads depend on the caller still being authorized
+                patient_id = args['patientId']
+                self.record_cache.invalidate_where(lambda key: key[0] == patient_id)
+    
+    def sync_events(self, to_block='latest'):
+        """
+        Apply contract events since the last sync to the read caches
+        
+        The first call only records the current block, since nothing is
+        cached from before it.
+        
+        Args:
+            to_block (int or str): Last block to process
+            
+        Returns:
+            int: Number of events applied
+        """
+        if not self.web3 or not self.contract:
+            raise ConnectionError("Blockchain or contract not initialized")
+        
+        if to_block == 'latest':
+            to_block = self.web3.eth.block_number
+        if self._last_event_block is None:
+            self._last_event_block = to_block
+            return 0
+        if to_block <= self._last_event_block:
+            return 0
+        
+        if self._event_decoders is None:
+            self._event_decoders = event_decoders(self.contract)
+        events = fetch_events(self.web3, self.contract, self._last_event_block + 1, to_block, self._event_decoders)
+        for event in events:
+            self.apply_event(event)
+        self._last_event_block = to_block
+        return len(events)
+    
+    def watch_events(self, interval=2.0):
+        """
+        Keep the read caches in sync with contract events from a background thread
+        
+        Args:
+            interval (float): Seconds between event polls
+        """
+        if self._event_thread and self._event_thread.is_alive():
+            return
+        
+        def run():
+            while not self._stop_events.wait(interval):
+                try:
+                    self.sync_events()
+                except Exception as e:
+                    logger.error(f"Error syncing contract events: {str(e)}")
+        
+        self._stop_events.clear()
+        self.sync_events()
+        self._event_thread = threading.Thread(target=run, name='contract-events', daemon=True)
+        self._event_thread.start()
+    
+    def stop_watching_events(self):
+        """Stop the background event sync"""
+        self._stop_events.set()
+        if self._event_thread:
+            self._event_thread.join()
+            self._event_thread = None
+    
+    def provider_metrics(self):
+        """
+        Get health and latency metrics of the blockchain nodes
+        
+        Returns:
+            list: One dictionary per node
+        """
+        if not self.web3 or not hasattr(self.web3.provider, 'metrics'):
+            return []
+        return self.web3.provider.metrics()
+
     def encrypt(self, data):
         """
         Encrypt data using Fernet symmetric encryption
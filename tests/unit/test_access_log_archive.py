@@ -0,0 +1,150 @@
+"""
+Unit tests for MedBlock access log archival
+
+This module contains unit tests for splitting SQLite access logs into
+monthly shards, archiving cold shards to segments and querying across
+the database and the archive.
+"""
+
+import os
+import sys
+import shutil
+import datetime
+import tempfile
+import unittest
+from unittest import mock
+
+# Add parent directory to path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from sqlalchemy import create_engine, inspect, select, func
+from sqlalchemy.pool import StaticPool
+
+from database.models import Base, Session, AccessLog
+from utils.database import get_recent_access_logs, get_record_access_logs, get_anomalous_access_logs
+from utils import access_log_archive
+from utils.access_log_archive import (
+    rollover, query_access_logs, load_index, list_partitions, archive_partition, add_months
+)
+
+NOW = datetime.datetime(2024, 6, 15)
+
+
+class TestAccessLogArchive(unittest.TestCase):
+    """Tests for access log partitions and segments"""
+
+    def setUp(self):
+        """Create a database with one access a day from January to June"""
+        self.engine = create_engine('sqlite://', poolclass=StaticPool,
+                                    connect_args={'check_same_thread': False})
+        Base.metadata.create_all(self.engine)
+        self.archive_dir = tempfile.mkdtemp()
+
+        day = datetime.datetime(2024, 1, 1)
+        rows = []
+        while day < NOW:
+            rows.append({'record_id': day.month, 'user_id': 1, 'action': 'view', 'access_time': day})
+            day += datetime.timedelta(days=1)
+        with self.engine.begin() as connection:
+            connection.execute(AccessLog.__table__.insert(), rows)
+        self.total = len(rows)
+
+    def tearDown(self):
+        """Remove the database and the archive"""
+        self.engine.dispose()
+        shutil.rmtree(self.archive_dir)
+
+    def count(self, table):
+        with self.engine.connect() as connection:
+            return connection.execute(select(func.count()).select_from(table)).scalar()
+
+    def test_rollover(self):
+        """Test that old months are sharded and months past retention archived"""
+        result = rollover(self.engine, self.archive_dir, retain_months=2, now=NOW)
+
+        self.assertEqual(result['moved'], self.total - 14)
+        self.assertEqual(self.count(AccessLog.__table__), 14)
+        with self.engine.connect() as connection:
+            self.assertEqual([name for month, name in list_partitions(connection)],
+                             ['access_logs_202404', 'access_logs_202405'])
+
+        index = load_index(self.archive_dir)
+        self.assertEqual([segment['partition'] for segment in index],
+                         ['access_logs_202401', 'access_logs_202402', 'access_logs_202403'])
+        self.assertEqual([segment['rows'] for segment in index], [31, 29, 31])
+        self.assertEqual(index[1]['min_time'], '2024-02-01T00:00:00')
+        self.assertEqual(index[1]['max_time'], '2024-02-29T00:00:00')
+
+        # Nothing more to do in the same month
+        self.assertEqual(rollover(self.engine, self.archive_dir, retain_months=2, now=NOW),
+                         {'moved': 0, 'archived': []})
+
+    def test_query_across_database_and_archive(self):
+        """Test that a range query reads the hot table, shards and segments"""
+        rollover(self.engine, self.archive_dir, retain_months=2, now=NOW)
+
+        start, end = datetime.datetime(2024, 2, 20), datetime.datetime(2024, 6, 5)
+        logs = query_access_logs(start, end, engine=self.engine, archive_dir=self.archive_dir)
+        self.assertEqual(len(logs), (end - start).days)
+        self.assertEqual(logs[0]['access_time'], start)
+        self.assertEqual(logs[-1]['access_time'], end - datetime.timedelta(days=1))
+
+        logs = query_access_logs(start, end, record_id=3, engine=self.engine, archive_dir=self.archive_dir)
+        self.assertEqual(len(logs), 31)
+
+    def test_query_reads_overlapping_segments_only(self):
+        """Test that segments outside the range are not opened"""
+        rollover(self.engine, self.archive_dir, retain_months=2, now=NOW)
+
+        with mock.patch.object(access_log_archive, 'Segment', wraps=access_log_archive.Segment) as segment:
+            query_access_logs(datetime.datetime(2024, 2, 10), datetime.datetime(2024, 2, 12),
+                              engine=self.engine, archive_dir=self.archive_dir)
+        self.assertEqual([os.path.basename(call.args[0]) for call in segment.call_args_list],
+                         ['access_logs_202402-1.seg'])
+
+    def test_latest_logs_include_shards(self):
+        """Test that the access log helpers return the same rows before and after sharding"""
+        with self.engine.begin() as connection:
+            table = AccessLog.__table__
+            connection.execute(table.update().where(func.strftime('%d', table.c.access_time) == '01')
+                               .values(is_anomalous=True))
+        Session.remove()
+        Session.configure(bind=self.engine)
+        self.addCleanup(Session.remove)
+
+        def latest():
+            return [
+                [log.id for log in get_recent_access_logs(limit=40)],
+                [log.id for log in get_record_access_logs(4, limit=10)],
+                [log.id for log in get_anomalous_access_logs(limit=4)]
+            ]
+
+        before = latest()
+        self.assertEqual(len(before[0]), 40)
+        self.assertEqual(len(before[2]), 4)
+
+        rollover(self.engine, self.archive_dir, retain_months=6, now=NOW)
+        self.assertEqual(self.count(AccessLog.__table__), 14)
+        self.assertEqual(latest(), before)
+
+    def test_archive_resumes_after_indexing(self):
+        """Test that a partition indexed before a failed drop is not written twice"""
+        rollover(self.engine, self.archive_dir, retain_months=6, now=NOW)
+
+        with mock.patch.object(access_log_archive, '_drop_partition', side_effect=RuntimeError('stopped')):
+            with self.assertRaises(RuntimeError):
+                archive_partition(self.engine, 'access_logs_202401', self.archive_dir)
+
+        entry = archive_partition(self.engine, 'access_logs_202401', self.archive_dir)
+        self.assertEqual(entry['file'], 'access_logs_202401-1.seg')
+        self.assertEqual(len(load_index(self.archive_dir)), 1)
+        self.assertNotIn('access_logs_202401', inspect(self.engine).get_table_names())
+
+    def test_add_months(self):
+        """Test month arithmetic across years"""
+        self.assertEqual(add_months(datetime.datetime(2024, 11, 1), 3), datetime.datetime(2025, 2, 1))
+        self.assertEqual(add_months(datetime.datetime(2024, 1, 1), -1), datetime.datetime(2023, 12, 1))
+
+
+if __name__ == '__main__':
+    unittest.main()
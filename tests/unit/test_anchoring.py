@@ -0,0 +1,366 @@
+"""
+Unit tests for MedBlock Merkle batch anchoring
+
+This module contains unit tests for the Merkle tree utilities and the
+batch anchorer.
+"""
+
+import os
+import sys
+import json
+import hashlib
+import unittest
+import datetime
+from unittest import mock
+from concurrent.futures import Future
+
+# Add parent directory to path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from sqlalchemy import create_engine
+from sqlalchemy.pool import StaticPool
+
+from database.models import Base, Session, User, MedicalRecord, AnchorBatch, RecordProof
+from utils.merkle import MerkleTree, verify_proof
+from utils.anchoring import BatchAnchorer, simulated_anchor
+from utils.verification import verify_records, verify_data_hash
+from utils.helpers import generate_encryption_key
+from medblock import app as medblock_app
+
+
+def make_hashes(count):
+    """Return count distinct hex SHA-256 hashes"""
+    return [hashlib.sha256(str(i).encode()).hexdigest() for i in range(count)]
+
+
+class TestMerkleTree(unittest.TestCase):
+    """Tests for the Merkle tree"""
+
+    def test_single_leaf(self):
+        """Test that a single leaf verifies with an empty proof"""
+        hashes = make_hashes(1)
+        tree = MerkleTree(hashes)
+
+        self.assertEqual(tree.proof(0), [])
+        self.assertTrue(verify_proof(hashes[0], [], tree.root))
+
+    def test_all_proofs_verify(self):
+        """Test that every leaf verifies for balanced and unbalanced trees"""
+        for count in (2, 3, 7, 8, 33):
+            hashes = make_hashes(count)
+            tree = MerkleTree(hashes)
+            for index, data_hash in enumerate(hashes):
+                self.assertTrue(verify_proof(data_hash, tree.proof(index), tree.root))
+
+    def test_proof_length_is_logarithmic(self):
+        """Test that proofs grow with the tree height"""
+        tree = MerkleTree(make_hashes(1024))
+        self.assertEqual(len(tree.proof(0)), 10)
+
+    def test_tampered_hash_fails(self):
+        """Test that a different data hash does not verify"""
+        hashes = make_hashes(5)
+        tree = MerkleTree(hashes)
+
+        self.assertFalse(verify_proof(hashes[1], tree.proof(0), tree.root))
+        self.assertFalse(verify_proof(hashes[0], tree.proof(0), '00' * 32))
+
+    def test_empty_tree_rejected(self):
+        """Test that a tree needs at least one leaf"""
+        with self.assertRaises(ValueError):
+            MerkleTree([])
+
+
+class TestBatchAnchorer(unittest.TestCase):
+    """Tests for the batch anchorer"""
+
+    def setUp(self):
+        """Bind the session to an in-memory database with a few records"""
+        self.engine = create_engine('sqlite://', poolclass=StaticPool,
+                                    connect_args={'check_same_thread': False})
+        Base.metadata.create_all(self.engine)
+        Session.remove()
+        Session.configure(bind=self.engine)
+
+        session = Session()
+        session.add(User(id=1, username='patient', email='p@example.com', password_hash='hash',
+                         first_name='Pat', last_name='Ient', role='patient'))
+        for i in range(5):
+            session.add(MedicalRecord(id=i + 1, record_id=f'rec-{i}', patient_id=1, provider_id=1,
+                                      record_type='consultation', recorded_at=datetime.datetime(2023, 1, 1),
+                                      data_hash=make_hashes(5)[i]))
+        session.commit()
+        Session.remove()
+
+    def tearDown(self):
+        """Drop the in-memory database"""
+        Session.remove()
+        self.engine.dispose()
+
+    def test_flush_anchors_one_root(self):
+        """Test that a flush sends one root and stores a proof per record"""
+        roots = []
+
+        def anchor(root):
+            roots.append(root)
+            return simulated_anchor(root)
+
+        anchorer = BatchAnchorer(anchor, max_batch_size=100, max_wait=60)
+        for i, data_hash in enumerate(make_hashes(5)):
+            anchorer.add(i + 1, data_hash)
+
+        summary = anchorer.flush()
+        self.assertEqual(len(roots), 1)
+        self.assertEqual(summary['leaf_count'], 5)
+        self.assertEqual(anchorer.pending_count(), 0)
+
+        session = Session()
+        batch = session.query(AnchorBatch).one()
+        self.assertEqual(batch.merkle_root, roots[0])
+        for proof in session.query(RecordProof).all():
+            self.assertTrue(verify_proof(proof.data_hash, json.loads(proof.proof), batch.merkle_root))
+
+        records = session.query(MedicalRecord).all()
+        self.assertTrue(all(r.transaction_id == batch.transaction_id for r in records))
+
+    def test_pending_anchor_confirmed_by_receipt(self):
+        """Test that records move from pending to confirmed when the receipt arrives"""
+        receipt_future = Future()
+
+        class Pending:
+            pass
+
+        pending = Pending()
+        pending.receipt_future = receipt_future
+
+        def anchor(root):
+            return {'transaction_hash': '0x' + 'ab' * 32, 'status': 'pending', 'pending': pending}
+
+        anchorer = BatchAnchorer(anchor, max_batch_size=100, max_wait=60)
+        anchorer.add(1, make_hashes(1)[0])
+        self.assertEqual(anchorer.flush()['status'], 'pending')
+
+        session = Session()
+        self.assertEqual(session.get(MedicalRecord, 1).confirmation_status, 'pending')
+        Session.remove()
+
+        receipt_future.set_result({'blockNumber': 42, 'status': 1})
+
+        session = Session()
+        record = session.get(MedicalRecord, 1)
+        self.assertEqual(record.confirmation_status, 'confirmed')
+        self.assertEqual(record.block_number, 42)
+        self.assertEqual(session.query(AnchorBatch).one().status, 'confirmed')
+
+    def test_restart_requeues_unanchored_records(self):
+        """Test that records lost from the queue, or changed since anchoring, are queued again"""
+        anchorer = BatchAnchorer(simulated_anchor, max_batch_size=100, max_wait=60)
+        for i, data_hash in enumerate(make_hashes(3)):
+            anchorer.add(i + 1, data_hash)
+        anchorer.flush()
+
+        session = Session()
+        session.get(MedicalRecord, 2).data_hash = 'ff' * 32
+        session.get(MedicalRecord, 5).is_active = False
+        session.commit()
+        Session.remove()
+
+        # A new process starts with an empty queue
+        restarted = BatchAnchorer(simulated_anchor, max_batch_size=100, max_wait=60)
+        self.assertEqual(restarted.requeue_unanchored(), 2)
+        self.assertEqual(restarted.flush()['leaf_count'], 2)
+        self.assertEqual(restarted.requeue_unanchored(), 0)
+
+        session = Session()
+        self.assertEqual(session.query(RecordProof).filter_by(record_id=2).one().data_hash, 'ff' * 32)
+        self.assertIsNotNone(session.get(MedicalRecord, 4).transaction_id)
+
+    def test_reverted_anchor_reanchored_after_restart(self):
+        """Test that records of a reverted anchor transaction are anchored again on restart"""
+        receipt_futures = []
+
+        class Pending:
+            pass
+
+        def anchor(root):
+            pending = Pending()
+            pending.receipt_future = Future()
+            receipt_futures.append(pending.receipt_future)
+            transaction_hash = '0x' + f"{len(receipt_futures):02x}" * 32
+            return {'transaction_hash': transaction_hash, 'status': 'pending', 'pending': pending}
+
+        anchorer = BatchAnchorer(anchor, max_batch_size=100, max_wait=60)
+        for i, data_hash in enumerate(make_hashes(3)):
+            anchorer.add(i + 1, data_hash)
+        anchorer.flush()
+        receipt_futures[0].set_result({'blockNumber': 42, 'status': 0})
+
+        session = Session()
+        self.assertEqual(session.query(AnchorBatch).one().status, 'failed')
+        self.assertEqual(session.get(MedicalRecord, 1).confirmation_status, 'failed')
+        Session.remove()
+
+        # Records 4 and 5 were never anchored; 1 to 3 reverted
+        restarted = BatchAnchorer(anchor, max_batch_size=100, max_wait=60)
+        self.assertEqual(restarted.requeue_unanchored(), 5)
+        restarted.flush()
+        receipt_futures[1].set_result({'blockNumber': 43, 'status': 1})
+        self.assertEqual(restarted.requeue_unanchored(), 0)
+
+        session = Session()
+        self.assertTrue(all(record.confirmation_status == 'confirmed' and record.block_number == 43
+                            for record in session.query(MedicalRecord)))
+        Session.remove()
+        self.assertTrue(all(verify_data_hash(data_hash)['verified'] for data_hash in make_hashes(5)))
+
+    def test_reverted_batch_row_reused(self):
+        """Test that anchoring the same hashes after a revert reuses the batch row"""
+        receipt_future = Future()
+
+        class Pending:
+            pass
+
+        pending = Pending()
+        pending.receipt_future = receipt_future
+        results = [
+            {'transaction_hash': '0x' + 'aa' * 32, 'status': 'pending', 'pending': pending},
+            {'transaction_hash': '0x' + 'bb' * 32, 'block_number': 50, 'status': 'success'}
+        ]
+
+        anchorer = BatchAnchorer(lambda root: results.pop(0), max_batch_size=100, max_wait=60)
+        for i, data_hash in enumerate(make_hashes(5)):
+            anchorer.add(i + 1, data_hash)
+        first = anchorer.flush()
+        receipt_future.set_result({'blockNumber': 42, 'status': 0})
+
+        self.assertEqual(anchorer.requeue_unanchored(), 5)
+        second = anchorer.flush()
+        self.assertEqual(second['batch_id'], first['batch_id'])
+
+        session = Session()
+        batch = session.query(AnchorBatch).one()
+        self.assertEqual((batch.transaction_id, batch.status, batch.block_number), ('0x' + 'bb' * 32, 'confirmed', 50))
+        self.assertEqual({proof.batch_id for proof in session.query(RecordProof)}, {batch.id})
+
+    def test_failed_anchor_requeues(self):
+        """Test that records stay queued when anchoring fails"""
+        def anchor(root):
+            raise ConnectionError("node unavailable")
+
+        anchorer = BatchAnchorer(anchor, max_batch_size=100, max_wait=60)
+        anchorer.add(1, make_hashes(1)[0])
+
+        with self.assertRaises(ConnectionError):
+            anchorer.flush()
+        self.assertEqual(anchorer.pending_count(), 1)
+
+
+class TestRecordVerification(unittest.TestCase):
+    """Tests for verifying records against anchored roots"""
+
+    def setUp(self):
+        """Bind the session to an in-memory database with anchored records"""
+        self.engine = create_engine('sqlite://', poolclass=StaticPool,
+                                    connect_args={'check_same_thread': False})
+        Base.metadata.create_all(self.engine)
+        Session.remove()
+        Session.configure(bind=self.engine)
+        self.key = generate_encryption_key()
+
+        session = Session()
+        session.add(User(id=1, username='patient', email='p@example.com', password_hash='hash',
+                         first_name='Pat', last_name='Ient', role='patient'))
+        for i in range(4):
+            record = MedicalRecord(id=i + 1, record_id=f'rec-{i}', patient_id=1, provider_id=1,
+                                   record_type='lab_result', recorded_at=datetime.datetime(2023, 1, 1))
+            record.encrypt_data({'result': i}, self.key)
+            session.add(record)
+        session.commit()
+
+        def confirmed_anchor(root):
+            return {'transaction_hash': '0x' + 'cd' * 32, 'status': 'success', 'block_number': 7}
+
+        anchorer = BatchAnchorer(confirmed_anchor, max_batch_size=100, max_wait=60)
+        for record in session.query(MedicalRecord).filter(MedicalRecord.id <= 3):
+            anchorer.add(record.id, record.data_hash)
+        Session.remove()
+        anchorer.flush()
+
+    def tearDown(self):
+        """Drop the in-memory database"""
+        Session.remove()
+        self.engine.dispose()
+
+    def test_anchored_records_verify(self):
+        """Test that anchored, unmodified records verify"""
+        results = verify_records([1, 2, 3], self.key)
+        self.assertTrue(all(result['verified'] for result in results))
+        self.assertEqual(len({result['merkle_root'] for result in results}), 1)
+
+    def test_unanchored_and_missing_records(self):
+        """Test that unanchored and unknown records are reported"""
+        results = verify_records([4, 99], self.key)
+        self.assertEqual([result['reason'] for result in results], ['not_anchored', 'record_not_found'])
+
+    def test_tampered_record_fails(self):
+        """Test that changed record data no longer verifies"""
+        session = Session()
+        record = session.get(MedicalRecord, 2)
+        original_hash = record.data_hash
+        record.encrypt_data({'result': 'altered'}, self.key)
+        record.data_hash = original_hash
+        session.commit()
+
+        result = verify_records([2], self.key)[0]
+        self.assertFalse(result['verified'])
+        self.assertEqual(result['reason'], 'data_hash_mismatch')
+
+    def test_verify_data_hash(self):
+        """Test verification of a bare data hash"""
+        session = Session()
+        data_hash = session.get(MedicalRecord, 1).data_hash
+        Session.remove()
+
+        self.assertTrue(verify_data_hash(data_hash)['verified'])
+        self.assertFalse(verify_data_hash('00' * 32)['verified'])
+
+    def test_unconfirmed_anchors_do_not_verify(self):
+        """Test that a valid proof only verifies once its batch is confirmed"""
+        session = Session()
+        data_hash = session.get(MedicalRecord, 1).data_hash
+        Session.remove()
+
+        for status, reason in (('simulated', 'anchor_simulated'), ('failed', 'anchor_failed'),
+                               ('pending', 'anchor_pending')):
+            with self.subTest(status=status):
+                session = Session()
+                session.query(AnchorBatch).update({AnchorBatch.status: status})
+                session.commit()
+                Session.remove()
+
+                for result in (verify_records([1], self.key)[0], verify_data_hash(data_hash)):
+                    self.assertFalse(result['verified'])
+                    self.assertEqual(result['reason'], reason)
+                    self.assertEqual(result['anchor_status'], status)
+
+    def test_patient_verification_capped(self):
+        """Test that a patient history above the record cap is refused like a long ID list"""
+        keyring = mock.Mock(keys=[self.key])
+        client = medblock_app.app.test_client()
+        with mock.patch.object(medblock_app, 'get_keyring', lambda *args: keyring):
+            with mock.patch.object(medblock_app, 'MAX_VERIFY_RECORDS', 3):
+                for body in ({'patient_id': 1}, {'record_ids': [1, 2, 3, 4]}):
+                    with self.subTest(body=body):
+                        response = client.post('/api/blockchain/verify', json=body)
+                        self.assertEqual(response.status_code, 400)
+                        self.assertIn('At most 3 records', response.get_json()['error'])
+
+            with mock.patch.object(medblock_app, 'MAX_VERIFY_RECORDS', 4):
+                response = client.post('/api/blockchain/verify', json={'patient_id': 1})
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(response.get_json()['total'], 4)
+                self.assertEqual(response.get_json()['verified_count'], 3)
+
+
+if __name__ == "__main__":
+    unittest.main()
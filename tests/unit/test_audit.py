@@ -0,0 +1,160 @@
+"""
+Unit tests for the MedBlock access log writer
+
+This module contains unit tests for batched access log inserts and the
+journal that keeps entries through database outages and crashes.
+"""
+
+import os
+import sys
+import json
+import time
+import tempfile
+import unittest
+from unittest import mock
+
+# Add parent directory to path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from sqlalchemy import create_engine
+from sqlalchemy.pool import StaticPool
+
+from database.models import Base, Session, AccessLog
+from utils import audit
+from utils.audit import AuditWriter
+
+
+class TestAuditWriter(unittest.TestCase):
+    """Tests for the access log writer"""
+
+    def setUp(self):
+        """Bind the session to an in-memory database and create a journal directory"""
+        self.engine = create_engine('sqlite://', poolclass=StaticPool,
+                                    connect_args={'check_same_thread': False})
+        Base.metadata.create_all(self.engine)
+        Session.remove()
+        Session.configure(bind=self.engine)
+
+        self.tempdir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tempdir.cleanup)
+
+    def tearDown(self):
+        """Drop the in-memory database"""
+        Session.remove()
+        self.engine.dispose()
+
+    def writer(self, **kwargs):
+        kwargs.setdefault('max_wait', 60)
+        return AuditWriter(journal_dir=self.tempdir.name, **kwargs)
+
+    def logged(self):
+        session = Session()
+        try:
+            return session.query(AccessLog).count()
+        finally:
+            session.close()
+
+    def segments(self):
+        return sorted(os.listdir(self.tempdir.name))
+
+    def test_flush_inserts_and_removes_segment(self):
+        """Test that queued entries are inserted together and their journal is removed"""
+        writer = self.writer()
+        writer.log(1, 2, 'view', ip_address='127.0.0.1')
+        writer.log_many([3, 4, 5], 2, 'view')
+        writer.log(6, 2, 'view', is_authorized=False, anomaly_score=0.9)
+
+        self.assertEqual(self.logged(), 0)
+        self.assertEqual(len(self.segments()), 1)
+
+        with mock.patch.object(audit, 'insert_entries', wraps=audit.insert_entries) as insert:
+            self.assertEqual(writer.flush(), 5)
+        self.assertEqual(insert.call_count, 1)
+        self.assertEqual(self.logged(), 5)
+        self.assertEqual(self.segments(), [])
+
+        session = Session()
+        log = session.query(AccessLog).filter(AccessLog.record_id == 6).one()
+        self.assertAlmostEqual(log.anomaly_score, 0.9)
+        self.assertFalse(log.is_authorized)
+        session.close()
+
+    def test_background_flush_on_batch_size(self):
+        """Test that a full batch is inserted by the background thread"""
+        writer = self.writer(max_batch_size=10)
+        writer.start()
+        self.addCleanup(writer.stop)
+
+        writer.log_many(list(range(10)), 1, 'view')
+        deadline = time.monotonic() + 5
+        while self.logged() < 10 and time.monotonic() < deadline:
+            time.sleep(0.01)
+        self.assertEqual(self.logged(), 10)
+
+    def test_failed_insert_kept_and_replayed(self):
+        """Test that entries survive a database outage"""
+        writer = self.writer()
+        writer.log_many([1, 2, 3], 1, 'view')
+
+        with mock.patch.object(audit, 'insert_entries', side_effect=RuntimeError("database down")):
+            with self.assertRaises(RuntimeError):
+                writer.flush()
+        self.assertEqual(writer.pending_count(), 0)
+        self.assertEqual(len(self.segments()), 1)
+
+        writer.log(4, 1, 'view')
+        self.assertEqual(writer.replay(), 3)
+        self.assertEqual(writer.flush(), 1)
+        self.assertEqual(self.logged(), 4)
+        self.assertEqual(self.segments(), [])
+
+    def test_rejected_entries_dead_lettered(self):
+        """Test that entries the database rejects do not block the rest of the journal"""
+        writer = self.writer()
+        writer.log_many([1, 2], 1, 'view')
+        writer.log(3, None, 'view')
+        writer.log(4, 1, 'view')
+
+        with self.assertRaises(audit.IntegrityError):
+            writer.flush()
+        self.assertEqual(self.logged(), 0)
+
+        # An outage keeps the segment for a later replay
+        with mock.patch.object(audit, 'insert_entries', side_effect=RuntimeError("database down")):
+            with self.assertRaises(RuntimeError):
+                writer.replay()
+        self.assertEqual(len(self.segments()), 1)
+
+        self.assertEqual(writer.replay(), 3)
+        self.assertEqual(self.logged(), 3)
+        self.assertEqual(self.segments(), [audit.DEAD_LETTER_FILE])
+
+        with open(os.path.join(self.tempdir.name, audit.DEAD_LETTER_FILE)) as f:
+            rejected = [json.loads(line) for line in f]
+        self.assertEqual(len(rejected), 1)
+        self.assertEqual(rejected[0]['record_id'], 3)
+        self.assertIn('NOT NULL', rejected[0]['error'])
+
+        # The dead-letter file is not replayed as a segment
+        self.assertEqual(writer.replay(), 0)
+
+    def test_crash_recovery(self):
+        """Test that a new writer replays the journal of a dead one but not of a live one"""
+        live = self.writer()
+        live.log_many([1, 2], 1, 'view')
+
+        recovering = self.writer()
+        self.assertEqual(recovering.replay(), 0)
+
+        # The process dies: its lock goes away with its file descriptor
+        os.close(live._fd)
+        with open(os.path.join(self.tempdir.name, live._segment), 'a') as f:
+            f.write('{"record_id": 3, "trunc')
+
+        self.assertEqual(recovering.replay(), 2)
+        self.assertEqual(self.logged(), 2)
+        self.assertEqual(self.segments(), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
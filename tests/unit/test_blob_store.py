@@ -0,0 +1,128 @@
+"""
+Unit tests for the MedBlock attachment store
+
+This module contains unit tests for content addressing, deduplication,
+record references and garbage collection.
+"""
+
+import io
+import os
+import sys
+import time
+import hashlib
+import tempfile
+import unittest
+
+# Add parent directory to path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from utils.blob_store import BlobStore
+from utils.helpers import generate_encryption_key
+from utils.stream_crypto import EncryptedFile
+
+
+class TestBlobStore(unittest.TestCase):
+    """Tests for the attachment store"""
+
+    def setUp(self):
+        """Create a store in a temporary directory"""
+        self.tempdir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tempdir.cleanup)
+        self.store = BlobStore(self.tempdir.name)
+        self.key = generate_encryption_key()
+
+    def age(self, digest, seconds=7200):
+        """Backdate a blob past the gc grace period"""
+        past = time.time() - seconds
+        os.utime(self.store.blob_path(digest), (past, past))
+
+    def test_content_addressed(self):
+        """Test that blobs are stored under the plaintext SHA-256 in sharded directories"""
+        data = os.urandom(5000)
+        digest = hashlib.sha256(data).hexdigest()
+
+        result = self.store.put_stream(io.BytesIO(data), chunk_size=1024)
+
+        self.assertEqual(result, {'sha256': digest, 'size': 5000, 'encrypted': False, 'deduplicated': False})
+        self.assertEqual(self.store.blob_path(digest),
+                         os.path.join(self.tempdir.name, 'objects', digest[:2], digest[2:4], digest))
+        with open(self.store.blob_path(digest), 'rb') as f:
+            self.assertEqual(f.read(), data)
+        self.assertEqual(os.listdir(self.store.tmp_dir), [])
+
+    def test_deduplicates_encrypted_uploads(self):
+        """Test that the same file uploaded twice is stored once"""
+        data = os.urandom(3000)
+        first = self.store.put_stream(io.BytesIO(data), self.key)
+        second = self.store.put_stream(io.BytesIO(data), self.key)
+
+        self.assertEqual(first['sha256'], second['sha256'])
+        self.assertFalse(first['deduplicated'])
+        self.assertTrue(second['deduplicated'])
+        self.assertTrue(self.store.is_encrypted(first['sha256']))
+        with EncryptedFile(self.store.blob_path(first['sha256']), self.key) as encrypted:
+            self.assertEqual(b''.join(encrypted.iter_range()), data)
+
+    def test_upload_written_in_parts(self):
+        """Test that an upload written piece by piece is only ever ciphertext on disk"""
+        data = os.urandom(3000)
+        upload = self.store.open_upload(self.key, chunk_size=1024)
+        for offset in range(0, len(data), 700):
+            upload.write(data[offset:offset + 700])
+            with open(upload.temp_path, 'rb') as f:
+                self.assertNotIn(data[:16], f.read())
+        upload.seek(0)
+
+        result = self.store.commit_upload(upload)
+        self.assertEqual(result['sha256'], hashlib.sha256(data).hexdigest())
+        self.assertTrue(result['encrypted'])
+        with EncryptedFile(self.store.blob_path(result['sha256']), self.key) as encrypted:
+            self.assertEqual(b''.join(encrypted.iter_range()), data)
+        self.assertEqual(os.listdir(self.store.tmp_dir), [])
+
+        # An upload that is never committed leaves nothing behind
+        upload = self.store.open_upload(self.key)
+        upload.write(data)
+        upload.close()
+        self.assertEqual(os.listdir(self.store.tmp_dir), [])
+
+    def test_references(self):
+        """Test per-record references"""
+        digest = self.store.put_stream(io.BytesIO(b'scan'))['sha256']
+
+        self.assertEqual(self.store.add_ref(digest, 'rec-001'), 1)
+        self.assertEqual(self.store.add_ref(digest, 'rec/002'), 2)
+        self.assertEqual(self.store.add_ref(digest, 'rec-001'), 2)
+        self.assertEqual(self.store.refs(digest), ['rec-001', 'rec/002'])
+        self.assertEqual(self.store.remove_ref(digest, 'rec/002'), 1)
+
+        with self.assertRaises(FileNotFoundError):
+            self.store.add_ref('0' * 64, 'rec-001')
+        with self.assertRaises(ValueError):
+            self.store.blob_path('../../etc/passwd')
+
+    def test_gc(self):
+        """Test that only old, unreferenced blobs are collected"""
+        kept = self.store.put_stream(io.BytesIO(b'referenced'))['sha256']
+        orphan = self.store.put_stream(io.BytesIO(b'orphan'))['sha256']
+        fresh = self.store.put_stream(io.BytesIO(b'just uploaded'))['sha256']
+        self.store.add_ref(kept, 'rec-001')
+        self.age(kept)
+        self.age(orphan)
+
+        self.assertEqual(self.store.gc(dry_run=True)['removed'], [orphan])
+        self.assertTrue(self.store.exists(orphan))
+
+        result = self.store.gc()
+        self.assertEqual(result, {'removed': [orphan], 'freed': 6})
+        self.assertFalse(self.store.exists(orphan))
+        self.assertTrue(self.store.exists(kept))
+        self.assertTrue(self.store.exists(fresh))
+
+        # A blob whose last reference is dropped is collected next
+        self.store.remove_ref(kept, 'rec-001')
+        self.assertEqual(self.store.gc()['removed'], [kept])
+
+
+if __name__ == '__main__':
+    unittest.main()
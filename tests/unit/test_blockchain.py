@@ -0,0 +1,563 @@
+"""
+Unit tests for MedBlock blockchain transaction handling
+
+This module contains unit tests for nonce allocation and batched receipt
+polling. They run against a fake provider, so no Ethereum node is needed.
+"""
+
+import os
+import sys
+import json
+import time
+import types
+import tempfile
+import unittest
+import threading
+from http.server import BaseHTTPRequestHandler, HTTPServer
+
+# Add parent directory to path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+try:
+    from web3 import Web3
+    from web3.exceptions import TimeExhausted
+    from medblock.blockchain.nonce_manager import NonceManager, TransactionPipeline
+    from medblock.blockchain.confirmations import ReceiptPoller
+    from medblock.blockchain.cache import TTLCache, MISSING
+    from medblock.blockchain.smart_contracts import BlockchainIntegration
+    from medblock.blockchain.providers import FailoverProvider
+    from medblock.blockchain.rpc import batch_request
+    from medblock.blockchain.fees import FeeOracle, GasEstimator, argument_words
+    from medblock.blockchain.local_chain import local_blockchain
+    from medblock.blockchain.events import fetch_events
+    from eth_account import Account
+    from web3.exceptions import ContractLogicError
+    WEB3_AVAILABLE = True
+except ImportError:
+    WEB3_AVAILABLE = False
+
+
+class FakeProvider:
+    """Provider that answers receipt requests from a dictionary"""
+
+    endpoint_uri = None
+
+    def __init__(self):
+        self.receipts = {}
+        self.requests = []
+        self.call_handler = None
+
+    def make_request(self, method, params):
+        self.requests.append((method, params))
+        if method == 'eth_getTransactionReceipt':
+            return {'jsonrpc': '2.0', 'result': self.receipts.get(params[0])}
+        if method == 'eth_call' and self.call_handler:
+            return {'jsonrpc': '2.0', 'result': self.call_handler(params[0])}
+        return {'jsonrpc': '2.0', 'error': {'code': -32601, 'message': 'Method not found'}}
+
+
+class FakeEth:
+    """Eth namespace returning a fixed pending transaction count and fee history"""
+
+    def __init__(self, count):
+        self.count = count
+        self.count_requests = []
+        self.gas_price = 7
+        self.fee_history_calls = 0
+        self.base_fees = [100, 120]
+        self.rewards = [[1, 5, 9], [3, 5, 11]]
+
+    def get_transaction_count(self, address, block_identifier='latest'):
+        self.count_requests.append((address, block_identifier))
+        return self.count
+
+    def fee_history(self, block_count, newest_block, reward_percentiles):
+        self.fee_history_calls += 1
+        return {'baseFeePerGas': self.base_fees, 'reward': self.rewards}
+
+
+class FakeAccount:
+    """Signs a transaction by serializing it"""
+
+    @staticmethod
+    def sign_transaction(transaction, private_key):
+        return types.SimpleNamespace(rawTransaction=json.dumps(transaction, sort_keys=True).encode())
+
+
+class FakeSendingEth(FakeEth):
+    """Eth namespace that records sent raw transactions"""
+
+    account = FakeAccount
+
+    def __init__(self, count):
+        super().__init__(count)
+        self.sent = []
+        self.send_error = None
+
+    def send_raw_transaction(self, raw_transaction):
+        if self.send_error:
+            error, self.send_error = self.send_error, None
+            raise error
+        self.sent.append(json.loads(raw_transaction))
+        return bytes([len(self.sent)]) * 32
+
+
+class FakeWeb3:
+    """Minimal stand-in for a Web3 instance"""
+
+    def __init__(self, count=0, eth_class=FakeEth):
+        self.provider = FakeProvider()
+        self.eth = eth_class(count)
+
+
+@unittest.skipUnless(WEB3_AVAILABLE, "web3 is not installed")
+class TestNonceManager(unittest.TestCase):
+    """Tests for the nonce manager"""
+
+    def test_concurrent_allocations_are_unique(self):
+        """Test that concurrent allocations hand out consecutive nonces"""
+        manager = NonceManager(FakeWeb3(count=7))
+        allocated = []
+
+        def allocate():
+            for _ in range(50):
+                allocated.append(manager.allocate('0xabc'))
+
+        threads = [threading.Thread(target=allocate) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(sorted(allocated), list(range(7, 207)))
+
+    def test_failed_send_resynchronizes(self):
+        """Test that a failure inside reserve() re-reads the count from the node"""
+        web3 = FakeWeb3(count=3)
+        manager = NonceManager(web3)
+        self.assertEqual(manager.allocate('0xabc'), 3)
+
+        web3.eth.count = 10
+        with self.assertRaises(RuntimeError):
+            with manager.reserve('0xabc'):
+                raise RuntimeError("send failed")
+        self.assertEqual(manager.allocate('0xabc'), 10)
+
+    def test_counters_are_per_account(self):
+        """Test that each account reads the pending count once and then counts locally"""
+        web3 = FakeWeb3(count=5)
+        manager = NonceManager(web3)
+
+        self.assertEqual([manager.allocate('0xabc') for _ in range(3)], [5, 6, 7])
+        self.assertEqual(manager.allocate('0xdef'), 5)
+        self.assertEqual(manager.allocate('0xabc'), 8)
+        self.assertEqual(web3.eth.count_requests, [('0xabc', 'pending'), ('0xdef', 'pending')])
+
+    def test_reset(self):
+        """Test that reset re-reads one account or all accounts from the node"""
+        web3 = FakeWeb3(count=1)
+        manager = NonceManager(web3)
+        manager.allocate('0xabc')
+        manager.allocate('0xdef')
+
+        web3.eth.count = 20
+        manager.reset('0xabc')
+        self.assertEqual(manager.allocate('0xabc'), 20)
+        self.assertEqual(manager.allocate('0xdef'), 2)
+
+        web3.eth.count = 30
+        manager.reset()
+        self.assertEqual(manager.allocate('0xabc'), 30)
+        self.assertEqual(manager.allocate('0xdef'), 30)
+
+
+@unittest.skipUnless(WEB3_AVAILABLE, "web3 is not installed")
+class TestTransactionPipeline(unittest.TestCase):
+    """Tests for sending transactions without waiting for receipts"""
+
+    def setUp(self):
+        self.web3 = FakeWeb3(count=4, eth_class=FakeSendingEth)
+        self.poller = ReceiptPoller(self.web3, interval=3600, timeout=60)
+        self.pipeline = TransactionPipeline(self.web3, poller=self.poller)
+
+    def tearDown(self):
+        self.pipeline.shutdown()
+
+    def test_submit_many_sends_consecutive_nonces(self):
+        """Test that back-to-back transactions get consecutive nonces and resolve from one poll"""
+        calls = [(FakeContractCall('p1', f'r{index}'), {'gas': 90000, 'gasPrice': 7}) for index in range(3)]
+        pending = self.pipeline.submit_many('0xabc', 'key', calls)
+
+        self.assertEqual([tx.nonce for tx in pending], [4, 5, 6])
+        self.assertEqual([tx['nonce'] for tx in self.web3.eth.sent], [4, 5, 6])
+        self.assertEqual(self.web3.eth.sent[0],
+                         {'from': '0xabc', 'nonce': 4, 'gas': 90000, 'gasPrice': 7, 'to': FakeContractCall.address})
+        self.assertFalse(any(tx.done() for tx in pending))
+
+        for tx in pending[:2]:
+            self.web3.provider.receipts[Web3.to_hex(tx.tx_hash)] = {'blockNumber': '0x20', 'status': '0x1'}
+        self.assertEqual(self.poller.poll(), 2)
+        self.assertEqual(pending[0].receipt(timeout=1)['blockNumber'], 32)
+        self.assertFalse(pending[2].done())
+
+        collected = []
+        pending[2].add_done_callback(collected.append)
+        self.web3.provider.receipts[Web3.to_hex(pending[2].tx_hash)] = {'blockNumber': '0x21', 'status': '0x1'}
+        self.poller.poll()
+        self.assertEqual(collected, [pending[2]])
+
+    def test_rejected_send_resynchronizes(self):
+        """Test that a send the node rejects does not use up a nonce"""
+        self.pipeline.submit('0xabc', 'key', {'gas': 21000})
+
+        self.web3.eth.count = 9
+        self.web3.eth.send_error = ValueError("nonce too low")
+        with self.assertRaises(ValueError):
+            self.pipeline.submit('0xabc', 'key', {'gas': 21000})
+
+        self.assertEqual(self.pipeline.submit('0xabc', 'key', {'gas': 21000}).nonce, 9)
+        self.assertEqual(self.poller.pending_count(), 2)
+
+
+@unittest.skipUnless(WEB3_AVAILABLE, "web3 is not installed")
+class TestReceiptPoller(unittest.TestCase):
+    """Tests for the batched receipt poller"""
+
+    def setUp(self):
+        self.web3 = FakeWeb3()
+        self.poller = ReceiptPoller(self.web3, interval=3600, timeout=60)
+
+    def tearDown(self):
+        self.poller.stop()
+
+    def test_poll_resolves_mined_transactions(self):
+        """Test that one poll resolves every mined transaction"""
+        first = self.poller.track('0x' + '11' * 32)
+        second = self.poller.track('0x' + '22' * 32)
+        self.web3.provider.receipts['0x' + '11' * 32] = {'blockNumber': '0x10', 'status': '0x1'}
+
+        self.assertEqual(self.poller.poll(), 1)
+        self.assertEqual(first.result(timeout=1)['blockNumber'], 16)
+        self.assertFalse(second.done())
+        self.assertEqual(self.poller.pending_count(), 1)
+
+    def test_timeout_fails_future(self):
+        """Test that a transaction past its deadline fails with TimeExhausted"""
+        future = self.poller.track('0x' + '33' * 32, timeout=0)
+        self.poller.poll()
+
+        with self.assertRaises(TimeExhausted):
+            future.result(timeout=1)
+
+
+@unittest.skipUnless(WEB3_AVAILABLE, "web3 is not installed")
+class TestTTLCache(unittest.TestCase):
+    """Tests for the read-through cache"""
+
+    def test_lru_eviction(self):
+        """Test that the least recently used entry is evicted"""
+        cache = TTLCache(maxsize=2, ttl=60)
+        cache.set('a', 1)
+        cache.set('b', 2)
+        cache.get('a')
+        cache.set('c', 3)
+
+        self.assertEqual(cache.get('a'), 1)
+        self.assertIs(cache.get('b'), MISSING)
+        self.assertEqual(len(cache), 2)
+
+    def test_entry_expires_at_timestamp(self):
+        """Test that an explicit expiry shortens the time-to-live"""
+        cache = TTLCache(maxsize=10, ttl=60)
+        cache.set('grant', (True, 1, 0), expires_at=time.time() - 1)
+        cache.set('other', None)
+
+        self.assertIs(cache.get('grant'), MISSING)
+        self.assertIsNone(cache.get('other'))
+
+    def test_invalidate_where(self):
+        """Test invalidation by key predicate"""
+        cache = TTLCache()
+        cache.set(('patient-1', 'rec-1'), 'x')
+        cache.set(('patient-1', 'rec-2'), 'y')
+        cache.set(('patient-2', 'rec-1'), 'z')
+
+        self.assertEqual(cache.invalidate_where(lambda key: key[0] == 'patient-1'), 2)
+        self.assertEqual(cache.get(('patient-2', 'rec-1')), 'z')
+
+
+@unittest.skipUnless(WEB3_AVAILABLE, "web3 is not installed")
+class TestCheckAccessMany(unittest.TestCase):
+    """Tests for batched access checks"""
+
+    def setUp(self):
+        """Load the contract against a provider that answers checkAccess calls"""
+        abi_path = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))),
+                                'medblock', 'blockchain', 'abi', 'MedicalRecords.json')
+        with open(abi_path, 'r') as f:
+            abi = json.load(f)['abi']
+
+        self.blockchain = BlockchainIntegration(provider_url='http://127.0.0.1:1')
+        self.blockchain.web3 = Web3()
+        self.blockchain.web3.provider = FakeProvider()
+        self.blockchain.contract = self.blockchain.web3.eth.contract(address='0x' + '12' * 20, abi=abi)
+        self.grants = {'p1': (True, 2, 0), 'p2': (False, 0, 0)}
+
+        def answer(transaction):
+            _, args = self.blockchain.contract.decode_function_input(transaction['data'])
+            encoded = Web3().codec.encode(['bool', 'uint8', 'uint256'], list(self.grants[args['patientId']]))
+            return '0x' + encoded.hex()
+
+        self.blockchain.web3.provider.call_handler = answer
+
+    def test_results_and_cache(self):
+        """Test that every patient is answered and cached hits skip the node"""
+        provider = '0x' + 'ab' * 20
+        results = self.blockchain.check_access_many(provider, ['p1', 'p2', 'p1'])
+
+        self.assertEqual(set(results), {'p1', 'p2'})
+        self.assertTrue(results['p1']['has_access'])
+        self.assertEqual(results['p1']['access_level'], 2)
+        self.assertFalse(results['p2']['has_access'])
+        self.assertEqual(len(self.blockchain.web3.provider.requests), 2)
+
+        self.blockchain.check_access_many(provider, ['p1', 'p2'])
+        self.assertEqual(len(self.blockchain.web3.provider.requests), 2)
+
+
+class FakeContractCall:
+    """Contract call counting estimate_gas requests"""
+
+    address = '0x' + '12' * 20
+    fn_name = 'addMedicalRecord'
+
+    def __init__(self, *args, gas=50000):
+        self.args = args
+        self.gas = gas
+        self.estimates = 0
+
+    def estimate_gas(self, transaction):
+        self.estimates += 1
+        return self.gas
+
+    def build_transaction(self, transaction):
+        return dict(transaction, to=self.address)
+
+
+@unittest.skipUnless(WEB3_AVAILABLE, "web3 is not installed")
+class TestFees(unittest.TestCase):
+    """Tests for fee sampling and gas estimate caching"""
+
+    def test_fee_params_use_cached_sample(self):
+        """Test that EIP-1559 fields come from one fee history sample per interval"""
+        web3 = FakeWeb3()
+        oracle = FeeOracle(web3, refresh_interval=60, min_priority_fee=0)
+
+        self.assertEqual(oracle.fee_params(), {'maxFeePerGas': 245, 'maxPriorityFeePerGas': 5})
+        self.assertEqual(oracle.fee_params('fast')['maxPriorityFeePerGas'], 10)
+        self.assertEqual(web3.eth.fee_history_calls, 1)
+
+    def test_legacy_chain_uses_gas_price(self):
+        """Test that a chain without a base fee gets a legacy gas price"""
+        web3 = FakeWeb3()
+        web3.eth.base_fees = [0, 0]
+        self.assertEqual(FeeOracle(web3).fee_params(), {'gasPrice': 7})
+
+    def test_estimates_are_cached_per_size_class(self):
+        """Test that calls with arguments of the same word count share an estimate"""
+        estimator = GasEstimator(margin=1.5)
+        first = FakeContractCall('p1', 'r1', 'x' * 40)
+        same_class = FakeContractCall('p2', 'r2', 'y' * 60)
+        larger = FakeContractCall('p1', 'r3', 'z' * 200)
+
+        self.assertEqual(estimator.estimate(first, '0xabc'), 75000)
+        self.assertEqual(estimator.estimate(same_class, '0xabc'), 75000)
+        estimator.estimate(larger, '0xabc')
+        self.assertEqual((first.estimates, same_class.estimates, larger.estimates), (1, 0, 1))
+
+        estimator.observe(same_class, 80000)
+        self.assertEqual(estimator.estimate(first, '0xabc'), 120000)
+
+    def test_argument_words(self):
+        """Test ABI word counting for static and dynamic arguments"""
+        self.assertEqual(argument_words((1, 'a' * 32, b'')), 4)
+
+
+class FakeNodeHandler(BaseHTTPRequestHandler):
+    """JSON-RPC node answering every call with its block number, or failing"""
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+        if self.server.failing:
+            self.send_response(503)
+            self.end_headers()
+            return
+        self.server.calls += 1
+        answer = lambda request: {'jsonrpc': '2.0', 'id': request['id'], 'result': hex(self.server.block_number)}
+        payload = [answer(request) for request in body] if isinstance(body, list) else answer(body)
+        data = json.dumps(payload).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_node(block_number=100, failing=False):
+    """Start a fake node on a free local port"""
+    server = HTTPServer(('127.0.0.1', 0), FakeNodeHandler)
+    server.block_number = block_number
+    server.failing = failing
+    server.calls = 0
+    threading.Thread(target=server.serve_forever, kwargs={'poll_interval': 0.05}, daemon=True).start()
+    return server
+
+
+@unittest.skipUnless(WEB3_AVAILABLE, "web3 is not installed")
+class TestFailoverProvider(unittest.TestCase):
+    """Tests for the pooled failover provider"""
+
+    def setUp(self):
+        self.good = start_node()
+        self.bad = start_node(failing=True)
+        urls = [f"http://127.0.0.1:{server.server_port}" for server in (self.bad, self.good)]
+        self.provider = FailoverProvider(urls, timeout=5, max_failures=1, health_check_interval=0)
+
+    def tearDown(self):
+        self.provider.close()
+        for server in (self.good, self.bad):
+            server.shutdown()
+            server.server_close()
+
+    def test_fails_over_and_demotes_failing_node(self):
+        """Test that a failing node is skipped once it is marked unhealthy"""
+        self.assertEqual(self.provider.make_request('eth_blockNumber', [])['result'], hex(100))
+        self.assertEqual(self.provider.make_request('eth_blockNumber', [])['result'], hex(100))
+
+        bad, good = self.provider.metrics()
+        self.assertFalse(bad['healthy'])
+        self.assertEqual(bad['failures'], 1)
+        self.assertTrue(good['healthy'])
+        self.assertEqual(good['requests'], 2)
+        self.assertIsNotNone(good['latency_ms'])
+
+    def test_batches_go_through_provider(self):
+        """Test that JSON-RPC batches use the provider's failover"""
+        web3 = Web3(self.provider)
+        replies = batch_request(web3, [('eth_blockNumber', [])] * 3)
+
+        self.assertEqual([reply['result'] for reply in replies], [hex(100)] * 3)
+        self.assertEqual(self.good.calls, 1)
+
+    def test_health_check_demotes_lagging_node(self):
+        """Test that a reachable node far behind the best node is unhealthy"""
+        self.bad.failing = False
+        self.bad.block_number = 10
+        metrics = self.provider.check_health()
+
+        self.assertEqual([node['healthy'] for node in metrics], [False, True])
+        self.assertEqual(metrics[0]['block_number'], 10)
+
+    def test_lagging_node_stays_demoted_after_request(self):
+        """Test that a request answered by a lagging node does not bring it back into rotation"""
+        self.bad.failing = False
+        self.bad.block_number = 10
+        self.provider.check_health()
+
+        # The best node goes down, so the lagging node answers
+        self.good.failing = True
+        self.assertEqual(self.provider.make_request('eth_blockNumber', [])['result'], hex(10))
+
+        lagging, best = self.provider.metrics()
+        self.assertFalse(lagging['healthy'])
+        self.assertEqual(lagging['requests'], 2)
+
+        # Only a health check that finds it caught up restores it
+        self.good.failing = False
+        self.bad.block_number = 100
+        self.assertTrue(self.provider.check_health()[0]['healthy'])
+
+
+@unittest.skipUnless(WEB3_AVAILABLE, "web3 is not installed")
+class TestLocalChain(unittest.TestCase):
+    """Tests for BlockchainIntegration on the in-process chain"""
+
+    def setUp(self):
+        self.blockchain, self.admin, self.key = local_blockchain()
+        self.patient = Account.create()
+        self.doctor = Account.create()
+        self.blockchain.add_patient(self.admin, self.key, 'p1', self.patient.address, 'name', 'dob')
+
+    def tearDown(self):
+        self.blockchain.pipeline.shutdown()
+
+    def test_access_rules_are_enforced(self):
+        """Test the onlyAdmin and onlyAuthorized rules of the contract"""
+        result = self.blockchain.add_patient(self.doctor.address, self.doctor.key, 'p2',
+                                             self.patient.address, 'name', 'dob')
+        self.assertEqual(result['status'], 'failed')
+
+        with self.assertRaises(ContractLogicError):
+            self.blockchain.contract.functions.addMedicalRecord('p1', 'r1', 'lab', 'data', 'now').call(
+                {'from': self.doctor.address}
+            )
+
+        self.blockchain.grant_access(self.admin, self.key, 'p1', self.doctor.address, 2)
+        result = self.blockchain.add_medical_record(self.doctor.address, self.doctor.key, 'p1', 'r1', 'lab', {'a': 1})
+        self.assertEqual(result['status'], 'success')
+
+    def test_events_are_emitted(self):
+        """Test that writes emit decodable contract events"""
+        self.blockchain.grant_access(self.admin, self.key, 'p1', self.doctor.address, 1)
+        self.blockchain.revoke_access(self.admin, self.key, 'p1', self.doctor.address)
+
+        events = fetch_events(self.blockchain.web3, self.blockchain.contract, 0, 'latest')
+        self.assertEqual([event['event'] for event in events], ['PatientAdded', 'AccessGranted', 'AccessRevoked'])
+        self.assertEqual(events[1]['args']['provider'], self.doctor.address)
+
+    def test_grant_expires_with_chain_time(self):
+        """Test that checkAccess follows the chain clock"""
+        self.blockchain.grant_access(self.admin, self.key, 'p1', self.doctor.address, 1)
+        self.assertTrue(self.blockchain.check_access_many(self.doctor.address, ['p1'], use_cache=False)['p1']['has_access'])
+
+        self.blockchain.web3.provider.chain.advance_time(31 * 24 * 3600)
+        self.assertFalse(self.blockchain.check_access_many(self.doctor.address, ['p1'], use_cache=False)['p1']['has_access'])
+
+    def test_rotated_key_file(self):
+        """Test that a key file with several keys encrypts with the first and decrypts with any"""
+        from cryptography.fernet import Fernet
+        from utils.helpers import save_encryption_key
+
+        old_key, new_key = Fernet.generate_key(), Fernet.generate_key()
+        with tempfile.TemporaryDirectory() as tempdir:
+            keyfile = os.path.join(tempdir, 'encryption_key.key')
+            save_encryption_key([new_key, old_key], keyfile)
+            blockchain, _, _ = local_blockchain(keyfile=keyfile)
+            try:
+                self.assertEqual(blockchain.decrypt(Fernet(old_key).encrypt(b'older data')), 'older data')
+                self.assertEqual(Fernet(new_key).decrypt(blockchain.encrypt('new data').encode()), b'new data')
+            finally:
+                blockchain.pipeline.shutdown()
+
+    def test_block_time_batches_transactions(self):
+        """Test that transactions sent within one block time share a block"""
+        blockchain, admin, key = local_blockchain(block_time=0.2)
+        try:
+            results = [
+                blockchain.add_patient(admin, key, f"p{i}", self.patient.address, 'name', 'dob', wait=False)
+                for i in range(5)
+            ]
+            receipts = [result['pending'].receipt(timeout=5) for result in results]
+            # The sends may straddle one block boundary at most
+            self.assertLessEqual(len({receipt['blockNumber'] for receipt in receipts}), 2)
+            self.assertEqual([receipt['status'] for receipt in receipts], [1] * 5)
+        finally:
+            blockchain.web3.provider.chain.stop()
+            blockchain.pipeline.shutdown()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,196 @@
+"""
+Unit tests for the MedBlock contract event indexer
+
+This module contains unit tests for checkpointed indexing, reorg rollback
+and the local access lookups. A fake chain stands in for the Ethereum node.
+"""
+
+import os
+import sys
+import unittest
+from unittest import mock
+
+# Add parent directory to path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from sqlalchemy import create_engine
+from sqlalchemy.pool import StaticPool
+
+from database.models import Base, Session, ChainEvent, ChainPatient, IndexerCheckpoint
+
+try:
+    from web3.exceptions import BlockNotFound
+    from utils import chain_indexer
+    from utils.chain_indexer import ChainIndexer, ReorgTooDeepError, indexed_access, indexed_records
+    WEB3_AVAILABLE = True
+except ImportError:
+    WEB3_AVAILABLE = False
+
+PROVIDER = '0x' + 'ab' * 20
+
+
+class FakeChain:
+    """Chain of blocks holding decoded events, exposed like web3.eth"""
+
+    def __init__(self):
+        self.blocks = []  # (hash, events) per block number
+        self.fork = 0
+
+    @property
+    def block_number(self):
+        return len(self.blocks) - 1
+
+    def mine(self, *events):
+        number = len(self.blocks)
+        block_hash = bytes([self.fork, number % 256]) * 16
+        self.blocks.append((block_hash, [
+            {
+                'event': name,
+                'args': args,
+                'blockNumber': number,
+                'blockHash': block_hash,
+                'transactionHash': bytes([number % 256]) * 32,
+                'logIndex': log_index
+            }
+            for log_index, (name, args) in enumerate(events)
+        ]))
+
+    def reorg(self, block_number):
+        """Drop every block after block_number and start a new fork"""
+        del self.blocks[block_number + 1:]
+        self.fork += 1
+
+    def get_block(self, number):
+        if number >= len(self.blocks):
+            raise BlockNotFound(f"Block {number} not found")
+        return {'hash': self.blocks[number][0]}
+
+    def events(self, from_block, to_block):
+        return [event for _, events in self.blocks[from_block:to_block + 1] for event in events]
+
+
+def granted(patient_id, level=1, expiry=0):
+    return ('AccessGranted', {'patientId': patient_id, 'provider': PROVIDER, 'accessLevel': level, 'expiry': expiry})
+
+
+@unittest.skipUnless(WEB3_AVAILABLE, "web3 is not installed")
+class TestChainIndexer(unittest.TestCase):
+    """Tests for the chain indexer"""
+
+    def setUp(self):
+        """Bind the session to an in-memory database and patch log fetching"""
+        self.engine = create_engine('sqlite://', poolclass=StaticPool,
+                                    connect_args={'check_same_thread': False})
+        Base.metadata.create_all(self.engine)
+        Session.remove()
+        Session.configure(bind=self.engine)
+
+        self.chain = FakeChain()
+        self.chain.mine()
+        web3 = mock.Mock()
+        web3.eth = self.chain
+
+        patches = [
+            mock.patch.object(chain_indexer, 'event_decoders', return_value={}),
+            mock.patch.object(chain_indexer, 'fetch_events',
+                              side_effect=lambda web3, contract, start, end, decoders: self.chain.events(start, end))
+        ]
+        for patch in patches:
+            patch.start()
+            self.addCleanup(patch.stop)
+
+        self.indexer = ChainIndexer(web3, contract=None, reorg_depth=4, chunk_size=3)
+
+    def tearDown(self):
+        """Drop the in-memory database"""
+        Session.remove()
+        self.engine.dispose()
+
+    def test_sync_materializes_and_checkpoints(self):
+        """Test that events are applied and the last block is checkpointed"""
+        self.chain.mine(('PatientAdded', {'patientId': 'p1', 'patientAddress': '0x' + 'CD' * 20}))
+        self.chain.mine(('MedicalRecordAdded', {'patientId': 'p1', 'recordId': 'r1', 'recordType': 'lab'}),
+                        granted('p1', level=2))
+
+        self.assertEqual(self.indexer.sync(), 3)
+        self.assertEqual(self.indexer.last_block(), 2)
+        self.assertEqual(indexed_access(PROVIDER.upper(), 'p1')['access_level'], 2)
+        self.assertEqual([record['record_id'] for record in indexed_records('p1')], ['r1'])
+
+        self.chain.mine(('AccessRevoked', {'patientId': 'p1', 'provider': PROVIDER}))
+        self.assertEqual(self.indexer.sync(), 1)
+        self.assertFalse(indexed_access(PROVIDER, 'p1')['has_access'])
+
+    def test_backfill_applies_chunks_in_order(self):
+        """Test that a parallel backfill applies every range in block order"""
+        for level in range(1, 21):
+            self.chain.mine(granted('p1', level=level))
+
+        self.assertEqual(self.indexer.backfill(workers=4), 20)
+        self.assertEqual(self.indexer.last_block(), 20)
+        self.assertEqual(indexed_access(PROVIDER, 'p1')['access_level'], 20)
+
+        session = Session()
+        self.assertEqual(session.query(ChainEvent).count(), 20)
+        Session.remove()
+
+    def test_reorg_rolls_back_and_replays(self):
+        """Test that forked blocks are discarded and state rebuilt from surviving events"""
+        self.chain.mine(granted('p1', level=1))
+        self.chain.mine(granted('p1', level=2))
+        self.chain.mine(('PatientAdded', {'patientId': 'p2', 'patientAddress': PROVIDER}))
+        self.indexer.sync()
+
+        self.chain.reorg(1)
+        self.chain.mine()
+        self.chain.mine()
+        self.indexer.sync()
+
+        self.assertEqual(self.indexer.last_block(), 3)
+        self.assertEqual(indexed_access(PROVIDER, 'p1')['access_level'], 1)
+        session = Session()
+        self.assertIsNone(session.query(ChainPatient).filter_by(patient_id='p2').first())
+        self.assertEqual(session.get(IndexerCheckpoint, 'medical_records').last_block, 3)
+        Session.remove()
+
+    def test_head_reorg_after_empty_blocks(self):
+        """Test that a one block fork at the head rolls back one block after a range without events"""
+        # One range covers every block, so only its end would have a hash from the logs
+        indexer = ChainIndexer(self.indexer.web3, contract=None, reorg_depth=4, chunk_size=100)
+        self.chain.mine(granted('p1', level=1))
+        for _ in range(10):
+            self.chain.mine()
+        indexer.sync()
+        head = self.chain.block_number
+
+        self.chain.reorg(head - 1)
+        self.chain.mine(granted('p1', level=3))
+        self.assertEqual(indexer.sync(), 1)
+
+        self.assertEqual(indexer.last_block(), head)
+        self.assertEqual(indexed_access(PROVIDER, 'p1')['access_level'], 3)
+
+    def test_reorg_deeper_than_depth_raises(self):
+        """Test that a fork below every tracked block is reported"""
+        for _ in range(10):
+            self.chain.mine()
+        self.indexer.sync()
+
+        self.chain.reorg(0)
+        for _ in range(10):
+            self.chain.mine()
+        with self.assertRaises(ReorgTooDeepError):
+            self.indexer.sync()
+
+    def test_expired_grant_has_no_access(self):
+        """Test that an expired grant is reported as expired"""
+        self.chain.mine(granted('p1', expiry=1))
+        self.indexer.sync()
+
+        access = indexed_access(PROVIDER, 'p1')
+        self.assertFalse(access['has_access'])
+        self.assertTrue(access['expired'])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,129 @@
+"""
+Unit tests for MedBlock database connection setup
+
+This module contains unit tests for the engine factory, the SQLite
+pragmas and request-scoped sessions.
+"""
+
+import os
+import sys
+import shutil
+import tempfile
+import unittest
+
+# Add parent directory to path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from flask import Flask
+from sqlalchemy import text
+from sqlalchemy.orm import sessionmaker, scoped_session
+from sqlalchemy.pool import QueuePool
+
+import database.models as models
+from database.models import User, init_app, close_session
+from database.models.connection import create_db_engine, in_request_scope
+from config.config import DB_POOL_SIZE, DB_MAX_OVERFLOW
+
+
+class TestCreateEngine(unittest.TestCase):
+    """Tests for the engine factory"""
+
+    def setUp(self):
+        """Create a temporary directory for database files"""
+        self.temp_dir = tempfile.mkdtemp()
+        self.db_path = os.path.join(self.temp_dir, 'test.db')
+
+    def tearDown(self):
+        """Remove the temporary directory"""
+        shutil.rmtree(self.temp_dir)
+
+    def test_sqlite_file_pragmas(self):
+        """Test that SQLite file connections use WAL and NORMAL sync"""
+        engine = create_db_engine(f"sqlite:///{self.db_path}")
+        try:
+            with engine.connect() as connection:
+                self.assertEqual(connection.exec_driver_sql("PRAGMA journal_mode").scalar(), 'wal')
+                # NORMAL is 1
+                self.assertEqual(connection.exec_driver_sql("PRAGMA synchronous").scalar(), 1)
+                self.assertGreater(connection.exec_driver_sql("PRAGMA busy_timeout").scalar(), 0)
+            self.assertIsInstance(engine.pool, QueuePool)
+            self.assertEqual(engine.pool.size(), DB_POOL_SIZE)
+            self.assertEqual(engine.pool._max_overflow, DB_MAX_OVERFLOW)
+        finally:
+            engine.dispose()
+
+    def test_overrides(self):
+        """Test that keyword arguments override the configured pool"""
+        engine = create_db_engine(f"sqlite:///{self.db_path}", pool_size=2, max_overflow=0)
+        try:
+            self.assertEqual(engine.pool.size(), 2)
+            self.assertEqual(engine.pool._max_overflow, 0)
+        finally:
+            engine.dispose()
+
+    def test_sqlite_memory(self):
+        """Test that in-memory SQLite gets no pool settings"""
+        engine = create_db_engine('sqlite://')
+        try:
+            with engine.connect() as connection:
+                self.assertEqual(connection.execute(text("SELECT 1")).scalar(), 1)
+        finally:
+            engine.dispose()
+
+
+class TestRequestScopedSession(unittest.TestCase):
+    """Tests for sessions scoped to a Flask request"""
+
+    def setUp(self):
+        """Swap the session registry for one bound to an in-memory database"""
+        self.engine = create_db_engine('sqlite://')
+        models.Base.metadata.create_all(self.engine)
+        self.original_session = models.Session
+        models.Session = scoped_session(sessionmaker(bind=self.engine, expire_on_commit=False))
+
+        self.app = Flask(__name__)
+        init_app(self.app)
+        self.seen = []
+
+        @self.app.route('/ping')
+        def ping():
+            session = models.Session()
+            close_session(session)
+            # A helper called later in the request gets the same session
+            self.seen.append((session, models.Session(), in_request_scope()))
+            return 'ok'
+
+    def tearDown(self):
+        """Restore the session registry"""
+        models.Session.remove()
+        models.Session = self.original_session
+        self.engine.dispose()
+
+    def test_session_shared_and_removed(self):
+        """Test that a request shares one session and removes it at teardown"""
+        response = self.app.test_client().get('/ping')
+        self.assertEqual(response.status_code, 200)
+
+        first, second, scoped = self.seen[0]
+        self.assertIs(first, second)
+        self.assertTrue(scoped)
+        self.assertFalse(in_request_scope())
+        self.assertIsNot(models.Session(), first)
+
+    def test_init_app_idempotent(self):
+        """Test that registering twice adds the hooks once"""
+        init_app(self.app)
+        self.assertEqual(len(self.app.teardown_appcontext_funcs), 1)
+
+    def test_objects_readable_after_commit(self):
+        """Test that committed objects are not expired"""
+        session = models.Session()
+        user = User(username='reader', email='reader@example.com', password_hash='x', first_name='Ada', last_name='Reader', role='patient')
+        session.add(user)
+        session.commit()
+        session.close()
+        self.assertEqual(user.username, 'reader')
+
+
+if __name__ == '__main__':
+    unittest.main()
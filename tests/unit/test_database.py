@@ -0,0 +1,204 @@
+"""
+Unit tests for MedBlock database utilities
+
+This module contains unit tests for the record listing queries, including
+a query count check that the listing does not grow with the record count.
+"""
+
+import os
+import sys
+import datetime
+import tempfile
+import unittest
+from unittest import mock
+
+# Add parent directory to path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from sqlalchemy import create_engine, event
+from sqlalchemy.pool import StaticPool
+
+from database.models import Base, Session, User, MedicalRecord, AccessLog
+from utils import audit
+from utils.audit import AuditWriter
+from utils.database import (
+    get_record_summaries_for_patient, get_record_page_for_patient, get_medical_records_for_patient, log_records_access
+)
+
+
+class QueryCounter:
+    """Counts statements sent to an engine"""
+
+    def __init__(self, engine):
+        self.engine = engine
+        self.count = 0
+
+    def _count(self, *args):
+        self.count += 1
+
+    def __enter__(self):
+        event.listen(self.engine, 'before_cursor_execute', self._count)
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        event.remove(self.engine, 'before_cursor_execute', self._count)
+
+
+class TestRecordListing(unittest.TestCase):
+    """Tests for the record listing queries"""
+
+    def setUp(self):
+        """Bind the session to an in-memory database with two providers"""
+        self.engine = create_engine('sqlite://', poolclass=StaticPool,
+                                    connect_args={'check_same_thread': False})
+        Base.metadata.create_all(self.engine)
+        Session.remove()
+        Session.configure(bind=self.engine)
+
+        session = Session()
+        self.users = {}
+        for username, role in (('patient', 'patient'), ('small', 'patient'), ('drhouse', 'doctor'), ('drwho', 'doctor')):
+            user = User(username=username, email=f"{username}@example.com", password_hash='hash',
+                        first_name=username.capitalize(), last_name='Test', role=role)
+            session.add(user)
+            session.flush()
+            self.users[username] = user.id
+        session.commit()
+        Session.remove()
+
+        tempdir = tempfile.TemporaryDirectory()
+        self.addCleanup(tempdir.cleanup)
+        self.writer = AuditWriter(journal_dir=tempdir.name)
+        patch = mock.patch.object(audit, '_writer', self.writer)
+        patch.start()
+        self.addCleanup(patch.stop)
+
+    def tearDown(self):
+        """Drop the in-memory database"""
+        Session.remove()
+        self.engine.dispose()
+
+    def add_records(self, patient, count):
+        session = Session()
+        providers = [self.users['drhouse'], self.users['drwho'], 999]
+        session.bulk_insert_mappings(MedicalRecord, [
+            {
+                'record_id': f"{patient}-{index}",
+                'patient_id': self.users[patient],
+                'provider_id': providers[index % 3],
+                'record_type': 'consultation',
+                'recorded_at': datetime.datetime(2024, 1, 1) + datetime.timedelta(days=index),
+                'data_hash': '0x' + '00' * 32,
+                'encrypted_data': 'ciphertext'
+            }
+            for index in range(count)
+        ])
+        session.commit()
+        Session.remove()
+
+    def list_and_log(self, patient):
+        summaries = get_record_summaries_for_patient(self.users[patient])
+        log_records_access([summary['id'] for summary in summaries], self.users[patient], 'view')
+        return summaries
+
+    def test_summaries(self):
+        """Test that summaries carry provider names and leave out the payload"""
+        self.add_records('patient', 3)
+
+        summaries = get_record_summaries_for_patient(self.users['patient'])
+
+        self.assertEqual([summary['record_id'] for summary in summaries], ['patient-2', 'patient-1', 'patient-0'])
+        self.assertEqual([summary['provider_name'] for summary in summaries],
+                         ['Unknown', 'Drwho Test', 'Drhouse Test'])
+        self.assertNotIn('encrypted_data', summaries[0])
+
+    def test_query_count_constant(self):
+        """Test that listing and logging cost the same number of queries for 5 or 500 records"""
+        self.add_records('small', 5)
+        self.add_records('patient', 500)
+
+        with QueryCounter(self.engine) as small:
+            self.assertEqual(len(self.list_and_log('small')), 5)
+        with QueryCounter(self.engine) as large:
+            self.assertEqual(len(self.list_and_log('patient')), 500)
+
+        # Access logging is queued, only the listing query runs on the request path
+        self.assertEqual(small.count, large.count)
+        self.assertEqual(large.count, 1)
+
+        self.assertEqual(self.writer.flush(), 505)
+        session = Session()
+        self.assertEqual(session.query(AccessLog).count(), 505)
+        Session.remove()
+
+    def test_keyset_pages(self):
+        """Test that following cursors visits every record once, including recorded_at ties"""
+        self.add_records('patient', 45)
+        session = Session()
+        session.query(MedicalRecord).filter(MedicalRecord.id <= 10).update(
+            {MedicalRecord.recorded_at: datetime.datetime(2024, 6, 1)}
+        )
+        session.commit()
+        Session.remove()
+
+        expected = [summary['id'] for summary in get_record_summaries_for_patient(self.users['patient'])]
+        seen, cursor, pages = [], None, 0
+        while True:
+            records, record_ids, cursor = get_record_page_for_patient(self.users['patient'], 20, cursor=cursor)
+            self.assertEqual([record['id'] for record in records], record_ids)
+            seen.extend(record_ids)
+            pages += 1
+            if not cursor:
+                break
+
+        self.assertEqual(pages, 3)
+        self.assertEqual(seen, expected)
+        self.assertEqual(len(set(seen)), 45)
+
+        with self.assertRaises(ValueError):
+            get_record_page_for_patient(self.users['patient'], 20, cursor='garbage')
+
+    def test_projection_and_filters(self):
+        """Test that fields and filters are applied in the query"""
+        self.add_records('patient', 30)
+        session = Session()
+        session.query(MedicalRecord).filter(MedicalRecord.id % 2 == 0).update(
+            {MedicalRecord.record_type: 'lab_result'}
+        )
+        session.commit()
+        Session.remove()
+
+        records, record_ids, cursor = get_record_page_for_patient(
+            self.users['patient'], 5,
+            fields=['record_type', 'provider_name'],
+            record_type='lab_result',
+            recorded_from=datetime.datetime(2024, 1, 5),
+            recorded_to=datetime.datetime(2024, 1, 20)
+        )
+        self.assertEqual(records[0], {'record_type': 'lab_result', 'provider_name': 'Drwho Test'})
+        self.assertEqual(len(records), 5)
+        self.assertIsNotNone(cursor)
+
+        records, _, cursor = get_record_page_for_patient(
+            self.users['patient'], 5, fields=['recorded_at'], cursor=cursor, record_type='lab_result',
+            recorded_from=datetime.datetime(2024, 1, 5), recorded_to=datetime.datetime(2024, 1, 20)
+        )
+        self.assertEqual(len(records), 3)
+        self.assertIsNone(cursor)
+        self.assertEqual(records[-1], {'recorded_at': datetime.datetime(2024, 1, 6)})
+
+        with self.assertRaises(ValueError):
+            get_record_page_for_patient(self.users['patient'], 5, fields=['encrypted_data'])
+
+    def test_records_usable_after_session_close(self):
+        """Test that full records come back with their provider loaded"""
+        self.add_records('patient', 2)
+
+        with QueryCounter(self.engine) as counter:
+            records = get_medical_records_for_patient(self.users['patient'])
+            self.assertEqual(records[-1].provider.full_name, 'Drhouse Test')
+        self.assertEqual(counter.count, 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,169 @@
+"""
+Unit tests for MedBlock attachment downloads
+
+This module contains Flask test client tests for serving encrypted and
+plain attachments with ranges and conditional requests.
+"""
+
+import io
+import os
+import sys
+import tempfile
+import unittest
+from unittest import mock
+
+# Add parent directory to path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from medblock import app as medblock_app
+from utils.blob_store import BlobStore
+from utils.keyring import Keyring
+from utils.stream_crypto import encrypt_stream
+
+CHUNK_SIZE = 1000
+
+
+class TestFileDownloads(unittest.TestCase):
+    """Tests for the attachment download endpoint"""
+
+    def setUp(self):
+        """Store an encrypted blob and legacy uploads in a temporary directory"""
+        self.tempdir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tempdir.cleanup)
+        upload_folder = os.path.join(self.tempdir.name, 'uploads')
+        os.makedirs(upload_folder)
+
+        keyring = Keyring(os.path.join(self.tempdir.name, 'encryption_key.key'))
+        keys = keyring.ensure_key()
+        store = BlobStore(os.path.join(self.tempdir.name, 'store'))
+        for patcher in (
+            mock.patch.object(medblock_app, 'get_keyring', lambda *args: keyring),
+            mock.patch.object(medblock_app, 'attachment_store', store),
+            mock.patch.dict(medblock_app.app.config, {'UPLOAD_FOLDER': upload_folder})
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+        # Several chunks, the last one short
+        self.data = os.urandom(5 * CHUNK_SIZE + 123)
+        self.digest = store.put_stream(io.BytesIO(self.data), keys, chunk_size=CHUNK_SIZE)['sha256']
+
+        with open(os.path.join(upload_folder, 'old.pdf'), 'wb') as f:
+            encrypt_stream(io.BytesIO(self.data), f, keys, chunk_size=CHUNK_SIZE)
+        self.plain = os.urandom(3000)
+        with open(os.path.join(upload_folder, 'plain.pdf'), 'wb') as f:
+            f.write(self.plain)
+
+        self.client = medblock_app.app.test_client()
+
+    def get(self, path, **headers):
+        response = self.client.get(path, headers=headers)
+        body = response.get_data()
+        response.close()
+        return response, body
+
+    def test_full_download(self):
+        """Test that a blob decrypts whole with a strong entity tag"""
+        response, body = self.get(f'/api/files/{self.digest}')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(body, self.data)
+        self.assertEqual(response.headers['Content-Length'], str(len(self.data)))
+        self.assertEqual(response.headers['Accept-Ranges'], 'bytes')
+        self.assertEqual(response.headers['ETag'], f'"{self.digest}"')
+        self.assertIn('private', response.headers['Cache-Control'])
+        self.assertIn(f'filename="{self.digest}"', response.headers['Content-Disposition'])
+
+    def test_partial_content(self):
+        """Test that ranges within and across chunks return exactly the requested bytes"""
+        size = len(self.data)
+        ranges = {
+            'bytes=0-0': (0, 0),
+            'bytes=999-1000': (999, 1000),
+            'bytes=990-3010': (990, 3010),
+            'bytes=1000-1999': (1000, 1999),
+            'bytes=4990-': (4990, size - 1),
+            'bytes=-50': (size - 50, size - 1),
+            'bytes=5000-99999': (5000, size - 1)
+        }
+        for header, (first, last) in ranges.items():
+            with self.subTest(range=header):
+                response, body = self.get(f'/api/files/{self.digest}', Range=header)
+                self.assertEqual(response.status_code, 206)
+                self.assertEqual(body, self.data[first:last + 1])
+                self.assertEqual(response.headers['Content-Range'], f'bytes {first}-{last}/{size}')
+                self.assertEqual(response.headers['Content-Length'], str(last - first + 1))
+
+    def test_unsatisfiable_range(self):
+        """Test that a range past the end is refused with the file size"""
+        response, body = self.get(f'/api/files/{self.digest}', Range='bytes=9000-9999')
+
+        self.assertEqual(response.status_code, 416)
+        self.assertEqual(body, b'')
+        self.assertEqual(response.headers['Content-Range'], f'bytes */{len(self.data)}')
+
+    def test_multiple_ranges_return_whole_file(self):
+        """Test that a multi-range request is answered with the whole file"""
+        response, body = self.get(f'/api/files/{self.digest}', Range='bytes=0-10,2000-2010')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(body, self.data)
+        self.assertNotIn('Content-Range', response.headers)
+
+    def test_if_range(self):
+        """Test that a range is honoured only while the client's validator is current"""
+        response, body = self.get(f'/api/files/{self.digest}', Range='bytes=1500-2500',
+                                  **{'If-Range': f'"{self.digest}"'})
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(body, self.data[1500:2501])
+
+        response, body = self.get(f'/api/files/{self.digest}', Range='bytes=1500-2500',
+                                  **{'If-Range': '"stale"'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(body, self.data)
+
+    def test_not_modified(self):
+        """Test that a current entity tag is answered without a body"""
+        response, body = self.get(f'/api/files/{self.digest}', **{'If-None-Match': f'"{self.digest}"'})
+
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(body, b'')
+        self.assertEqual(response.headers['ETag'], f'"{self.digest}"')
+
+        response, body = self.get(f'/api/files/{self.digest}', **{'If-None-Match': '"other"'})
+        self.assertEqual(response.status_code, 200)
+
+    def test_encrypted_upload_by_name(self):
+        """Test that an older encrypted upload is served by name with an mtime validator"""
+        response, body = self.get('/api/files/old.pdf', Range='bytes=2990-3020')
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(body, self.data[2990:3021])
+
+        etag = response.headers['ETag']
+        response, body = self.get('/api/files/old.pdf', **{'If-None-Match': etag})
+        self.assertEqual(response.status_code, 304)
+
+    def test_plain_file(self):
+        """Test that an unencrypted upload goes through send_file with ranges and validators"""
+        response, body = self.get('/api/files/plain.pdf')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(body, self.plain)
+        self.assertIn('private', response.headers['Cache-Control'])
+
+        etag = response.headers['ETag']
+        response, body = self.get('/api/files/plain.pdf', Range='bytes=100-199')
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(body, self.plain[100:200])
+
+        response, body = self.get('/api/files/plain.pdf', **{'If-None-Match': etag})
+        self.assertEqual(response.status_code, 304)
+
+    def test_missing_file(self):
+        """Test that unknown blobs and names are not found"""
+        self.assertEqual(self.get(f"/api/files/{'0' * 64}")[0].status_code, 404)
+        self.assertEqual(self.get('/api/files/missing.pdf')[0].status_code, 404)
+        self.assertEqual(self.get('/api/files/..%2F..%2Fconfig.py')[0].status_code, 404)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,187 @@
+"""
+Unit tests for the MedBlock key rotation job
+
+This module contains unit tests for rotating records to a new master key,
+resuming from a checkpoint and the key file commands.
+"""
+
+import os
+import sys
+import datetime
+import tempfile
+import unittest
+
+# Add parent directory to path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from sqlalchemy import create_engine
+from sqlalchemy.pool import StaticPool
+
+from database.models import Base, Session, MedicalRecord
+from utils.helpers import generate_encryption_key, load_encryption_keys, save_encryption_key
+from utils.envelope import get_cipher, key_version
+from utils import key_rotation
+from utils.key_rotation import rotate_keys, load_checkpoint
+
+
+class TestKeyRotation(unittest.TestCase):
+    """Tests for the key rotation job"""
+
+    def setUp(self):
+        """Bind the session to an in-memory database holding records under the old key"""
+        self.engine = create_engine('sqlite://', poolclass=StaticPool,
+                                    connect_args={'check_same_thread': False})
+        Base.metadata.create_all(self.engine)
+        Session.remove()
+        Session.configure(bind=self.engine)
+
+        self.tempdir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tempdir.cleanup)
+        self.checkpoint = os.path.join(self.tempdir.name, 'rotation.json')
+
+        self.old_key = generate_encryption_key()
+        self.new_key = generate_encryption_key()
+        self.payloads = {}
+
+        session = Session()
+        for index in range(7):
+            record = MedicalRecord(
+                record_id=f"rec-{index}",
+                patient_id=1,
+                provider_id=2,
+                record_type='consultation',
+                recorded_at=datetime.datetime(2024, 1, 1),
+                data_hash='0x' + '00' * 32
+            )
+            payload = {'index': index}
+            if index % 3 == 0:
+                # Record written before envelope encryption
+                record.encrypted_data = get_cipher(self.old_key).encrypt(b'{"index": %d}' % index).decode()
+            else:
+                record.encrypt_data(payload, self.old_key)
+            session.add(record)
+            session.flush()
+            self.payloads[record.id] = payload
+        session.commit()
+        Session.remove()
+
+    def tearDown(self):
+        """Drop the in-memory database"""
+        Session.remove()
+        self.engine.dispose()
+
+    def records(self):
+        session = Session()
+        try:
+            return session.query(MedicalRecord).order_by(MedicalRecord.id).all()
+        finally:
+            session.close()
+
+    def test_rotate_all_records(self):
+        """Test that every record ends up readable with the new key alone"""
+        updated = {record.id: record.updated_at for record in self.records()}
+        summary = rotate_keys([self.new_key, self.old_key], chunk_size=3, workers=0,
+                              checkpoint_file=self.checkpoint)
+
+        self.assertEqual(summary['rotated'], 7)
+        self.assertEqual(summary['failed'], [])
+        for record in self.records():
+            self.assertEqual(record.key_version, key_version(self.new_key))
+            self.assertIsNotNone(record.wrapped_data_key)
+            self.assertEqual(record.decrypt_data(self.new_key), self.payloads[record.id])
+            self.assertEqual(record.updated_at, updated[record.id])
+
+    def test_process_pool(self):
+        """Test rotation through worker processes"""
+        summary = rotate_keys([self.new_key, self.old_key], chunk_size=4, workers=2,
+                              checkpoint_file=self.checkpoint)
+
+        self.assertEqual(summary['rotated'], 7)
+        for record in self.records():
+            self.assertEqual(record.decrypt_data(self.new_key), self.payloads[record.id])
+
+    def test_resume_from_checkpoint(self):
+        """Test that an interrupted run continues after the last completed chunk"""
+        original = key_rotation._rotate_rows
+        calls = []
+
+        def fail_second_chunk(keys, rows):
+            calls.append(rows)
+            if len(calls) == 2:
+                raise RuntimeError("worker crashed")
+            return original(keys, rows)
+
+        key_rotation._rotate_rows = fail_second_chunk
+        try:
+            with self.assertRaises(RuntimeError):
+                rotate_keys([self.new_key, self.old_key], chunk_size=3, workers=0,
+                            checkpoint_file=self.checkpoint)
+        finally:
+            key_rotation._rotate_rows = original
+
+        state = load_checkpoint(self.checkpoint, key_version(self.new_key))
+        self.assertEqual(state['last_id'], 3)
+        self.assertEqual(state['rotated'], 3)
+        self.assertIsNone(load_checkpoint(self.checkpoint, key_version(self.old_key)))
+
+        summary = rotate_keys([self.new_key, self.old_key], chunk_size=3, workers=0,
+                              checkpoint_file=self.checkpoint)
+        self.assertEqual(summary['rotated'], 7)
+        for record in self.records():
+            self.assertEqual(record.decrypt_data(self.new_key), self.payloads[record.id])
+
+    def test_changed_record_skipped(self):
+        """Test that a record rewritten during the run is kept and counted as skipped"""
+        original = key_rotation._rotate_rows
+        fresh = get_cipher(self.new_key).encrypt(b'{"index": "new"}').decode()
+
+        def rewrite_record(keys, rows):
+            # The application re-encrypts record 2 after the chunk was read
+            Session().query(MedicalRecord).filter(MedicalRecord.id == 2).update(
+                {MedicalRecord.encrypted_data: fresh}, synchronize_session=False)
+            return original(keys, rows)
+
+        key_rotation._rotate_rows = rewrite_record
+        try:
+            summary = rotate_keys([self.new_key, self.old_key], chunk_size=10, workers=0,
+                                  checkpoint_file=self.checkpoint)
+        finally:
+            key_rotation._rotate_rows = original
+
+        self.assertEqual(summary['rotated'], 6)
+        self.assertEqual(summary['skipped'], 1)
+        self.assertEqual(load_checkpoint(self.checkpoint, key_version(self.new_key))['skipped'], 1)
+        record = self.records()[1]
+        self.assertEqual(record.encrypted_data, fresh)
+        self.assertNotEqual(record.key_version, key_version(self.new_key))
+
+    def test_unknown_key_reported(self):
+        """Test that records under a key that is not supplied are reported, not rotated"""
+        summary = rotate_keys([self.new_key], chunk_size=10, workers=0,
+                              checkpoint_file=self.checkpoint)
+
+        self.assertEqual(summary['rotated'], 0)
+        self.assertEqual(len(summary['failed']), 7)
+        for record in self.records():
+            self.assertNotEqual(record.key_version, key_version(self.new_key))
+
+    def test_key_file_commands(self):
+        """Test adding a primary key, rotating and retiring the old key"""
+        key_file = os.path.join(self.tempdir.name, 'encryption.key')
+        save_encryption_key(self.old_key, key_file)
+        args = ['--key-file', key_file, '--checkpoint', self.checkpoint, '--workers', '0']
+
+        self.assertEqual(key_rotation.main(['new-key'] + args), 0)
+        keys = load_encryption_keys(key_file)
+        self.assertEqual(len(keys), 2)
+        self.assertEqual(keys[1], self.old_key)
+
+        # Old keys stay until every record has been rotated
+        self.assertEqual(key_rotation.main(['retire-keys'] + args), 1)
+        self.assertEqual(key_rotation.main(['rotate-keys'] + args), 0)
+        self.assertEqual(key_rotation.main(['retire-keys'] + args), 0)
+        self.assertEqual(load_encryption_keys(key_file), keys[:1])
+
+
+if __name__ == '__main__':
+    unittest.main()
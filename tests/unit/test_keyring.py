@@ -0,0 +1,78 @@
+"""
+Unit tests for the MedBlock encryption keyring
+
+This module contains unit tests for loading keys once, picking up key file
+changes and handing out ciphers.
+"""
+
+import os
+import sys
+import tempfile
+import unittest
+from unittest import mock
+
+# Add parent directory to path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from utils import keyring as keyring_module
+from utils.keyring import Keyring, get_keyring
+from utils.helpers import generate_encryption_key, save_encryption_key, load_encryption_keys
+from utils.envelope import key_version, encrypt_envelope, decrypt_envelope
+
+
+class TestKeyring(unittest.TestCase):
+    """Tests for the keyring"""
+
+    def setUp(self):
+        """Create a key file in a temporary directory"""
+        self.tempdir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tempdir.cleanup)
+        self.key_file = os.path.join(self.tempdir.name, 'encryption.key')
+        self.old_key = generate_encryption_key()
+        save_encryption_key(self.old_key, self.key_file)
+
+    def test_keys_loaded_once(self):
+        """Test that repeated lookups do not read the key file"""
+        keyring = Keyring(self.key_file, check_interval=60)
+        with mock.patch.object(keyring_module, 'load_encryption_keys', wraps=load_encryption_keys) as load:
+            for _ in range(100):
+                self.assertEqual(keyring.keys, (self.old_key,))
+        self.assertEqual(load.call_count, 1)
+
+    def test_reload_on_change(self):
+        """Test that a rewritten key file is picked up after the check interval"""
+        keyring = Keyring(self.key_file, check_interval=0)
+        self.assertEqual(keyring.primary_key, self.old_key)
+
+        new_key = generate_encryption_key()
+        save_encryption_key([new_key, self.old_key], self.key_file)
+        keyring.refresh(force=True)
+
+        self.assertEqual(keyring.keys, (new_key, self.old_key))
+        self.assertEqual(keyring.version, key_version(new_key))
+
+        # Data under the old key stays readable with the keyring's ciphers
+        ciphertext, wrapped, version = encrypt_envelope(b'data', self.old_key)
+        self.assertEqual(decrypt_envelope(ciphertext, wrapped, keyring.keys), b'data')
+        self.assertEqual(keyring.cipher.decrypt(wrapped.encode()),
+                         keyring.cipher_for(version).decrypt(wrapped.encode()))
+        self.assertIsNone(keyring.cipher_for('unknown'))
+
+    def test_missing_file(self):
+        """Test that a missing key file gives no keys until one is created"""
+        keyring = Keyring(os.path.join(self.tempdir.name, 'missing.key'), check_interval=60)
+        self.assertEqual(keyring.keys, ())
+        self.assertIsNone(keyring.cipher)
+
+        keys = keyring.ensure_key()
+        self.assertEqual(len(keys), 1)
+        self.assertEqual(keyring.keys, keys)
+        self.assertEqual(load_encryption_keys(keyring.filename), list(keys))
+
+    def test_shared_keyring(self):
+        """Test that a key file gets one shared keyring"""
+        self.assertIs(get_keyring(self.key_file), get_keyring(self.key_file))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,85 @@
+"""
+Unit tests for MedBlock log segments
+
+This module contains unit tests for writing and reading columnar segment
+files.
+"""
+
+import os
+import sys
+import shutil
+import datetime
+import tempfile
+import unittest
+
+# Add parent directory to path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from utils.log_segments import SegmentWriter, Segment, SegmentError
+
+START = datetime.datetime(2024, 1, 1)
+
+
+class TestLogSegments(unittest.TestCase):
+    """Tests for segment files"""
+
+    def setUp(self):
+        """Write a segment of 25 hourly rows in groups of 10"""
+        self.temp_dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.temp_dir, 'logs.seg')
+        writer = SegmentWriter(self.path, ['id', 'access_time', 'action'], 'access_time', group_size=10)
+        for index in range(25):
+            writer.write((index, START + datetime.timedelta(hours=index), 'view' if index % 2 else 'update'))
+        self.summary = writer.close()
+
+    def tearDown(self):
+        """Remove the temporary directory"""
+        shutil.rmtree(self.temp_dir)
+
+    def test_round_trip(self):
+        """Test that all rows and the time range are read back"""
+        segment = Segment(self.path)
+        self.assertEqual(segment.rows, 25)
+        self.assertEqual(segment.min_time, START)
+        self.assertEqual(segment.max_time, START + datetime.timedelta(hours=24))
+        self.assertEqual(self.summary['rows'], 25)
+
+        rows = list(segment.read())
+        self.assertEqual([row['id'] for row in rows], list(range(25)))
+        self.assertEqual(rows[3], {'id': 3, 'access_time': START + datetime.timedelta(hours=3), 'action': 'view'})
+        self.assertEqual(os.stat(self.path).st_mode & 0o777, 0o444)
+        self.assertFalse(os.path.exists(f"{self.path}.tmp"))
+
+    def test_time_range_and_columns(self):
+        """Test that a range returns its rows and only the requested columns"""
+        segment = Segment(self.path)
+        rows = list(segment.read(START + datetime.timedelta(hours=12), START + datetime.timedelta(hours=15), ['id']))
+        self.assertEqual(rows, [{'id': 12}, {'id': 13}, {'id': 14}])
+        self.assertEqual(list(segment.read(START - datetime.timedelta(days=1), START)), [])
+
+    def test_groups_outside_range_not_read(self):
+        """Test that groups outside the range are skipped"""
+        segment = Segment(self.path)
+        blocks = []
+        read_block = segment._read_block
+        segment._read_block = lambda f, group, column: blocks.append(column) or read_block(f, group, column)
+        list(segment.read(START + datetime.timedelta(hours=21), None, ['id']))
+        # Only the last group: its time block and its id block
+        self.assertEqual(blocks, ['access_time', 'id'])
+
+    def test_segments_immutable(self):
+        """Test that an existing segment is not overwritten"""
+        with self.assertRaises(FileExistsError):
+            SegmentWriter(self.path, ['id'], 'id')
+
+    def test_truncated_segment(self):
+        """Test that a truncated segment is rejected"""
+        truncated = os.path.join(self.temp_dir, 'truncated.seg')
+        with open(self.path, 'rb') as source, open(truncated, 'wb') as target:
+            target.write(source.read()[:-5])
+        with self.assertRaises(SegmentError):
+            Segment(truncated)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,105 @@
+"""
+Unit tests for MedBlock database migrations
+
+This module contains unit tests for upgrading a database created before
+the envelope columns, hot path indexes and the tables added since.
+"""
+
+import os
+import sys
+import unittest
+
+# Add parent directory to path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from sqlalchemy import create_engine, inspect
+from sqlalchemy.pool import StaticPool
+
+import database.models as models
+from database.models import Base, Session
+from utils.database import get_record_summaries_for_patient
+from database.migrations import MIGRATIONS, migrate, applied_migrations
+
+NEW_INDEXES = {
+    'medical_records': ['ix_medical_records_patient_listing'],
+    'access_logs': ['ix_access_logs_access_time', 'ix_access_logs_anomalous_time', 'ix_access_logs_record_time']
+}
+
+
+class TestMigrations(unittest.TestCase):
+    """Tests for the migration runner"""
+
+    def setUp(self):
+        """Create an in-memory database"""
+        self.engine = create_engine('sqlite://', poolclass=StaticPool,
+                                    connect_args={'check_same_thread': False})
+        Base.metadata.create_all(self.engine)
+
+    def tearDown(self):
+        """Drop the in-memory database"""
+        self.engine.dispose()
+
+    def test_upgrade_old_database(self):
+        """Test that an old schema gets the new columns and indexes, once"""
+        with self.engine.begin() as connection:
+            # The baseline schema only has users, medical_records and access_logs
+            Base.metadata.drop_all(connection, tables=[
+                table for name, table in Base.metadata.tables.items()
+                if name not in ('users', 'medical_records', 'access_logs')
+            ])
+            for indexes in NEW_INDEXES.values():
+                for name in indexes:
+                    connection.exec_driver_sql(f"DROP INDEX {name}")
+            connection.exec_driver_sql("ALTER TABLE medical_records DROP COLUMN wrapped_data_key")
+            connection.exec_driver_sql("ALTER TABLE medical_records DROP COLUMN key_version")
+            connection.exec_driver_sql("ALTER TABLE medical_records DROP COLUMN confirmation_status")
+
+        self.assertEqual(migrate(self.engine), MIGRATIONS)
+
+        inspector = inspect(self.engine)
+        self.assertTrue(set(Base.metadata.tables) <= set(inspector.get_table_names()))
+        columns = {column['name'] for column in inspector.get_columns('medical_records')}
+        self.assertTrue({'wrapped_data_key', 'key_version', 'confirmation_status'} <= columns)
+        for table, names in NEW_INDEXES.items():
+            existing = {index['name'] for index in inspector.get_indexes(table)}
+            self.assertTrue(set(names) <= existing, table)
+
+        self.assertEqual(migrate(self.engine), [])
+        self.assertEqual(applied_migrations(self.engine), set(MIGRATIONS))
+
+    def test_confirmation_status_backfilled(self):
+        """Test that an upgraded database can list records again"""
+        with self.engine.begin() as connection:
+            connection.exec_driver_sql(
+                "INSERT INTO users (id, username, email, password_hash, first_name, last_name, role) "
+                "VALUES (1, 'patient', 'p@example.com', 'hash', 'Pat', 'Ient', 'patient')"
+            )
+            for record_id, block_number in ((1, 12), (2, None)):
+                connection.exec_driver_sql(
+                    "INSERT INTO medical_records (id, record_id, patient_id, provider_id, record_type, "
+                    "recorded_at, data_hash, is_active, block_number) "
+                    "VALUES (?, ?, 1, 1, 'consultation', '2024-01-01 00:00:00', 'hash', 1, ?)",
+                    (record_id, f'rec-{record_id}', block_number)
+                )
+            connection.exec_driver_sql("ALTER TABLE medical_records DROP COLUMN confirmation_status")
+
+        migrate(self.engine)
+
+        Session.remove()
+        Session.configure(bind=self.engine)
+        try:
+            summaries = get_record_summaries_for_patient(1)
+        finally:
+            Session.remove()
+            Session.configure(bind=models.engine)
+        self.assertEqual({summary['id']: summary['confirmation_status'] for summary in summaries},
+                         {1: 'confirmed', 2: 'pending'})
+
+    def test_new_database_only_stamped(self):
+        """Test that a database created from the models needs no changes"""
+        self.assertEqual(migrate(self.engine), MIGRATIONS)
+        self.assertEqual(migrate(self.engine), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
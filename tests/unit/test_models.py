@@ -14,6 +14,8 @@ sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(
 
 from database.models import User, MedicalRecord, AccessLog
 from utils.helpers import generate_encryption_key
+from utils.envelope import get_cipher, key_version
+from cryptography.fernet import Fernet
 
 class TestUserModel(unittest.TestCase):
     """Tests for the User model"""
@@ -141,6 +143,34 @@ class TestMedicalRecordModel(unittest.TestCase):
         # Decrypt data
         decrypted_data = record.decrypt_data(key)
         self.assertEqual(decrypted_data, test_data)
+    
+    def test_envelope_key_rotation(self):
+        """Test that rewrapping the data key keeps the payload readable under the new key"""
+        record = MedicalRecord(record_id="record456", patient_id=1, provider_id=2,
+                               record_type="lab_result", recorded_at=datetime.datetime(2023, 1, 1))
+        old_key = generate_encryption_key()
+        new_key = generate_encryption_key()
+        record.encrypt_data({"glucose": 5.4}, old_key)
+        encrypted_data = record.encrypted_data
+        
+        self.assertEqual(record.key_version, key_version(old_key))
+        self.assertTrue(record.rewrap_key(old_key, new_key))
+        
+        self.assertEqual(record.encrypted_data, encrypted_data)
+        self.assertEqual(record.key_version, key_version(new_key))
+        self.assertEqual(record.decrypt_data(new_key), {"glucose": 5.4})
+        self.assertIsNone(record.decrypt_data(old_key))
+    
+    def test_legacy_record_decrypts(self):
+        """Test that records encrypted directly with the master key still decrypt"""
+        key = generate_encryption_key()
+        record = MedicalRecord(record_id="record789", patient_id=1, provider_id=2,
+                               record_type="consultation", recorded_at=datetime.datetime(2023, 1, 1))
+        record.encrypted_data = Fernet(key).encrypt(b'{"notes": "legacy"}').decode()
+        
+        self.assertEqual(record.decrypt_data(key), {"notes": "legacy"})
+        self.assertFalse(record.rewrap_key(key, generate_encryption_key()))
+        self.assertIs(get_cipher(key), get_cipher(key))
 
 
 class TestAccessLogModel(unittest.TestCase):
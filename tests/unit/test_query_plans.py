@@ -0,0 +1,175 @@
+"""
+Query plan regression tests for MedBlock
+
+This module runs the hot record and access log queries, captures the SQL
+they send and checks its EXPLAIN output for full table scans and sorts
+that an index should avoid. SQLite always runs; PostgreSQL runs when
+MEDBLOCK_TEST_POSTGRES_URL points at a scratch database.
+"""
+
+import os
+import sys
+import datetime
+import unittest
+
+# Add parent directory to path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from sqlalchemy import create_engine, event
+from sqlalchemy.pool import StaticPool
+
+from database.models import Base, Session, User, MedicalRecord, AccessLog
+from utils.database import (
+    get_medical_records_for_patient, get_record_summaries_for_patient,
+    get_recent_access_logs, get_anomalous_access_logs, get_record_access_logs
+)
+
+POSTGRES_URL = os.getenv('MEDBLOCK_TEST_POSTGRES_URL')
+
+HOT_QUERIES = {
+    'medical records for patient': lambda: get_medical_records_for_patient(1),
+    'record listing': lambda: get_record_summaries_for_patient(1, limit=21),
+    'record listing next page': lambda: get_record_summaries_for_patient(
+        1, cursor=(datetime.datetime(2024, 1, 10), 10), limit=21
+    ),
+    'record listing filtered': lambda: get_record_summaries_for_patient(
+        1, record_type='lab_result', recorded_from=datetime.datetime(2024, 1, 5),
+        recorded_to=datetime.datetime(2024, 1, 20), limit=21
+    ),
+    'recent access logs': lambda: get_recent_access_logs(),
+    'anomalous access logs': lambda: get_anomalous_access_logs(),
+    'record access logs': lambda: get_record_access_logs(1)
+}
+
+
+class QueryPlanMixin:
+    """Runs the hot queries against self.engine and checks their plans"""
+
+    def populate(self):
+        session = Session()
+        session.add_all([
+            User(username=f"user{index}", email=f"user{index}@example.com", password_hash='hash',
+                 first_name='Test', last_name=f"User{index}", role='patient' if index % 2 else 'doctor')
+            for index in range(1, 5)
+        ])
+        session.flush()
+        session.bulk_insert_mappings(MedicalRecord, [
+            {
+                'record_id': f"rec-{index}",
+                'patient_id': 1 + index % 2 * 2,
+                'provider_id': 2,
+                'record_type': 'lab_result' if index % 3 else 'consultation',
+                'recorded_at': datetime.datetime(2024, 1, 1) + datetime.timedelta(days=index % 40),
+                'data_hash': '0x' + '00' * 32
+            }
+            for index in range(200)
+        ])
+        session.bulk_insert_mappings(AccessLog, [
+            {
+                'record_id': 1 + index % 200,
+                'user_id': 1 + index % 4,
+                'action': 'view',
+                'access_time': datetime.datetime(2024, 1, 1) + datetime.timedelta(minutes=index),
+                'is_anomalous': index % 50 == 0
+            }
+            for index in range(1000)
+        ])
+        session.commit()
+        Session.remove()
+
+    def capture(self, run):
+        """Run a query function and return the SELECT statements it sent"""
+        statements = []
+
+        def before_execute(conn, cursor, statement, parameters, context, executemany):
+            # Listing the SQLite access log shards reads the schema catalog, not a data table
+            if 'sqlite_master' in statement:
+                return
+            if statement.lstrip().upper().startswith('SELECT'):
+                statements.append((statement, parameters))
+
+        event.listen(self.engine, 'before_cursor_execute', before_execute)
+        try:
+            run()
+        finally:
+            event.remove(self.engine, 'before_cursor_execute', before_execute)
+        return statements
+
+    def test_hot_queries_use_indexes(self):
+        """Test that no hot query scans a whole table or sorts its rows"""
+        for name, run in HOT_QUERIES.items():
+            statements = self.capture(run)
+            self.assertTrue(statements, name)
+            for statement, parameters in statements:
+                with self.subTest(query=name):
+                    plan = self.explain(statement, parameters)
+                    problems = self.plan_problems(plan)
+                    self.assertEqual(problems, [], f"{name}:\n" + '\n'.join(plan))
+
+
+class TestSQLiteQueryPlans(QueryPlanMixin, unittest.TestCase):
+    """Query plans on SQLite"""
+
+    def setUp(self):
+        """Create and fill an in-memory database"""
+        self.engine = create_engine('sqlite://', poolclass=StaticPool,
+                                    connect_args={'check_same_thread': False})
+        Base.metadata.create_all(self.engine)
+        Session.remove()
+        Session.configure(bind=self.engine)
+        self.populate()
+
+    def tearDown(self):
+        """Drop the in-memory database"""
+        Session.remove()
+        self.engine.dispose()
+
+    def explain(self, statement, parameters):
+        with self.engine.connect() as connection:
+            rows = connection.exec_driver_sql(f"EXPLAIN QUERY PLAN {statement}", parameters).fetchall()
+        return [row[-1] for row in rows]
+
+    @staticmethod
+    def plan_problems(plan):
+        # "SCAN t USING INDEX" walks an index in order; a bare "SCAN t" reads every row
+        return [
+            step for step in plan
+            if (step.startswith('SCAN ') and ' USING ' not in step) or 'TEMP B-TREE' in step
+        ]
+
+
+@unittest.skipUnless(POSTGRES_URL, "MEDBLOCK_TEST_POSTGRES_URL is not set")
+class TestPostgresQueryPlans(QueryPlanMixin, unittest.TestCase):
+    """Query plans on PostgreSQL"""
+
+    def setUp(self):
+        """Create and fill the tables in the scratch database"""
+        self.engine = create_engine(POSTGRES_URL)
+        Base.metadata.drop_all(self.engine)
+        Base.metadata.create_all(self.engine)
+        Session.remove()
+        Session.configure(bind=self.engine)
+        self.populate()
+        with self.engine.begin() as connection:
+            connection.exec_driver_sql("ANALYZE")
+
+    def tearDown(self):
+        """Drop the tables"""
+        Session.remove()
+        Base.metadata.drop_all(self.engine)
+        self.engine.dispose()
+
+    def explain(self, statement, parameters):
+        with self.engine.connect() as connection:
+            # Small test tables make a sequential scan cheapest; ask whether an index plan exists
+            connection.exec_driver_sql("SET enable_seqscan = off")
+            rows = connection.exec_driver_sql(f"EXPLAIN {statement}", parameters).fetchall()
+        return [row[0] for row in rows]
+
+    @staticmethod
+    def plan_problems(plan):
+        return [step for step in plan if 'Seq Scan' in step]
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,196 @@
+"""
+Unit tests for MedBlock record export
+
+This module contains unit tests for streaming a patient's record history
+as NDJSON and gzipped NDJSON, directly and through the export endpoint.
+"""
+
+import os
+import sys
+import gzip
+import json
+import types
+import datetime
+import functools
+import unittest
+from unittest import mock
+
+# Add parent directory to path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from cryptography.fernet import Fernet
+from flask import Blueprint, Flask
+from sqlalchemy import create_engine
+from sqlalchemy.pool import StaticPool
+
+from database.models import Base, Session, User, MedicalRecord
+from utils import record_export
+from utils.record_export import export_patient_records
+
+try:
+    from api.v1 import records as records_api
+except ImportError:
+    # The ML endpoints imported by the api.v1 package need numpy; the records API does not
+    ml_endpoints = types.ModuleType('api.v1.ml_endpoints')
+    ml_endpoints.ml_blueprint = Blueprint('ml', __name__)
+    sys.modules['api.v1.ml_endpoints'] = ml_endpoints
+    from api.v1 import records as records_api
+from api.v1.users import generate_token
+
+
+class ExportDataMixin:
+    """Seeds an in-memory database with the record history of a patient"""
+
+    def setUp(self):
+        """Bind the session to an in-memory database with seven records of one patient"""
+        self.engine = create_engine('sqlite://', poolclass=StaticPool,
+                                    connect_args={'check_same_thread': False})
+        Base.metadata.create_all(self.engine)
+        Session.remove()
+        Session.configure(bind=self.engine)
+        self.key = Fernet.generate_key()
+
+        session = Session()
+        for username, role in (('patient', 'patient'), ('other', 'patient'), ('doctor', 'doctor')):
+            session.add(User(username=username, email=f"{username}@example.com", password_hash='hash',
+                             first_name=username.capitalize(), last_name='Test', role=role))
+        session.flush()
+        for index in range(8):
+            record = MedicalRecord(
+                record_id=f"record-{index}", patient_id=2 if index == 7 else 1, provider_id=3,
+                record_type='consultation', recorded_at=datetime.datetime(2024, 1, 8 - index)
+            )
+            record.encrypt_data({'visit': index}, self.key)
+            session.add(record)
+        # Encrypted under a key that is no longer in the keyring
+        lost = MedicalRecord(record_id='lost', patient_id=1, provider_id=3, record_type='diagnosis',
+                             recorded_at=datetime.datetime(2024, 2, 1))
+        lost.encrypt_data({'visit': 'lost'}, Fernet.generate_key())
+        session.add(lost)
+        session.commit()
+        Session.remove()
+
+    def tearDown(self):
+        """Drop the in-memory database"""
+        Session.remove()
+        self.engine.dispose()
+
+
+class TestRecordExport(ExportDataMixin, unittest.TestCase):
+    """Tests for the record history export"""
+
+    def test_ndjson_export(self):
+        """Test that the history is written oldest first with decrypted data"""
+        batches = []
+        output = b''.join(export_patient_records(1, [self.key], batch_size=3, workers=2, on_batch=batches.append))
+        lines = [json.loads(line) for line in output.decode().splitlines()]
+
+        self.assertEqual([line['data'] for line in lines[:-1]], [{'visit': index} for index in range(6, -1, -1)])
+        self.assertEqual(lines[0]['recorded_at'], '2024-01-02T00:00:00')
+        self.assertEqual(lines[-1]['record_id'], 'lost')
+        self.assertIsNone(lines[-1]['data'])
+        self.assertEqual(lines[-1]['error'], 'decryption failed')
+        self.assertNotIn('encrypted_data', lines[0])
+
+        self.assertEqual([len(batch) for batch in batches], [3, 3, 2])
+        self.assertEqual(sum(batches, []), [line['id'] for line in lines])
+
+    def test_gzip_export(self):
+        """Test that the gzipped export decompresses to the NDJSON export"""
+        plain = b''.join(export_patient_records(1, [self.key], batch_size=3))
+        compressed = b''.join(export_patient_records(1, [self.key], batch_size=3, compress=True))
+        self.assertEqual(gzip.decompress(compressed), plain)
+
+    def test_batches_fetched_ahead_are_bounded(self):
+        """Test that only a bounded number of batches is decrypted ahead of the output"""
+        decrypted = []
+        export_lines = record_export._export_lines
+
+        def tracking(keys, rows):
+            decrypted.append(len(rows))
+            return export_lines(keys, rows)
+
+        with mock.patch.object(record_export, '_export_lines', side_effect=tracking):
+            chunks = export_patient_records(1, [self.key], batch_size=1, workers=1)
+            next(chunks)
+            # One worker keeps at most two batches pending
+            self.assertLessEqual(len(decrypted), 2)
+            self.assertEqual(len(list(chunks)), 7)
+
+
+class TestExportEndpoint(ExportDataMixin, unittest.TestCase):
+    """Tests for the record export endpoint"""
+
+    def setUp(self):
+        """Serve the records API with the test key and a small batch size"""
+        super().setUp()
+        keyring = mock.Mock(keys=[self.key])
+        self.log_records_access = mock.Mock()
+        for patcher in (
+            mock.patch.object(records_api, 'get_keyring', return_value=keyring),
+            mock.patch.object(records_api, 'log_records_access', self.log_records_access),
+            mock.patch.object(records_api, 'export_patient_records',
+                              functools.partial(export_patient_records, batch_size=3))
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+        app = Flask(__name__)
+        app.register_blueprint(records_api.records_blueprint)
+        self.client = app.test_client()
+
+    def export(self, user_id, role, **params):
+        token = generate_token(user_id, role)
+        return self.client.get('/api/v1/records/export', query_string=params,
+                               headers={'Authorization': f'Bearer {token}'})
+
+    def test_ndjson_stream(self):
+        """Test that a patient streams their own history and each batch is logged"""
+        response = self.export(1, 'patient')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.is_streamed)
+        self.assertEqual(response.mimetype, 'application/x-ndjson')
+        self.assertEqual(response.headers['Content-Disposition'], 'attachment; filename="records-1.ndjson"')
+        self.assertEqual(response.headers['Cache-Control'], 'no-store')
+
+        lines = [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+        self.assertEqual([line['record_id'] for line in lines],
+                         [f"record-{index}" for index in range(6, -1, -1)] + ['lost'])
+        self.assertEqual(lines[0]['data'], {'visit': 6})
+
+        calls = self.log_records_access.call_args_list
+        self.assertEqual([len(call.kwargs['record_ids']) for call in calls], [3, 3, 2])
+        self.assertEqual(sum((call.kwargs['record_ids'] for call in calls), []), [line['id'] for line in lines])
+        self.assertTrue(all(call.kwargs['user_id'] == 1 and call.kwargs['action'] == 'view' for call in calls))
+
+    def test_gzip_stream(self):
+        """Test that a doctor gets the same history gzipped"""
+        plain = self.export(1, 'patient').get_data()
+        response = self.export(3, 'doctor', patient_id=1, format='gzip')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.mimetype, 'application/gzip')
+        self.assertEqual(response.headers['Content-Disposition'], 'attachment; filename="records-1.ndjson.gz"')
+        self.assertEqual(gzip.decompress(response.get_data()), plain)
+        self.assertTrue(all(call.kwargs['user_id'] == 3 for call in self.log_records_access.call_args_list[3:]))
+
+    def test_rejected_requests(self):
+        """Test that other patients, missing patients and unknown formats are refused before streaming"""
+        response = self.export(2, 'patient', patient_id=1)
+        self.assertEqual(response.status_code, 403)
+
+        response = self.export(3, 'doctor')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.get_json(), {'error': 'Patient ID required'})
+
+        response = self.export(1, 'patient', format='csv')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.get_json(), {'error': 'Invalid format'})
+
+        self.assertEqual(self.client.get('/api/v1/records/export').status_code, 401)
+        self.log_records_access.assert_not_called()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,164 @@
+"""
+Unit tests for MedBlock bulk record import
+
+This module contains unit tests for importing NDJSON and CSV record dumps,
+including rejected rows and resuming an interrupted import.
+"""
+
+import os
+import csv
+import sys
+import gzip
+import json
+import shutil
+import hashlib
+import tempfile
+import unittest
+from unittest import mock
+
+# Add parent directory to path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from cryptography.fernet import Fernet
+from sqlalchemy import create_engine
+from sqlalchemy.pool import StaticPool
+
+from database.models import Base, Session, User, MedicalRecord
+from utils import record_import
+from utils.record_import import import_records
+
+
+def make_row(index, **overrides):
+    row = {
+        'patient_id': 1,
+        'provider_id': 2,
+        'record_type': 'lab_result',
+        'recorded_at': f"2024-01-{index + 1:02d}T08:30:00",
+        'data': {'test': 'glucose', 'value': index}
+    }
+    row.update(overrides)
+    return row
+
+
+class TestRecordImport(unittest.TestCase):
+    """Tests for the bulk import"""
+
+    def setUp(self):
+        """Bind the session to an in-memory database with a patient and a provider"""
+        self.engine = create_engine('sqlite://', poolclass=StaticPool,
+                                    connect_args={'check_same_thread': False})
+        Base.metadata.create_all(self.engine)
+        Session.remove()
+        Session.configure(bind=self.engine)
+
+        session = Session()
+        for username, role in (('patient', 'patient'), ('doctor', 'doctor')):
+            session.add(User(username=username, email=f"{username}@example.com", password_hash='hash',
+                             first_name=username.capitalize(), last_name='Test', role=role))
+        session.commit()
+        Session.remove()
+
+        self.temp_dir = tempfile.mkdtemp()
+        self.key = Fernet.generate_key()
+        self.anchorer = mock.Mock()
+
+    def tearDown(self):
+        """Drop the in-memory database"""
+        Session.remove()
+        self.engine.dispose()
+        shutil.rmtree(self.temp_dir)
+
+    def write_ndjson(self, lines):
+        path = os.path.join(self.temp_dir, 'records.ndjson')
+        with open(path, 'w') as f:
+            for line in lines:
+                f.write((line if isinstance(line, str) else json.dumps(line)) + '\n')
+        return path
+
+    def records(self):
+        session = Session()
+        try:
+            return session.query(MedicalRecord).order_by(MedicalRecord.recorded_at).all()
+        finally:
+            Session.remove()
+
+    def test_ndjson_import(self):
+        """Test that valid rows are encrypted, hashed, inserted and queued for anchoring"""
+        path = self.write_ndjson([
+            make_row(0), make_row(1), '{not json', make_row(2, record_type='horoscope'),
+            make_row(3), make_row(4, recorded_at='yesterday'), make_row(5, institution='General')
+        ])
+        summary = import_records(path, self.key, chunk_size=3, workers=0, anchorer=self.anchorer)
+
+        self.assertEqual(summary['imported'], 4)
+        self.assertEqual(summary['failed'], [3, 4, 6])
+        self.assertEqual(summary['last_row'], 7)
+
+        records = self.records()
+        self.assertEqual([record.decrypt_data(self.key)['value'] for record in records], [0, 1, 3, 5])
+        self.assertEqual(records[0].data_hash,
+                         hashlib.sha256(json.dumps(make_row(0)['data']).encode()).hexdigest())
+        self.assertEqual(records[-1].institution, 'General')
+        self.assertTrue(all(record.is_active for record in records))
+
+        queued = sorted(call.args for call in self.anchorer.add.call_args_list)
+        self.assertEqual(queued, sorted((record.id, record.data_hash) for record in records))
+
+    def test_unknown_users_rejected(self):
+        """Test that rows naming a missing patient or provider fail without stopping the import"""
+        path = self.write_ndjson([
+            make_row(0), make_row(1, patient_id=99), make_row(2, provider_id=98),
+            make_row(3, record_id='same'), make_row(4, record_id='same'), make_row(5)
+        ])
+        summary = import_records(path, self.key, chunk_size=10, workers=0, anchorer=self.anchorer)
+
+        self.assertEqual(summary['imported'], 3)
+        self.assertEqual(summary['failed'], [2, 3, 5])
+        self.assertEqual([record.decrypt_data(self.key)['value'] for record in self.records()], [0, 3, 5])
+
+    def test_gzipped_csv_with_workers(self):
+        """Test a gzipped CSV dump prepared in worker processes"""
+        path = os.path.join(self.temp_dir, 'records.csv.gz')
+        with gzip.open(path, 'wt', newline='') as f:
+            writer = csv.DictWriter(f, fieldnames=['patient_id', 'provider_id', 'record_type', 'recorded_at', 'data'])
+            writer.writeheader()
+            for index in range(10):
+                row = make_row(index)
+                row['data'] = json.dumps(row['data'])
+                writer.writerow(row)
+
+        summary = import_records(path, self.key, chunk_size=4, workers=2, anchorer=self.anchorer)
+        self.assertEqual(summary['imported'], 10)
+        self.assertEqual(summary['failed'], [])
+        self.assertEqual(len(self.records()), 10)
+
+    def test_resume_after_interruption(self):
+        """Test that an interrupted import resumes without duplicating records"""
+        path = self.write_ndjson([make_row(index) for index in range(10)])
+        insert_chunk = record_import._insert_chunk
+        calls = []
+
+        def fail_on_third_chunk(records, anchorer):
+            calls.append(len(records))
+            if len(calls) == 3:
+                raise RuntimeError('interrupted')
+            return insert_chunk(records, anchorer)
+
+        with mock.patch.object(record_import, '_insert_chunk', side_effect=fail_on_third_chunk):
+            with self.assertRaises(RuntimeError):
+                import_records(path, self.key, chunk_size=3, workers=0, anchorer=self.anchorer)
+        self.assertEqual(len(self.records()), 6)
+
+        summary = import_records(path, self.key, chunk_size=3, workers=0, anchorer=self.anchorer)
+        self.assertEqual(summary['imported'], 10)
+        self.assertEqual(len(self.records()), 10)
+
+        # Without the checkpoint the rows are recognised as already imported
+        os.remove(f"{path}.import")
+        summary = import_records(path, self.key, chunk_size=3, workers=0, anchorer=self.anchorer)
+        self.assertEqual((summary['imported'], summary['skipped']), (0, 10))
+        self.assertEqual(len(self.records()), 10)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,189 @@
+"""
+Unit tests for MedBlock read replica routing
+
+This module contains unit tests for sending reads to a replica, using two
+SQLite files as the primary and the replica.
+"""
+
+import os
+import sys
+import shutil
+import sqlite3
+import datetime
+import tempfile
+import unittest
+
+# Add parent directory to path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from flask import Flask
+from sqlalchemy import text
+
+import database.models as models
+from database.models import Base, Session, User, replica_reads, init_app, set_session_user
+from database.models.connection import create_db_engine
+from database.models.routing import ReplicaSet, LAST_WRITE_COOKIE
+from utils.database import get_user_by_id, get_user_by_username
+
+
+class TestReplicaRouting(unittest.TestCase):
+    """Tests for routing reads between a primary and a replica"""
+
+    def setUp(self):
+        """Create a primary with one user and an up to date replica"""
+        self.temp_dir = tempfile.mkdtemp()
+        self.primary_path = os.path.join(self.temp_dir, 'primary.db')
+        self.replica_path = os.path.join(self.temp_dir, 'replica.db')
+        self.primary = create_db_engine(f"sqlite:///{self.primary_path}")
+        self.replica = create_db_engine(f"sqlite:///{self.replica_path}")
+        Base.metadata.create_all(self.primary)
+
+        self.replicas = ReplicaSet(self.primary, [self.replica], max_lag=5, check_interval=60)
+        Session.remove()
+        Session.configure(bind=self.primary, replicas=self.replicas)
+
+        self.first_id = self.add_user('first')
+        self.replicas.beat()
+        self.replicate()
+        self.replicas.check()
+
+    def tearDown(self):
+        """Restore the session and remove the databases"""
+        Session.remove()
+        Session.configure(bind=models.engine, replicas=models.replicas)
+        self.primary.dispose()
+        self.replica.dispose()
+        shutil.rmtree(self.temp_dir)
+
+    def add_user(self, username, by_user=None):
+        session = Session()
+        if by_user is not None:
+            set_session_user(by_user)
+        user = User(username=username, email=f"{username}@example.com", password_hash='hash',
+                    first_name=username.capitalize(), last_name='Test', role='patient')
+        session.add(user)
+        session.commit()
+        Session.remove()
+        return user.id
+
+    def replicate(self):
+        """Copy the primary into the replica file"""
+        self.replica.dispose()
+        source = sqlite3.connect(self.primary_path)
+        target = sqlite3.connect(self.replica_path)
+        try:
+            source.backup(target)
+        finally:
+            source.close()
+            target.close()
+
+    def test_reads_go_to_replica(self):
+        """Test that routed reads see the replica and other reads the primary"""
+        second_id = self.add_user('second')
+
+        self.assertIsNotNone(get_user_by_id(self.first_id))
+        # Not replicated yet
+        self.assertIsNone(get_user_by_id(second_id))
+        self.assertIsNotNone(get_user_by_username('second'))
+
+        self.replicate()
+        self.assertIsNotNone(get_user_by_id(second_id))
+
+    def test_lagging_replica_skipped(self):
+        """Test that a replica with an old heartbeat is not read from"""
+        second_id = self.add_user('second')
+        with self.replica.begin() as connection:
+            connection.execute(text("UPDATE replication_heartbeat SET beat_at = :beat_at"),
+                               {'beat_at': datetime.datetime.utcnow() - datetime.timedelta(seconds=60)})
+
+        self.assertEqual(self.replicas.check(), [])
+        self.assertGreater(self.replicas.lags[self.replica], 5)
+        self.assertIsNotNone(get_user_by_id(second_id))
+
+        # Catching up puts it back into rotation
+        self.replicate()
+        self.assertEqual(self.replicas.check(), [self.replica])
+
+    def test_reads_after_write_stay_on_primary(self):
+        """Test that a session reads its own writes"""
+        session = Session()
+        with replica_reads(session):
+            self.assertEqual(session.query(User).count(), 1)
+            session.add(User(username='third', email='third@example.com', password_hash='hash',
+                             first_name='Third', last_name='Test', role='patient'))
+            session.flush()
+            self.assertEqual(session.query(User).count(), 2)
+        session.rollback()
+        Session.remove()
+
+    def test_user_reads_held_after_write(self):
+        """Test that a user who just wrote reads from the primary until the lag has passed"""
+        second_id = self.add_user('second', by_user=self.first_id)
+
+        set_session_user(self.first_id)
+        self.assertIsNotNone(get_user_by_id(second_id))
+        Session.remove()
+
+        # Other users still read from the replica
+        set_session_user(12345)
+        self.assertIsNone(get_user_by_id(second_id))
+        Session.remove()
+
+        self.replicas.max_lag = 0
+        set_session_user(self.first_id)
+        self.assertIsNone(get_user_by_id(second_id))
+        Session.remove()
+
+    def test_last_write_cookie(self):
+        """Test that a client's reads after a write stay on the primary in another process"""
+        app = Flask(__name__)
+        init_app(app)
+
+        @app.route('/users/<username>', methods=['POST'])
+        def create(username):
+            session = Session()
+            user = User(username=username, email=f"{username}@example.com", password_hash='hash',
+                        first_name='New', last_name='Test', role='patient')
+            session.add(user)
+            session.commit()
+            return str(user.id)
+
+        @app.route('/users/<int:user_id>')
+        def read(user_id):
+            return 'found' if get_user_by_id(user_id) else 'missing'
+
+        client = app.test_client()
+        response = client.post('/users/second')
+        second_id = int(response.get_data(as_text=True))
+        self.assertIn(LAST_WRITE_COOKIE, response.headers['Set-Cookie'])
+        self.assertIn('Max-Age=5', response.headers['Set-Cookie'])
+
+        # Another process knows nothing of the write but the client's cookie
+        self.replicas._last_writes.clear()
+        self.assertEqual(client.get(f'/users/{second_id}').get_data(as_text=True), 'found')
+        self.assertNotIn('Set-Cookie', client.get(f'/users/{second_id}').headers)
+
+        client.delete_cookie(LAST_WRITE_COOKIE)
+        self.assertEqual(client.get(f'/users/{second_id}').get_data(as_text=True), 'missing')
+
+    def test_failed_replica_falls_back(self):
+        """Test that a read failing on the replica is retried on the primary"""
+        with self.replica.begin() as connection:
+            connection.execute(text("DROP TABLE users"))
+
+        self.assertIsNotNone(get_user_by_id(self.first_id))
+        self.assertIsNone(self.replicas.choose())
+
+    def test_unreachable_replica(self):
+        """Test that an unreachable replica is never chosen"""
+        missing = create_db_engine(f"sqlite:///{os.path.join(self.temp_dir, 'missing', 'replica.db')}")
+        replicas = ReplicaSet(self.primary, [missing], max_lag=5, check_interval=60)
+        try:
+            self.assertIsNone(replicas.choose())
+            self.assertIsNone(replicas.lags[missing])
+        finally:
+            missing.dispose()
+
+
+if __name__ == '__main__':
+    unittest.main()
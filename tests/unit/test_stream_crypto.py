@@ -0,0 +1,112 @@
+"""
+Unit tests for MedBlock streaming attachment encryption
+
+This module contains unit tests for the chunked AES-GCM attachment format.
+"""
+
+import io
+import os
+import sys
+import hashlib
+import tempfile
+import unittest
+
+# Add parent directory to path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from utils.helpers import generate_encryption_key
+from utils.stream_crypto import (
+    encrypt_stream, decrypt_stream, EncryptedFile, StreamEncryptor, StreamDecryptionError, is_encrypted, TAG_SIZE
+)
+
+
+class TestStreamCrypto(unittest.TestCase):
+    """Tests for chunked attachment encryption"""
+
+    def setUp(self):
+        """Create a temporary directory and a master key"""
+        self.tempdir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tempdir.cleanup)
+        self.key = generate_encryption_key()
+        self.path = os.path.join(self.tempdir.name, 'scan.dcm')
+
+    def encrypt(self, data, chunk_size=100):
+        with open(self.path, 'wb') as f:
+            return encrypt_stream(io.BytesIO(data), f, self.key, chunk_size=chunk_size)
+
+    def decrypt(self, key=None):
+        output = io.BytesIO()
+        decrypt_stream(self.path, output, key or self.key)
+        return output.getvalue()
+
+    def test_round_trip(self):
+        """Test that files of every size relative to the chunk size decrypt to the original"""
+        for size in (0, 1, 99, 100, 101, 250, 300):
+            data = os.urandom(size)
+            result = self.encrypt(data)
+            self.assertEqual(result, {'size': size, 'sha256': hashlib.sha256(data).hexdigest()})
+            self.assertTrue(is_encrypted(self.path))
+            self.assertEqual(self.decrypt(), data)
+
+    def test_incremental_writes(self):
+        """Test that writes of any size seal the same chunks as encrypting a stream"""
+        data = os.urandom(300)
+        for write_size in (1, 37, 100, 300):
+            with open(self.path, 'wb') as f:
+                encryptor = StreamEncryptor(f, self.key, chunk_size=100)
+                for offset in range(0, len(data), write_size):
+                    encryptor.write(data[offset:offset + write_size])
+                result = encryptor.finish()
+            self.assertEqual(result, {'size': 300, 'sha256': hashlib.sha256(data).hexdigest()})
+            self.assertEqual(self.decrypt(), data)
+            with EncryptedFile(self.path, self.key) as encrypted:
+                self.assertEqual(encrypted.chunk_count, 3)
+
+    def test_older_key_decrypts(self):
+        """Test that an attachment stays readable after the master key is rotated"""
+        data = os.urandom(250)
+        self.encrypt(data)
+        self.assertEqual(self.decrypt([generate_encryption_key(), self.key]), data)
+
+        with self.assertRaises(StreamDecryptionError):
+            self.decrypt(generate_encryption_key())
+
+    def test_range_reads_touched_chunks(self):
+        """Test that a byte range only decrypts the chunks it covers"""
+        data = os.urandom(1000)
+        self.encrypt(data)
+
+        with EncryptedFile(self.path, self.key) as encrypted:
+            self.assertEqual(encrypted.size, 1000)
+            self.assertEqual(encrypted.chunk_count, 10)
+
+            read = []
+            original = encrypted.read_chunk
+            encrypted.read_chunk = lambda index: read.append(index) or original(index)
+
+            self.assertEqual(b''.join(encrypted.iter_range(250, 420)), data[250:421])
+            self.assertEqual(read, [2, 3, 4])
+            self.assertEqual(b''.join(encrypted.iter_range(990, 5000)), data[990:])
+
+    def test_tampering_detected(self):
+        """Test that modified and truncated files fail authentication"""
+        self.encrypt(os.urandom(250))
+        with open(self.path, 'rb') as f:
+            original = f.read()
+
+        tampered = bytearray(original)
+        tampered[-1] ^= 1
+        with open(self.path, 'wb') as f:
+            f.write(bytes(tampered))
+        with self.assertRaises(StreamDecryptionError):
+            self.decrypt()
+
+        # Dropping the final chunk leaves a chunk that was not sealed as the last one
+        with open(self.path, 'wb') as f:
+            f.write(original[:-(50 + TAG_SIZE)])
+        with self.assertRaises(StreamDecryptionError):
+            self.decrypt()
+
+
+if __name__ == '__main__':
+    unittest.main()
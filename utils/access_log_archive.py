@@ -0,0 +1,437 @@
+"""
+Access Log Partitioning and Archival for MedBlock
+
+This module keeps access_logs split by month and moves cold months out of
+the database into columnar segment files (see utils.log_segments).
+
+On PostgreSQL access_logs is partitioned by range of access_time (see
+migration v003) with one partition per month, access_logs_YYYYMM. On
+SQLite the access_logs table holds the current month, and rollover moves
+older rows into shard tables with the same names.
+
+The rollover job, run at least monthly:
+
+    1. creates the PostgreSQL partitions for the current and next month,
+       or moves SQLite rows older than the current month into shards
+    2. exports each partition or shard older than the retained months to
+       a segment, records it in the archive index and drops it
+
+The archive index (index.json in the archive directory) lists every
+segment with its time range, so query_access_logs reads only the
+segments that overlap the requested range.
+
+Run with:
+
+    python -m utils.access_log_archive rollover
+"""
+
+import os
+import re
+import sys
+import json
+import logging
+import argparse
+import datetime
+
+# Add parent directory to path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import MetaData, Table, Column, Index, inspect, select, func, text, union_all
+
+from database.models import AccessLog
+from utils.log_segments import SegmentWriter, Segment
+from config.config import ACCESS_LOG_ARCHIVE_DIR, ACCESS_LOG_RETAIN_MONTHS
+
+# Set up logger
+logger = logging.getLogger(__name__)
+
+PARTITION_PATTERN = re.compile(r'^access_logs_(\d{4})(\d{2})$')
+INDEX_FILE = 'index.json'
+COLUMNS = [column.name for column in AccessLog.__table__.columns]
+
+
+def month_start(value):
+    """Return the first moment of the month containing a time"""
+    return datetime.datetime(value.year, value.month, 1)
+
+
+def add_months(month, count):
+    """Return the start of the month count months after another"""
+    index = month.year * 12 + month.month - 1 + count
+    return datetime.datetime(index // 12, index % 12 + 1, 1)
+
+
+def partition_name(month):
+    """Return the name of a month's partition or shard"""
+    return f"access_logs_{month:%Y%m}"
+
+
+def _is_postgresql(connection):
+    return connection.dialect.name == 'postgresql'
+
+
+def _shard_table(name):
+    """Build a SQLite shard table with the access_logs columns"""
+    # Shards are read-only copies, so they keep only the time index
+    columns = [
+        Column(column.name, column.type, primary_key=column.primary_key, nullable=column.nullable)
+        for column in AccessLog.__table__.columns
+    ]
+    return Table(name, MetaData(), *columns, Index(f"ix_{name}_access_time", 'access_time'))
+
+
+def list_partitions(connection):
+    """
+    List the monthly partitions or shards of access_logs
+
+    Args:
+        connection (Connection): Database connection
+
+    Returns:
+        list: (month start, table name) tuples in month order
+    """
+    if _is_postgresql(connection):
+        names = connection.execute(text(
+            "SELECT child.relname FROM pg_inherits "
+            "JOIN pg_class child ON child.oid = pg_inherits.inhrelid "
+            "JOIN pg_class parent ON parent.oid = pg_inherits.inhparent "
+            "WHERE parent.relname = 'access_logs'"
+        )).scalars()
+    else:
+        names = inspect(connection).get_table_names()
+
+    partitions = []
+    for name in names:
+        match = PARTITION_PATTERN.match(name)
+        if match:
+            partitions.append((datetime.datetime(int(match.group(1)), int(match.group(2)), 1), name))
+    return sorted(partitions)
+
+
+def create_month_partition(connection, month):
+    """
+    Create the partition or shard for a month if it does not exist
+
+    Args:
+        connection (Connection): Database connection
+        month (datetime): Start of the month
+
+    Returns:
+        str: Table name
+    """
+    name = partition_name(month)
+    if _is_postgresql(connection):
+        connection.execute(text(
+            f"CREATE TABLE IF NOT EXISTS {name} PARTITION OF access_logs "
+            f"FOR VALUES FROM ('{month.isoformat()}') TO ('{add_months(month, 1).isoformat()}')"
+        ))
+    else:
+        _shard_table(name).create(connection, checkfirst=True)
+    return name
+
+
+def move_to_shards(connection, before):
+    """
+    Move SQLite access logs older than a month start into monthly shards
+
+    Args:
+        connection (Connection): Database connection
+        before (datetime): Start of the oldest month left in access_logs
+
+    Returns:
+        int: Number of rows moved
+    """
+    hot = AccessLog.__table__
+    oldest = connection.execute(select(func.min(hot.c.access_time)).where(hot.c.access_time < before)).scalar()
+    if oldest is None:
+        return 0
+
+    moved = 0
+    month = month_start(oldest)
+    while month < before:
+        in_month = (hot.c.access_time >= month) & (hot.c.access_time < add_months(month, 1))
+        if connection.execute(select(func.count()).select_from(hot).where(in_month)).scalar():
+            shard = _shard_table(create_month_partition(connection, month))
+            connection.execute(shard.insert().from_select(COLUMNS, select(*hot.columns).where(in_month)))
+            moved += connection.execute(hot.delete().where(in_month)).rowcount
+        month = add_months(month, 1)
+    return moved
+
+
+def load_index(archive_dir):
+    """
+    Read the archive index
+
+    Args:
+        archive_dir (str): Archive directory
+
+    Returns:
+        list: Segment entries, oldest first
+    """
+    path = os.path.join(archive_dir, INDEX_FILE)
+    if not os.path.exists(path):
+        return []
+    with open(path, 'r') as f:
+        return json.load(f)['segments']
+
+
+def _save_index(archive_dir, segments):
+    """Replace the archive index"""
+    path = os.path.join(archive_dir, INDEX_FILE)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump({'segments': segments}, f, indent=2)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+def _drop_partition(connection, name):
+    """Remove an archived partition or shard"""
+    if _is_postgresql(connection):
+        connection.execute(text(f"ALTER TABLE access_logs DETACH PARTITION {name}"))
+    connection.execute(text(f"DROP TABLE {name}"))
+
+
+def archive_partition(engine, name, archive_dir=ACCESS_LOG_ARCHIVE_DIR):
+    """
+    Export a partition or shard to a segment and drop it
+
+    The partition is dropped only after its segment has been written,
+    read back and added to the index. If the job stopped after indexing,
+    the partition is recognised by its row count and ID range and dropped
+    without writing it again.
+
+    Args:
+        engine (Engine): Database engine
+        name (str): Partition or shard table name
+        archive_dir (str): Archive directory
+
+    Returns:
+        dict: Index entry of the segment, None if the partition was empty
+    """
+    os.makedirs(archive_dir, exist_ok=True)
+    table = Table(name, MetaData(), autoload_with=engine)
+    segments = load_index(archive_dir)
+
+    with engine.connect() as connection:
+        rows, min_id, max_id = connection.execute(
+            select(func.count(), func.min(table.c.id), func.max(table.c.id))
+        ).one()
+
+    entry = None
+    if rows:
+        entry = next((
+            segment for segment in segments
+            if segment['partition'] == name and segment['rows'] == rows
+            and segment['min_id'] == min_id and segment['max_id'] == max_id
+        ), None)
+
+    if rows and entry is None:
+        sequence = sum(1 for segment in segments if segment['partition'] == name) + 1
+        filename = f"{name}-{sequence}.seg"
+        path = os.path.join(archive_dir, filename)
+        if os.path.exists(path):
+            # Written but never indexed; segments are immutable, so start a new one
+            os.rename(path, f"{path}.orphaned")
+
+        with engine.connect() as connection:
+            result = connection.execution_options(stream_results=True, yield_per=10000).execute(
+                select(*[table.c[column] for column in COLUMNS]).order_by(table.c.access_time, table.c.id)
+            )
+            writer = SegmentWriter(path, COLUMNS, 'access_time')
+            try:
+                for row in result:
+                    writer.write(row)
+            except Exception:
+                writer.abort()
+                raise
+            summary = writer.close()
+
+        written = Segment(path).rows
+        if written != rows:
+            raise RuntimeError(f"Segment {path} has {written} rows, {name} has {rows}")
+
+        entry = {
+            'file': filename,
+            'partition': name,
+            'rows': rows,
+            'min_id': min_id,
+            'max_id': max_id,
+            'min_time': summary['min_time'],
+            'max_time': summary['max_time'],
+            'sha256': summary['sha256']
+        }
+        segments.append(entry)
+        _save_index(archive_dir, segments)
+        logger.info(f"Archived {rows} access logs from {name} to {filename}")
+
+    with engine.begin() as connection:
+        _drop_partition(connection, name)
+    return entry
+
+
+def rollover(engine=None, archive_dir=ACCESS_LOG_ARCHIVE_DIR, retain_months=ACCESS_LOG_RETAIN_MONTHS, now=None):
+    """
+    Prepare the coming partitions and archive the cold ones
+
+    Args:
+        engine (Engine, optional): Database engine, defaults to the application engine
+        archive_dir (str): Archive directory
+        retain_months (int): Whole months before the current one kept in the database
+        now (datetime, optional): Current time, defaults to now
+
+    Returns:
+        dict: rows moved to shards and index entries of the archived segments
+    """
+    if engine is None:
+        from database.models import engine
+
+    current = month_start(now or datetime.datetime.utcnow())
+    moved = 0
+    with engine.begin() as connection:
+        if _is_postgresql(connection):
+            for month in (current, add_months(current, 1)):
+                create_month_partition(connection, month)
+        else:
+            moved = move_to_shards(connection, current)
+            if moved:
+                logger.info(f"Moved {moved} access logs into monthly shards")
+
+    with engine.connect() as connection:
+        partitions = list_partitions(connection)
+
+    cutoff = add_months(current, -retain_months)
+    archived = []
+    for month, name in partitions:
+        if add_months(month, 1) <= cutoff:
+            entry = archive_partition(engine, name, archive_dir)
+            if entry:
+                archived.append(entry)
+
+    return {'moved': moved, 'archived': archived}
+
+
+def query_access_logs(start, end, record_id=None, user_id=None, engine=None, archive_dir=ACCESS_LOG_ARCHIVE_DIR):
+    """
+    Get the access logs in a time range from the database and the archive
+
+    Only the SQLite shards and archived segments overlapping the range are
+    read; PostgreSQL prunes the partitions itself.
+
+    Args:
+        start (datetime): Earliest access time, inclusive
+        end (datetime): Latest access time, exclusive
+        record_id (int, optional): Only accesses to this record
+        user_id (int, optional): Only accesses by this user
+        engine (Engine, optional): Database engine, defaults to the application engine
+        archive_dir (str): Archive directory
+
+    Returns:
+        list: Access logs as dicts, ordered by access time
+    """
+    if engine is None:
+        from database.models import engine
+
+    def matches(row):
+        return ((record_id is None or row['record_id'] == record_id)
+                and (user_id is None or row['user_id'] == user_id))
+
+    logs = []
+    with engine.connect() as connection:
+        tables = [AccessLog.__table__]
+        if not _is_postgresql(connection):
+            tables += [
+                _shard_table(name) for month, name in list_partitions(connection)
+                if month < end and add_months(month, 1) > start
+            ]
+        for table in tables:
+            query = select(*[table.c[column] for column in COLUMNS]).where(
+                table.c.access_time >= start, table.c.access_time < end
+            )
+            if record_id is not None:
+                query = query.where(table.c.record_id == record_id)
+            if user_id is not None:
+                query = query.where(table.c.user_id == user_id)
+            logs.extend(row._asdict() for row in connection.execute(query))
+
+    for segment in load_index(archive_dir):
+        if (datetime.datetime.fromisoformat(segment['min_time']) < end
+                and datetime.datetime.fromisoformat(segment['max_time']) >= start):
+            reader = Segment(os.path.join(archive_dir, segment['file']))
+            logs.extend(row for row in reader.read(start, end) if matches(row))
+
+    logs.sort(key=lambda log: (log['access_time'], log['id']))
+    return logs
+
+
+def latest_access_logs(session, limit, where=None):
+    """
+    Get the latest access logs still in the database
+
+    On PostgreSQL access_logs covers its partitions; on SQLite the retained
+    shards are read along with it, so both return the same rows. Archived
+    months are only read by query_access_logs.
+
+    Args:
+        session (Session): Session to read with
+        limit (int): Maximum number of logs to return
+        where (callable, optional): Returns the filter clause for a table
+            with the access_logs columns
+
+    Returns:
+        list: AccessLog objects, newest first
+    """
+    hot = AccessLog.__table__
+    connection = session.connection(bind_arguments={'clause': select(hot)})
+    tables = [hot]
+    if not _is_postgresql(connection):
+        tables += [_shard_table(name) for month, name in reversed(list_partitions(connection))]
+
+    # Each table returns its own latest rows from its time index before they are merged
+    branches = []
+    for table in tables:
+        query = select(*[table.c[column] for column in COLUMNS])
+        if where is not None:
+            query = query.where(where(table))
+        branches.append(query.order_by(table.c.access_time.desc()).limit(limit))
+
+    if len(branches) == 1:
+        statement = branches[0]
+    else:
+        merged = union_all(*[select(branch.subquery()) for branch in branches]).subquery()
+        statement = select(merged).order_by(merged.c.access_time.desc()).limit(limit)
+    return session.query(AccessLog).from_statement(statement).all()
+
+
+def main(argv=None):
+    """Command line entry point"""
+    parser = argparse.ArgumentParser(description='Partition and archive MedBlock access logs')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    rollover_parser = subparsers.add_parser('rollover', help='Create partitions and archive cold months')
+    rollover_parser.add_argument('--archive-dir', default=ACCESS_LOG_ARCHIVE_DIR, help='Segment directory')
+    rollover_parser.add_argument('--retain-months', type=int, default=ACCESS_LOG_RETAIN_MONTHS,
+                                 help='Whole months kept in the database')
+
+    query_parser = subparsers.add_parser('query', help='Print the access logs in a time range as JSON lines')
+    query_parser.add_argument('--from', dest='start', required=True, type=datetime.datetime.fromisoformat)
+    query_parser.add_argument('--to', dest='end', required=True, type=datetime.datetime.fromisoformat)
+    query_parser.add_argument('--record-id', type=int)
+    query_parser.add_argument('--user-id', type=int)
+    query_parser.add_argument('--archive-dir', default=ACCESS_LOG_ARCHIVE_DIR, help='Segment directory')
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    if args.command == 'rollover':
+        result = rollover(archive_dir=args.archive_dir, retain_months=args.retain_months)
+        logger.info(f"Moved {result['moved']} rows, archived {len(result['archived'])} partitions")
+    else:
+        for log in query_access_logs(args.start, args.end, record_id=args.record_id,
+                                     user_id=args.user_id, archive_dir=args.archive_dir):
+            print(json.dumps(log, default=str))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,435 @@
+"""
+Batch Anchoring Utilities for MedBlock
+
+This module collects medical record data hashes over a time or size window
+and anchors each window on the blockchain as a single Merkle root. The
+inclusion proof of every record is stored in the database. Anchor
+transactions are confirmed in the background and the records are updated
+once their receipt arrives.
+"""
+
+import os
+import sys
+import json
+import time
+import logging
+import datetime
+import threading
+
+from sqlalchemy import or_
+
+# Add parent directory to path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database.models import Session, MedicalRecord, AnchorBatch, RecordProof
+from utils.merkle import MerkleTree
+from utils.helpers import generate_unique_id
+from config.config import (
+    BLOCKCHAIN_PROVIDER, BLOCKCHAIN_ACCOUNT_ADDRESS, BLOCKCHAIN_PRIVATE_KEY,
+    ANCHOR_BATCH_SIZE, ANCHOR_BATCH_INTERVAL
+)
+
+# Set up logger
+logger = logging.getLogger(__name__)
+
+# Map transaction result statuses to batch statuses
+BATCH_STATUSES = {
+    'success': 'confirmed',
+    'failed': 'failed',
+    'pending': 'pending',
+    'simulated': 'simulated'
+}
+
+
+class BatchAnchorer:
+    """
+    Collects record data hashes and anchors them as Merkle batches
+
+    A batch is flushed from a background thread when it reaches
+    max_batch_size records or when max_wait seconds have passed since its
+    first record was added, whichever comes first.
+    """
+
+    def __init__(self, anchor_fn, max_batch_size=ANCHOR_BATCH_SIZE, max_wait=ANCHOR_BATCH_INTERVAL):
+        """
+        Initialize the anchorer
+
+        Args:
+            anchor_fn (callable): Called with a hex Merkle root, returns a dict
+                with 'transaction_hash', 'status' and optionally 'block_number'
+            max_batch_size (int): Number of records that triggers a flush
+            max_wait (float): Seconds after the first record that trigger a flush
+        """
+        self.anchor_fn = anchor_fn
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+
+        self._pending = {}  # record ID -> data hash, in arrival order
+        self._first_added = None
+        self._condition = threading.Condition()
+        self._running = False
+        self._thread = None
+
+    def add(self, record_id, data_hash):
+        """
+        Queue a record for the next batch
+
+        Args:
+            record_id (int): Database ID of the medical record
+            data_hash (str): Hex-encoded SHA-256 hash of the record data
+        """
+        with self._condition:
+            # A newer hash for the same record replaces the queued one
+            self._pending.pop(record_id, None)
+            self._pending[record_id] = data_hash
+            if self._first_added is None:
+                self._first_added = time.monotonic()
+            if len(self._pending) >= self.max_batch_size:
+                self._condition.notify()
+
+    def requeue_unanchored(self):
+        """
+        Queue the active records whose current data hash is not anchored
+
+        The queue lives in memory, so records added shortly before a crash
+        or restart would otherwise never be anchored. Records whose anchor
+        transaction reverted are queued again as well.
+
+        Returns:
+            int: Number of records queued
+        """
+        records = unanchored_records()
+        for record_id, data_hash in records:
+            self.add(record_id, data_hash)
+        if records:
+            logger.info(f"Queued {len(records)} records left unanchored by an earlier run")
+        return len(records)
+
+    def pending_count(self):
+        """Return the number of records waiting to be anchored"""
+        with self._condition:
+            return len(self._pending)
+
+    def start(self):
+        """Start the background flush thread"""
+        with self._condition:
+            if self._running:
+                return
+            self._running = True
+        self._thread = threading.Thread(target=self._run, name='batch-anchorer', daemon=True)
+        self._thread.start()
+
+    def stop(self, flush=True):
+        """
+        Stop the background flush thread
+
+        Args:
+            flush (bool): Anchor any records still queued before returning
+        """
+        with self._condition:
+            self._running = False
+            self._condition.notify()
+        if self._thread:
+            self._thread.join()
+            self._thread = None
+        if flush:
+            self.flush()
+
+    def _batch_due(self):
+        """Return True if the queued records should be anchored now"""
+        if not self._pending:
+            return False
+        if len(self._pending) >= self.max_batch_size:
+            return True
+        return time.monotonic() - self._first_added >= self.max_wait
+
+    def _time_left(self):
+        """Return the seconds until the current window closes, or None if empty"""
+        if self._first_added is None:
+            return None
+        return max(0.0, self.max_wait - (time.monotonic() - self._first_added))
+
+    def _run(self):
+        """Flush batches as they become due"""
+        while True:
+            with self._condition:
+                while self._running and not self._batch_due():
+                    self._condition.wait(timeout=self._time_left())
+                if not self._running:
+                    return
+            try:
+                self.flush()
+            except Exception as e:
+                logger.error(f"Error anchoring batch: {str(e)}")
+                # Back off before retrying the requeued records
+                with self._condition:
+                    self._condition.wait(timeout=self.max_wait)
+
+    def flush(self):
+        """
+        Anchor all queued records now
+
+        Returns:
+            dict: Summary of the anchored batch, or None if nothing was queued
+        """
+        with self._condition:
+            if not self._pending:
+                return None
+            batch = list(self._pending.items())
+            self._pending = {}
+            self._first_added = None
+
+        try:
+            return self._anchor(batch)
+        except Exception:
+            # Requeue the batch, keeping any newer hash queued in the meantime
+            with self._condition:
+                for record_id, data_hash in batch:
+                    self._pending.setdefault(record_id, data_hash)
+                if self._first_added is None:
+                    self._first_added = time.monotonic()
+            raise
+
+    def _anchor(self, batch):
+        """
+        Anchor one batch and store its proofs
+
+        Args:
+            batch (list): (record_id, data_hash) pairs
+
+        Returns:
+            dict: Summary of the anchored batch
+        """
+        record_ids = [record_id for record_id, _ in batch]
+        tree = MerkleTree([data_hash for _, data_hash in batch])
+
+        result = self.anchor_fn(tree.root)
+        transaction_id = result['transaction_hash']
+        block_number = result.get('block_number')
+        status = BATCH_STATUSES.get(result.get('status'), 'pending')
+
+        session = Session()
+        try:
+            # Re-anchoring the records of a reverted batch yields the same root
+            anchor_batch = session.query(AnchorBatch).filter(AnchorBatch.merkle_root == tree.root).first()
+            if anchor_batch is None:
+                anchor_batch = AnchorBatch(merkle_root=tree.root)
+                session.add(anchor_batch)
+            anchor_batch.leaf_count = len(tree)
+            anchor_batch.transaction_id = transaction_id
+            anchor_batch.block_number = block_number
+            anchor_batch.status = status
+            anchor_batch.anchored_at = datetime.datetime.utcnow()
+            session.flush()
+
+            # Replace any proof from an earlier version of the record
+            session.query(RecordProof).filter(
+                RecordProof.record_id.in_(record_ids)
+            ).delete(synchronize_session=False)
+
+            session.bulk_insert_mappings(RecordProof, [
+                {
+                    'record_id': record_id,
+                    'batch_id': anchor_batch.id,
+                    'data_hash': data_hash,
+                    'leaf_index': index,
+                    'proof': json.dumps(tree.proof(index))
+                }
+                for index, (record_id, data_hash) in enumerate(batch)
+            ])
+
+            session.query(MedicalRecord).filter(
+                MedicalRecord.id.in_(record_ids)
+            ).update({
+                MedicalRecord.transaction_id: transaction_id,
+                MedicalRecord.block_number: block_number,
+                MedicalRecord.confirmation_status: status
+            }, synchronize_session=False)
+
+            session.commit()
+
+            # Records are confirmed once the receipt arrives
+            if result.get('pending') is not None:
+                watch_confirmation(transaction_id, result['pending'].receipt_future)
+
+            logger.info(f"Anchored {len(tree)} records under root {tree.root} in transaction {transaction_id}")
+            return {
+                'batch_id': anchor_batch.id,
+                'merkle_root': tree.root,
+                'leaf_count': len(tree),
+                'transaction_id': transaction_id,
+                'block_number': block_number,
+                'status': status
+            }
+        except Exception as e:
+            session.rollback()
+            raise e
+        finally:
+            session.close()
+
+
+def confirm_transaction(transaction_id, receipt):
+    """
+    Record the receipt of an anchor transaction
+
+    Updates the anchored batch and every record anchored by the transaction.
+
+    Args:
+        transaction_id (str): Hash of the anchor transaction
+        receipt (dict): Transaction receipt
+    """
+    status = 'confirmed' if receipt['status'] == 1 else 'failed'
+    block_number = receipt['blockNumber']
+
+    session = Session()
+    try:
+        session.query(AnchorBatch).filter(
+            AnchorBatch.transaction_id == transaction_id
+        ).update({
+            AnchorBatch.block_number: block_number,
+            AnchorBatch.status: status
+        }, synchronize_session=False)
+
+        updated = session.query(MedicalRecord).filter(
+            MedicalRecord.transaction_id == transaction_id
+        ).update({
+            MedicalRecord.block_number: block_number,
+            MedicalRecord.confirmation_status: status
+        }, synchronize_session=False)
+
+        session.commit()
+        logger.info(f"Anchor transaction {transaction_id} {status} in block {block_number} for {updated} records")
+    except Exception as e:
+        session.rollback()
+        raise e
+    finally:
+        session.close()
+
+
+def watch_confirmation(transaction_id, receipt_future):
+    """
+    Update the database when an anchor transaction receipt arrives
+
+    Args:
+        transaction_id (str): Hash of the anchor transaction
+        receipt_future (Future): Resolves to the transaction receipt
+    """
+    def on_receipt(future):
+        try:
+            confirm_transaction(transaction_id, future.result())
+        except Exception as e:
+            # The batch stays pending and is tracked again on the next start
+            logger.warning(f"Could not confirm anchor transaction {transaction_id}: {str(e)}")
+
+    receipt_future.add_done_callback(on_receipt)
+
+
+def unanchored_records():
+    """
+    Get active records without an anchored proof of their current data hash
+
+    A record counts as unanchored if it has no proof, its proof is for an
+    older data hash, or the transaction of its batch reverted.
+
+    Returns:
+        list: (record ID, data hash) pairs in ID order
+    """
+    session = Session()
+    try:
+        return [tuple(row) for row in session.query(MedicalRecord.id, MedicalRecord.data_hash).outerjoin(
+            RecordProof, RecordProof.record_id == MedicalRecord.id
+        ).outerjoin(
+            AnchorBatch, AnchorBatch.id == RecordProof.batch_id
+        ).filter(
+            MedicalRecord.is_active == True,
+            or_(RecordProof.id.is_(None), RecordProof.data_hash != MedicalRecord.data_hash,
+                AnchorBatch.status == 'failed')
+        ).order_by(MedicalRecord.id)]
+    finally:
+        session.close()
+
+
+def pending_anchor_transactions():
+    """
+    Get anchor transactions that are still waiting for a receipt
+
+    Returns:
+        list: Transaction hashes of pending batches
+    """
+    session = Session()
+    try:
+        return [row.transaction_id for row in session.query(AnchorBatch.transaction_id).filter(
+            AnchorBatch.status == 'pending'
+        )]
+    finally:
+        session.close()
+
+
+def simulated_anchor(merkle_root):
+    """
+    Stand-in anchor used when no blockchain account is configured
+
+    Args:
+        merkle_root (str): Hex-encoded Merkle root
+
+    Returns:
+        dict: Simulated transaction details
+    """
+    return {
+        'transaction_hash': f"tx_{generate_unique_id()}",
+        'block_number': None,
+        'status': 'simulated'
+    }
+
+
+def create_blockchain_anchor():
+    """
+    Create an anchor function that writes roots to the configured blockchain
+
+    Returns:
+        callable: Anchor function, or None if the blockchain is not available
+    """
+    if not BLOCKCHAIN_ACCOUNT_ADDRESS or not BLOCKCHAIN_PRIVATE_KEY:
+        return None
+
+    try:
+        from medblock.blockchain import BlockchainIntegration
+    except ImportError as e:
+        logger.warning(f"Blockchain integration unavailable, anchoring is simulated: {str(e)}")
+        return None
+
+    blockchain = BlockchainIntegration(provider_url=BLOCKCHAIN_PROVIDER)
+    if not blockchain.web3:
+        return None
+
+    # Pick up batches that were still unconfirmed when the process stopped
+    for transaction_id in pending_anchor_transactions():
+        watch_confirmation(transaction_id, blockchain.pipeline.poller.track(transaction_id))
+
+    def anchor(merkle_root):
+        return blockchain.anchor_root(BLOCKCHAIN_ACCOUNT_ADDRESS, BLOCKCHAIN_PRIVATE_KEY, merkle_root, wait=False)
+
+    return anchor
+
+
+_anchorer = None
+_anchorer_lock = threading.Lock()
+
+
+def get_batch_anchorer():
+    """
+    Get the process-wide batch anchorer, starting it on first use
+
+    Returns:
+        BatchAnchorer: Shared anchorer
+    """
+    global _anchorer
+    with _anchorer_lock:
+        if _anchorer is None:
+            _anchorer = BatchAnchorer(create_blockchain_anchor() or simulated_anchor)
+            try:
+                _anchorer.requeue_unanchored()
+            except Exception as e:
+                logger.error(f"Error queueing unanchored records: {str(e)}")
+            _anchorer.start()
+        return _anchorer
@@ -0,0 +1,364 @@
+"""
+Access Log Writer for MedBlock
+
+This module takes access log entries off the request path. Entries are
+appended to a journal file and queued in memory, then inserted in bulk from
+a background thread when a batch fills up or the flush interval elapses.
+A journal segment is deleted once its entries are committed, so entries
+survive a crash or a database outage and are replayed from the journal
+later. Replay is at-least-once: a crash between a commit and the segment
+deletion writes that batch twice. Entries the database rejects are moved to
+a dead-letter file in the journal directory so the rest still drains.
+"""
+
+import os
+import sys
+import json
+import time
+import atexit
+import logging
+import datetime
+import threading
+
+try:
+    import fcntl
+except ImportError:  # Windows, segments are then only replayed at startup
+    fcntl = None
+
+from sqlalchemy.exc import DataError, IntegrityError
+
+# Add parent directory to path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database.models import Session, AccessLog
+from config.config import AUDIT_BATCH_SIZE, AUDIT_FLUSH_INTERVAL, AUDIT_SPILL_DIR
+
+# Set up logger
+logger = logging.getLogger(__name__)
+
+SEGMENT_PREFIX = 'access-'
+SEGMENT_SUFFIX = '.jsonl'
+DEAD_LETTER_FILE = 'dead-letter.jsonl'
+
+
+def _lock(fd, blocking=True):
+    """Take an exclusive lock on a journal segment, returns False if it is held"""
+    if fcntl is None:
+        return True
+    try:
+        fcntl.flock(fd, fcntl.LOCK_EX if blocking else fcntl.LOCK_EX | fcntl.LOCK_NB)
+        return True
+    except OSError:
+        return False
+
+
+def insert_entries(entries):
+    """
+    Insert access log entries in one bulk insert
+
+    Args:
+        entries (list): Access log column dictionaries
+    """
+    session = Session()
+    try:
+        session.bulk_insert_mappings(AccessLog, entries)
+        session.commit()
+    except Exception as e:
+        session.rollback()
+        raise e
+    finally:
+        session.close()
+
+
+class AuditWriter:
+    """
+    Journals access log entries and inserts them in batches
+
+    Each process writes its own journal segment and holds a lock on it, so
+    segments left behind by a failed flush or a dead process can be
+    replayed by any writer sharing the journal directory.
+    """
+
+    def __init__(self, journal_dir=AUDIT_SPILL_DIR, max_batch_size=AUDIT_BATCH_SIZE,
+                 max_wait=AUDIT_FLUSH_INTERVAL):
+        """
+        Initialize the writer
+
+        Args:
+            journal_dir (str): Directory for journal segments, created if missing
+            max_batch_size (int): Number of queued entries that triggers a flush
+            max_wait (float): Seconds after the first queued entry that trigger a flush
+        """
+        self.journal_dir = journal_dir
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+        os.makedirs(journal_dir, exist_ok=True)
+
+        self._pending = []
+        self._first_added = None
+        self._fd = None
+        self._segment = None
+        self._condition = threading.Condition()
+        self._flush_lock = threading.Lock()
+        self._running = False
+        self._thread = None
+
+    def _open_segment(self):
+        """Start a new journal segment"""
+        self._segment = os.path.join(
+            self.journal_dir, f"{SEGMENT_PREFIX}{time.time_ns()}-{os.getpid()}{SEGMENT_SUFFIX}"
+        )
+        self._fd = os.open(self._segment, os.O_WRONLY | os.O_CREAT | os.O_APPEND, 0o600)
+        _lock(self._fd)
+
+    def log(self, record_id, user_id, action, ip_address=None, user_agent=None, is_authorized=True, **kwargs):
+        """
+        Queue an access log entry
+
+        Args:
+            record_id (int): ID of the accessed record
+            user_id (int): ID of the user accessing the record
+            action (str): Action performed (view, create, update, delete)
+            ip_address (str, optional): IP address of the request
+            user_agent (str, optional): User agent of the request
+            is_authorized (bool): Whether the access was authorized
+            **kwargs: Additional access log fields, such as anomaly_score
+        """
+        self.log_many([record_id], user_id, action, ip_address, user_agent, is_authorized, **kwargs)
+
+    def log_many(self, record_ids, user_id, action, ip_address=None, user_agent=None, is_authorized=True, **kwargs):
+        """
+        Queue access log entries for several records
+
+        Args:
+            record_ids (list): IDs of the accessed records
+            user_id (int): ID of the user accessing the records
+            action (str): Action performed (view, create, update, delete)
+            ip_address (str, optional): IP address of the request
+            user_agent (str, optional): User agent of the request
+            is_authorized (bool): Whether the access was authorized
+            **kwargs: Additional access log fields, such as anomaly_score
+        """
+        if not record_ids:
+            return
+        access_time = datetime.datetime.utcnow()
+        entries = [
+            dict(kwargs, record_id=record_id, user_id=user_id, action=action, ip_address=ip_address,
+                 user_agent=user_agent, is_authorized=is_authorized, access_time=access_time)
+            for record_id in record_ids
+        ]
+        lines = ''.join(json.dumps(entry, default=datetime.datetime.isoformat) + '\n' for entry in entries)
+
+        with self._condition:
+            if self._fd is None:
+                self._open_segment()
+            # One unbuffered append, the entries reach the OS before the request continues
+            os.write(self._fd, lines.encode())
+            self._pending.extend(entries)
+            if self._first_added is None:
+                self._first_added = time.monotonic()
+            if len(self._pending) >= self.max_batch_size:
+                self._condition.notify()
+
+    def pending_count(self):
+        """Return the number of entries waiting to be inserted"""
+        with self._condition:
+            return len(self._pending)
+
+    def start(self):
+        """Start the background flush thread, replaying segments left by earlier runs"""
+        with self._condition:
+            if self._running:
+                return
+            self._running = True
+        try:
+            self.replay()
+        except Exception as e:
+            logger.error(f"Error replaying access log journal: {str(e)}")
+        self._thread = threading.Thread(target=self._run, name='audit-writer', daemon=True)
+        self._thread.start()
+
+    def stop(self, flush=True):
+        """
+        Stop the background flush thread
+
+        Args:
+            flush (bool): Insert any entries still queued before returning;
+                entries that cannot be inserted stay in the journal
+        """
+        with self._condition:
+            self._running = False
+            self._condition.notify()
+        if self._thread:
+            self._thread.join()
+            self._thread = None
+        if flush:
+            try:
+                self.flush()
+            except Exception as e:
+                logger.error(f"Access log entries kept in the journal: {str(e)}")
+
+    def _batch_due(self):
+        """Return True if the queued entries should be inserted now"""
+        if not self._pending:
+            return False
+        if len(self._pending) >= self.max_batch_size:
+            return True
+        return time.monotonic() - self._first_added >= self.max_wait
+
+    def _time_left(self):
+        """Return the seconds until the current window closes, or None if empty"""
+        if self._first_added is None:
+            return None
+        return max(0.0, self.max_wait - (time.monotonic() - self._first_added))
+
+    def _run(self):
+        """Flush batches as they become due and retry kept segments after a failure"""
+        retry = False
+        while True:
+            with self._condition:
+                while self._running and not self._batch_due():
+                    timeout = self._time_left()
+                    if retry and timeout is None:
+                        timeout = self.max_wait
+                    if not self._condition.wait(timeout=timeout) and retry and not self._pending:
+                        break
+                if not self._running:
+                    return
+            try:
+                self.flush()
+                self.replay()
+                retry = False
+            except Exception as e:
+                # The entries are safe in the journal, retried after max_wait
+                logger.error(f"Error writing access logs: {str(e)}")
+                retry = True
+
+    def flush(self):
+        """
+        Insert all queued entries now
+
+        The journal segment holding the entries is swapped for a fresh one
+        and removed once the insert is committed. If the insert fails the
+        segment is kept and replayed later.
+
+        Returns:
+            int: Number of entries inserted
+        """
+        with self._flush_lock:
+            with self._condition:
+                if not self._pending:
+                    return 0
+                entries, self._pending = self._pending, []
+                self._first_added = None
+                fd, segment = self._fd, self._segment
+                self._fd = self._segment = None
+
+            try:
+                insert_entries(entries)
+                os.remove(segment)
+            finally:
+                # Closing releases the lock, a kept segment becomes replayable
+                os.close(fd)
+            return len(entries)
+
+    def _insert_segment(self, name, entries):
+        """
+        Insert the entries of a replayed segment
+
+        If the database rejects the batch, the entries are inserted one by
+        one and those rejected again are appended to the dead-letter file.
+        Any other error, such as an outage, is raised and the segment kept.
+
+        Args:
+            name (str): Segment file name
+            entries (list): Access log column dictionaries
+
+        Returns:
+            int: Number of entries inserted
+        """
+        try:
+            insert_entries(entries)
+            return len(entries)
+        except (IntegrityError, DataError) as e:
+            logger.warning(f"Journal segment {name} rejected, retrying entry by entry: {str(e)}")
+
+        rejected = []
+        for entry in entries:
+            try:
+                insert_entries([entry])
+            except (IntegrityError, DataError) as e:
+                rejected.append(dict(entry, segment=name, error=str(e.orig)))
+        if not rejected:
+            return len(entries)
+
+        lines = ''.join(json.dumps(entry, default=datetime.datetime.isoformat) + '\n' for entry in rejected)
+        fd = os.open(os.path.join(self.journal_dir, DEAD_LETTER_FILE), os.O_WRONLY | os.O_CREAT | os.O_APPEND, 0o600)
+        try:
+            os.write(fd, lines.encode())
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+        logger.error(f"Moved {len(rejected)} rejected access log entries from {name} to {DEAD_LETTER_FILE}")
+        return len(entries) - len(rejected)
+
+    def replay(self):
+        """
+        Insert entries from journal segments no live writer holds
+
+        Returns:
+            int: Number of entries replayed
+        """
+        replayed = 0
+        for name in sorted(os.listdir(self.journal_dir)):
+            if not (name.startswith(SEGMENT_PREFIX) and name.endswith(SEGMENT_SUFFIX)):
+                continue
+            path = os.path.join(self.journal_dir, name)
+            if path == self._segment:
+                continue
+            try:
+                fd = os.open(path, os.O_RDONLY)
+            except FileNotFoundError:
+                continue
+            try:
+                if not _lock(fd, blocking=False) or not os.path.exists(path):
+                    continue
+                with os.fdopen(os.dup(fd), 'r') as f:
+                    entries = []
+                    for line in f:
+                        try:
+                            entry = json.loads(line)
+                        except ValueError:
+                            # A write cut short by a crash
+                            continue
+                        entry['access_time'] = datetime.datetime.fromisoformat(entry['access_time'])
+                        entries.append(entry)
+                if entries:
+                    replayed += self._insert_segment(name, entries)
+                os.remove(path)
+            finally:
+                os.close(fd)
+
+        if replayed:
+            logger.info(f"Replayed {replayed} access log entries from the journal")
+        return replayed
+
+
+_writer = None
+_writer_lock = threading.Lock()
+
+
+def get_audit_writer():
+    """
+    Get the process-wide access log writer, starting it on first use
+
+    Returns:
+        AuditWriter: Shared writer
+    """
+    global _writer
+    with _writer_lock:
+        if _writer is None:
+            _writer = AuditWriter()
+            _writer.start()
+            atexit.register(_writer.stop)
+        return _writer
@@ -0,0 +1,322 @@
+"""
+Content-Addressed Attachment Store for MedBlock
+
+This module stores attachments under the SHA-256 of their plaintext, which
+is computed while the upload streams to disk and doubles as the hash that
+is anchored on chain. Identical files are stored once. Blobs live in
+directories sharded by the first hash bytes so no directory grows too
+large, and each record referencing a blob has a marker file, so a blob
+without markers can be garbage collected.
+
+Layout under the store root:
+
+    objects/ab/cd/abcd...   blob, encrypted when a master key is given
+    refs/ab/cd/abcd.../rec  one empty marker per referencing record
+    tmp/                    uploads in progress
+"""
+
+import os
+import re
+import sys
+import time
+import shutil
+import hashlib
+import logging
+import argparse
+import tempfile
+from urllib.parse import quote, unquote
+
+# Add parent directory to path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.stream_crypto import StreamEncryptor, is_encrypted, DEFAULT_CHUNK_SIZE
+
+# Set up logger
+logger = logging.getLogger(__name__)
+
+DIGEST_PATTERN = re.compile(r'^[0-9a-f]{64}$')
+
+
+class BlobUpload:
+    """
+    Upload in progress, hashed and encrypted as it is written
+
+    The file only ever holds ciphertext when a master key is given, so it
+    can serve as the spool file of a form parser without plaintext ever
+    reaching the disk.
+    """
+
+    def __init__(self, tmp_dir, master_key=None, chunk_size=DEFAULT_CHUNK_SIZE):
+        """
+        Initialize the upload
+
+        Args:
+            tmp_dir (str): Directory for the file in progress
+            master_key (bytes or list, optional): Master key to encrypt the
+                blob with; stored in plaintext if omitted
+            chunk_size (int): Plaintext bytes per chunk
+        """
+        fd, self.temp_path = tempfile.mkstemp(dir=tmp_dir)
+        self._file = os.fdopen(fd, 'wb')
+        self.encrypted = bool(master_key)
+        self._encryptor = StreamEncryptor(self._file, master_key, chunk_size=chunk_size) if master_key else None
+        self._digest = hashlib.sha256()
+        self._size = 0
+
+    def write(self, data):
+        """Write plaintext to the upload"""
+        if self._encryptor:
+            return self._encryptor.write(data)
+        self._digest.update(data)
+        self._size += len(data)
+        return self._file.write(data)
+
+    def seek(self, offset, whence=os.SEEK_SET):
+        """Ignore rewinds; form parsers rewind each file part once it is written"""
+        return 0
+
+    def finish(self):
+        """
+        Complete the file in progress
+
+        Returns:
+            dict: 'size' and 'sha256' of the plaintext
+        """
+        if self._encryptor:
+            result = self._encryptor.finish()
+        else:
+            result = {'size': self._size, 'sha256': self._digest.hexdigest()}
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._file.close()
+        return result
+
+    def close(self):
+        """Discard the upload unless it has been stored"""
+        if not self._file.closed:
+            self._file.close()
+        if self.temp_path and os.path.exists(self.temp_path):
+            os.remove(self.temp_path)
+        self.temp_path = None
+
+
+class BlobStore:
+    """
+    Deduplicating attachment store keyed by SHA-256
+    """
+
+    def __init__(self, root):
+        """
+        Initialize the store
+
+        Args:
+            root (str): Store directory, created if missing
+        """
+        self.root = root
+        self.objects_dir = os.path.join(root, 'objects')
+        self.refs_dir = os.path.join(root, 'refs')
+        self.tmp_dir = os.path.join(root, 'tmp')
+        for directory in (self.objects_dir, self.refs_dir, self.tmp_dir):
+            os.makedirs(directory, exist_ok=True)
+
+    @staticmethod
+    def _shard(digest):
+        if not DIGEST_PATTERN.match(digest or ''):
+            raise ValueError(f"Invalid blob digest: {digest!r}")
+        return os.path.join(digest[:2], digest[2:4], digest)
+
+    def blob_path(self, digest):
+        """
+        Get the path of a blob
+
+        Args:
+            digest (str): SHA-256 hex digest of the blob content
+
+        Returns:
+            str: Blob path, whether or not the blob exists
+        """
+        return os.path.join(self.objects_dir, self._shard(digest))
+
+    def exists(self, digest):
+        """Check whether a blob is stored"""
+        return os.path.isfile(self.blob_path(digest))
+
+    def is_encrypted(self, digest):
+        """Check whether a stored blob is encrypted"""
+        return is_encrypted(self.blob_path(digest))
+
+    def open_upload(self, master_key=None, chunk_size=DEFAULT_CHUNK_SIZE):
+        """
+        Start an upload that is written piece by piece
+
+        Args:
+            master_key (bytes or list, optional): Master key to encrypt the
+                blob with; stored in plaintext if omitted
+            chunk_size (int): Plaintext bytes per chunk
+
+        Returns:
+            BlobUpload: Writable upload, stored with commit_upload()
+        """
+        return BlobUpload(self.tmp_dir, master_key, chunk_size=chunk_size)
+
+    def commit_upload(self, upload):
+        """
+        Store a completed upload under its content hash
+
+        Args:
+            upload (BlobUpload): Upload returned by open_upload()
+
+        Returns:
+            dict: 'sha256', 'size', 'encrypted' and 'deduplicated'
+        """
+        try:
+            result = upload.finish()
+            path = self.blob_path(result['sha256'])
+            deduplicated = os.path.exists(path)
+            if deduplicated:
+                # Refresh the mtime so the blob survives a concurrent gc until it is referenced
+                os.utime(path)
+            else:
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                os.replace(upload.temp_path, path)
+                upload.temp_path = None
+        finally:
+            upload.close()
+
+        logger.info(f"Stored blob {result['sha256']} ({result['size']} bytes{', deduplicated' if deduplicated else ''})")
+        return dict(result, encrypted=upload.encrypted, deduplicated=deduplicated)
+
+    def put_stream(self, source, master_key=None, chunk_size=DEFAULT_CHUNK_SIZE):
+        """
+        Store a stream, hashing it as it is written
+
+        Args:
+            source (file): Readable binary stream
+            master_key (bytes or list, optional): Master key to encrypt the
+                blob with; stored in plaintext if omitted
+            chunk_size (int): Bytes read per chunk
+
+        Returns:
+            dict: 'sha256', 'size', 'encrypted' and 'deduplicated'
+        """
+        upload = self.open_upload(master_key, chunk_size=chunk_size)
+        try:
+            for chunk in iter(lambda: source.read(chunk_size), b''):
+                upload.write(chunk)
+        except Exception:
+            upload.close()
+            raise
+        return self.commit_upload(upload)
+
+    def _ref_dir(self, digest):
+        return os.path.join(self.refs_dir, self._shard(digest))
+
+    def add_ref(self, digest, record_id):
+        """
+        Record that a medical record references a blob
+
+        Args:
+            digest (str): Blob digest
+            record_id (str): Referencing record
+
+        Returns:
+            int: Number of records referencing the blob
+        """
+        if not self.exists(digest):
+            raise FileNotFoundError(f"Blob {digest} is not stored")
+        ref_dir = self._ref_dir(digest)
+        os.makedirs(ref_dir, exist_ok=True)
+        open(os.path.join(ref_dir, quote(str(record_id), safe='')), 'a').close()
+        return len(os.listdir(ref_dir))
+
+    def remove_ref(self, digest, record_id):
+        """
+        Drop a record's reference to a blob
+
+        The blob itself is removed by the next gc once no references remain.
+
+        Args:
+            digest (str): Blob digest
+            record_id (str): Referencing record
+
+        Returns:
+            int: Number of records still referencing the blob
+        """
+        ref_dir = self._ref_dir(digest)
+        try:
+            os.remove(os.path.join(ref_dir, quote(str(record_id), safe='')))
+        except FileNotFoundError:
+            pass
+        return len(self.refs(digest))
+
+    def refs(self, digest):
+        """
+        Get the records referencing a blob
+
+        Args:
+            digest (str): Blob digest
+
+        Returns:
+            list: Record IDs
+        """
+        try:
+            return sorted(unquote(name) for name in os.listdir(self._ref_dir(digest)))
+        except FileNotFoundError:
+            return []
+
+    def gc(self, grace_period=3600, dry_run=False):
+        """
+        Remove blobs no record references
+
+        Blobs and temporary files younger than the grace period are kept, so
+        an upload whose reference has not been added yet is not collected.
+
+        Args:
+            grace_period (float): Minimum age in seconds of a collected file
+            dry_run (bool): Only report what would be removed
+
+        Returns:
+            dict: 'removed' digests and 'freed' bytes
+        """
+        cutoff = time.time() - grace_period
+        removed, freed = [], 0
+
+        for directory, _, filenames in os.walk(self.objects_dir):
+            for digest in filenames:
+                path = os.path.join(directory, digest)
+                if not DIGEST_PATTERN.match(digest) or self.refs(digest):
+                    continue
+                stat = os.stat(path)
+                if stat.st_mtime > cutoff:
+                    continue
+                removed.append(digest)
+                freed += stat.st_size
+                if not dry_run:
+                    os.remove(path)
+                    shutil.rmtree(self._ref_dir(digest), ignore_errors=True)
+
+        for name in os.listdir(self.tmp_dir):
+            path = os.path.join(self.tmp_dir, name)
+            if os.stat(path).st_mtime <= cutoff and not dry_run:
+                os.remove(path)
+
+        logger.info(f"Garbage collection {'found' if dry_run else 'removed'} {len(removed)} blobs ({freed} bytes)")
+        return {'removed': removed, 'freed': freed}
+
+
+def main(argv=None):
+    """Command line entry point"""
+    parser = argparse.ArgumentParser(description='Maintain the MedBlock attachment store')
+    parser.add_argument('command', choices=['gc'])
+    parser.add_argument('--root', required=True, help='Store directory')
+    parser.add_argument('--grace-period', type=float, default=3600, help='Minimum age in seconds of removed blobs')
+    parser.add_argument('--dry-run', action='store_true', help='Only report unreferenced blobs')
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    BlobStore(args.root).gc(grace_period=args.grace_period, dry_run=args.dry_run)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
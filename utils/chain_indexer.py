@@ -0,0 +1,449 @@
+"""
+Chain Event Indexer for MedBlock
+
+This module mirrors the MedicalRecords contract state into local tables so
+record lookups and access checks can be answered without calling the chain.
+Contract logs are fetched in block ranges and applied in block order, and
+the last processed block is checkpointed so the indexer resumes where it
+stopped. Block hashes within the reorg depth are kept; when the chain forks
+below the checkpoint the indexer rolls back to the last common block and
+replays the surviving events of the affected patients.
+"""
+
+import os
+import sys
+import json
+import logging
+import datetime
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+from web3.exceptions import BlockNotFound
+
+# Add parent directory to path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database.models import (
+    Session, ChainEvent, ChainPatient, ChainRecord, ChainAccessGrant, ChainBlock, IndexerCheckpoint
+)
+from medblock.blockchain.events import event_decoders, fetch_events
+from config.config import INDEXER_REORG_DEPTH, INDEXER_CHUNK_SIZE, INDEXER_START_BLOCK
+
+# Set up logger
+logger = logging.getLogger(__name__)
+
+
+class ReorgTooDeepError(Exception):
+    """Raised when the chain forked below the oldest tracked block"""
+
+
+def _hex(value):
+    """Return a hash as a 0x-prefixed hex string"""
+    if isinstance(value, (bytes, bytearray)):
+        return '0x' + bytes(value).hex()
+    return str(value)
+
+
+def _materialize(session, event_name, args, block_number, transaction_hash):
+    """
+    Apply one contract event to the materialized tables
+
+    Args:
+        session (Session): Database session
+        event_name (str): Name of the contract event
+        args (dict): Decoded event arguments
+        block_number (int): Block the event was emitted in
+        transaction_hash (str): Transaction that emitted the event
+    """
+    patient_id = args['patientId']
+
+    if event_name == 'PatientAdded':
+        patient = session.query(ChainPatient).filter_by(patient_id=patient_id).first()
+        if patient is None:
+            patient = ChainPatient(patient_id=patient_id)
+            session.add(patient)
+        patient.patient_address = args['patientAddress'].lower()
+        patient.block_number = block_number
+
+    elif event_name == 'MedicalRecordAdded':
+        record = session.query(ChainRecord).filter_by(
+            patient_id=patient_id, record_id=args['recordId']
+        ).first()
+        if record is None:
+            record = ChainRecord(patient_id=patient_id, record_id=args['recordId'])
+            session.add(record)
+        record.record_type = args['recordType']
+        record.block_number = block_number
+        record.transaction_hash = transaction_hash
+
+    elif event_name == 'AccessGranted':
+        provider = args['provider'].lower()
+        grant = session.query(ChainAccessGrant).filter_by(
+            provider_address=provider, patient_id=patient_id
+        ).first()
+        if grant is None:
+            grant = ChainAccessGrant(provider_address=provider, patient_id=patient_id)
+            session.add(grant)
+        grant.access_level = args['accessLevel']
+        grant.expiry = args['expiry']
+        grant.block_number = block_number
+
+    elif event_name == 'AccessRevoked':
+        session.query(ChainAccessGrant).filter_by(
+            provider_address=args['provider'].lower(), patient_id=patient_id
+        ).delete(synchronize_session=False)
+
+
+class ChainIndexer:
+    """
+    Mirrors contract events into the chain index tables
+
+    Block ranges are fetched by a thread pool, so a backfill of historical
+    blocks overlaps many eth_getLogs calls, while ranges are always applied
+    and checkpointed one at a time in block order.
+    """
+
+    def __init__(self, web3, contract, name='medical_records', reorg_depth=INDEXER_REORG_DEPTH,
+                 chunk_size=INDEXER_CHUNK_SIZE, start_block=INDEXER_START_BLOCK):
+        """
+        Initialize the indexer
+
+        Args:
+            web3 (Web3): Connected Web3 instance
+            contract (Contract): Loaded MedicalRecords contract
+            name (str): Checkpoint name of this indexer
+            reorg_depth (int): Number of recent blocks checked for forks
+            chunk_size (int): Number of blocks fetched per eth_getLogs call
+            start_block (int): First block to index when there is no checkpoint
+        """
+        self.web3 = web3
+        self.contract = contract
+        self.name = name
+        self.reorg_depth = reorg_depth
+        self.chunk_size = chunk_size
+        self.start_block = start_block
+
+        self._decoders = None
+        self._stop = threading.Event()
+        self._thread = None
+
+    def last_block(self):
+        """
+        Get the last indexed block
+
+        Returns:
+            int: Checkpointed block number, or start_block - 1 if none
+        """
+        session = Session()
+        try:
+            checkpoint = session.get(IndexerCheckpoint, self.name)
+            return checkpoint.last_block if checkpoint else self.start_block - 1
+        finally:
+            session.close()
+
+    def _save_checkpoint(self, session, block_number):
+        """Store the last indexed block in the current transaction"""
+        checkpoint = session.get(IndexerCheckpoint, self.name)
+        if checkpoint is None:
+            checkpoint = IndexerCheckpoint(name=self.name)
+            session.add(checkpoint)
+        checkpoint.last_block = block_number
+        checkpoint.updated_at = datetime.datetime.utcnow()
+
+    def _block_hash(self, block_number):
+        """Return the canonical hash of a block, or None if it does not exist"""
+        try:
+            return _hex(self.web3.eth.get_block(block_number)['hash'])
+        except BlockNotFound:
+            return None
+
+    def _fetch(self, from_block, to_block, head):
+        """
+        Fetch the events of a block range
+
+        The hash of every block of the range within the reorg depth of the
+        sync target is read before the logs, so a fork that happens in
+        between is caught by the next reorg check, and a fork of any depth
+        up to reorg_depth finds a tracked common block.
+
+        Args:
+            from_block (int): First block of the range
+            to_block (int): Last block of the range
+            head (int): Last block of the sync
+
+        Returns:
+            tuple: (from_block, to_block, block number -> hash, events)
+        """
+        if self._decoders is None:
+            self._decoders = event_decoders(self.contract)
+        block_hashes = {}
+        for block_number in range(max(from_block, head - self.reorg_depth), to_block + 1):
+            block_hash = self._block_hash(block_number)
+            if block_hash is not None:
+                block_hashes[block_number] = block_hash
+        events = fetch_events(self.web3, self.contract, from_block, to_block, self._decoders)
+        return from_block, to_block, block_hashes, events
+
+    def _apply(self, from_block, to_block, block_hashes, events):
+        """
+        Apply the events of a block range and checkpoint it in one transaction
+
+        Returns:
+            int: Number of events applied
+        """
+        session = Session()
+        try:
+            rows = []
+            block_hashes = dict(block_hashes)
+            for event in events:
+                args = dict(event['args'])
+                block_number = event['blockNumber']
+                transaction_hash = _hex(event['transactionHash'])
+                _materialize(session, event['event'], args, block_number, transaction_hash)
+
+                block_hashes[block_number] = _hex(event['blockHash'])
+                rows.append({
+                    'block_number': block_number,
+                    'block_hash': block_hashes[block_number],
+                    'transaction_hash': transaction_hash,
+                    'log_index': event['logIndex'],
+                    'event_name': event['event'],
+                    'patient_id': args['patientId'],
+                    'provider_address': args['provider'].lower() if 'provider' in args else None,
+                    'args': json.dumps(args)
+                })
+            session.bulk_insert_mappings(ChainEvent, rows)
+
+            session.query(ChainBlock).filter(
+                ChainBlock.block_number.in_(list(block_hashes))
+            ).delete(synchronize_session=False)
+            session.bulk_insert_mappings(ChainBlock, [
+                {'block_number': number, 'block_hash': block_hash}
+                for number, block_hash in block_hashes.items()
+            ])
+            # Only hashes within the reorg depth are needed to find a fork
+            session.query(ChainBlock).filter(
+                ChainBlock.block_number < to_block - self.reorg_depth
+            ).delete(synchronize_session=False)
+
+            self._save_checkpoint(session, to_block)
+            session.commit()
+        except Exception as e:
+            session.rollback()
+            raise e
+        finally:
+            session.close()
+
+        if events:
+            logger.info(f"Indexed {len(events)} events in blocks {from_block}-{to_block}")
+        return len(events)
+
+    def check_reorg(self):
+        """
+        Roll back the index if the chain forked below the checkpoint
+
+        Returns:
+            int: Last indexed block after any rollback
+
+        Raises:
+            ReorgTooDeepError: If no tracked block is still canonical
+        """
+        last = self.last_block()
+        session = Session()
+        try:
+            blocks = session.query(ChainBlock).filter(
+                ChainBlock.block_number <= last
+            ).order_by(ChainBlock.block_number.desc()).all()
+        finally:
+            session.close()
+
+        for block in blocks:
+            if self._block_hash(block.block_number) == block.block_hash:
+                if block.block_number < last:
+                    logger.warning(f"Chain reorganized, rolling back index from block {last} to {block.block_number}")
+                    self.rollback(block.block_number)
+                return block.block_number
+
+        if blocks:
+            raise ReorgTooDeepError(f"Chain reorganized deeper than {self.reorg_depth} blocks below block {last}")
+        return last
+
+    def rollback(self, block_number):
+        """
+        Discard everything indexed after a block
+
+        The materialized rows of every patient touched by a discarded event
+        are rebuilt from that patient's remaining events.
+
+        Args:
+            block_number (int): Last block to keep
+        """
+        session = Session()
+        try:
+            patient_ids = [row.patient_id for row in session.query(ChainEvent.patient_id).filter(
+                ChainEvent.block_number > block_number
+            ).distinct()]
+
+            session.query(ChainEvent).filter(
+                ChainEvent.block_number > block_number
+            ).delete(synchronize_session=False)
+            session.query(ChainBlock).filter(
+                ChainBlock.block_number > block_number
+            ).delete(synchronize_session=False)
+
+            if patient_ids:
+                for model in (ChainPatient, ChainRecord, ChainAccessGrant):
+                    session.query(model).filter(
+                        model.patient_id.in_(patient_ids)
+                    ).delete(synchronize_session=False)
+
+                events = session.query(ChainEvent).filter(
+                    ChainEvent.patient_id.in_(patient_ids)
+                ).order_by(ChainEvent.block_number, ChainEvent.log_index).all()
+                for event in events:
+                    _materialize(session, event.event_name, json.loads(event.args),
+                                 event.block_number, event.transaction_hash)
+
+            self._save_checkpoint(session, block_number)
+            session.commit()
+        except Exception as e:
+            session.rollback()
+            raise e
+        finally:
+            session.close()
+
+    def sync(self, to_block=None, workers=1):
+        """
+        Index all blocks since the checkpoint
+
+        Args:
+            to_block (int, optional): Last block to index, defaults to the chain head
+            workers (int): Number of block ranges fetched concurrently
+
+        Returns:
+            int: Number of events applied
+        """
+        last = self.check_reorg()
+        if to_block is None:
+            to_block = self.web3.eth.block_number
+
+        ranges = iter([
+            (start, min(start + self.chunk_size - 1, to_block))
+            for start in range(last + 1, to_block + 1, self.chunk_size)
+        ])
+
+        applied = 0
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            # Keep a bounded window of fetches in flight ahead of the apply
+            window = deque()
+            for block_range in ranges:
+                window.append(executor.submit(self._fetch, *block_range, to_block))
+                if len(window) >= workers * 2:
+                    break
+            while window:
+                applied += self._apply(*window.popleft().result())
+                block_range = next(ranges, None)
+                if block_range is not None:
+                    window.append(executor.submit(self._fetch, *block_range, to_block))
+        return applied
+
+    def backfill(self, to_block=None, workers=4):
+        """
+        Catch up on historical blocks with parallel range fetches
+
+        Args:
+            to_block (int, optional): Last block to index, defaults to the chain head
+            workers (int): Number of block ranges fetched concurrently
+
+        Returns:
+            int: Number of events applied
+        """
+        return self.sync(to_block=to_block, workers=workers)
+
+    def watch(self, interval=5.0):
+        """
+        Keep the index in sync from a background thread
+
+        Args:
+            interval (float): Seconds between syncs
+        """
+        if self._thread and self._thread.is_alive():
+            return
+
+        def run():
+            while not self._stop.wait(interval):
+                try:
+                    self.sync()
+                except Exception as e:
+                    logger.error(f"Error indexing contract events: {str(e)}")
+
+        self._stop.clear()
+        self._thread = threading.Thread(target=run, name='chain-indexer', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Stop the background sync"""
+        self._stop.set()
+        if self._thread:
+            self._thread.join()
+            self._thread = None
+
+
+def indexed_access(provider_address, patient_id):
+    """
+    Check a provider's access to a patient's records from the index
+
+    Args:
+        provider_address (str): Address of the healthcare provider
+        patient_id (str): ID of the patient
+
+    Returns:
+        dict: Access details in the format of BlockchainIntegration.check_access
+    """
+    session = Session()
+    try:
+        grant = session.query(ChainAccessGrant).filter_by(
+            provider_address=provider_address.lower(), patient_id=patient_id
+        ).first()
+    finally:
+        session.close()
+
+    if grant is None:
+        return {'has_access': False, 'access_level': 0, 'expiry': 0, 'expired': False}
+
+    expired = grant.expiry > 0 and grant.expiry < datetime.datetime.now().timestamp()
+    return {
+        'has_access': not expired,
+        'access_level': grant.access_level,
+        'expiry': grant.expiry,
+        'expired': expired
+    }
+
+
+def indexed_records(patient_id):
+    """
+    Get the records of a patient stored on the contract from the index
+
+    Args:
+        patient_id (str): ID of the patient
+
+    Returns:
+        list: Dictionaries with record ID, type, block number and transaction hash
+    """
+    session = Session()
+    try:
+        records = session.query(ChainRecord).filter_by(
+            patient_id=patient_id
+        ).order_by(ChainRecord.block_number, ChainRecord.id).all()
+        return [
+            {
+                'record_id': record.record_id,
+                'record_type': record.record_type,
+                'block_number': record.block_number,
+                'transaction_hash': record.transaction_hash
+            }
+            for record in records
+        ]
+    finally:
+        session.close()
@@ -6,13 +6,75 @@ This module provides utility functions for database operations.
 
 import os
 import sys
+import base64
 import datetime
+import functools
+import logging
 
 # Add parent directory to path
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from database.models import Session, User, MedicalRecord, AccessLog
+from sqlalchemy import tuple_
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import aliased, joinedload
+
+from database.models import Session, User, MedicalRecord, AccessLog, close_session, replica_reads
 from utils.helpers import generate_unique_id
+from utils.audit import get_audit_writer
+from utils.access_log_archive import latest_access_logs
+
+logger = logging.getLogger(__name__)
+
+# Columns returned by record listings; encrypted_data and the key columns are left out
+RECORD_SUMMARY_COLUMNS = [
+    MedicalRecord.id,
+    MedicalRecord.record_id,
+    MedicalRecord.patient_id,
+    MedicalRecord.provider_id,
+    MedicalRecord.record_type,
+    MedicalRecord.created_at,
+    MedicalRecord.recorded_at,
+    MedicalRecord.institution,
+    MedicalRecord.department,
+    MedicalRecord.location,
+    MedicalRecord.transaction_id,
+    MedicalRecord.block_number,
+    MedicalRecord.confirmation_status
+]
+
+# Fields a listing can be projected to
+RECORD_SUMMARY_FIELDS = dict(
+    [(column.key, column) for column in RECORD_SUMMARY_COLUMNS] + [('provider_name', None)]
+)
+
+def replica_read(func):
+    """
+    Run a read-only helper against a read replica
+
+    If the replica fails during the read it is taken out of rotation and
+    the helper runs again on the primary.
+
+    Args:
+        func (callable): Helper that only reads
+
+    Returns:
+        callable: Wrapped helper
+    """
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        session = Session()
+        with replica_reads(session):
+            try:
+                return func(*args, **kwargs)
+            except OperationalError as e:
+                replica = session.info.get('replica')
+                if replica is None:
+                    raise e
+                session.rollback()
+                session.replicas.mark_down(replica)
+                logger.warning(f"Read from replica {replica.url!r} failed, retrying on the primary: {e}")
+        return func(*args, **kwargs)
+    return wrapper
 
 def create_user(username, email, password_hash, first_name, last_name, role, **kwargs):
     """
@@ -48,8 +110,9 @@ def create_user(username, email, password_hash, first_name, last_name, role, **k
         session.rollback()
         raise e
     finally:
-        session.close()
+        close_session(session)
 
+@replica_read
 def get_user_by_id(user_id):
     """
     Get a user by ID
@@ -64,7 +127,7 @@ def get_user_by_id(user_id):
     try:
         return session.query(User).filter(User.id == user_id).first()
     finally:
-        session.close()
+        close_session(session)
 
 def get_user_by_username(username):
     """
@@ -80,7 +143,7 @@ def get_user_by_username(username):
     try:
         return session.query(User).filter(User.username == username).first()
     finally:
-        session.close()
+        close_session(session)
 
 def create_medical_record(patient_id, provider_id, record_type, data, encryption_key, recorded_at=None, **kwargs):
     """
@@ -124,8 +187,9 @@ def create_medical_record(patient_id, provider_id, record_type, data, encryption
         session.rollback()
         raise e
     finally:
-        session.close()
+        close_session(session)
 
+@replica_read
 def get_medical_records_for_patient(patient_id):
     """
     Get all medical records for a patient
@@ -134,21 +198,175 @@ def get_medical_records_for_patient(patient_id):
         patient_id (int): ID of the patient
         
     Returns:
-        list: List of medical records
+        list: List of medical records, with their provider loaded so it can
+            be read after the session is closed
     """
     session = Session()
     try:
-        return session.query(MedicalRecord).filter(
+        return session.query(MedicalRecord).options(
+            joinedload(MedicalRecord.provider)
+        ).filter(
             MedicalRecord.patient_id == patient_id,
             MedicalRecord.is_active == True
         ).order_by(MedicalRecord.recorded_at.desc()).all()
     finally:
-        session.close()
+        close_session(session)
 
-def log_record_access(record_id, user_id, action, ip_address=None, user_agent=None, is_authorized=True):
+def encode_record_cursor(recorded_at, record_id):
+    """
+    Encode the position after a record in a patient's record listing
+    
+    Args:
+        recorded_at (datetime): recorded_at of the last record on a page
+        record_id (int): ID of the last record on a page
+        
+    Returns:
+        str: Opaque URL-safe cursor
+    """
+    position = f"{recorded_at.isoformat()}|{record_id}"
+    return base64.urlsafe_b64encode(position.encode()).decode().rstrip('=')
+
+def decode_record_cursor(cursor):
+    """
+    Decode a record listing cursor
+    
+    Args:
+        cursor (str): Cursor from encode_record_cursor
+        
+    Returns:
+        tuple: (recorded_at, record ID)
+        
+    Raises:
+        ValueError: If the cursor is malformed
+    """
+    try:
+        position = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode()
+        recorded_at, record_id = position.split('|')
+        return datetime.datetime.fromisoformat(recorded_at), int(record_id)
+    except Exception:
+        raise ValueError(f"Invalid cursor: {cursor}")
+
+@replica_read
+def get_record_summaries_for_patient(patient_id, fields=None, record_type=None, recorded_from=None,
+                                     recorded_to=None, cursor=None, limit=None):
+    """
+    Get the record listing of a patient in a single query
+    
+    Provider names come from a join instead of one query per record, and
+    only the requested columns are read, never the encrypted payload.
+    Records are ordered newest first on (recorded_at, id), and a cursor
+    continues after a given record without an OFFSET scan.
+    
+    Args:
+        patient_id (int): ID of the patient
+        fields (list, optional): Names from RECORD_SUMMARY_FIELDS to return, defaults to all
+        record_type (str, optional): Only return records of this type
+        recorded_from (datetime, optional): Only return records recorded at or after this time
+        recorded_to (datetime, optional): Only return records recorded at or before this time
+        cursor (tuple, optional): (recorded_at, id) of the last record of the previous page
+        limit (int, optional): Maximum number of records
+        
+    Returns:
+        list: Record dictionaries, newest first
+        
+    Raises:
+        ValueError: If a field is unknown
+    """
+    fields = list(fields) if fields else list(RECORD_SUMMARY_FIELDS)
+    unknown = [field for field in fields if field not in RECORD_SUMMARY_FIELDS]
+    if unknown:
+        raise ValueError(f"Unknown fields: {', '.join(unknown)}")
+    
+    columns = [RECORD_SUMMARY_FIELDS[field] for field in fields if field != 'provider_name']
+    provider = aliased(User)
+    if 'provider_name' in fields:
+        columns += [
+            provider.first_name.label('provider_first_name'),
+            provider.last_name.label('provider_last_name')
+        ]
+    
+    session = Session()
+    try:
+        query = session.query(*columns)
+        if 'provider_name' in fields:
+            query = query.outerjoin(provider, provider.id == MedicalRecord.provider_id)
+        query = query.filter(
+            MedicalRecord.patient_id == patient_id,
+            MedicalRecord.is_active == True
+        )
+        if record_type:
+            query = query.filter(MedicalRecord.record_type == record_type)
+        if recorded_from:
+            query = query.filter(MedicalRecord.recorded_at >= recorded_from)
+        if recorded_to:
+            query = query.filter(MedicalRecord.recorded_at <= recorded_to)
+        if cursor:
+            query = query.filter(tuple_(MedicalRecord.recorded_at, MedicalRecord.id) < tuple_(*cursor))
+        query = query.order_by(MedicalRecord.recorded_at.desc(), MedicalRecord.id.desc())
+        if limit:
+            query = query.limit(limit)
+        rows = query.all()
+    finally:
+        close_session(session)
+    
+    summaries = []
+    for row in rows:
+        summary = row._asdict()
+        if 'provider_name' in fields:
+            first_name = summary.pop('provider_first_name')
+            last_name = summary.pop('provider_last_name')
+            summary['provider_name'] = f"{first_name} {last_name}" if first_name is not None else "Unknown"
+        summaries.append(summary)
+    return summaries
+
+def get_record_page_for_patient(patient_id, limit, fields=None, cursor=None, **filters):
+    """
+    Get one page of a patient's record listing
+    
+    Args:
+        patient_id (int): ID of the patient
+        limit (int): Page size
+        fields (list, optional): Names from RECORD_SUMMARY_FIELDS to return, defaults to all
+        cursor (str, optional): next_cursor of the previous page
+        **filters: record_type, recorded_from and recorded_to, as for
+            get_record_summaries_for_patient
+        
+    Returns:
+        tuple: (records, IDs of the records, next_cursor or None on the last page)
+        
+    Raises:
+        ValueError: If the cursor or a field is invalid
+    """
+    fields = list(fields) if fields else list(RECORD_SUMMARY_FIELDS)
+    # The cursor is built from id and recorded_at, so they are always read
+    extra = [field for field in ('id', 'recorded_at') if field not in fields]
+    
+    # One extra row tells whether another page follows
+    records = get_record_summaries_for_patient(
+        patient_id,
+        fields=fields + extra,
+        cursor=decode_record_cursor(cursor) if cursor else None,
+        limit=limit + 1,
+        **filters
+    )
+    next_cursor = None
+    if len(records) > limit:
+        records = records[:limit]
+        next_cursor = encode_record_cursor(records[-1]['recorded_at'], records[-1]['id'])
+    
+    record_ids = [record['id'] for record in records]
+    for record in records:
+        for field in extra:
+            del record[field]
+    return records, record_ids, next_cursor
+
+def log_record_access(record_id, user_id, action, ip_address=None, user_agent=None, is_authorized=True, **kwargs):
     """
     Log access to a medical record
     
+    The entry is journaled and queued; the access log writer inserts it
+    with the next batch.
+    
     Args:
         record_id (int): ID of the accessed record
         user_id (int): ID of the user accessing the record
@@ -156,34 +374,51 @@ def log_record_access(record_id, user_id, action, ip_address=None, user_agent=No
         ip_address (str, optional): IP address of the request
         user_agent (str, optional): User agent of the request
         is_authorized (bool): Whether the access was authorized
+        **kwargs: Additional access log fields, such as anomaly_score
+    """
+    get_audit_writer().log(record_id, user_id, action, ip_address, user_agent, is_authorized, **kwargs)
+
+def log_records_access(record_ids, user_id, action, ip_address=None, user_agent=None, is_authorized=True):
+    """
+    Log access to several medical records
+    
+    Args:
+        record_ids (list): IDs of the accessed records
+        user_id (int): ID of the user accessing the records
+        action (str): Action performed (view, create, update, delete)
+        ip_address (str, optional): IP address of the request
+        user_agent (str, optional): User agent of the request
+        is_authorized (bool): Whether the access was authorized
+    """
+    get_audit_writer().log_many(record_ids, user_id, action, ip_address, user_agent, is_authorized)
+
+@replica_read
+def get_recent_access_logs(limit=100):
+    """
+    Get the most recent access logs
+    
+    Months still in the database are included on every backend; archived
+    months are read with utils.access_log_archive.query_access_logs.
+    
+    Args:
+        limit (int): Maximum number of logs to return
         
     Returns:
-        AccessLog: Created log object
+        list: List of access logs
     """
     session = Session()
     try:
-        log = AccessLog(
-            record_id=record_id,
-            user_id=user_id,
-            action=action,
-            ip_address=ip_address,
-            user_agent=user_agent,
-            is_authorized=is_authorized
-        )
-        session.add(log)
-        session.commit()
-        return log
-    except Exception as e:
-        session.rollback()
-        raise e
+        return latest_access_logs(session, limit)
     finally:
-        session.close()
+        close_session(session)
 
-def get_recent_access_logs(limit=100):
+@replica_read
+def get_record_access_logs(record_id, limit=100):
     """
-    Get the most recent access logs
+    Get the most recent accesses to a medical record
     
     Args:
+        record_id (int): ID of the record
         limit (int): Maximum number of logs to return
         
     Returns:
@@ -191,12 +426,11 @@ def get_recent_access_logs(limit=100):
     """
     session = Session()
     try:
-        return session.query(AccessLog).order_by(
-            AccessLog.access_time.desc()
-        ).limit(limit).all()
+        return latest_access_logs(session, limit, lambda table: table.c.record_id == record_id)
     finally:
-        session.close()
+        close_session(session)
 
+@replica_read
 def get_anomalous_access_logs(limit=100):
     """
     Get access logs marked as anomalous
@@ -209,8 +443,6 @@ def get_anomalous_access_logs(limit=100):
     """
     session = Session()
     try:
-        return session.query(AccessLog).filter(
-            AccessLog.is_anomalous == True
-        ).order_by(AccessLog.access_time.desc()).limit(limit).all()
+        return latest_access_logs(session, limit, lambda table: table.c.is_anomalous == True)
     finally:
-        session.close() 
\ No newline at end of file
+        close_session(session) 
\ No newline at end of file
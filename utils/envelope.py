@@ -0,0 +1,138 @@
+"""
+Envelope Encryption Utilities for MedBlock
+
+This module encrypts each medical record with its own data key and stores
+that key wrapped by the master key. Rotating the master key only rewraps
+the small data keys; record payloads are never re-encrypted. Master key
+ciphers are built once per process and reused.
+"""
+
+import hashlib
+import threading
+
+from cryptography.fernet import Fernet, MultiFernet, InvalidToken
+
+_ciphers = {}
+_ciphers_lock = threading.Lock()
+
+
+def _as_bytes(key):
+    return key.encode() if isinstance(key, str) else key
+
+
+def get_cipher(key):
+    """
+    Get the shared cipher for a key or a list of keys
+
+    A list gives a MultiFernet that encrypts with the first key and
+    decrypts with any of them.
+
+    Args:
+        key (bytes, str or list): Fernet key, or keys with the primary key first
+
+    Returns:
+        Fernet or MultiFernet: Cipher built on first use and reused afterwards
+    """
+    if isinstance(key, (list, tuple)):
+        key = tuple(_as_bytes(k) for k in key)
+    else:
+        key = _as_bytes(key)
+    cipher = _ciphers.get(key)
+    if cipher is None:
+        if isinstance(key, tuple):
+            cipher = MultiFernet([get_cipher(k) for k in key])
+        else:
+            cipher = Fernet(key)
+        with _ciphers_lock:
+            cipher = _ciphers.setdefault(key, cipher)
+    return cipher
+
+
+def key_version(key):
+    """
+    Identify a master key without revealing it
+
+    Args:
+        key (bytes, str or list): Fernet key, or keys with the primary key first
+
+    Returns:
+        str: 16 hex digit fingerprint of the (primary) key
+    """
+    if isinstance(key, (list, tuple)):
+        key = key[0]
+    return hashlib.sha256(_as_bytes(key)).hexdigest()[:16]
+
+
+def encrypt_envelope(plaintext, master_key):
+    """
+    Encrypt data under a fresh data key wrapped by the master key
+
+    Args:
+        plaintext (bytes): Data to encrypt
+        master_key (bytes or list): Master Fernet key, or keys with the primary first
+
+    Returns:
+        tuple: (ciphertext, wrapped data key, key version), all strings
+    """
+    data_key = Fernet.generate_key()
+    ciphertext = Fernet(data_key).encrypt(plaintext)
+    wrapped_key = get_cipher(master_key).encrypt(data_key)
+    return ciphertext.decode(), wrapped_key.decode(), key_version(master_key)
+
+
+def unwrap_data_key(wrapped_key, master_key):
+    """
+    Recover a data key with the master key
+
+    Args:
+        wrapped_key (str): Wrapped data key
+        master_key (bytes or list): Master Fernet key, or keys with the primary first
+
+    Returns:
+        bytes: Data key
+
+    Raises:
+        InvalidToken: If the master key does not match
+    """
+    return get_cipher(master_key).decrypt(wrapped_key.encode())
+
+
+def decrypt_envelope(ciphertext, wrapped_key, master_key):
+    """
+    Decrypt envelope-encrypted data
+
+    Records written before envelope encryption have no wrapped key and are
+    decrypted with the master key directly.
+
+    Args:
+        ciphertext (str): Encrypted data
+        wrapped_key (str): Wrapped data key, or None for legacy records
+        master_key (bytes or list): Master Fernet key, or keys with the primary first
+
+    Returns:
+        bytes: Decrypted data
+
+    Raises:
+        InvalidToken: If a key does not match
+    """
+    if not wrapped_key:
+        return get_cipher(master_key).decrypt(ciphertext.encode())
+    data_key = unwrap_data_key(wrapped_key, master_key)
+    return Fernet(data_key).decrypt(ciphertext.encode())
+
+
+def rewrap_data_key(wrapped_key, old_master_key, new_master_key):
+    """
+    Move a data key from one master key to another
+
+    Args:
+        wrapped_key (str): Data key wrapped by the old master key
+        old_master_key (bytes): Current master key
+        new_master_key (bytes): Replacement master key
+
+    Returns:
+        tuple: (wrapped data key, key version) under the new master key
+    """
+    data_key = unwrap_data_key(wrapped_key, old_master_key)
+    return get_cipher(new_master_key).encrypt(data_key).decode(), key_version(new_master_key)
+
@@ -66,41 +66,62 @@ def save_encryption_key(key, filename='encryption_key.key'):
     """
     Save an encryption key to a file
     
+    Several keys are written one per line, the primary key first.
+    
     Args:
-        key (bytes): Encryption key
+        key (bytes or list): Encryption key, or keys with the primary key first
         filename (str): File to save the key to
         
     Returns:
         bool: True if successful, False otherwise
     """
     try:
+        keys = key if isinstance(key, (list, tuple)) else [key]
         with open(filename, 'wb') as key_file:
-            key_file.write(key)
+            key_file.write(b'\n'.join(keys) + b'\n')
         os.chmod(filename, 0o600)  # Restrict permissions to owner only
         return True
     except Exception as e:
         print(f"Error saving key: {str(e)}")
         return False
 
-def load_encryption_key(filename='encryption_key.key'):
+def load_encryption_keys(filename='encryption_key.key'):
     """
-    Load an encryption key from a file
+    Load all encryption keys from a key file
+    
+    The file holds one key per line. The first key is the primary key used
+    for new data, the others are older keys still accepted for decryption.
+    Blank lines and lines starting with # are ignored.
     
     Args:
-        filename (str): File to load the key from
+        filename (str): File to load the keys from
         
     Returns:
-        bytes: Encryption key or None if file doesn't exist
+        list: Keys as bytes, primary first, or None if file doesn't exist
     """
     try:
         with open(filename, 'rb') as key_file:
-            return key_file.read()
+            keys = [line.strip() for line in key_file.read().splitlines()]
+        return [key for key in keys if key and not key.startswith(b'#')] or None
     except FileNotFoundError:
         return None
     except Exception as e:
         print(f"Error loading key: {str(e)}")
         return None
 
+def load_encryption_key(filename='encryption_key.key'):
+    """
+    Load the primary encryption key from a file
+    
+    Args:
+        filename (str): File to load the key from
+        
+    Returns:
+        bytes: Encryption key or None if file doesn't exist
+    """
+    keys = load_encryption_keys(filename)
+    return keys[0] if keys else None
+
 def format_datetime(dt):
     """
     Format a datetime object for display
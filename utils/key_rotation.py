@@ -0,0 +1,297 @@
+"""
+Key Rotation Job for MedBlock
+
+This module moves encrypted medical records to a new master key. Records
+are streamed in primary-key order in chunks and a process pool rotates
+them with MultiFernet: envelope records only get their data key rewrapped,
+and records from before envelope encryption are re-encrypted into an
+envelope. Each chunk is written back with bulk updates and checkpointed, so
+an interrupted run resumes after the last completed chunk.
+
+Typical use, with the key file holding one key per line, primary first:
+
+    python -m utils.key_rotation new-key
+    python -m utils.key_rotation rotate-keys --workers 4 --max-rate 2000
+    python -m utils.key_rotation retire-keys
+"""
+
+import os
+import sys
+import json
+import time
+import logging
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+
+# Add parent directory to path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import or_, update, bindparam
+
+from database.models import Session, MedicalRecord
+from utils.envelope import InvalidToken, get_cipher, key_version, encrypt_envelope
+from utils.helpers import generate_encryption_key, save_encryption_key, load_encryption_keys
+from config.config import BLOCKCHAIN_KEY_FILE
+
+# Set up logger
+logger = logging.getLogger(__name__)
+
+
+def _rotate_rows(keys, rows):
+    """
+    Rotate a slice of records, run in a worker process
+
+    Args:
+        keys (list): Master keys, the new primary key first
+        rows (list): (id, encrypted_data, wrapped_data_key) tuples
+
+    Returns:
+        tuple: (rewrapped, reencrypted, failed IDs) where the first two are
+            lists of update parameter dictionaries
+    """
+    cipher = get_cipher(keys)
+    version = key_version(keys)
+    rewrapped, reencrypted, failed = [], [], []
+
+    for record_id, encrypted_data, wrapped_key in rows:
+        try:
+            if wrapped_key:
+                rewrapped.append({
+                    '_id': record_id,
+                    '_encrypted_data': encrypted_data,
+                    'wrapped_data_key': cipher.rotate(wrapped_key.encode()).decode(),
+                    'key_version': version
+                })
+            else:
+                ciphertext, wrapped, _ = encrypt_envelope(cipher.decrypt(encrypted_data.encode()), keys)
+                reencrypted.append({
+                    '_id': record_id,
+                    '_encrypted_data': encrypted_data,
+                    'encrypted_data': ciphertext,
+                    'wrapped_data_key': wrapped,
+                    'key_version': version
+                })
+        except InvalidToken:
+            failed.append(record_id)
+
+    return rewrapped, reencrypted, failed
+
+
+def _update_statement(columns):
+    """
+    Build a bulk update that only applies to records still holding the data that was rotated
+
+    A record re-encrypted by the application during the run keeps its new
+    data instead of being overwritten with a rotated copy of the old one.
+    """
+    table = MedicalRecord.__table__
+    return update(table).where(
+        table.c.id == bindparam('_id'),
+        table.c.encrypted_data == bindparam('_encrypted_data')
+    ).values(
+        # Keep updated_at, the record content does not change
+        dict({column: bindparam(column) for column in columns}, updated_at=table.c.updated_at)
+    )
+
+
+def load_checkpoint(checkpoint_file, version):
+    """
+    Load the progress of an interrupted rotation to the same key
+
+    Args:
+        checkpoint_file (str): Path of the checkpoint file
+        version (str): Version of the target primary key
+
+    Returns:
+        dict: Checkpoint state, or None if there is no matching checkpoint
+    """
+    try:
+        with open(checkpoint_file, 'r') as f:
+            state = json.load(f)
+    except (FileNotFoundError, ValueError):
+        return None
+    return state if state.get('key_version') == version else None
+
+
+def save_checkpoint(checkpoint_file, state):
+    """Atomically write the rotation progress"""
+    temp_file = f"{checkpoint_file}.tmp"
+    with open(temp_file, 'w') as f:
+        json.dump(state, f)
+    os.replace(temp_file, checkpoint_file)
+
+
+def rotate_keys(keys, chunk_size=1000, workers=None, max_rate=None, checkpoint_file=None):
+    """
+    Move every encrypted record to the primary key
+
+    Args:
+        keys (list): Master keys, the new primary key first and the keys
+            records may currently be under after it
+        chunk_size (int): Records read, rotated and written per chunk
+        workers (int, optional): Worker processes, defaults to the CPU count;
+            0 rotates in the calling process
+        max_rate (float, optional): Maximum records per second, to leave
+            database capacity for production traffic
+        checkpoint_file (str, optional): Progress file, defaults to the key
+            file path with a .rotation suffix
+
+    Returns:
+        dict: Rotation summary
+    """
+    keys = [key.encode() if isinstance(key, str) else key for key in keys]
+    version = key_version(keys)
+    checkpoint_file = checkpoint_file or f"{BLOCKCHAIN_KEY_FILE}.rotation"
+    workers = (os.cpu_count() or 1) if workers is None else workers
+
+    state = load_checkpoint(checkpoint_file, version)
+    if state:
+        logger.info(f"Resuming key rotation after record {state['last_id']}")
+        state.setdefault('skipped', 0)
+    else:
+        state = {'key_version': version, 'last_id': 0, 'rotated': 0, 'skipped': 0, 'failed': []}
+
+    rewrap_statement = _update_statement(['wrapped_data_key', 'key_version'])
+    reencrypt_statement = _update_statement(['encrypted_data', 'wrapped_data_key', 'key_version'])
+
+    started = time.monotonic()
+    processed = 0
+    executor = ProcessPoolExecutor(max_workers=workers) if workers else None
+    try:
+        while True:
+            chunk_started = time.monotonic()
+            session = Session()
+            try:
+                rows = [tuple(row) for row in session.query(
+                    MedicalRecord.id,
+                    MedicalRecord.encrypted_data,
+                    MedicalRecord.wrapped_data_key
+                ).filter(
+                    MedicalRecord.id > state['last_id'],
+                    MedicalRecord.encrypted_data.isnot(None),
+                    or_(MedicalRecord.key_version.is_(None), MedicalRecord.key_version != version)
+                ).order_by(MedicalRecord.id).limit(chunk_size)]
+                if not rows:
+                    break
+
+                if executor:
+                    slice_size = -(-len(rows) // workers)
+                    slices = [rows[start:start + slice_size] for start in range(0, len(rows), slice_size)]
+                    results = list(executor.map(_rotate_rows, [keys] * len(slices), slices))
+                else:
+                    results = [_rotate_rows(keys, rows)]
+
+                rewrapped = [params for result in results for params in result[0]]
+                reencrypted = [params for result in results for params in result[1]]
+                failed = [record_id for result in results for record_id in result[2]]
+
+                # Count only the rows the guarded updates changed, a record
+                # rewritten by the application since it was read is skipped
+                updated = 0
+                if rewrapped:
+                    updated += session.execute(rewrap_statement, rewrapped).rowcount
+                if reencrypted:
+                    updated += session.execute(reencrypt_statement, reencrypted).rowcount
+                session.commit()
+            except Exception as e:
+                session.rollback()
+                raise e
+            finally:
+                session.close()
+
+            state['last_id'] = rows[-1][0]
+            state['rotated'] += updated
+            state['skipped'] += len(rewrapped) + len(reencrypted) - updated
+            state['failed'].extend(failed)
+            save_checkpoint(checkpoint_file, state)
+
+            processed += len(rows)
+            rate = processed / max(time.monotonic() - started, 1e-9)
+            logger.info(f"Rotated records up to ID {state['last_id']} ({state['rotated']} total, "
+                        f"{state['skipped']} skipped, {rate:.0f} records/s)")
+            if failed:
+                logger.warning(f"{len(failed)} records could not be decrypted with any key")
+
+            # Throttle to max_rate by stretching each chunk to its time budget
+            if max_rate:
+                budget = len(rows) / max_rate
+                elapsed = time.monotonic() - chunk_started
+                if elapsed < budget:
+                    time.sleep(budget - elapsed)
+    finally:
+        if executor:
+            executor.shutdown()
+
+    elapsed = time.monotonic() - started
+    logger.info(f"Key rotation finished: {state['rotated']} records in {elapsed:.1f}s, "
+                f"{state['skipped']} skipped as changed during the run, {len(state['failed'])} failed")
+    return {
+        'key_version': version,
+        'rotated': state['rotated'],
+        'skipped': state['skipped'],
+        'failed': state['failed'],
+        'last_id': state['last_id'],
+        'elapsed': elapsed
+    }
+
+
+def remaining_records(version):
+    """
+    Count encrypted records not yet under a key version
+
+    Args:
+        version (str): Version of the primary key
+
+    Returns:
+        int: Number of records still to rotate
+    """
+    session = Session()
+    try:
+        return session.query(MedicalRecord.id).filter(
+            MedicalRecord.encrypted_data.isnot(None),
+            or_(MedicalRecord.key_version.is_(None), MedicalRecord.key_version != version)
+        ).count()
+    finally:
+        session.close()
+
+
+def main(argv=None):
+    """Command line entry point"""
+    parser = argparse.ArgumentParser(description='Rotate the MedBlock record encryption key')
+    parser.add_argument('command', choices=['new-key', 'rotate-keys', 'retire-keys'])
+    parser.add_argument('--key-file', default=BLOCKCHAIN_KEY_FILE, help='Key file, one key per line, primary first')
+    parser.add_argument('--chunk-size', type=int, default=1000, help='Records per chunk')
+    parser.add_argument('--workers', type=int, default=None, help='Worker processes (0 = no pool)')
+    parser.add_argument('--max-rate', type=float, default=None, help='Maximum records per second')
+    parser.add_argument('--checkpoint', default=None, help='Checkpoint file')
+    parser.add_argument('--force', action='store_true', help='Retire old keys even if records still use them')
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    keys = load_encryption_keys(args.key_file) or []
+
+    if args.command == 'new-key':
+        save_encryption_key([generate_encryption_key()] + keys, args.key_file)
+        logger.info(f"Added new primary key to {args.key_file}, {len(keys)} older keys kept for decryption")
+        return 0
+
+    if not keys:
+        logger.error(f"No keys found in {args.key_file}")
+        return 1
+
+    if args.command == 'rotate-keys':
+        summary = rotate_keys(keys, chunk_size=args.chunk_size, workers=args.workers,
+                              max_rate=args.max_rate, checkpoint_file=args.checkpoint)
+        return 1 if summary['failed'] else 0
+
+    remaining = remaining_records(key_version(keys))
+    if remaining and not args.force:
+        logger.error(f"{remaining} records are not under the primary key yet, run rotate-keys first")
+        return 1
+    save_encryption_key(keys[:1], args.key_file)
+    logger.info(f"Removed {len(keys) - 1} old keys from {args.key_file}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
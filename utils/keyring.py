@@ -0,0 +1,159 @@
+"""
+Encryption Keyring for MedBlock
+
+This module keeps the master keys in memory so record reads and writes do
+not open the key file. The file is re-read only when a stat shows it has
+changed, and at most once per check interval, so a key rotation is picked
+up by running processes without a restart. Ciphers for every key version
+are built when the keys are loaded and handed out ready to use.
+"""
+
+import os
+import sys
+import time
+import logging
+import threading
+
+# Add parent directory to path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.envelope import get_cipher, key_version
+from utils.helpers import generate_encryption_key, save_encryption_key, load_encryption_keys
+from config.config import BLOCKCHAIN_KEY_FILE, KEYRING_CHECK_INTERVAL
+
+# Set up logger
+logger = logging.getLogger(__name__)
+
+_keyrings = {}
+_keyrings_lock = threading.Lock()
+
+
+class Keyring:
+    """
+    In-memory view of a key file holding one key per line, primary first
+    """
+
+    def __init__(self, filename, check_interval=KEYRING_CHECK_INTERVAL):
+        """
+        Initialize the keyring
+
+        Args:
+            filename (str): Key file path
+            check_interval (float): Minimum seconds between stats of the key file
+        """
+        self.filename = filename
+        self.check_interval = check_interval
+
+        self._keys = ()
+        self._ciphers = {}
+        self._cipher = None
+        self._signature = None
+        self._checked_at = None
+        self._lock = threading.Lock()
+
+    def _stat(self):
+        """Get the file attributes that change when the key file is rewritten"""
+        try:
+            stat = os.stat(self.filename)
+        except FileNotFoundError:
+            return None
+        return (stat.st_ino, stat.st_size, stat.st_mtime_ns)
+
+    def _load(self, signature):
+        """Load the keys and build their ciphers"""
+        keys = tuple(load_encryption_keys(self.filename) or ())
+        self._ciphers = {key_version(key): get_cipher(key) for key in keys}
+        self._cipher = get_cipher(keys) if keys else None
+        self._keys = keys
+        self._signature = signature
+        if keys:
+            logger.info(f"Loaded {len(keys)} encryption keys, primary version {key_version(keys)}")
+
+    def refresh(self, force=False):
+        """
+        Reload the keys if the key file changed
+
+        Args:
+            force (bool): Check the file even if the check interval has not passed
+        """
+        now = time.monotonic()
+        if not force and self._checked_at is not None and now - self._checked_at < self.check_interval:
+            return
+        with self._lock:
+            if not force and self._checked_at is not None and now - self._checked_at < self.check_interval:
+                return
+            signature = self._stat()
+            if signature != self._signature or force:
+                self._load(signature)
+            self._checked_at = now
+
+    @property
+    def keys(self):
+        """tuple: All keys, primary first, empty if there is no key file"""
+        self.refresh()
+        return self._keys
+
+    @property
+    def primary_key(self):
+        """bytes: Key used for new data, or None"""
+        keys = self.keys
+        return keys[0] if keys else None
+
+    @property
+    def version(self):
+        """str: Version of the primary key, or None"""
+        keys = self.keys
+        return key_version(keys) if keys else None
+
+    @property
+    def cipher(self):
+        """MultiFernet: Encrypts with the primary key and decrypts with any key, or None"""
+        self.refresh()
+        return self._cipher
+
+    def cipher_for(self, version):
+        """
+        Get the cipher of one key version
+
+        Args:
+            version (str): Key version, as stored with a record
+
+        Returns:
+            Fernet: Cipher of that key, or None if the key is not loaded
+        """
+        self.refresh()
+        return self._ciphers.get(version)
+
+    def ensure_key(self):
+        """
+        Get the keys, creating a primary key if the key file has none
+
+        Returns:
+            tuple: All keys, primary first
+        """
+        keys = self.keys
+        if keys:
+            return keys
+        with self._lock:
+            if not self._keys:
+                save_encryption_key(generate_encryption_key(), self.filename)
+                self._load(self._stat())
+                self._checked_at = time.monotonic()
+            return self._keys
+
+
+def get_keyring(filename=BLOCKCHAIN_KEY_FILE):
+    """
+    Get the shared keyring for a key file
+
+    Args:
+        filename (str): Key file path
+
+    Returns:
+        Keyring: Keyring created on first use and reused afterwards
+    """
+    keyring = _keyrings.get(filename)
+    if keyring is None:
+        with _keyrings_lock:
+            keyring = _keyrings.setdefault(filename, Keyring(filename))
+    return keyring
@@ -0,0 +1,285 @@
+"""
+Columnar Log Segments for MedBlock
+
+This module writes rows to immutable, compressed, columnar segment files
+and reads them back. Rows are written in groups; each column of a group is
+stored as its own zlib-compressed JSON block, so a reader decodes only the
+columns it needs. The footer records the minimum and maximum time of the
+segment and of every group, so a time range query skips the groups, and
+with the archive index the segments, that fall outside it.
+
+Layout:
+
+    MBLS                         magic
+    column blocks                one per column per group
+    footer                       JSON: columns, row count, times, block offsets
+    footer length                8 bytes, big-endian
+    MBLS                         magic
+
+A segment is written to a temporary file and renamed into place when
+complete, then made read-only.
+"""
+
+import os
+import json
+import zlib
+import struct
+import hashlib
+import datetime
+
+MAGIC = b'MBLS'
+VERSION = 1
+DEFAULT_GROUP_SIZE = 65536
+_LENGTH = struct.Struct('>Q')
+
+
+class SegmentError(Exception):
+    """Raised when a segment file is missing parts or corrupted"""
+    pass
+
+
+def _encode(value):
+    """Convert a value to its JSON form"""
+    if isinstance(value, datetime.datetime):
+        return value.isoformat()
+    return value
+
+
+def _parse_time(value):
+    """Parse a stored time, keeping None"""
+    return datetime.datetime.fromisoformat(value) if value is not None else None
+
+
+class SegmentWriter:
+    """Writes rows to a new segment file"""
+
+    def __init__(self, path, columns, time_column, group_size=DEFAULT_GROUP_SIZE):
+        """
+        Initialize the segment writer
+
+        Args:
+            path (str): Path of the segment to create
+            columns (list): Column names, in the order of the rows
+            time_column (str): Column holding the row time
+            group_size (int): Rows per group
+
+        Raises:
+            FileExistsError: If the segment already exists
+        """
+        if os.path.exists(path):
+            raise FileExistsError(f"Segment {path} already exists")
+        self.path = path
+        self.columns = list(columns)
+        self.time_column = time_column
+        self.group_size = group_size
+
+        self.rows = 0
+        self.min_time = None
+        self.max_time = None
+        self._datetime_columns = set()
+        self._groups = []
+        self._buffer = {column: [] for column in self.columns}
+        self._buffered = 0
+
+        self._tmp_path = f"{path}.tmp"
+        self._file = open(self._tmp_path, 'wb')
+        self._file.write(MAGIC)
+        self._sha256 = hashlib.sha256(MAGIC)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+    def _write(self, data):
+        self._file.write(data)
+        self._sha256.update(data)
+
+    def write(self, row):
+        """
+        Add a row
+
+        Args:
+            row (dict or sequence): Values by column name, or in column order
+        """
+        if not isinstance(row, dict):
+            row = dict(zip(self.columns, row))
+        for column in self.columns:
+            value = row.get(column)
+            if isinstance(value, datetime.datetime):
+                self._datetime_columns.add(column)
+            self._buffer[column].append(_encode(value))
+        self._buffered += 1
+        if self._buffered >= self.group_size:
+            self._write_group()
+
+    def _write_group(self):
+        """Compress the buffered rows as one group of column blocks"""
+        if not self._buffered:
+            return
+        times = [value for value in self._buffer[self.time_column] if value is not None]
+        group = {
+            'rows': self._buffered,
+            'min_time': min(times) if times else None,
+            'max_time': max(times) if times else None,
+            'blocks': {}
+        }
+        for column in self.columns:
+            block = zlib.compress(json.dumps(self._buffer[column], separators=(',', ':')).encode('utf-8'))
+            group['blocks'][column] = [self._file.tell(), len(block)]
+            self._write(block)
+            self._buffer[column] = []
+
+        if group['min_time'] is not None:
+            self.min_time = min(self.min_time or group['min_time'], group['min_time'])
+            self.max_time = max(self.max_time or group['max_time'], group['max_time'])
+        self.rows += self._buffered
+        self._buffered = 0
+        self._groups.append(group)
+
+    def close(self):
+        """
+        Finish the segment and move it into place
+
+        Returns:
+            dict: rows, min_time, max_time and sha256 of the segment
+        """
+        self._write_group()
+        footer = json.dumps({
+            'version': VERSION,
+            'columns': self.columns,
+            'time_column': self.time_column,
+            'datetime_columns': sorted(self._datetime_columns),
+            'rows': self.rows,
+            'min_time': self.min_time,
+            'max_time': self.max_time,
+            'groups': self._groups
+        }, separators=(',', ':')).encode('utf-8')
+        self._write(footer)
+        self._write(_LENGTH.pack(len(footer)))
+        self._write(MAGIC)
+
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._file.close()
+        os.replace(self._tmp_path, self.path)
+        os.chmod(self.path, 0o444)
+
+        return {
+            'rows': self.rows,
+            'min_time': self.min_time,
+            'max_time': self.max_time,
+            'sha256': self._sha256.hexdigest()
+        }
+
+    def abort(self):
+        """Discard the unfinished segment"""
+        self._file.close()
+        if os.path.exists(self._tmp_path):
+            os.remove(self._tmp_path)
+
+
+class Segment:
+    """Reads a segment file"""
+
+    def __init__(self, path):
+        """
+        Open a segment and read its footer
+
+        Args:
+            path (str): Path of the segment
+
+        Raises:
+            SegmentError: If the file is not a complete segment
+        """
+        self.path = path
+        with open(path, 'rb') as f:
+            f.seek(0, os.SEEK_END)
+            size = f.tell()
+            trailer_size = _LENGTH.size + len(MAGIC)
+            if size < len(MAGIC) + trailer_size:
+                raise SegmentError(f"Segment {path} is truncated")
+
+            f.seek(0)
+            if f.read(len(MAGIC)) != MAGIC:
+                raise SegmentError(f"{path} is not a log segment")
+            f.seek(size - trailer_size)
+            trailer = f.read(trailer_size)
+            if trailer[_LENGTH.size:] != MAGIC:
+                raise SegmentError(f"Segment {path} is truncated")
+
+            footer_length = _LENGTH.unpack(trailer[:_LENGTH.size])[0]
+            f.seek(size - trailer_size - footer_length)
+            try:
+                footer = json.loads(f.read(footer_length).decode('utf-8'))
+            except ValueError as e:
+                raise SegmentError(f"Segment {path} has a corrupted footer: {e}")
+
+        if footer.get('version') != VERSION:
+            raise SegmentError(f"Segment {path} has unsupported version {footer.get('version')}")
+        self.columns = footer['columns']
+        self.time_column = footer['time_column']
+        self.rows = footer['rows']
+        self.min_time = _parse_time(footer['min_time'])
+        self.max_time = _parse_time(footer['max_time'])
+        self._datetime_columns = set(footer['datetime_columns'])
+        self._groups = footer['groups']
+
+    def _read_block(self, f, group, column):
+        offset, length = group['blocks'][column]
+        f.seek(offset)
+        try:
+            values = json.loads(zlib.decompress(f.read(length)).decode('utf-8'))
+        except (zlib.error, ValueError) as e:
+            raise SegmentError(f"Segment {self.path} has a corrupted {column} block: {e}")
+        if column in self._datetime_columns:
+            values = [_parse_time(value) for value in values]
+        return values
+
+    def read(self, start=None, end=None, columns=None):
+        """
+        Read the rows in a time range
+
+        Args:
+            start (datetime, optional): Earliest time, inclusive
+            end (datetime, optional): Latest time, exclusive
+            columns (list, optional): Columns to return, defaults to all
+
+        Yields:
+            dict: Rows in the order they were written
+        """
+        columns = list(columns) if columns else self.columns
+        start_key = start.isoformat() if start else None
+        end_key = end.isoformat() if end else None
+
+        with open(self.path, 'rb') as f:
+            for group in self._groups:
+                if group['min_time'] is None:
+                    if start or end:
+                        continue
+                elif ((start_key and group['max_time'] < start_key)
+                        or (end_key and group['min_time'] >= end_key)):
+                    continue
+
+                times = self._read_block(f, group, self.time_column)
+                selected = [
+                    index for index, value in enumerate(times)
+                    if not (start or end) or (
+                        value is not None
+                        and (start is None or value >= start)
+                        and (end is None or value < end)
+                    )
+                ]
+                if not selected:
+                    continue
+
+                values = {
+                    column: times if column == self.time_column else self._read_block(f, group, column)
+                    for column in columns
+                }
+                for index in selected:
+                    yield {column: values[column][index] for column in columns}
@@ -0,0 +1,125 @@
+"""
+Merkle Tree Utilities for MedBlock
+
+This module builds Merkle trees over record data hashes and verifies
+inclusion proofs against an anchored root.
+"""
+
+import hashlib
+
+# Domain separation prefixes so a leaf can never be passed off as an inner node
+LEAF_PREFIX = b'\x00'
+NODE_PREFIX = b'\x01'
+
+
+def hash_leaf(data_hash):
+    """
+    Hash a record data hash into a Merkle leaf
+
+    Args:
+        data_hash (str): Hex-encoded SHA-256 hash of the record data
+
+    Returns:
+        bytes: Leaf hash
+    """
+    return hashlib.sha256(LEAF_PREFIX + bytes.fromhex(data_hash)).digest()
+
+
+def hash_node(left, right):
+    """
+    Hash two child nodes into their parent
+
+    Args:
+        left (bytes): Left child hash
+        right (bytes): Right child hash
+
+    Returns:
+        bytes: Parent hash
+    """
+    return hashlib.sha256(NODE_PREFIX + left + right).digest()
+
+
+class MerkleTree:
+    """
+    Binary SHA-256 Merkle tree over a list of record data hashes
+
+    An unpaired node at the end of a level is promoted to the next level
+    unchanged, so no leaf is ever duplicated.
+    """
+
+    def __init__(self, data_hashes):
+        """
+        Build the tree
+
+        Args:
+            data_hashes (list): Hex-encoded SHA-256 data hashes, in leaf order
+        """
+        if not data_hashes:
+            raise ValueError("Cannot build a Merkle tree without leaves")
+
+        self.data_hashes = list(data_hashes)
+        self.levels = [[hash_leaf(h) for h in self.data_hashes]]
+        while len(self.levels[-1]) > 1:
+            level = self.levels[-1]
+            parents = [hash_node(level[i], level[i + 1]) for i in range(0, len(level) - 1, 2)]
+            if len(level) % 2:
+                parents.append(level[-1])
+            self.levels.append(parents)
+
+    def __len__(self):
+        return len(self.data_hashes)
+
+    @property
+    def root(self):
+        """Return the hex-encoded Merkle root"""
+        return self.levels[-1][0].hex()
+
+    def proof(self, index):
+        """
+        Get the inclusion proof for a leaf
+
+        Args:
+            index (int): Position of the leaf
+
+        Returns:
+            list: (sibling_hash, side) pairs from the leaf up to the root, where
+                side is 'left' or 'right' depending on where the sibling sits
+        """
+        if index < 0 or index >= len(self.data_hashes):
+            raise IndexError(f"Leaf index {index} out of range")
+
+        path = []
+        for level in self.levels[:-1]:
+            sibling = index ^ 1
+            if sibling < len(level):
+                side = 'left' if sibling < index else 'right'
+                path.append((level[sibling].hex(), side))
+            index //= 2
+        return path
+
+
+def verify_proof(data_hash, proof, root):
+    """
+    Verify that a data hash is included under a Merkle root
+
+    Args:
+        data_hash (str): Hex-encoded SHA-256 hash of the record data
+        proof (list): (sibling_hash, side) pairs as returned by MerkleTree.proof
+        root (str): Hex-encoded Merkle root
+
+    Returns:
+        bool: True if the proof is valid, False otherwise
+    """
+    try:
+        node = hash_leaf(data_hash)
+        for sibling, side in proof:
+            sibling = bytes.fromhex(sibling)
+            if side == 'left':
+                node = hash_node(sibling, node)
+            elif side == 'right':
+                node = hash_node(node, sibling)
+            else:
+                return False
+        return node.hex() == root
+    except (ValueError, TypeError):
+        return False
@@ -0,0 +1,177 @@
+"""
+Streaming Record Export for MedBlock
+
+This module writes a patient's full record history as NDJSON, one record
+per line with its decrypted data, optionally gzip-compressed. Records are
+fetched in batches through a server-side cursor and decrypted by a bounded
+pool of worker threads, and each batch is written as soon as it is ready,
+so memory use does not depend on the size of the history.
+
+Run with:
+
+    python -m utils.record_export --patient-id 42 --output history.ndjson.gz
+"""
+
+import os
+import sys
+import json
+import zlib
+import logging
+import argparse
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+# Add parent directory to path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import select
+
+from database.models import Session, MedicalRecord
+from utils.envelope import decrypt_envelope
+from utils.keyring import get_keyring
+from config.config import BLOCKCHAIN_KEY_FILE, RECORDS_EXPORT_BATCH_SIZE, RECORDS_EXPORT_WORKERS
+
+# Set up logger
+logger = logging.getLogger(__name__)
+
+EXPORT_COLUMNS = [
+    MedicalRecord.id,
+    MedicalRecord.record_id,
+    MedicalRecord.record_type,
+    MedicalRecord.recorded_at,
+    MedicalRecord.created_at,
+    MedicalRecord.provider_id,
+    MedicalRecord.institution,
+    MedicalRecord.department,
+    MedicalRecord.location,
+    MedicalRecord.data_hash,
+    MedicalRecord.transaction_id,
+    MedicalRecord.block_number,
+    MedicalRecord.confirmation_status
+]
+
+
+def _export_lines(keys, rows):
+    """
+    Decrypt a batch of records and format them as NDJSON, run in a worker thread
+
+    Args:
+        keys (list): Master keys, primary first
+        rows (list): Rows of EXPORT_COLUMNS followed by the encrypted data
+            and wrapped data key
+
+    Returns:
+        bytes: One JSON line per record
+    """
+    lines = []
+    for row in rows:
+        record = dict(row._mapping)
+        encrypted_data = record.pop('encrypted_data')
+        wrapped_data_key = record.pop('wrapped_data_key')
+        for field in ('recorded_at', 'created_at'):
+            if record[field]:
+                record[field] = record[field].isoformat()
+
+        record['data'] = None
+        if encrypted_data:
+            try:
+                record['data'] = json.loads(decrypt_envelope(encrypted_data, wrapped_data_key, keys).decode())
+            except Exception as e:
+                logger.error(f"Error decrypting record {record['id']} for export: {str(e)}")
+                record['error'] = 'decryption failed'
+        lines.append(json.dumps(record))
+    return ('\n'.join(lines) + '\n').encode('utf-8')
+
+
+def export_patient_records(patient_id, keys, compress=False, batch_size=RECORDS_EXPORT_BATCH_SIZE,
+                           workers=RECORDS_EXPORT_WORKERS, on_batch=None):
+    """
+    Stream a patient's active records, oldest first
+
+    At most twice as many batches as workers are fetched ahead of the one
+    being written.
+
+    Args:
+        patient_id (int): ID of the patient
+        keys (list): Master keys, primary first
+        compress (bool): Gzip the output
+        batch_size (int): Records fetched and decrypted together
+        workers (int): Decryption threads
+        on_batch (callable, optional): Called with the IDs of each batch
+            once it has been written, e.g. to log the access
+
+    Yields:
+        bytes: Output chunks
+    """
+    compressor = zlib.compressobj(wbits=31) if compress else None
+    max_pending = workers * 2
+    pending = deque()
+
+    # A session of its own, so a streamed response does not hold the request's
+    session = Session.session_factory()
+    executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='record-export')
+    try:
+        result = session.execute(
+            select(*EXPORT_COLUMNS, MedicalRecord.encrypted_data, MedicalRecord.wrapped_data_key).where(
+                MedicalRecord.patient_id == patient_id,
+                MedicalRecord.is_active == True
+            ).order_by(MedicalRecord.recorded_at, MedicalRecord.id),
+            execution_options={'yield_per': batch_size}
+        )
+
+        def write(batch_ids, future):
+            data = future.result()
+            if compressor:
+                data = compressor.compress(data) + compressor.flush(zlib.Z_SYNC_FLUSH)
+            if on_batch:
+                on_batch(batch_ids)
+            return data
+
+        for rows in result.partitions():
+            pending.append(([row.id for row in rows], executor.submit(_export_lines, keys, rows)))
+            if len(pending) >= max_pending:
+                yield write(*pending.popleft())
+        while pending:
+            yield write(*pending.popleft())
+
+        if compressor:
+            yield compressor.flush()
+    finally:
+        executor.shutdown(wait=True, cancel_futures=True)
+        session.close()
+
+
+def main(argv=None):
+    """Command line entry point"""
+    parser = argparse.ArgumentParser(description="Export a patient's MedBlock record history as NDJSON")
+    parser.add_argument('--patient-id', type=int, required=True, help='ID of the patient')
+    parser.add_argument('--output', default='-', help='Output file, gzipped if it ends in .gz (- for stdout)')
+    parser.add_argument('--key-file', default=BLOCKCHAIN_KEY_FILE, help='Key file, primary key first')
+    parser.add_argument('--batch-size', type=int, default=RECORDS_EXPORT_BATCH_SIZE, help='Records per batch')
+    parser.add_argument('--workers', type=int, default=RECORDS_EXPORT_WORKERS, help='Decryption threads')
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    keys = get_keyring(args.key_file).keys
+    if not keys:
+        logger.error(f"No keys found in {args.key_file}")
+        return 1
+
+    exported = []
+    chunks = export_patient_records(args.patient_id, keys, compress=args.output.endswith('.gz'),
+                                    batch_size=args.batch_size, workers=args.workers,
+                                    on_batch=lambda record_ids: exported.append(len(record_ids)))
+    output = sys.stdout.buffer if args.output == '-' else open(args.output, 'wb')
+    try:
+        for chunk in chunks:
+            output.write(chunk)
+    finally:
+        if output is not sys.stdout.buffer:
+            output.close()
+
+    logger.info(f"Exported {sum(exported)} records of patient {args.patient_id}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
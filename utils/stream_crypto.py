@@ -0,0 +1,274 @@
+"""
+Streaming Attachment Encryption for MedBlock
+
+This module encrypts large attachments in fixed-size chunks with AES-GCM so
+a file never has to be held in memory whole. Each file gets its own data
+key, wrapped by the master key and stored in the header, and each chunk is
+sealed with a nonce made of a per-file random prefix and the chunk index.
+The last chunk is marked in its associated data, so truncating a file or
+reordering chunks fails authentication.
+
+File layout:
+
+    magic (4) | version (1) | chunk size (4) | nonce prefix (8) |
+    wrapped key length (2) | wrapped key | chunk 0 | chunk 1 | ...
+
+Every chunk is chunk size bytes of ciphertext plus a 16 byte tag, except
+the last, which may be shorter. Chunk positions follow from the header, so
+a byte range is served by decrypting only the chunks it touches.
+"""
+
+import os
+import sys
+import struct
+import hashlib
+
+# Add parent directory to path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+from cryptography.exceptions import InvalidTag
+
+from utils.envelope import get_cipher
+
+MAGIC = b'MBSE'
+VERSION = 1
+DEFAULT_CHUNK_SIZE = 64 * 1024
+TAG_SIZE = 16
+
+_HEADER = struct.Struct('>4sBI8sH')
+
+
+class StreamDecryptionError(Exception):
+    """Raised when an encrypted attachment is malformed or fails authentication"""
+    pass
+
+
+def _nonce(prefix, index):
+    return prefix + struct.pack('>I', index)
+
+
+def is_encrypted(path):
+    """
+    Check whether a file is an encrypted attachment
+
+    Args:
+        path (str): File path
+
+    Returns:
+        bool: True if the file starts with the attachment header
+    """
+    with open(path, 'rb') as f:
+        return f.read(len(MAGIC)) == MAGIC
+
+
+class StreamEncryptor:
+    """
+    Writable stream that encrypts what is written to it chunk by chunk
+
+    Plaintext is sealed as soon as a full chunk is buffered, except that
+    the last chunk is held back until finish() so it can be marked final.
+    At most one chunk plus the pending write is held in memory.
+    """
+
+    def __init__(self, destination, master_key, chunk_size=DEFAULT_CHUNK_SIZE):
+        """
+        Initialize the encryptor and write the file header
+
+        Args:
+            destination (file): Writable binary stream for the encrypted file
+            master_key (bytes or list): Master Fernet key, or keys with the primary first
+            chunk_size (int): Plaintext bytes per chunk
+        """
+        data_key = AESGCM.generate_key(bit_length=256)
+        self._prefix = os.urandom(8)
+        wrapped_key = get_cipher(master_key).encrypt(data_key)
+        self._header = _HEADER.pack(MAGIC, VERSION, chunk_size, self._prefix, len(wrapped_key)) + wrapped_key
+        destination.write(self._header)
+
+        self._destination = destination
+        self._aesgcm = AESGCM(data_key)
+        self._chunk_size = chunk_size
+        self._buffer = bytearray()
+        self._digest = hashlib.sha256()
+        self._size = 0
+        self._index = 0
+        self._finished = False
+
+    def _seal(self, chunk, final):
+        associated_data = self._header + (b'\x01' if final else b'\x00')
+        self._destination.write(self._aesgcm.encrypt(_nonce(self._prefix, self._index), bytes(chunk), associated_data))
+        self._index += 1
+
+    def write(self, data):
+        """
+        Encrypt plaintext, sealing every chunk that is complete
+
+        Args:
+            data (bytes): Plaintext
+
+        Returns:
+            int: Number of bytes accepted
+        """
+        if self._finished:
+            raise ValueError("Write to a finished attachment")
+        self._digest.update(data)
+        self._size += len(data)
+        self._buffer += data
+
+        # Keep at least one byte back, so the chunk sealed by finish() is never empty
+        # unless the whole file is
+        sealed = 0
+        while len(self._buffer) - sealed > self._chunk_size:
+            self._seal(memoryview(self._buffer)[sealed:sealed + self._chunk_size], False)
+            sealed += self._chunk_size
+        del self._buffer[:sealed]
+        return len(data)
+
+    def finish(self):
+        """
+        Seal the last chunk
+
+        Returns:
+            dict: 'size' and 'sha256' of the plaintext
+        """
+        if not self._finished:
+            self._seal(self._buffer, True)
+            self._buffer = bytearray()
+            self._finished = True
+        return {'size': self._size, 'sha256': self._digest.hexdigest()}
+
+
+def encrypt_stream(source, destination, master_key, chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    Encrypt a stream chunk by chunk
+
+    Args:
+        source (file): Readable binary stream of plaintext
+        destination (file): Writable binary stream for the encrypted file
+        master_key (bytes or list): Master Fernet key, or keys with the primary first
+        chunk_size (int): Plaintext bytes per chunk
+
+    Returns:
+        dict: 'size' and 'sha256' of the plaintext
+    """
+    encryptor = StreamEncryptor(destination, master_key, chunk_size=chunk_size)
+    for chunk in iter(lambda: source.read(chunk_size), b''):
+        encryptor.write(chunk)
+    return encryptor.finish()
+
+
+class EncryptedFile:
+    """
+    Random access reader for an encrypted attachment
+    """
+
+    def __init__(self, path, master_key):
+        """
+        Open an encrypted attachment
+
+        Args:
+            path (str): File path
+            master_key (bytes or list): Master Fernet key, or keys with the primary first
+
+        Raises:
+            StreamDecryptionError: If the header is invalid or the key does not match
+        """
+        self.path = path
+        self._file = open(path, 'rb')
+        try:
+            fixed = self._file.read(_HEADER.size)
+            if len(fixed) != _HEADER.size:
+                raise StreamDecryptionError(f"{path} is too short to be an encrypted attachment")
+            magic, version, self.chunk_size, self._prefix, key_length = _HEADER.unpack(fixed)
+            if magic != MAGIC or version != VERSION:
+                raise StreamDecryptionError(f"{path} is not an encrypted attachment")
+            wrapped_key = self._file.read(key_length)
+            self._header = fixed + wrapped_key
+            try:
+                self._aesgcm = AESGCM(get_cipher(master_key).decrypt(wrapped_key))
+            except Exception as e:
+                raise StreamDecryptionError(f"Cannot unwrap the data key of {path}: {str(e)}")
+
+            body = os.fstat(self._file.fileno()).st_size - len(self._header)
+            stride = self.chunk_size + TAG_SIZE
+            self.chunk_count = max(-(-body // stride), 1)
+            self.size = body - self.chunk_count * TAG_SIZE
+            if self.size < 0:
+                raise StreamDecryptionError(f"{path} is truncated")
+        except Exception:
+            self._file.close()
+            raise
+
+    def read_chunk(self, index):
+        """
+        Decrypt one chunk
+
+        Args:
+            index (int): Chunk index
+
+        Returns:
+            bytes: Plaintext of the chunk
+
+        Raises:
+            StreamDecryptionError: If the chunk fails authentication
+        """
+        stride = self.chunk_size + TAG_SIZE
+        self._file.seek(len(self._header) + index * stride)
+        ciphertext = self._file.read(stride)
+        final = index == self.chunk_count - 1
+        try:
+            return self._aesgcm.decrypt(_nonce(self._prefix, index), ciphertext,
+                                        self._header + (b'\x01' if final else b'\x00'))
+        except InvalidTag:
+            raise StreamDecryptionError(f"Chunk {index} of {self.path} failed authentication")
+
+    def iter_range(self, start=0, end=None):
+        """
+        Decrypt a byte range, one chunk at a time
+
+        Args:
+            start (int): First plaintext byte
+            end (int, optional): Last plaintext byte, inclusive; defaults to the end of the file
+
+        Yields:
+            bytes: Plaintext pieces covering the range
+        """
+        end = self.size - 1 if end is None else min(end, self.size - 1)
+        if start > end:
+            if self.size == 0:
+                # An empty file still has its final chunk to authenticate
+                self.read_chunk(0)
+            return
+        for index in range(start // self.chunk_size, end // self.chunk_size + 1):
+            chunk = self.read_chunk(index)
+            offset = index * self.chunk_size
+            yield chunk[max(start - offset, 0):end - offset + 1]
+
+    def close(self):
+        """Close the underlying file"""
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+def decrypt_stream(source_path, destination, master_key):
+    """
+    Decrypt an encrypted attachment into a stream
+
+    Args:
+        source_path (str): Path of the encrypted file
+        destination (file): Writable binary stream for the plaintext
+        master_key (bytes or list): Master Fernet key, or keys with the primary first
+
+    Returns:
+        int: Number of plaintext bytes written
+    """
+    with EncryptedFile(source_path, master_key) as encrypted:
+        for piece in encrypted.iter_range():
+            destination.write(piece)
+        return encrypted.size
@@ -0,0 +1,229 @@
+"""
+Record Verification Utilities for MedBlock
+
+This module verifies medical records against their anchored Merkle roots
+using the inclusion proofs stored in the database. Proofs are checked
+locally, so no blockchain call is needed for confirmed roots. A record
+only verifies once its batch is confirmed on chain; a valid proof against
+a simulated, failed or still pending anchor is reported with the reason.
+"""
+
+import os
+import sys
+import json
+import hashlib
+import logging
+
+# Add parent directory to path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from cryptography.fernet import InvalidToken
+
+from database.models import Session, MedicalRecord, AnchorBatch, RecordProof
+from utils.merkle import verify_proof
+from utils.envelope import decrypt_envelope
+
+# Set up logger
+logger = logging.getLogger(__name__)
+
+# Maximum number of IDs bound into a single IN clause
+QUERY_CHUNK_SIZE = 500
+
+# Reasons a valid proof does not verify, by batch status
+UNCONFIRMED_ANCHOR_REASONS = {
+    'simulated': 'anchor_simulated',
+    'failed': 'anchor_failed',
+    'pending': 'anchor_pending'
+}
+
+
+def _chunks(items, size):
+    """Yield successive slices of a list"""
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def _verification_result(record_id, verified, reason=None, data_hash=None, batch=None):
+    """Build the verification result for one record"""
+    result = {
+        'record_id': record_id,
+        'verified': verified,
+        'reason': reason,
+        'data_hash': data_hash,
+        'merkle_root': None,
+        'transaction_id': None,
+        'block_number': None,
+        'anchor_status': None
+    }
+    if batch is not None:
+        result.update({
+            'merkle_root': batch['merkle_root'],
+            'transaction_id': batch['transaction_id'],
+            'block_number': batch['block_number'],
+            'anchor_status': batch['status']
+        })
+    return result
+
+
+def verify_records(record_ids, encryption_key):
+    """
+    Verify medical records against their anchored Merkle roots
+
+    For each record the SHA-256 data hash is recomputed from the decrypted
+    payload, compared with the stored hash and then checked against the
+    batch root with the stored inclusion proof.
+
+    Args:
+        record_ids (list): Database IDs of the records to verify
+        encryption_key (bytes): Master key used to decrypt record data
+
+    Returns:
+        list: One result dictionary per requested record, in request order
+    """
+    results = {}
+
+    session = Session()
+    try:
+        for chunk in _chunks(list(dict.fromkeys(record_ids)), QUERY_CHUNK_SIZE):
+            rows = session.query(
+                MedicalRecord.id,
+                MedicalRecord.data_hash,
+                MedicalRecord.encrypted_data,
+                MedicalRecord.wrapped_data_key,
+                RecordProof.data_hash.label('proof_hash'),
+                RecordProof.proof,
+                AnchorBatch.merkle_root,
+                AnchorBatch.transaction_id,
+                AnchorBatch.block_number,
+                AnchorBatch.status
+            ).outerjoin(
+                RecordProof, RecordProof.record_id == MedicalRecord.id
+            ).outerjoin(
+                AnchorBatch, AnchorBatch.id == RecordProof.batch_id
+            ).filter(MedicalRecord.id.in_(chunk)).all()
+
+            for row in rows:
+                results[row.id] = _verify_row(row, encryption_key)
+    finally:
+        session.close()
+
+    return [
+        results.get(record_id) or _verification_result(record_id, False, 'record_not_found')
+        for record_id in record_ids
+    ]
+
+
+def _proof_result(record_id, data_hash, proof, batch):
+    """Check an inclusion proof and the status of the batch it leads to"""
+    if not verify_proof(data_hash, json.loads(proof), batch['merkle_root']):
+        return _verification_result(record_id, False, 'invalid_proof', data_hash, batch)
+
+    if batch['status'] != 'confirmed':
+        reason = UNCONFIRMED_ANCHOR_REASONS.get(batch['status'], 'anchor_pending')
+        return _verification_result(record_id, False, reason, data_hash, batch)
+
+    return _verification_result(record_id, True, None, data_hash, batch)
+
+
+def _verify_row(row, encryption_key):
+    """Verify one joined record/proof/batch row"""
+    if not row.encrypted_data:
+        return _verification_result(row.id, False, 'no_record_data', row.data_hash)
+
+    try:
+        plaintext = decrypt_envelope(row.encrypted_data, row.wrapped_data_key, encryption_key)
+    except InvalidToken:
+        return _verification_result(row.id, False, 'decryption_failed', row.data_hash)
+
+    data_hash = hashlib.sha256(plaintext).hexdigest()
+    if data_hash != row.data_hash:
+        return _verification_result(row.id, False, 'data_hash_mismatch', data_hash)
+
+    if row.proof is None:
+        return _verification_result(row.id, False, 'not_anchored', data_hash)
+
+    batch = {
+        'merkle_root': row.merkle_root,
+        'transaction_id': row.transaction_id,
+        'block_number': row.block_number,
+        'status': row.status
+    }
+    if row.proof_hash != data_hash:
+        return _verification_result(row.id, False, 'anchored_hash_outdated', data_hash, batch)
+
+    return _proof_result(row.id, data_hash, row.proof, batch)
+
+
+def patient_record_ids(patient_id, limit=None):
+    """
+    Get the IDs of a patient's active records, newest first
+
+    Args:
+        patient_id (int): ID of the patient
+        limit (int, optional): Maximum number of IDs to return
+
+    Returns:
+        list: Record IDs
+    """
+    session = Session()
+    try:
+        query = session.query(MedicalRecord.id).filter(
+            MedicalRecord.patient_id == patient_id,
+            MedicalRecord.is_active == True
+        ).order_by(MedicalRecord.recorded_at.desc())
+        if limit is not None:
+            query = query.limit(limit)
+        return [row.id for row in query]
+    finally:
+        session.close()
+
+
+def verify_patient_records(patient_id, encryption_key):
+    """
+    Verify every active record of a patient
+
+    Args:
+        patient_id (int): ID of the patient
+        encryption_key (bytes): Key used to decrypt record data
+
+    Returns:
+        list: One result dictionary per record
+    """
+    return verify_records(patient_record_ids(patient_id), encryption_key)
+
+
+def verify_data_hash(data_hash):
+    """
+    Verify that a data hash was anchored
+
+    Args:
+        data_hash (str): Hex-encoded SHA-256 hash of the record data
+
+    Returns:
+        dict: Verification result for the hash
+    """
+    session = Session()
+    try:
+        row = session.query(
+            RecordProof.record_id,
+            RecordProof.proof,
+            AnchorBatch.merkle_root,
+            AnchorBatch.transaction_id,
+            AnchorBatch.block_number,
+            AnchorBatch.status
+        ).join(
+            AnchorBatch, AnchorBatch.id == RecordProof.batch_id
+        ).filter(RecordProof.data_hash == data_hash).first()
+    finally:
+        session.close()
+
+    if row is None:
+        return _verification_result(None, False, 'not_anchored', data_hash)
+
+    batch = {
+        'merkle_root': row.merkle_root,
+        'transaction_id': row.transaction_id,
+        'block_number': row.block_number,
+        'status': row.status
+    }
+    return _proof_result(row.record_id, data_hash, row.proof, batch)